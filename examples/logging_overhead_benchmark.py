@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Logging overhead benchmark
+
+Measures the per-turn cost of hot-path logging for a typical agent turn
+(one LLM call with a large prompt and tool schemas, three tool calls, one
+knowledge search result) in three modes:
+
+- legacy:        eager f-string + json.dumps at INFO (the old behaviour)
+- policy:        nanobot.utils.logging_policy with default levels (payloads off)
+- policy-debug:  same policy with payload logging on (capped at 2000 chars)
+
+Usage:
+    python examples/logging_overhead_benchmark.py [--turns 200]
+"""
+
+import argparse
+import json
+import os
+import time
+
+from loguru import logger
+
+from nanobot.utils.logging_policy import LogPolicy, configure_logging_policy, get_logger
+
+
+def build_turn_payloads():
+    """Build payloads roughly the size of a real turn."""
+    system_prompt = "你是运维助手。" * 4000  # ~28k chars
+    tools = [
+        {
+            "type": "function",
+            "function": {
+                "name": f"tool_{i}",
+                "description": "Run an operation against the cluster. " * 10,
+                "parameters": {
+                    "type": "object",
+                    "properties": {f"arg_{j}": {"type": "string", "description": "x" * 80} for j in range(6)},
+                },
+            },
+        }
+        for i in range(40)
+    ]
+    kwargs = {
+        "model": "deepseek/deepseek-chat",
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": "RocketMQ 消费堆积怎么排查？"},
+        ],
+        "tools": tools,
+        "max_tokens": 4096,
+        "temperature": 0.7,
+    }
+    response = {"choices": [{"message": {"content": "分析结果：" * 500}}], "usage": {"total_tokens": 12345}}
+    tool_args = {"command": "kubectl get pods -A -o wide", "timeout": 60}
+    tool_result = "NAME READY STATUS RESTARTS AGE\n" * 400
+    knowledge_result = "## 文档片段\n消费堆积排查步骤...\n" * 300
+    return kwargs, response, tool_args, tool_result, knowledge_result
+
+
+def legacy_turn(kwargs, response, tool_args, tool_result, knowledge_result):
+    logger.info(f"[LLM] 调用模型: {kwargs['model']}")
+    logger.info(f"[LLM] 入参: {json.dumps(kwargs, ensure_ascii=False)}")
+    logger.info(f"[LLM] 出参: {json.dumps(response, ensure_ascii=False)}")
+    logger.info(f"[LOOP] 🤖 LLM response content: {response['choices'][0]['message']['content']}")
+    for _ in range(3):
+        args_str = json.dumps(tool_args, ensure_ascii=False)
+        logger.info(f"[LOOP] 🔧 工具输入: {args_str[:500]}...")
+        logger.info(f"[LOOP] 🔧 工具输出: {str(tool_result)[:300]}...")
+    logger.info(f"[KNOWLEDGE] 📝 Returning {knowledge_result}")
+
+
+def policy_turn(kwargs, response, tool_args, tool_result, knowledge_result):
+    llm, loop, tools = get_logger("llm"), get_logger("loop"), get_logger("tools.knowledge")
+    llm.info(f"[LLM] 调用模型: {kwargs['model']}, messages={len(kwargs['messages'])}, tools={len(kwargs['tools'])}")
+    llm.payload("[LLM] 入参:", lambda: kwargs)
+    llm.payload("[LLM] 出参:", lambda: response)
+    loop.payload("[LOOP] 🤖 LLM response content:", response["choices"][0]["message"]["content"])
+    for _ in range(3):
+        loop.payload("[LOOP] 🔧 工具输入:", tool_args)
+        loop.payload("[LOOP] 🔧 工具输出:", tool_result)
+    tools.payload("[KNOWLEDGE] 📝 Returning", knowledge_result)
+
+
+def run(label, fn, payloads, turns):
+    fn(*payloads)  # warm-up
+    start = time.perf_counter()
+    for _ in range(turns):
+        fn(*payloads)
+    per_turn_us = (time.perf_counter() - start) / turns * 1e6
+    print(f"{label:<14} {per_turn_us:>10.1f} µs/turn")
+    return per_turn_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+
+    # 与生产环境一致：INFO 级别写入文件（这里写到 /dev/null，只衡量格式化和 sink 开销）
+    logger.remove()
+    sink = open(os.devnull, "w", encoding="utf-8")
+    logger.add(sink, level="INFO")
+
+    payloads = build_turn_payloads()
+
+    configure_logging_policy(LogPolicy())
+    legacy = run("legacy", legacy_turn, payloads, args.turns)
+    policy = run("policy", policy_turn, payloads, args.turns)
+
+    logger.remove()
+    logger.add(sink, level="DEBUG")
+    configure_logging_policy(LogPolicy(default_level="DEBUG", max_payload_chars=2000))
+    debug = run("policy-debug", policy_turn, payloads, args.turns)
+
+    print(f"\nspeedup (policy vs legacy):       {legacy / policy:.1f}x")
+    print(f"speedup (policy-debug vs legacy): {legacy / debug:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
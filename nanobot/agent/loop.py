@@ -4,14 +4,16 @@ import asyncio
 import json
 import re
 import time
+from contextvars import ContextVar
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable
 
 from loguru import logger
 
 from nanobot.agent.context import ContextBuilder
 from nanobot.agent.subagent import SubagentManager
 from nanobot.agent.tools.cron import CronTool
+from nanobot.agent.tools.exposure import MCP_PROXY_TOOL, ToolExposure
 from nanobot.agent.tools.knowledge import KnowledgeSearchTool
 from nanobot.agent.tools.mcp import MCPTool
 from nanobot.agent.tools.message import MessageTool
@@ -22,6 +24,14 @@ from nanobot.bus.events import InboundMessage, OutboundMessage
 from nanobot.bus.queue import MessageBus
 from nanobot.providers.base import LLMProvider
 from nanobot.session.manager import SessionManager
+from nanobot.utils.logging_policy import get_logger
+
+log = get_logger("loop")
+
+# 请求级流式回调：并发处理的请求（如 Web UI 的多个连接）各自持有，互不覆盖
+_request_stream_callback: ContextVar[Callable[[dict], Any] | None] = ContextVar(
+    "agent_stream_callback", default=None
+)
 
 
 class AgentLoop:
@@ -49,8 +59,14 @@ class AgentLoop:
             restrict_to_workspace: bool = False,
             session_manager: SessionManager | None = None,
             custom_prompt: str | None = None,
+            tool_exposure: str = "all",
+            dynamic_tools_top_n: int = 8,
+            pinned_tools: list[str] | None = None,
+            tool_search_fn: Callable[[str, int], list[dict[str, Any]]] | None = None,
+            mcp_config: "MCPConfig | None" = None,
+            domain_router: "DomainRouter | None" = None,
     ):
-        from nanobot.config.schema import ExecToolConfig
+        from nanobot.config.schema import ExecToolConfig, MCPConfig
         self.bus = bus
         self.provider = provider
         self.workspace = workspace
@@ -60,6 +76,11 @@ class AgentLoop:
         self.exec_config = exec_config or ExecToolConfig()
         self.cron_service = cron_service
         self.restrict_to_workspace = restrict_to_workspace
+        self.tool_exposure = tool_exposure
+        self.dynamic_tools_top_n = dynamic_tools_top_n
+        self.pinned_tools = list(pinned_tools if pinned_tools is not None else ["exec", "knowledge_search"])
+        self.tool_search_fn = tool_search_fn
+        self.mcp_config = mcp_config or MCPConfig()
 
         self.context = ContextBuilder(workspace)
         self.sessions = session_manager or SessionManager(workspace)
@@ -75,6 +96,9 @@ class AgentLoop:
         )
 
         self._running = False
+        self._domain_router = domain_router
+        self._tool_exposure: ToolExposure | None = None
+        self._tool_exposure_loaded = False
         self._register_default_tools()
 
         self.custom_prompt = custom_prompt
@@ -121,6 +145,7 @@ class AgentLoop:
         # Knowledge base tools (for local knowledge storage and retrieval)
         self.tools.register(KnowledgeSearchTool())
         # self.tools.register(KnowledgeAddTool())
+        # self.tools.register(KnowledgeJobStatusTool())
         # self.tools.register(DomainKnowledgeTool())
         # self.tools.register(KnowledgeExportTool())
 
@@ -175,7 +200,7 @@ class AgentLoop:
 
         preview = msg.content[:80] + "..." if len(msg.content) > 80 else msg.content
         logger.info(f"Processing message from {msg.channel}:{msg.sender_id}: {preview}")
-        logger.info(f"[LOOP] 📥 Received user message: {msg.content}")
+        log.payload("[LOOP] 📥 Received user message:", msg.content)
 
         # Get or create session
         session = self.sessions.get_or_create(msg.session_key)
@@ -213,6 +238,10 @@ class AgentLoop:
             additional_context=knowledge_context  # 添加知识库查询结果作为额外上下文
         )
 
+        # dynamic 工具下发：按当前消息检索相关工具，会话中调用过的工具始终下发
+        exposed_tools = await self._retrieve_tools(msg.content)
+        called_tools = set(session.metadata.get("called_tools", []))
+
         # Agent loop
         iteration = 0
         final_content = None
@@ -223,24 +252,24 @@ class AgentLoop:
         while iteration < self.max_iterations:
             iteration += 1
 
-            logger.info(f"[LOOP] 🔄 Agent iteration {iteration}/{self.max_iterations}")
-            logger.info(f"[LOOP] 📝 Context messages count: {len(messages)}")
+            log.info(f"[LOOP] 🔄 Agent iteration {iteration}/{self.max_iterations}, context messages: {len(messages)}")
 
-            # Log the last user message for context
-            for msg_item in reversed(messages):
-                if msg_item.get("role") == "user":
-                    content_preview = str(msg_item.get("content", ""))[:200]
-                    logger.info(f"[LOOP] 💬 Last user message: {content_preview}...")
-                    break
+            # Log the last user message for context (only scanned when DEBUG is on for "loop")
+            if log.enabled("DEBUG"):
+                for msg_item in reversed(messages):
+                    if msg_item.get("role") == "user":
+                        content_preview = str(msg_item.get("content", ""))[:200]
+                        log.debug(f"[LOOP] 💬 Last user message: {content_preview}...")
+                        break
 
             # Call LLM
-            logger.info(f"[LOOP] 🤖 Calling LLM with model: {self.model}")
+            log.debug(f"[LOOP] 🤖 Calling LLM with model: {self.model}")
 
             # 记录LLM调用开始时间
             llm_start_time = time.time()
 
             # 检查是否有流式回调函数
-            stream_callback = getattr(self, 'stream_callback', None)
+            stream_callback = self._active_stream_callback()
 
             # 如果存在流式回调，传递迭代计数信息
             if stream_callback:
@@ -259,7 +288,7 @@ class AgentLoop:
 
             response = await self.provider.chat(
                 messages=messages,
-                tools=self.tools.get_definitions(),
+                tools=self._tool_definitions(exposed_tools, called_tools),
                 model=self.model,
                 stream=bool(stream_callback),
                 stream_callback=stream_callback
@@ -271,16 +300,16 @@ class AgentLoop:
             logger.info(f"[LOOP] ⏱️  LLM调用耗时: {llm_duration:.3f}秒")
 
             # Log LLM response
-            response_preview = response.content if response.content else "(no content)"
-            logger.info(f"[LOOP] 🤖 LLM response content: {response_preview}")
-            logger.info(f"[LOOP] 🤖 LLM response has_tool_calls: {response.has_tool_calls}")
+            log.payload("[LOOP] 🤖 LLM response content:", response.content or "(no content)")
 
             if response.has_tool_calls:
-                logger.info(f"[LOOP] 🔧 LLM requested {len(response.tool_calls)} tool call(s)")
-                for tc in response.tool_calls:
-                    logger.info(f"[LOOP] 🔧   - Tool: {tc.name}")
+                log.info(
+                    "[LOOP] 🔧 LLM requested {} tool call(s): {}",
+                    lambda: len(response.tool_calls),
+                    lambda: ", ".join(tc.name for tc in response.tool_calls),
+                )
             else:
-                logger.info(f"[LOOP] ✅ LLM provided final response (no tool calls)")
+                log.info("[LOOP] ✅ LLM provided final response (no tool calls)")
 
             # Handle tool calls
             if response.has_tool_calls:
@@ -308,9 +337,8 @@ class AgentLoop:
                         tool_call.arguments,
                         msg.content,
                     )
-                    args_str = json.dumps(tool_args, ensure_ascii=False)
-                    logger.info(f"[LOOP] 🔧 执行工具: {tool_name}")
-                    logger.info(f"[LOOP] 🔧 工具输入: {args_str[:500]}...")
+                    log.info(f"[LOOP] 🔧 执行工具: {tool_name}")
+                    log.payload("[LOOP] 🔧 工具输入:", tool_args)
 
                     # 记录开始时间
                     start_time = time.time()
@@ -327,6 +355,7 @@ class AgentLoop:
                                 if command_parts:
                                     display_tool_name = f"exec: {command_parts[0]}"
 
+                        args_str = json.dumps(tool_args, ensure_ascii=False)
                         tool_start_info = {
                             "content": f"🔧 开始执行工具: {display_tool_name}\\n工具参数: {args_str[:1000]}...\\n",
                             "is_tool_call": True,
@@ -339,6 +368,7 @@ class AgentLoop:
                         else:
                             stream_callback(tool_start_info)
 
+                    called_tools.add(tool_name)
                     try:
                         result = await self.tools.execute(tool_name, tool_args)
 
@@ -347,8 +377,8 @@ class AgentLoop:
                         duration = end_time - start_time
 
                         result_preview = str(result)[:300] if result else "(empty result)"
-                        logger.info(f"[LOOP] 🔧 工具输出: {result_preview}...")
-                        logger.info(f"[LOOP] ⏱️  工具执行耗时: {duration:.3f}秒")
+                        log.payload("[LOOP] 🔧 工具输出:", result or "(empty result)")
+                        log.info(f"[LOOP] ⏱️  工具执行耗时: {duration:.3f}秒")
 
                         # 发送工具执行结果到前端
                         if stream_callback:
@@ -449,6 +479,7 @@ class AgentLoop:
         # Save to session
         session.add_message("user", msg.content)
         session.add_message("assistant", final_content)
+        session.metadata["called_tools"] = sorted(called_tools)
         self.sessions.save(session)
 
         return OutboundMessage(
@@ -501,6 +532,8 @@ class AgentLoop:
             channel=origin_channel,
             chat_id=origin_chat_id,
         )
+        exposed_tools = await self._retrieve_tools(msg.content)
+        called_tools = set(session.metadata.get("called_tools", []))
 
         # Agent loop (limited for announce handling)
         iteration = 0
@@ -518,7 +551,7 @@ class AgentLoop:
 
             response = await self.provider.chat(
                 messages=messages,
-                tools=self.tools.get_definitions(),
+                tools=self._tool_definitions(exposed_tools, called_tools),
                 model=self.model
             )
 
@@ -549,13 +582,13 @@ class AgentLoop:
                         tool_call.arguments,
                         msg.content,
                     )
-                    args_str = json.dumps(tool_args, ensure_ascii=False)
-                    logger.info(f"[SYSTEM] 🔧 执行工具: {tool_name}")
-                    logger.info(f"[SYSTEM] 🔧 工具输入: {args_str[:200]}...")
+                    log.info(f"[SYSTEM] 🔧 执行工具: {tool_name}")
+                    log.payload("[SYSTEM] 🔧 工具输入:", tool_args)
 
                     # 记录开始时间
                     start_time = time.time()
 
+                    called_tools.add(tool_name)
                     try:
                         result = await self.tools.execute(tool_name, tool_args)
 
@@ -563,9 +596,8 @@ class AgentLoop:
                         end_time = time.time()
                         duration = end_time - start_time
 
-                        result_preview = str(result)[:300] if result else "(empty result)"
-                        logger.info(f"[SYSTEM] 🔧 工具输出: {result_preview}...")
-                        logger.info(f"[SYSTEM] ⏱️  工具执行耗时: {duration:.3f}秒")
+                        log.payload("[SYSTEM] 🔧 工具输出:", result or "(empty result)")
+                        log.info(f"[SYSTEM] ⏱️  工具执行耗时: {duration:.3f}秒")
 
                         messages = self.context.add_tool_result(
                             messages, tool_call.id, tool_name, result
@@ -604,6 +636,7 @@ class AgentLoop:
         # Save to session (mark as system message in history)
         session.add_message("user", f"[System: {msg.sender_id}] {msg.content}")
         session.add_message("assistant", final_content)
+        session.metadata["called_tools"] = sorted(called_tools)
         self.sessions.save(session)
 
         return OutboundMessage(
@@ -722,6 +755,7 @@ class AgentLoop:
             chat_id: str = "direct",
             additional_context: str | None = None,
             disable_auto_kb: bool = False,
+            stream_callback: Callable[[dict], Any] | None = None,
     ) -> str:
         """
         Process a message directly (for CLI or cron usage).
@@ -731,6 +765,8 @@ class AgentLoop:
             session_key: Session identifier.
             channel: Source channel (for context).
             chat_id: Source chat ID (for context).
+            stream_callback: Streaming callback for this call only (defaults to self.stream_callback).
+                Scoped to the calling task, so concurrent calls do not overwrite each other's callback.
         
         Returns:
             The agent's response.
@@ -750,7 +786,7 @@ class AgentLoop:
         start_time = time.time()
 
         # 设置流式回调函数，传递迭代计数和耗时信息
-        original_stream_callback = getattr(self, 'stream_callback', None)
+        original_stream_callback = stream_callback or self._active_stream_callback()
 
         if original_stream_callback:
             async def enhanced_stream_callback(context_info: dict):
@@ -766,13 +802,15 @@ class AgentLoop:
                 else:
                     original_stream_callback(context_info)
 
-            self.stream_callback = enhanced_stream_callback
-
-        response = await self._process_message(msg)
+            token = _request_stream_callback.set(enhanced_stream_callback)
+        else:
+            token = _request_stream_callback.set(None)
 
-        # 恢复原始回调函数
-        if original_stream_callback:
-            self.stream_callback = original_stream_callback
+        try:
+            response = await self._process_message(msg)
+        finally:
+            # 恢复原始回调函数
+            _request_stream_callback.reset(token)
 
         return response.content if response else ""
 
@@ -812,22 +850,38 @@ class AgentLoop:
         # 根据类型进行不同的处理
         if response_type == "reasoning":
             # 意图识别或推理过程
-            logger.info(f"[STREAM] 🤔 意图识别 (模型: {context_info.get('model', 'unknown')}): {content}")
+            log.debug(
+                "[STREAM] 🤔 意图识别 (模型: {}): {}",
+                lambda: context_info.get('model', 'unknown'),
+                lambda: content,
+            )
             # 这里可以调用UI更新方法，显示意图识别内容
 
         elif response_type == "tool_call":
             # 工具调用
-            logger.info(f"[STREAM] 🔧 工具执行 (模型: {context_info.get('model', 'unknown')}): {content}")
+            log.debug(
+                "[STREAM] 🔧 工具执行 (模型: {}): {}",
+                lambda: context_info.get('model', 'unknown'),
+                lambda: content,
+            )
             # 这里可以调用UI更新方法，显示工具执行内容
 
         elif response_type == "final_answer":
             # 最终答案
-            logger.info(f"[STREAM] 💬 最终回答 (模型: {context_info.get('model', 'unknown')}): {content}")
+            log.debug(
+                "[STREAM] 💬 最终回答 (模型: {}): {}",
+                lambda: context_info.get('model', 'unknown'),
+                lambda: content,
+            )
             # 这里可以调用UI更新方法，显示最终回答内容
 
         else:
             # 普通文本内容
-            logger.info(f"[STREAM] 📝 普通内容 (模型: {context_info.get('model', 'unknown')}): {content}")
+            log.debug(
+                "[STREAM] 📝 普通内容 (模型: {}): {}",
+                lambda: context_info.get('model', 'unknown'),
+                lambda: content,
+            )
             # 这里可以调用UI更新方法，显示普通内容
 
     def _determine_response_type(self, context_info: dict) -> str:
@@ -1012,14 +1066,60 @@ class AgentLoop:
                 })
             return None
 
+    def _active_stream_callback(self) -> Callable[[dict], Any] | None:
+        """当前请求的流式回调（process_direct 设置的优先于实例属性）."""
+        return _request_stream_callback.get() or getattr(self, 'stream_callback', None)
+
     async def _send_stream_callback(self, context_info: dict):
         """发送流式回调信息的辅助方法."""
-        if hasattr(self, 'stream_callback') and self.stream_callback:
-            import asyncio
-            if asyncio.iscoroutinefunction(self.stream_callback):
-                await self.stream_callback(context_info)
+        stream_callback = self._active_stream_callback()
+        if stream_callback:
+            if asyncio.iscoroutinefunction(stream_callback):
+                await stream_callback(context_info)
             else:
-                self.stream_callback(context_info)
+                stream_callback(context_info)
+
+    def _get_tool_exposure(self) -> ToolExposure | None:
+        """惰性创建动态工具下发器；tool_exposure 不是 dynamic 时返回 None（下发全部工具）."""
+        if not self._tool_exposure_loaded:
+            if self.tool_exposure == "dynamic":
+                pinned = list(self.pinned_tools)
+                # 启用了 MCP 服务时代理工具始终下发：检索未命中时隐藏它只会失去 MCP 能力
+                if any(server.enabled for server in self.mcp_config.servers.values()):
+                    pinned.append(MCP_PROXY_TOOL)
+                self._tool_exposure = ToolExposure(
+                    self.tools, self.tool_search_fn, top_n=self.dynamic_tools_top_n, pinned=pinned
+                )
+            self._tool_exposure_loaded = True
+        return self._tool_exposure
+
+    async def _retrieve_tools(self, query: str) -> set[str] | None:
+        """dynamic 模式下与消息相关的工具名；None 表示下发全部工具."""
+        exposure = self._get_tool_exposure()
+        if exposure is None:
+            return None
+        return await asyncio.to_thread(exposure.retrieve, query)
+
+    def _tool_definitions(self, exposed: set[str] | None, called: set[str]) -> list[dict[str, Any]]:
+        exposure = self._get_tool_exposure()
+        if exposure is None:
+            return self.tools.get_definitions()
+        definitions = exposure.definitions(exposed, called)
+        log.info(
+            "[LOOP] 🧰 下发工具 {}/{}: {}",
+            lambda: len(definitions),
+            lambda: len(self.tools),
+            lambda: ", ".join(d["function"]["name"] for d in definitions),
+        )
+        return definitions
+
+    def _get_domain_router(self) -> "DomainRouter":
+        """领域路由器：未从构造函数传入时惰性创建（不带 embedding 兜底）."""
+        if self._domain_router is None:
+            from nanobot.knowledge.domain_router import DomainRouter
+
+            self._domain_router = DomainRouter(self.workspace)
+        return self._domain_router
 
     def _infer_knowledge_query(self, user_input: str) -> tuple[str | None, str | None]:
         """
@@ -1033,24 +1133,9 @@ class AgentLoop:
         """
         input_lower = user_input.lower()
 
-        # 定义领域关键词映射
-        domain_keywords = {
-            "rocketmq": ["rocketmq", "tdmq", "消息队列", "mq", "broker", "namesrv", "nameserver", "cluster", "topic",
-                         "consumer", "producer", "group"],
-            "kubernetes": ["k8s", "kubernetes", "pod", "deployment", "service", "kubectl", "namespace"],
-            "general": []  # 通用领域，用于没有匹配到特定领域的情况
-        }
-
-        # 根据关键词匹配领域
-        matched_domain = None
-        for domain, keywords in domain_keywords.items():
-            if any(keyword in input_lower for keyword in keywords):
-                matched_domain = domain
-                break
-
-        # 如果没有匹配到特定领域，使用通用领域
-        if not matched_domain:
-            matched_domain = "general"
+        # 按工作空间的领域关键词表路由（Aho–Corasick 单次扫描，关键词文件变化时自动重新加载）
+        decision = self._get_domain_router().route(user_input)
+        matched_domain = decision.domain
 
         # 清理查询关键词：移除标点符号和多余空格
         import re
@@ -1061,6 +1146,9 @@ class AgentLoop:
         if not query_keywords.strip():
             query_keywords = user_input[:20].strip()
 
-        logger.info(f"[KNOWLEDGE] 🔍 推断查询参数: domain={matched_domain}, query={query_keywords}")
+        logger.info(
+            f"[KNOWLEDGE] 🔍 推断查询参数: domain={matched_domain} ({decision.method}, "
+            f"{decision.elapsed_ms:.3f}ms), query={query_keywords}"
+        )
 
         return matched_domain, query_keywords
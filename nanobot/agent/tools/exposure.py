@@ -0,0 +1,68 @@
+"""Dynamic tool exposure: send only the tool schemas relevant to a message."""
+
+from typing import Any, Callable, Iterable
+
+from loguru import logger
+
+from nanobot.agent.tools.registry import ToolRegistry
+
+# Registry tool that proxies every MCP server tool
+MCP_PROXY_TOOL = "use_mcp_tool"
+
+
+class ToolExposure:
+    """
+    Selects which registered tools are exposed to the LLM for a message.
+
+    The tools vector index is searched with the message text; hits on registry
+    tools expose that tool, hits on MCP server tools expose the MCP proxy tool.
+    A pinned core set and every tool already called in the conversation are
+    always exposed. When the index is unavailable or returns nothing usable,
+    all tools are exposed.
+    """
+
+    def __init__(
+        self,
+        registry: ToolRegistry,
+        search_fn: Callable[[str, int], list[dict[str, Any]]] | None,
+        top_n: int = 8,
+        pinned: Iterable[str] = (),
+    ):
+        self.registry = registry
+        self.search_fn = search_fn
+        self.top_n = top_n
+        self.pinned = [name for name in pinned if name]
+
+    @staticmethod
+    def registry_tool_for(hit: dict[str, Any]) -> str | None:
+        """Map a tools-index hit to the registry tool that serves it."""
+        meta = hit.get("metadata") or {}
+        source = meta.get("source", "")
+        if source == "registry_tool":
+            return meta.get("tool_name") or None
+        if source in ("mcp_tool", "mcp_server"):
+            return MCP_PROXY_TOOL
+        return None
+
+    def retrieve(self, query: str) -> set[str] | None:
+        """
+        Registry tool names relevant to the query.
+
+        Returns None when retrieval is unavailable (caller should expose all tools).
+        """
+        if self.search_fn is None or not query.strip():
+            return None
+        try:
+            hits = self.search_fn(query, self.top_n)
+        except Exception as e:
+            logger.warning(f"[TOOLS] tool retrieval failed, exposing all tools: {e}")
+            return None
+        names = {name for name in map(self.registry_tool_for, hits) if name and self.registry.has(name)}
+        return names or None
+
+    def definitions(self, retrieved: set[str] | None, called: Iterable[str] = ()) -> list[dict[str, Any]]:
+        """Schemas for pinned + retrieved + already-called tools (all tools if retrieved is None)."""
+        if retrieved is None:
+            return self.registry.get_definitions()
+        names = set(self.pinned) | retrieved | set(called)
+        return self.registry.get_definitions(names)
@@ -1,5 +1,6 @@
 """Knowledge base tools for storing and retrieving domain-specific knowledge."""
 
+import asyncio
 import json
 from datetime import datetime
 from pathlib import Path
@@ -7,8 +8,12 @@ from typing import Any, List, Optional
 
 from nanobot.agent.tools.base import Tool
 from nanobot.config.loader import load_config
-from nanobot.knowledge.store_factory import get_chroma_store
+from nanobot.knowledge.ingestion_queue import PRIORITY_INTERACTIVE
+from nanobot.knowledge.store_factory import get_chroma_store, get_ingestion_queue
 from nanobot.knowledge.store import DomainKnowledgeManager
+from nanobot.utils.logging_policy import get_logger
+
+log = get_logger("tools.knowledge")
 
 
 def _create_chroma_store_with_config(workspace: Path):
@@ -70,13 +75,11 @@ class KnowledgeSearchTool(Tool):
             from loguru import logger
             config = load_config()
 
-            logger.info(f"[KNOWLEDGE] 🔍 Search request:")
-            logger.info(f"[KNOWLEDGE]   - Domain: {domain}")
-            logger.info(f"[KNOWLEDGE]   - Query: {query}")
-            logger.info(f"[KNOWLEDGE]   - Category: {category}")
-            logger.info(f"[KNOWLEDGE]   - Tags: {tags}")
-            logger.info(f"[KNOWLEDGE]   - Limit: {limit}")
-            logger.info(f"[KNOWLEDGE]   - Workspace: {config.agents.defaults.workspace}")
+            log.info(f"[KNOWLEDGE] 🔍 Search request: domain={domain}, query={query}, limit={limit}")
+            log.debug(
+                f"[KNOWLEDGE]   - Category: {category}, Tags: {tags}, "
+                f"Workspace: {config.agents.defaults.workspace}"
+            )
 
             workspace = Path(config.agents.defaults.workspace)
 
@@ -84,25 +87,42 @@ class KnowledgeSearchTool(Tool):
             store = _create_chroma_store_with_config(workspace)
 
             # Search knowledge
-            results = store.search_knowledge(
+            # 在线程中执行检索，不阻塞事件循环，并发查询的向量化可被合并批处理
+            # 配置了 token 预算时按 MMR 去冗余并截断到预算内
+            token_budget = store.config.context_token_budget or None
+            results = await asyncio.to_thread(
+                store.search_knowledge,
                 query=query,
                 domain=domain,
                 category=category,
-                tags=tags
+                tags=tags,
+                token_budget=token_budget,
+                token_model=config.agents.defaults.model
             )
-
-            logger.info(f"[KNOWLEDGE] 📊 Search results: {len(results)} items found")
+            packing_note = ""
+            if token_budget is not None:
+                dropped = results.drop_summary()
+                if dropped or results.truncated:
+                    packing_note = (
+                        f"\n(Context budget {results.tokens_used}/{results.token_budget} tokens: "
+                        f"omitted {dropped.get('redundant', 0)} redundant and "
+                        f"{dropped.get('budget', 0)} over-budget results, truncated {results.truncated})\n"
+                    )
+                results = results.items
+
+            log.info(f"[KNOWLEDGE] 📊 Search results: {len(results)} items found")
 
             # Apply limit
             results = results[:limit]
 
             if not results:
-                logger.info(f"[KNOWLEDGE] ⚠️  No knowledge found")
+                log.info("[KNOWLEDGE] ⚠️  No knowledge found")
                 return f"No knowledge found for domain '{domain}' with query '{query}'"
 
             # Log result titles
-            for i, item in enumerate(results, 1):
-                logger.info(f"[KNOWLEDGE]   {i}. {item.title} (score: {getattr(item, 'similarity_score', 'N/A')})")
+            if log.enabled("DEBUG"):
+                for i, item in enumerate(results, 1):
+                    log.debug(f"[KNOWLEDGE]   {i}. {item.title} (score: {getattr(item, 'similarity_score', 'N/A')})")
 
             # Format results
             formatted_results = []
@@ -141,9 +161,9 @@ class KnowledgeSearchTool(Tool):
 ---
 """)
 
-            result_text = f"Found {len(results)} knowledge items:\n" + "\n".join(formatted_results)
-            logger.info(f"[KNOWLEDGE] ✅ Returning {len(result_text)} chars of formatted results")
-            logger.info(f"[KNOWLEDGE] 📝 Returning {result_text}")
+            result_text = f"Found {len(results)} knowledge items:\n" + "\n".join(formatted_results) + packing_note
+            log.info(f"[KNOWLEDGE] ✅ Returning {len(result_text)} chars of formatted results")
+            log.payload("[KNOWLEDGE] 📝 Returning", result_text)
             return result_text
 
         except Exception as e:
@@ -221,15 +241,16 @@ class KnowledgeAddTool(Tool):
                       tags: Optional[List[str]] = None, priority: int = 1,
                       source_url: str = "", file_path: str = "", 
                       preview_available: bool = True) -> str:
-        """Add knowledge to the knowledge base."""
+        """Queue knowledge for background ingestion; returns the job handle immediately."""
         try:
             config = load_config()
             workspace = Path(config.agents.defaults.workspace)
 
-            # Use ChromaKnowledgeStore for vector-based knowledge storage
-            store = _create_chroma_store_with_config(workspace)
-
-            item_id = store.add_knowledge(
+            # 分块与向量化在后台导入队列中执行，不阻塞当前对话轮次
+            queue = await asyncio.to_thread(get_ingestion_queue, workspace, cfg=config)
+            job = queue.submit(
+                "add",
+                job_priority=PRIORITY_INTERACTIVE,
                 domain=domain,
                 category=category,
                 title=title,
@@ -241,12 +262,65 @@ class KnowledgeAddTool(Tool):
                 preview_available=preview_available
             )
 
-            return f"Successfully added knowledge item '{title}' with ID: {item_id}"
+            return (
+                f"Queued knowledge item '{title}' with ID: {job.item_id} (job {job.job_id}). "
+                f"It becomes searchable once the job completes; check it with knowledge_job_status."
+            )
 
         except Exception as e:
             return f"Error adding knowledge: {str(e)}"
 
 
+class KnowledgeJobStatusTool(Tool):
+    """Tool for checking background knowledge ingestion jobs."""
+
+    @property
+    def name(self) -> str:
+        return "knowledge_job_status"
+
+    @property
+    def description(self) -> str:
+        return "Check the status and progress of background knowledge ingestion jobs created by knowledge_add."
+
+    @property
+    def parameters(self) -> dict[str, Any]:
+        return {
+            "type": "object",
+            "properties": {
+                "job_id": {
+                    "type": "string",
+                    "description": "Job ID returned by knowledge_add (omit to list recent jobs)"
+                }
+            },
+            "required": []
+        }
+
+    async def execute(self, job_id: Optional[str] = None) -> str:
+        """Report job status."""
+        try:
+            config = load_config()
+            queue = await asyncio.to_thread(get_ingestion_queue, Path(config.agents.defaults.workspace), cfg=config)
+
+            jobs = [queue.get(job_id)] if job_id else None
+            if job_id and jobs[0] is None:
+                return f"No ingestion job found with ID: {job_id}"
+            summaries = [job.summary() for job in jobs] if jobs else queue.list_jobs(limit=10)
+            if not summaries:
+                return "No ingestion jobs"
+
+            lines = []
+            for s in summaries:
+                line = (f"- {s['job_id']} [{s['status']}] {s['kind']} '{s['title']}' "
+                        f"item={s['item_id']} stage={s['stage'] or '-'} progress={s['progress']:.0%}")
+                if s["error"]:
+                    line += f" error={s['error']}"
+                lines.append(line)
+            return "\n".join(lines)
+
+        except Exception as e:
+            return f"Error checking ingestion jobs: {str(e)}"
+
+
 class DomainKnowledgeTool(Tool):
     """Specialized tool for domain-specific knowledge management."""
 
@@ -1,6 +1,6 @@
 """Tool registry for dynamic tool management."""
 
-from typing import Any
+from typing import Any, Iterable
 
 from nanobot.agent.tools.base import Tool
 
@@ -31,9 +31,17 @@ class ToolRegistry:
         """Check if a tool is registered."""
         return name in self._tools
 
-    def get_definitions(self) -> list[dict[str, Any]]:
-        """Get all tool definitions in OpenAI format."""
-        return [tool.to_schema() for tool in self._tools.values()]
+    def get_definitions(self, names: Iterable[str] | None = None) -> list[dict[str, Any]]:
+        """
+        Get tool definitions in OpenAI format.
+
+        Args:
+            names: Only include these tools (registration order is kept). None means all.
+        """
+        if names is None:
+            return [tool.to_schema() for tool in self._tools.values()]
+        wanted = set(names)
+        return [tool.to_schema() for name, tool in self._tools.items() if name in wanted]
 
     async def execute(self, name: str, params: dict[str, Any]) -> str:
         """
@@ -314,6 +314,22 @@ def _make_provider(config):
     )
 
 
+def _apply_logging_policy(config, verbose: bool = False) -> None:
+    """Install the hot-path logging policy from config (verbose forces DEBUG everywhere)."""
+    from nanobot.utils.logging_policy import LogPolicy, configure_logging_policy
+
+    policy = LogPolicy.from_config(config.logging)
+    if verbose:
+        policy = LogPolicy(
+            default_level="DEBUG",
+            levels={},
+            max_payload_chars=policy.max_payload_chars,
+            payload_sample_rate=policy.payload_sample_rate,
+            payload_level=policy.payload_level,
+        )
+    configure_logging_policy(policy)
+
+
 # ============================================================================
 # Gateway / Server
 # ============================================================================
@@ -333,6 +349,8 @@ def gateway(
     from nanobot.cron.service import CronService
     from nanobot.cron.types import CronJob
     from nanobot.heartbeat.service import HeartbeatService
+    from nanobot.knowledge.intent_routing_store import make_tool_search_fn
+    from nanobot.knowledge.store_factory import build_domain_router
 
     if verbose:
         import logging
@@ -341,6 +359,7 @@ def gateway(
     console.print(f"{__logo__} Starting nanobot gateway on port {port}...")
 
     config = load_config()
+    _apply_logging_policy(config, verbose=verbose)
     bus = MessageBus()
     provider = _make_provider(config)
     session_manager = SessionManager(config.workspace_path)
@@ -382,6 +401,12 @@ def gateway(
         cron_service=cron,
         restrict_to_workspace=config.tools.restrict_to_workspace,
         session_manager=session_manager,
+        tool_exposure=config.agents.defaults.tool_exposure,
+        dynamic_tools_top_n=config.agents.defaults.dynamic_tools_top_n,
+        pinned_tools=config.agents.defaults.pinned_tools,
+        tool_search_fn=make_tool_search_fn(config.workspace_path, config),
+        mcp_config=config.mcp,
+        domain_router=build_domain_router(config.workspace_path, config),
     )
 
     # Set cron callback (needs agent)
@@ -464,9 +489,12 @@ def agent(
     from nanobot.config.loader import load_config
     from nanobot.bus.queue import MessageBus
     from nanobot.agent.loop import AgentLoop
+    from nanobot.knowledge.intent_routing_store import make_tool_search_fn
+    from nanobot.knowledge.store_factory import build_domain_router
     from loguru import logger
 
     config = load_config()
+    _apply_logging_policy(config)
 
     bus = MessageBus()
     provider = _make_provider(config)
@@ -506,6 +534,12 @@ def agent(
         brave_api_key=config.tools.web.search.api_key or None,
         exec_config=config.tools.exec,
         restrict_to_workspace=config.tools.restrict_to_workspace,
+        tool_exposure=config.agents.defaults.tool_exposure,
+        dynamic_tools_top_n=config.agents.defaults.dynamic_tools_top_n,
+        pinned_tools=config.agents.defaults.pinned_tools,
+        tool_search_fn=make_tool_search_fn(config.workspace_path, config),
+        mcp_config=config.mcp,
+        domain_router=build_domain_router(config.workspace_path, config),
     )
 
     # Show spinner when logs are off (no output to miss); skip when logs are on
@@ -878,6 +912,198 @@ def cron_run(
         console.print(f"[red]Failed to run job {job_id}[/red]")
 
 
+# ============================================================================
+# Inference Service Commands
+# ============================================================================
+
+inference_app = typer.Typer(help="Host-local embedding/rerank service")
+cli_app.add_typer(inference_app, name="inference")
+
+
+@inference_app.command("serve")
+def inference_serve(
+        socket_path: str = typer.Option(None, "--socket", help="Unix socket path (default: inference.socketPath)"),
+        max_batch_size: int = typer.Option(None, "--max-batch-size", help="Max items per model call"),
+        max_wait_ms: float = typer.Option(None, "--max-wait-ms", help="Max time to wait for a batch to fill"),
+):
+    """Serve embed/rerank requests for all nanobot processes on this host."""
+    import asyncio
+
+    from nanobot.config.loader import load_config
+    from nanobot.knowledge.inference_service import InferenceServer
+
+    config = load_config()
+    inference = config.inference
+    server = InferenceServer(
+        socket_path=socket_path or inference.socket_path,
+        embedding_model=config.agents.defaults.embedding_model,
+        rerank_model_path=config.rerank.model_path,
+        max_batch_size=max_batch_size or inference.max_batch_size,
+        max_wait_ms=max_wait_ms if max_wait_ms is not None else inference.max_wait_ms,
+    )
+    console.print(f"{__logo__} Starting inference service on {server.socket_path}")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        console.print("Inference service stopped")
+
+
+@inference_app.command("status")
+def inference_status(
+        socket_path: str = typer.Option(None, "--socket", help="Unix socket path (default: inference.socketPath)"),
+):
+    """Show inference service models and batching stats."""
+    from nanobot.config.loader import load_config
+    from nanobot.knowledge.inference_service import InferenceClient, InferenceServiceError
+
+    config = load_config()
+    client = InferenceClient(socket_path or config.inference.socket_path, timeout=5)
+    try:
+        info = client.info()
+        stats = client.stats()
+    except InferenceServiceError as e:
+        console.print(f"[red]Inference service unavailable: {e}[/red]")
+        raise typer.Exit(1)
+
+    console.print(f"Socket: {client.socket_path} (pid {info.get('pid')})")
+    console.print(f"Embedding: {info.get('embedding_model') or '-'} (dim {info.get('dimension')})")
+    console.print(f"Rerank: {info.get('rerank_model') or '-'}")
+    for op in ("embed", "rerank"):
+        if op in stats:
+            st = stats[op]
+            console.print(
+                f"{op}: requests={st['requests']} batches={st['batches']} "
+                f"avg_batch_items={st['avg_batch_items']:.1f} queued={st['queued']}"
+            )
+
+
+# ============================================================================
+# Knowledge Commands
+# ============================================================================
+
+knowledge_app = typer.Typer(help="Manage the knowledge index")
+cli_app.add_typer(knowledge_app, name="knowledge")
+
+
+@knowledge_app.command("snapshot")
+def knowledge_snapshot(
+        output: Path = typer.Argument(..., help="Archive path to write (.tar.gz)"),
+):
+    """Build the built-in knowledge index (if needed) and package it as a snapshot."""
+    from nanobot.config.loader import load_config
+    from nanobot.knowledge.rocketmq_init import RocketMQKnowledgeInitializer
+    from nanobot.knowledge.snapshot import create_snapshot
+    from nanobot.knowledge.store_factory import get_chroma_store
+
+    config = load_config()
+    store = get_chroma_store(Path(config.agents.defaults.workspace), cfg=config)
+    RocketMQKnowledgeInitializer(store).initialize()
+
+    manifest = create_snapshot(store, output)
+    fingerprint = manifest["fingerprint"]
+    console.print(f"[green]✓[/green] Snapshot written to {output}")
+    console.print(f"Model: {fingerprint['embedding_model'] or '-'} (dim {fingerprint['dimension']})")
+    console.print(f"Chunking: size={fingerprint['chunk_size']} overlap={fingerprint['chunk_overlap']}")
+    console.print(f"Corpus: {len(manifest['corpus'])} files, domains: {manifest['domains']}")
+
+
+@knowledge_app.command("restore")
+def knowledge_restore(
+        archive: Path = typer.Argument(..., help="Snapshot archive to restore"),
+        check: bool = typer.Option(False, "--check", help="Only verify compatibility, do not restore"),
+):
+    """Restore a knowledge index snapshot (stop running gateways first)."""
+    from nanobot.config.loader import load_config
+    from nanobot.knowledge.snapshot import (
+        SnapshotError,
+        SnapshotMismatchError,
+        compare_fingerprints,
+        config_fingerprint,
+        read_snapshot_manifest,
+        restore_snapshot,
+    )
+    from nanobot.knowledge.store_factory import build_rag_config
+    from nanobot.knowledge.vector_embedder import VectorEmbedder
+
+    config = load_config()
+    rag_config = build_rag_config(config)
+    knowledge_dir = Path(config.agents.defaults.workspace).expanduser() / "knowledge"
+    dimension = VectorEmbedder(rag_config.embedding_model, rag_config.inference_socket).get_embedding_dimension()
+    expected = config_fingerprint(rag_config, knowledge_dir, dimension)
+
+    try:
+        if check:
+            manifest = read_snapshot_manifest(archive)
+            mismatches = compare_fingerprints(manifest["fingerprint"], expected)
+            if mismatches:
+                raise SnapshotMismatchError(mismatches)
+            console.print(f"[green]✓[/green] Snapshot is compatible ({len(manifest['files'])} files)")
+            return
+        manifest = restore_snapshot(archive, knowledge_dir, expected)
+    except SnapshotError as e:
+        console.print(f"[red]{e}[/red]")
+        raise typer.Exit(1)
+
+    console.print(f"[green]✓[/green] Restored snapshot created at {manifest['created_at']}")
+    console.print(f"Domains: {manifest['domains']}")
+
+
+# ============================================================================
+# Intent Classifier Commands
+# ============================================================================
+
+intent_app = typer.Typer(help="Local A/B/C intent classifier")
+cli_app.add_typer(intent_app, name="intent")
+
+
+@intent_app.command("eval")
+def intent_eval(
+        dataset: Path = typer.Argument(..., help='Labeled JSONL ({"text": ..., "label": "A|B|C"} per line)'),
+        threshold: float = typer.Option(None, "--threshold", help="Confidence threshold (default: intentConfidenceThreshold)"),
+):
+    """Evaluate the local intent classifier offline: accuracy, coverage and latency."""
+    from nanobot.config.loader import load_config
+    from nanobot.knowledge.intent_classifier import (
+        INTENT_LABELS,
+        IntentClassifier,
+        evaluate,
+        load_labeled_examples,
+    )
+    from nanobot.knowledge.store_factory import build_rag_config
+    from nanobot.knowledge.vector_embedder import VectorEmbedder
+
+    config = load_config()
+    examples = load_labeled_examples(dataset)
+    if not examples:
+        console.print(f"[red]No labeled examples in {dataset}[/red]")
+        raise typer.Exit(1)
+
+    rag_config = build_rag_config(config)
+    embedder = VectorEmbedder(rag_config.embedding_model, rag_config.inference_socket)
+    classifier = IntentClassifier(embedder.embed_batch, workspace=config.workspace_path)
+    if threshold is None:
+        threshold = config.agents.defaults.intent_confidence_threshold
+    report = evaluate(classifier, examples, threshold=threshold)
+
+    console.print(f"Examples: {report['total']}  Accuracy: {report['accuracy']:.1%}")
+    console.print(
+        f"Threshold {threshold}: local coverage {report['coverage']:.1%}, "
+        f"accuracy when local {report['covered_accuracy']:.1%} (rest goes to the LLM)"
+    )
+    latency = report["latency_ms"]
+    console.print(f"Latency: p50 {latency['p50']:.1f}ms  p95 {latency['p95']:.1f}ms  max {latency['max']:.1f}ms")
+
+    table = Table(title="Confusion (rows: gold, columns: predicted)")
+    table.add_column("gold")
+    for label in INTENT_LABELS:
+        table.add_column(label, justify="right")
+    table.add_column("recall", justify="right")
+    for gold in INTENT_LABELS:
+        row = report["confusion"][gold]
+        table.add_row(gold, *(str(row[pred]) for pred in INTENT_LABELS), f"{report['per_label'][gold]['recall']:.1%}")
+    console.print(table)
+
+
 # ============================================================================
 # Status Commands
 # ============================================================================
@@ -889,32 +1115,28 @@ def webui(
         port: int = typer.Option(8001, "--port", help="Port to bind"),
 ):
     """Start the nanobot Web UI."""
-    from nanobot.web.web import web_app, initialize_webui_resources
+    from nanobot.web.web import web_app, configure_webui_limits, start_webui_warmup
     from nanobot.config.loader import load_config
-    from pathlib import Path
 
     console.print(f"{__logo__} Starting web ui on http://{host}:{port}")
 
+    ws_per_message_deflate = True
     try:
         config = load_config()
-        workspace = Path(config.agents.defaults.workspace)
-
-        # 01 初始化 RocketMQ 知识库。如果初始化过，会跳过
-        from nanobot.knowledge.rocketmq_init import initialize_rocketmq_knowledge
-        initialize_rocketmq_knowledge(workspace)
-
-        # 02 初始化 Web UI 资源：provider 和 agent_loop
-        console.print("🔧 正在初始化 Web UI 资源...")
-        if initialize_webui_resources():
-            console.print("✅ Web UI 资源初始化完成")
-        else:
-            console.print("⚠️  Web UI 资源初始化警告: 未配置 API 密钥")
-
+        _apply_logging_policy(config)
+        ws_per_message_deflate = config.webui.ws_per_message_deflate
+        # 每个连接独立会话，跨连接并发处理；上限在接受连接前设置
+        configure_webui_limits(config.webui)
     except Exception as e:
         console.print(f"⚠️  初始化警告: {str(e)}")
 
+    # 后台预热：RocketMQ 知识库（初始化过会跳过）、provider / agent_loop、意图路由索引。
+    # 服务立即接受请求，未就绪的子系统降级；进度见 /readyz，存活探针为 /healthz
+    console.print("🔧 正在后台初始化 Web UI 资源（进度: /readyz）...")
+    start_webui_warmup()
+
     import uvicorn
-    uvicorn.run(web_app, host=host, port=port)
+    uvicorn.run(web_app, host=host, port=port, ws_per_message_deflate=ws_per_message_deflate)
 
 
 @cli_app.command()
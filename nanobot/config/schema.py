@@ -171,8 +171,34 @@ class AgentDefaults(BaseModel):
     chunk_overlap: int = 100
     top_k: int = 5
     similarity_threshold: float = 0.0
+    two_tier_search: bool = True  # 大集合先检索文档级索引，再只检索选中文档的分块
+    two_tier_min_chunks: int = 2000  # 启用两级检索的集合最小分块数
+    two_tier_top_docs: int = 20  # 第一级选出的文档数
+    domain_pruning: bool = True  # 跨领域检索时按领域质心裁剪无关领域
+    domain_pruning_min_domains: int = 2  # 至少检索的领域数
+    domain_pruning_cutoff: float = 0.3  # 查询与领域质心的余弦相似度下限
+    domain_pruning_margin: float = 0.15  # 与最相似领域的最大相似度差
+    neighbor_chunks: int = 0  # 检索命中分块前后各补充的相邻分块数，默认 0 关闭
+    knowledge_router_embedding_fallback: bool = False  # 领域关键词未命中时用 embedding 相似度兜底路由
+    intent_local_classifier: bool = False  # Web UI 先用本地 embedding 分类器识别 A/B/C 意图（开启前用 nanobot intent eval 在标注集上校准阈值）
+    intent_confidence_threshold: float = 0.6  # 本地分类置信度低于该值时再调用 LLM 分类
+    speculative_retrieval: bool = True  # LLM 意图分类期间预先并行检索可能用到的分支，意图确定后取消其余分支
+    speculative_min_probability: float = 0.2  # 本地分类概率低于该值的意图不预检索（限制浪费的算力），0 全部预检索
+    tool_exposure: str = "all"  # 每次调用 LLM 下发的工具：all 全部 / dynamic 按工具索引检索 top-N
+    dynamic_tools_top_n: int = 8  # dynamic 模式检索的工具数
+    pinned_tools: list[str] = Field(default_factory=lambda: ["exec", "knowledge_search"])  # dynamic 模式始终下发的核心工具
+    knowledge_context_tokens: int = 2000  # 知识库检索结果注入上下文的 token 预算（MMR 去冗余），0 关闭
+    knowledge_mmr_lambda: float = 0.7  # MMR 相关性与多样性权衡，1.0 只看相关性
+    knowledge_memory_budget_mb: int = 0  # 已加载知识集合的内存预算（MB），超出时按 LRU 驱逐，0 不限制
+    knowledge_pinned_domains: list[str] = Field(default_factory=list)  # 常驻领域，永不驱逐
+    knowledge_eviction_interval_s: float = 30.0  # 两次驱逐（重开客户端并预热其余集合）的最小间隔，期间可能超出预算
     batch_size: int = 32
     timeout: int = 5
+    query_batch_size: int = 32  # 并发查询向量化的微批大小，<=1 关闭
+    query_batch_wait_ms: float = 2.0  # 微批收集窗口（毫秒）
+    knowledge_snapshot: str = ""  # 预构建索引快照路径，首次启动时恢复以跳过向量化
+    ingestion_workers: int = 1  # 后台知识导入线程数
+    ingestion_max_pending: int = 1000  # 排队导入任务上限
 
 
 class AgentsConfig(BaseModel):
@@ -211,6 +237,7 @@ class MCPConnectionConfig(BaseModel):
     message_path: str = "/mcp/message"  # MCP消息端点路径
     auth_token: str = ""  # 认证令牌
     enabled: bool = False  # 是否启用
+    discovery_timeout: float = 10.0  # 工具发现（tools/list）超时秒数，各 server 并发发现、互不拖累
     # MCP 服务工具清单（支持多种字段名，兼容不同配置来源）
     tools: list[dict[str, Any]] = Field(default_factory=list)
     tool_specs: list[dict[str, Any]] = Field(default_factory=list)
@@ -229,12 +256,38 @@ class GatewayConfig(BaseModel):
     port: int = 18790
 
 
+class WebUIConfig(BaseModel):
+    """Web UI (`nanobot webui`) request handling."""
+    max_concurrent_requests: int = 4  # 全局同时处理的请求数（每个 WebSocket 连接独立会话）
+    max_pending_per_connection: int = 8  # 单个连接排队等待的消息数上限
+    stream_coalesce_ms: float = 25.0  # 流式输出合并窗口（毫秒），窗口内的消息合并为一帧发送，0 不合并
+    stream_coalesce_bytes: int = 16384  # 缓冲达到该字节数时立即发送
+    ws_per_message_deflate: bool = True  # WebSocket permessage-deflate 压缩（客户端支持时协商启用）
+
+
 class RerankConfig(BaseModel):
     """Rerank configuration."""
     model_path: str = ""  # Rerank model path
     threshold: float = 0.0  # Rerank threshold
 
 
+class InferenceConfig(BaseModel):
+    """Host-local embedding/rerank service (`nanobot inference serve`)."""
+    enabled: bool = False  # 启用后 VectorEmbedder / CrossEncoder 通过 Unix socket 调用推理服务
+    socket_path: str = "~/.nanobot/inference.sock"
+    max_batch_size: int = 64  # 动态批处理的最大条数
+    max_wait_ms: float = 5.0  # 动态批处理的最大等待时间
+
+
+class LoggingConfig(BaseModel):
+    """Hot-path logging policy (see nanobot/utils/logging_policy.py)."""
+    default_level: str = "INFO"  # 未单独配置的子系统使用的级别
+    levels: dict[str, str] = Field(default_factory=dict)  # 子系统级别，如 {"llm": "DEBUG", "knowledge.chunker": "WARNING"}
+    max_payload_chars: int = 2000  # 大负载（LLM入参/出参、工具输入输出）日志截断长度，0 表示不截断
+    payload_sample_rate: float = 1.0  # 大负载日志采样率 (0-1]
+    payload_level: str = "DEBUG"  # 大负载日志的级别
+
+
 class WebSearchConfig(BaseModel):
     """Web search tool configuration."""
     api_key: str = ""  # Brave Search API key
@@ -267,6 +320,9 @@ class Config(BaseSettings):
     tools: ToolsConfig = Field(default_factory=ToolsConfig)
     mcp: MCPConfig = Field(default_factory=MCPConfig)
     rerank: RerankConfig = Field(default_factory=RerankConfig)
+    logging: LoggingConfig = Field(default_factory=LoggingConfig)
+    inference: InferenceConfig = Field(default_factory=InferenceConfig)
+    webui: WebUIConfig = Field(default_factory=WebUIConfig)
 
     @property
     def workspace_path(self) -> Path:
@@ -1,7 +1,16 @@
 """Knowledge base module for storing and retrieving domain-specific knowledge."""
 
+from .context_packer import PackedContext, pack_context
+from .domain_router import DomainRouter, RouteDecision
+from .inference_service import InferenceClient, InferenceServer, InferenceServiceError
+from .ingestion_queue import IngestionJob, IngestionQueue, IngestionQueueFullError
+from .metrics import InMemoryMetricsSink, MetricsSink, NullMetricsSink, RetrievalMetrics
 from .rag_config import RAGConfig
+from .residency import CollectionResidency
+from .retrieval_context import RetrievalContext
 from .rocketmq_init import RocketMQKnowledgeInitializer, initialize_rocketmq_knowledge
+from .snapshot import SnapshotError, SnapshotMismatchError, create_snapshot, restore_snapshot
+from .storage import StorageContext, get_storage_context
 from .store import KnowledgeStore, ChromaKnowledgeStore, DomainKnowledgeManager
 from .vector_embedder import VectorEmbedder, EmbeddingModelError
 
@@ -14,4 +23,26 @@ __all__ = [
     "RAGConfig",
     "VectorEmbedder",
     "EmbeddingModelError",
+    "RetrievalMetrics",
+    "MetricsSink",
+    "InMemoryMetricsSink",
+    "NullMetricsSink",
+    "InferenceServer",  # 本机共享的 embed/rerank 推理服务
+    "InferenceClient",
+    "InferenceServiceError",
+    "IngestionQueue",  # 后台知识导入队列
+    "IngestionJob",
+    "IngestionQueueFullError",
+    "create_snapshot",  # 预构建索引快照的打包与恢复
+    "restore_snapshot",
+    "SnapshotError",
+    "SnapshotMismatchError",
+    "CollectionResidency",  # 按内存预算驱逐已加载的知识集合
+    "pack_context",  # 按 token 预算和 MMR 打包检索结果
+    "PackedContext",
+    "DomainRouter",  # 知识领域路由（Aho–Corasick 关键词自动机）
+    "RouteDecision",
+    "StorageContext",  # 进程级共享的 Chroma 客户端（每个持久化目录一个）
+    "get_storage_context",
+    "RetrievalContext",  # 请求级查询向量（各索引检索共用）
 ]
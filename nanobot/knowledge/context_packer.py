@@ -0,0 +1,176 @@
+"""Token-budgeted context packing for retrieved knowledge.
+
+Retrieval returns the reranked top-k passages regardless of their size or of
+how much they repeat each other (overlapping chunk windows, the same section
+stored under two items). ``pack_context`` selects passages by maximal marginal
+relevance (MMR) using the chunk embeddings returned by the vector query, stops
+at a token budget measured with the chat model's tokenizer, and reports every
+candidate it dropped and why.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+import numpy as np
+from loguru import logger
+
+# 丢弃原因
+DROPPED_REDUNDANT = "redundant"
+DROPPED_BUDGET = "budget"
+
+# 预算剩余不足该值时不再截断填充
+MIN_PARTIAL_TOKENS = 64
+
+
+@dataclass
+class PackCandidate:
+    """待打包的检索结果."""
+
+    item: Any
+    text: str
+    relevance: float
+    embedding: Any = None
+
+
+@dataclass
+class PackedContext:
+    """打包结果：入选条目（按入选顺序）、被丢弃的条目及原因、token 用量."""
+
+    items: list[Any] = field(default_factory=list)
+    dropped: list[tuple[Any, str]] = field(default_factory=list)
+    tokens_used: int = 0
+    token_budget: int = 0
+    truncated: int = 0
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def drop_summary(self) -> dict[str, int]:
+        summary: dict[str, int] = {}
+        for _, reason in self.dropped:
+            summary[reason] = summary.get(reason, 0) + 1
+        return summary
+
+
+def _estimate_tokens(text: str) -> int:
+    """无分词器时的估算：CJK 字符约 1 token/字，其余约 4 字符/token."""
+    cjk = sum(1 for ch in text if "一" <= ch <= "鿿")
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def make_token_counter(model: str | None = None) -> Callable[[str], int]:
+    """返回按模型分词器计数的函数；分词器不可用时回退到字符估算."""
+    if not model:
+        return _estimate_tokens
+    try:
+        import litellm
+    except ImportError:
+        return _estimate_tokens
+
+    def count(text: str) -> int:
+        try:
+            return int(litellm.token_counter(model=model, text=text))
+        except Exception:
+            return _estimate_tokens(text)
+
+    return count
+
+
+def _truncate_to_tokens(text: str, max_tokens: int, count_tokens: Callable[[str], int]) -> str:
+    """按 token 预算截断文本（按比例估算后逐步收缩，末尾加省略号）."""
+    total = count_tokens(text)
+    if total <= max_tokens:
+        return text
+    end = max(1, int(len(text) * max_tokens / total))
+    while end > 1 and count_tokens(text[:end] + "…") > max_tokens:
+        end = int(end * 0.9)
+    return text[:end].rstrip() + "…"
+
+
+def pack_context(
+        candidates: list[PackCandidate],
+        token_budget: int,
+        mmr_lambda: float = 0.7,
+        count_tokens: Callable[[str], int] | None = None,
+        duplicate_threshold: float = 0.95,
+        on_truncate: Callable[[Any, str], Any] | None = None,
+) -> PackedContext:
+    """按 MMR 选择检索结果直到 token 预算用尽.
+
+    Args:
+        candidates: 重排序后的候选（relevance 越大越相关）
+        token_budget: 正文 token 预算
+        mmr_lambda: 相关性与多样性的权衡（1.0 只看相关性）
+        count_tokens: token 计数函数（默认字符估算）
+        duplicate_threshold: 与已选结果的余弦相似度不低于该值时视为重复直接丢弃
+        on_truncate: 截断最后一个结果时调用，返回替换正文后的条目（默认原条目）
+
+    Returns:
+        PackedContext
+    """
+    count_tokens = count_tokens or _estimate_tokens
+    packed = PackedContext(token_budget=token_budget)
+    if not candidates:
+        return packed
+
+    vectors = []
+    for candidate in candidates:
+        vector = np.asarray(candidate.embedding, dtype=np.float32) if candidate.embedding is not None else None
+        if vector is not None and vector.size:
+            norm = float(np.linalg.norm(vector))
+            vector = vector / norm if norm else None
+        else:
+            vector = None
+        vectors.append(vector)
+
+    relevance = np.asarray([c.relevance for c in candidates], dtype=np.float64)
+    # 相关性归一化到 [0, 1]，与余弦相似度同量纲
+    spread = relevance.max() - relevance.min()
+    relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones_like(relevance)
+
+    remaining = list(range(len(candidates)))
+    selected: list[int] = []
+    while remaining:
+        best, best_score, best_redundancy = None, -np.inf, 0.0
+        for i in remaining:
+            redundancy = 0.0
+            if vectors[i] is not None:
+                for j in selected:
+                    if vectors[j] is not None:
+                        redundancy = max(redundancy, float(vectors[i] @ vectors[j]))
+            score = mmr_lambda * relevance[i] - (1 - mmr_lambda) * redundancy
+            if score > best_score:
+                best, best_score, best_redundancy = i, score, redundancy
+        remaining.remove(best)
+        candidate = candidates[best]
+
+        if best_redundancy >= duplicate_threshold:
+            packed.dropped.append((candidate.item, DROPPED_REDUNDANT))
+            continue
+
+        tokens = count_tokens(candidate.text)
+        left = token_budget - packed.tokens_used
+        if tokens <= left:
+            packed.items.append(candidate.item)
+            packed.tokens_used += tokens
+            selected.append(best)
+        elif left >= MIN_PARTIAL_TOKENS and on_truncate is not None:
+            text = _truncate_to_tokens(candidate.text, left, count_tokens)
+            packed.items.append(on_truncate(candidate.item, text))
+            packed.tokens_used += count_tokens(text)
+            packed.truncated += 1
+            selected.append(best)
+        else:
+            packed.dropped.append((candidate.item, DROPPED_BUDGET))
+
+    if packed.dropped or packed.truncated:
+        logger.info(
+            f"📦 上下文打包: 选中 {len(packed.items)} 条 ({packed.tokens_used}/{token_budget} tokens), "
+            f"截断 {packed.truncated} 条, 丢弃 {packed.drop_summary()}"
+        )
+    return packed
@@ -0,0 +1,254 @@
+"""Keyword-driven knowledge domain router.
+
+Decides which knowledge domain a user message should be searched in. The
+per-domain keyword and synonym lists live in the workspace
+(``knowledge/domain_keywords.json``) and are compiled into one Aho–Corasick
+automaton, so routing a message is a single pass over its characters no matter
+how many domains or keywords are configured. The file is re-read when its
+mtime changes.
+
+``domain_keywords.json`` maps a domain to a keyword list, or to an object with
+``keywords`` and ``synonyms`` lists::
+
+    {
+      "rocketmq": {"keywords": ["rocketmq", "broker"], "synonyms": ["消息队列"]},
+      "kubernetes": ["k8s", "kubectl", "pod"]
+    }
+
+When no keyword matches and an embedding function is configured, the message
+is compared with each domain's keyword centroid as a fallback.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+import numpy as np
+from loguru import logger
+
+from .metrics import RetrievalMetrics
+
+DEFAULT_DOMAIN = "general"
+KEYWORDS_FILE = "domain_keywords.json"
+
+# 工作空间未提供关键词文件时使用的内置关键词
+DEFAULT_DOMAIN_KEYWORDS: dict[str, list[str]] = {
+    "rocketmq": ["rocketmq", "tdmq", "消息队列", "mq", "broker", "namesrv", "nameserver", "cluster", "topic",
+                 "consumer", "producer", "group"],
+    "kubernetes": ["k8s", "kubernetes", "pod", "deployment", "service", "kubectl", "namespace"],
+}
+
+
+class AhoCorasick:
+    """Multi-pattern substring matcher (goto/fail/output automaton)."""
+
+    def __init__(self, patterns: dict[str, Any]):
+        """构建自动机.
+
+        Args:
+            patterns: 模式串 -> 附带值（匹配时返回）
+        """
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._output: list[list[tuple[str, Any]]] = [[]]
+        for pattern, value in patterns.items():
+            if pattern:
+                self._add(pattern, value)
+        self._build_fail_links()
+
+    def _add(self, pattern: str, value: Any) -> None:
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = nxt
+        self._output[state].append((pattern, value))
+
+    def _build_fail_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._output[nxt] = self._output[nxt] + self._output[self._fail[nxt]]
+
+    def iter_matches(self, text: str) -> Iterator[tuple[int, str, Any]]:
+        """逐个返回 (结束位置, 模式串, 附带值)."""
+        state = 0
+        for pos, ch in enumerate(text):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for pattern, value in self._output[state]:
+                yield pos, pattern, value
+
+
+@dataclass
+class RouteDecision:
+    """一次路由决策."""
+
+    domain: str
+    method: str  # keyword / embedding / default
+    matches: dict[str, list[str]] = field(default_factory=dict)
+    score: float = 0.0
+    elapsed_ms: float = 0.0
+
+
+class DomainRouter:
+    """Routes messages to knowledge domains with a compiled keyword automaton."""
+
+    def __init__(
+            self,
+            workspace: Path,
+            embed_fn: Callable[[list[str]], list[list[float]]] | None = None,
+            embedding_threshold: float = 0.5,
+            metrics: RetrievalMetrics | None = None,
+    ):
+        """初始化路由器.
+
+        Args:
+            workspace: 工作空间（关键词文件位于 knowledge/domain_keywords.json）
+            embed_fn: 可选的批量向量化函数；关键词未命中时按领域关键词质心做相似度兜底
+            embedding_threshold: 兜底路由的最低余弦相似度
+            metrics: 指标（默认 routing 前缀，记录每次决策耗时）
+        """
+        self.keywords_file = Path(workspace) / "knowledge" / KEYWORDS_FILE
+        self.embed_fn = embed_fn
+        self.embedding_threshold = embedding_threshold
+        self.metrics = metrics or RetrievalMetrics(prefix="routing")
+        self._lock = threading.Lock()
+        self._mtime: int | None = -1
+        self._keywords: dict[str, list[str]] = {}
+        # (自动机, 领域顺序) 整体替换，路由时无需加锁
+        self._table: tuple[AhoCorasick, list[str]] = (AhoCorasick({}), [])
+        self._centroids: dict[str, np.ndarray] | None = None
+        self._reload_if_changed()
+
+    # ------------------------------------------------------------------
+    # 关键词加载与编译
+    # ------------------------------------------------------------------
+
+    def _load_keywords(self) -> dict[str, list[str]]:
+        if not self.keywords_file.exists():
+            return dict(DEFAULT_DOMAIN_KEYWORDS)
+        with open(self.keywords_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        keywords: dict[str, list[str]] = {}
+        for domain, spec in data.items():
+            if isinstance(spec, dict):
+                terms = list(spec.get("keywords", [])) + list(spec.get("synonyms", []))
+            else:
+                terms = list(spec)
+            keywords[domain] = [str(term).strip().lower() for term in terms if str(term).strip()]
+        return keywords
+
+    def _reload_if_changed(self) -> None:
+        """关键词文件变化（或被删除）时重新编译自动机."""
+        try:
+            mtime = self.keywords_file.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            try:
+                keywords = self._load_keywords()
+            except (OSError, ValueError, TypeError, AttributeError) as e:
+                logger.warning(f"⚠️ 领域关键词文件加载失败，保留当前路由表: {self.keywords_file}: {e}")
+                self._mtime = mtime
+                return
+
+            patterns: dict[str, list[str]] = {}
+            for domain, terms in keywords.items():
+                for term in terms:
+                    patterns.setdefault(term, []).append(domain)
+            self._table = (AhoCorasick(patterns), list(keywords))
+            self._keywords = keywords
+            self._centroids = None
+            self._mtime = mtime
+            logger.info(
+                f"🧭 领域路由表已加载: {len(keywords)} 个领域, {len(patterns)} 个关键词"
+                f"{'' if mtime is not None else '（内置默认）'}"
+            )
+
+    def _domain_centroids(self) -> dict[str, np.ndarray]:
+        if self._centroids is None:
+            centroids = {}
+            for domain, terms in self._keywords.items():
+                if not terms:
+                    continue
+                vectors = np.asarray(self.embed_fn(terms), dtype=np.float32)
+                centroid = vectors.mean(axis=0)
+                norm = float(np.linalg.norm(centroid))
+                if norm:
+                    centroids[domain] = centroid / norm
+            self._centroids = centroids
+        return self._centroids
+
+    # ------------------------------------------------------------------
+    # 路由
+    # ------------------------------------------------------------------
+
+    def route(self, text: str) -> RouteDecision:
+        """为消息选择知识领域：命中关键词最多的领域；未命中时尝试向量兜底，否则为 general."""
+        start = time.perf_counter()
+        self._reload_if_changed()
+        automaton, domains = self._table
+
+        matches: dict[str, list[str]] = {}
+        for _, pattern, pattern_domains in automaton.iter_matches(text.lower()):
+            for domain in pattern_domains:
+                matches.setdefault(domain, []).append(pattern)
+
+        if matches:
+            # 命中次数最多的领域；相同时按关键词文件中的顺序
+            best = max(matches, key=lambda d: (len(matches[d]), -domains.index(d)))
+            decision = RouteDecision(best, "keyword", matches, float(len(matches[best])))
+        else:
+            decision = self._embedding_route(text) or RouteDecision(DEFAULT_DOMAIN, "default")
+
+        decision.elapsed_ms = (time.perf_counter() - start) * 1000
+        self.metrics.record_stage("domain_route", decision.elapsed_ms, method=decision.method)
+        logger.debug(
+            f"🧭 领域路由: {decision.domain} ({decision.method}, score={decision.score:.3f}, "
+            f"{decision.elapsed_ms:.3f} 毫秒)"
+        )
+        return decision
+
+    def _embedding_route(self, text: str) -> RouteDecision | None:
+        if self.embed_fn is None or not text.strip():
+            return None
+        try:
+            centroids = self._domain_centroids()
+            if not centroids:
+                return None
+            vector = np.asarray(self.embed_fn([text])[0], dtype=np.float32)
+            norm = float(np.linalg.norm(vector))
+            if not norm:
+                return None
+            vector /= norm
+            domain, score = max(((d, float(c @ vector)) for d, c in centroids.items()), key=lambda x: x[1])
+        except Exception as e:
+            logger.warning(f"领域路由向量兜底失败: {e}")
+            return None
+        if score < self.embedding_threshold:
+            return None
+        return RouteDecision(domain, "embedding", score=score)
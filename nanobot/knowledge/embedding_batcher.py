@@ -0,0 +1,142 @@
+"""Micro-batching front for query embeddings.
+
+Concurrent searches each need one query vector. Embedding them one by one
+runs a batch-of-1 forward pass per search; this front collects requests for
+up to ``max_wait_ms`` (or ``max_batch_size`` texts), runs a single
+``embed_batch`` call and hands each caller its row. Identical texts that are
+already in flight share one computation (single-flight).
+
+Works from threads (``embed_text``) and from coroutines (``aembed_text``).
+When the worker is idle a lone request only waits ``max_wait_ms``, so the
+added latency is bounded by that window.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any
+
+from loguru import logger
+
+
+class EmbeddingBatcher:
+    """Collect concurrent ``embed_text`` calls into one ``embed_batch`` call."""
+
+    def __init__(self, embedder: Any, max_batch_size: int = 32, max_wait_ms: float = 2.0):
+        """初始化批处理前端.
+
+        Args:
+            embedder: 具有 embed_text / embed_batch 的向量化器（VectorEmbedder）
+            max_batch_size: 单次 embed_batch 的最大文本数
+            max_wait_ms: 首个请求到达后等待更多请求的最长时间（毫秒）
+        """
+        self.embedder = embedder
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+
+        self._cond = threading.Condition()
+        self._queue: list[str] = []
+        self._inflight: dict[str, Future] = {}
+        self._closed = False
+        self._worker: threading.Thread | None = None
+
+        self.requests = 0
+        self.deduplicated = 0
+        self.batches = 0
+        self.batched_texts = 0
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="nanobot-embed-batcher", daemon=True)
+            self._worker.start()
+
+    def submit(self, text: str) -> Future:
+        """Queue a text; returns a future resolving to its vector."""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("EmbeddingBatcher is closed")
+            self.requests += 1
+            fut = self._inflight.get(text)
+            if fut is not None:
+                self.deduplicated += 1
+                return fut
+            fut = Future()
+            self._inflight[text] = fut
+            self._queue.append(text)
+            self._ensure_worker()
+            self._cond.notify()
+            return fut
+
+    def embed_text(self, text: str) -> list[float]:
+        """Blocking drop-in for ``VectorEmbedder.embed_text``."""
+        if not text or not text.strip():
+            return self.embedder.embed_text(text)
+        return self.submit(text).result()
+
+    async def aembed_text(self, text: str) -> list[float]:
+        """Async variant; does not block the event loop while waiting."""
+        if not text or not text.strip():
+            return self.embedder.embed_text(text)
+        return await asyncio.wrap_future(self.submit(text))
+
+    def _take_batch(self) -> list[str] | None:
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if self._closed and not self._queue:
+                return None
+
+            deadline = time.monotonic() + self.max_wait
+            while len(self._queue) < self.max_batch_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = self._queue[:self.max_batch_size]
+            del self._queue[:self.max_batch_size]
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            try:
+                vectors = self.embedder.embed_batch(batch)
+                error = None
+            except Exception as e:
+                vectors, error = None, e
+                logger.error(f"[EMBED_BATCHER] 批量向量化失败: {e}")
+
+            with self._cond:
+                self.batches += 1
+                self.batched_texts += len(batch)
+                futures = [self._inflight.pop(text) for text in batch]
+
+            for i, fut in enumerate(futures):
+                if error is not None:
+                    fut.set_exception(error)
+                else:
+                    fut.set_result(vectors[i])
+
+    def stats(self) -> dict[str, Any]:
+        with self._cond:
+            return {
+                "requests": self.requests,
+                "deduplicated": self.deduplicated,
+                "batches": self.batches,
+                "avg_batch_size": self.batched_texts / self.batches if self.batches else 0.0,
+                "queued": len(self._queue),
+            }
+
+    def close(self) -> None:
+        """Flush queued requests and stop the worker."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._worker is not None:
+            self._worker.join(timeout=10)
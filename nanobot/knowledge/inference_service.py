@@ -0,0 +1,528 @@
+"""Host-local embedding/rerank service over a Unix domain socket.
+
+One daemon per host loads the SentenceTransformer and CrossEncoder once and
+serves every nanobot process (gateway, webui, workers). Concurrent requests are
+coalesced by a dynamic batcher into a single ``encode``/``predict`` call.
+
+Wire format: each frame is a 4-byte big-endian length followed by a msgpack map.
+
+    request:  {"op": "embed", "texts": [...]}
+              {"op": "rerank", "pairs": [[query, doc], ...]}
+              {"op": "info"} | {"op": "ping"} | {"op": "stats"}
+    response: {"ok": true, ...} | {"ok": false, "error": "..."}
+
+Embeddings travel as raw float32 bytes plus a shape, so the client rebuilds a
+numpy array without per-float decoding.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import socket
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Sequence
+
+import msgpack
+import numpy as np
+from loguru import logger
+
+_HEADER = struct.Struct(">I")
+MAX_FRAME_BYTES = 256 * 1024 * 1024
+
+
+class InferenceServiceError(Exception):
+    """Inference service request failed or the daemon is unreachable."""
+
+
+def default_socket_path() -> Path:
+    """Default daemon socket: ~/.nanobot/inference.sock."""
+    from nanobot.utils.helpers import get_data_path
+
+    return get_data_path() / "inference.sock"
+
+
+def _pack(obj: dict[str, Any]) -> bytes:
+    body = msgpack.packb(obj, use_bin_type=True)
+    return _HEADER.pack(len(body)) + body
+
+
+def _unpack(body: bytes) -> dict[str, Any]:
+    return msgpack.unpackb(body, raw=False)
+
+
+# ============================================================================
+# Server
+# ============================================================================
+
+
+class _DynamicBatcher:
+    """Collect requests for up to ``max_wait_ms`` or ``max_batch_size`` items, run one model call."""
+
+    def __init__(self, name: str, fn: Callable[[list[Any]], Sequence[Any]],
+                 max_batch_size: int = 64, max_wait_ms: float = 5.0):
+        self.name = name
+        self.fn = fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.queue: asyncio.Queue[tuple[list[Any], asyncio.Future]] = asyncio.Queue()
+        self.batches = 0
+        self.items = 0
+        self.requests = 0
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, items: list[Any]) -> list[Any]:
+        fut = asyncio.get_running_loop().create_future()
+        await self.queue.put((items, fut))
+        return await fut
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            size = len(pending[0][0])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    req = await asyncio.wait_for(self.queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                pending.append(req)
+                size += len(req[0])
+
+            flat = [item for items, _ in pending for item in items]
+            try:
+                outputs = await asyncio.to_thread(self.fn, flat)
+            except Exception as e:
+                for _, fut in pending:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(flat)
+            self.requests += len(pending)
+            offset = 0
+            for items, fut in pending:
+                if not fut.done():
+                    fut.set_result(outputs[offset:offset + len(items)])
+                offset += len(items)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_items": self.items / self.batches if self.batches else 0.0,
+            "queued": self.queue.qsize(),
+        }
+
+
+class InferenceServer:
+    """Serve embed/rerank requests for every nanobot process on the host.
+
+    Models can be injected (any object with ``encode``/``predict``) which keeps
+    the daemon testable with tiny models; otherwise they are loaded from
+    ``embedding_model`` / ``rerank_model_path``.
+    """
+
+    def __init__(
+        self,
+        socket_path: str | Path,
+        embedding_model: str = "",
+        rerank_model_path: str = "",
+        embed_model: Any = None,
+        rerank_model: Any = None,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+    ):
+        self.socket_path = Path(socket_path).expanduser()
+        self.embedding_model = embedding_model
+        self.rerank_model_path = rerank_model_path
+        self.embed_model = embed_model
+        self.rerank_model = rerank_model
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        self._server: asyncio.AbstractServer | None = None
+        self._batchers: dict[str, _DynamicBatcher] = {}
+        self._connections: set[asyncio.Task] = set()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._ready = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._started_at = 0.0
+
+    def _load_models(self) -> None:
+        if self.embed_model is None and self.embedding_model:
+            from sentence_transformers import SentenceTransformer
+
+            logger.info(f"[INFERENCE] 加载 Embedding 模型: {self.embedding_model}")
+            self.embed_model = SentenceTransformer(self.embedding_model)
+
+        if self.rerank_model is None and self.rerank_model_path:
+            import torch
+            from sentence_transformers import CrossEncoder
+
+            logger.info(f"[INFERENCE] 加载 CrossEncoder 模型: {self.rerank_model_path}")
+            self.rerank_model = CrossEncoder(
+                self.rerank_model_path,
+                device="cuda" if torch.cuda.is_available() else "cpu",
+                max_length=512,
+            )
+
+    def _embedding_dimension(self) -> int:
+        if self.embed_model is None:
+            return 0
+        get_dim = getattr(self.embed_model, "get_sentence_embedding_dimension", None)
+        return int(get_dim()) if get_dim else 0
+
+    def _encode(self, texts: list[str]) -> np.ndarray:
+        out = self.embed_model.encode(texts, convert_to_numpy=True)
+        return np.asarray(out, dtype=np.float32)
+
+    def _predict(self, pairs: list[Any]) -> list[float]:
+        scores = self.rerank_model.predict([(q, d) for q, d in pairs])
+        return [float(s) for s in np.asarray(scores).reshape(-1)]
+
+    async def start(self) -> None:
+        """Load models, bind the socket and start the batchers."""
+        await asyncio.to_thread(self._load_models)
+
+        if self.socket_path.exists():
+            if _socket_alive(self.socket_path):
+                raise InferenceServiceError(f"推理服务已在运行: {self.socket_path}")
+            self.socket_path.unlink()
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+
+        if self.embed_model is not None:
+            self._batchers["embed"] = _DynamicBatcher("embed", self._encode, self.max_batch_size, self.max_wait_ms)
+        if self.rerank_model is not None:
+            self._batchers["rerank"] = _DynamicBatcher("rerank", self._predict, self.max_batch_size, self.max_wait_ms)
+        for batcher in self._batchers.values():
+            batcher.start()
+
+        self._server = await asyncio.start_unix_server(self._handle, path=str(self.socket_path))
+        os.chmod(self.socket_path, 0o600)
+        self._started_at = time.time()
+        logger.info(
+            f"[INFERENCE] ✅ 推理服务已启动: {self.socket_path} "
+            f"(embed={bool(self.embed_model)}, rerank={bool(self.rerank_model)})"
+        )
+
+    async def close(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for task in list(self._connections):
+            task.cancel()
+        if self._connections:
+            await asyncio.gather(*self._connections, return_exceptions=True)
+        for batcher in self._batchers.values():
+            await batcher.stop()
+        self._batchers.clear()
+        try:
+            self.socket_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    def start_in_thread(self, timeout: float = 60.0) -> None:
+        """Run the server on a private event loop in a daemon thread (tests, embedded use)."""
+        errors: list[BaseException] = []
+
+        def _runner() -> None:
+            loop = asyncio.new_event_loop()
+            self._loop = loop
+            try:
+                loop.run_until_complete(self.start())
+            except BaseException as e:
+                errors.append(e)
+                self._ready.set()
+                loop.close()
+                return
+            self._ready.set()
+            try:
+                loop.run_forever()
+            finally:
+                loop.run_until_complete(self.close())
+                loop.close()
+
+        self._thread = threading.Thread(target=_runner, name="nanobot-inference", daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout)
+        if errors:
+            raise errors[0]
+
+    def stop_thread(self) -> None:
+        if self._loop and self._thread:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def info(self) -> dict[str, Any]:
+        return {
+            "embedding_model": self.embedding_model,
+            "dimension": self._embedding_dimension(),
+            "rerank_model": self.rerank_model_path,
+            "embed": self.embed_model is not None,
+            "rerank": self.rerank_model is not None,
+            "pid": os.getpid(),
+        }
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "uptime_s": time.time() - self._started_at if self._started_at else 0.0,
+            **{name: b.stats() for name, b in self._batchers.items()},
+        }
+
+    async def _dispatch(self, req: dict[str, Any]) -> dict[str, Any]:
+        op = req.get("op")
+        if op == "ping":
+            return {"ok": True}
+        if op == "info":
+            return {"ok": True, **self.info()}
+        if op == "stats":
+            return {"ok": True, **self.stats()}
+        if op == "embed":
+            batcher = self._batchers.get("embed")
+            if batcher is None:
+                return {"ok": False, "error": "embedding model not loaded"}
+            texts = [str(t) for t in req.get("texts") or []]
+            if not texts:
+                return {"ok": True, "shape": [0, self._embedding_dimension()], "data": b""}
+            rows = np.asarray(await batcher.submit(texts), dtype=np.float32)
+            return {"ok": True, "shape": list(rows.shape), "data": rows.tobytes()}
+        if op == "rerank":
+            batcher = self._batchers.get("rerank")
+            if batcher is None:
+                return {"ok": False, "error": "rerank model not loaded"}
+            pairs = [(str(p[0]), str(p[1])) for p in req.get("pairs") or []]
+            if not pairs:
+                return {"ok": True, "scores": []}
+            return {"ok": True, "scores": await batcher.submit(pairs)}
+        return {"ok": False, "error": f"unknown op: {op}"}
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(_HEADER.size)
+                except asyncio.IncompleteReadError:
+                    break
+                (length,) = _HEADER.unpack(header)
+                if length > MAX_FRAME_BYTES:
+                    break
+                body = await reader.readexactly(length)
+                try:
+                    resp = await self._dispatch(_unpack(body))
+                except Exception as e:
+                    logger.error(f"[INFERENCE] 请求处理失败: {e}")
+                    resp = {"ok": False, "error": str(e)}
+                writer.write(_pack(resp))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+
+def _socket_alive(path: Path) -> bool:
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.settimeout(0.5)
+    try:
+        s.connect(str(path))
+        return True
+    except OSError:
+        return False
+    finally:
+        s.close()
+
+
+# ============================================================================
+# Client
+# ============================================================================
+
+
+class InferenceClient:
+    """Blocking client; one persistent connection per thread, reconnects once on failure."""
+
+    def __init__(self, socket_path: str | Path, timeout: float = 30.0):
+        self.socket_path = Path(socket_path).expanduser()
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self) -> socket.socket:
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.settimeout(self.timeout)
+        try:
+            s.connect(str(self.socket_path))
+        except OSError as e:
+            s.close()
+            raise InferenceServiceError(f"无法连接推理服务 {self.socket_path}: {e}") from e
+        return s
+
+    def _recv_exact(self, s: socket.socket, n: int) -> bytes:
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = s.recv(n - len(buf))
+            if not chunk:
+                raise ConnectionError("inference service closed the connection")
+            buf.extend(chunk)
+        return bytes(buf)
+
+    def _roundtrip(self, s: socket.socket, frame: bytes) -> dict[str, Any]:
+        s.sendall(frame)
+        (length,) = _HEADER.unpack(self._recv_exact(s, _HEADER.size))
+        return _unpack(self._recv_exact(s, length))
+
+    def _call(self, request: dict[str, Any]) -> dict[str, Any]:
+        frame = _pack(request)
+        for attempt in (0, 1):
+            s = getattr(self._local, "sock", None)
+            if s is None:
+                s = self._connect()
+                self._local.sock = s
+            try:
+                resp = self._roundtrip(s, frame)
+                break
+            except (OSError, ConnectionError) as e:
+                s.close()
+                self._local.sock = None
+                if attempt:
+                    raise InferenceServiceError(f"推理服务请求失败: {e}") from e
+        if not resp.get("ok"):
+            raise InferenceServiceError(resp.get("error") or "unknown inference service error")
+        return resp
+
+    def ping(self) -> bool:
+        try:
+            self._call({"op": "ping"})
+            return True
+        except InferenceServiceError:
+            return False
+
+    def info(self) -> dict[str, Any]:
+        return self._call({"op": "info"})
+
+    def stats(self) -> dict[str, Any]:
+        return self._call({"op": "stats"})
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        resp = self._call({"op": "embed", "texts": list(texts)})
+        rows, dim = resp["shape"]
+        return np.frombuffer(resp["data"], dtype=np.float32).reshape(rows, dim)
+
+    def rerank(self, pairs: Sequence[Sequence[str]]) -> list[float]:
+        resp = self._call({"op": "rerank", "pairs": [list(p) for p in pairs]})
+        return resp["scores"]
+
+    def close(self) -> None:
+        s = getattr(self._local, "sock", None)
+        if s is not None:
+            s.close()
+            self._local.sock = None
+
+
+class RemoteEmbeddingModel:
+    """Drop-in for SentenceTransformer (``encode`` / dimension) backed by the daemon."""
+
+    def __init__(self, client: InferenceClient, info: dict[str, Any] | None = None):
+        self.client = client
+        self._info = info or client.info()
+        self.model_name = self._info.get("embedding_model", "")
+
+    def encode(self, sentences: str | Sequence[str], convert_to_numpy: bool = True, **_: Any) -> np.ndarray:
+        if isinstance(sentences, str):
+            return self.client.embed([sentences])[0]
+        return self.client.embed(list(sentences))
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return int(self._info.get("dimension", 0))
+
+
+class RemoteCrossEncoder:
+    """Drop-in for CrossEncoder (``predict``) backed by the daemon."""
+
+    def __init__(self, client: InferenceClient, info: dict[str, Any] | None = None):
+        self.client = client
+        self._info = info or client.info()
+        self.model_path = self._info.get("rerank_model", "")
+
+    def predict(self, pairs: Sequence[Sequence[str]], **_: Any) -> np.ndarray:
+        return np.asarray(self.client.rerank(pairs), dtype=np.float32)
+
+
+def connect_remote_embedder(socket_path: str | Path, model_name: str) -> RemoteEmbeddingModel | None:
+    """Return a remote embedding model when the daemon is up and serves ``model_name``.
+
+    Returns None (caller loads the model in-process) when the daemon is
+    unreachable, has no embedding model, or serves a different model - mixing
+    vectors from two models in one index would silently break retrieval.
+    """
+    client = InferenceClient(socket_path)
+    try:
+        info = client.info()
+    except InferenceServiceError as e:
+        logger.warning(f"[INFERENCE] ⚠️ 推理服务不可用，回退到进程内加载模型: {e}")
+        return None
+    if not info.get("embed"):
+        logger.warning("[INFERENCE] ⚠️ 推理服务未加载 Embedding 模型，回退到进程内加载")
+        return None
+    if model_name and info.get("embedding_model") and info["embedding_model"] != model_name:
+        logger.warning(
+            f"[INFERENCE] ⚠️ 推理服务模型 {info['embedding_model']} 与配置 {model_name} 不一致，回退到进程内加载"
+        )
+        return None
+    logger.info(f"[INFERENCE] 🔌 使用推理服务 Embedding: {socket_path} ({info.get('embedding_model')})")
+    return RemoteEmbeddingModel(client, info)
+
+
+def connect_remote_reranker(socket_path: str | Path, model_path: str) -> RemoteCrossEncoder | None:
+    """Return a remote CrossEncoder when the daemon is up and serves ``model_path``.
+
+    Returns None (caller loads the model in-process) when the daemon is
+    unreachable, has no rerank model, or serves a different model.
+    """
+    client = InferenceClient(socket_path)
+    try:
+        info = client.info()
+    except InferenceServiceError as e:
+        logger.warning(f"[INFERENCE] ⚠️ 推理服务不可用，回退到进程内加载重排序模型: {e}")
+        return None
+    if not info.get("rerank"):
+        logger.warning("[INFERENCE] ⚠️ 推理服务未加载重排序模型，回退到进程内加载")
+        return None
+    if model_path and info.get("rerank_model") and info["rerank_model"] != model_path:
+        logger.warning(
+            f"[INFERENCE] ⚠️ 推理服务重排序模型 {info['rerank_model']} 与配置 {model_path} 不一致，回退到进程内加载"
+        )
+        return None
+    logger.info(f"[INFERENCE] 🔌 使用推理服务 CrossEncoder: {socket_path} ({info.get('rerank_model')})")
+    return RemoteCrossEncoder(client, info)
@@ -0,0 +1,370 @@
+"""Persistent background ingestion queue for knowledge writes.
+
+Adding a large document means chunking and embedding it, which used to run
+inline in the agent turn (and on the event loop). Writes are now submitted as
+jobs: ``submit`` persists the job and returns a handle immediately, a bounded
+pool of worker threads executes jobs in priority order, and searches pick up
+the new content as soon as the job commits to Chroma.
+
+Jobs are stored one JSON file per job under ``knowledge/ingestion_jobs/`` so a
+restart resumes queued work. Jobs that were running when the process died are
+re-queued; ``add`` jobs carry a pre-assigned item id and the store upserts, so
+a retried job does not duplicate chunks.
+"""
+
+from __future__ import annotations
+
+import heapq
+import json
+import os
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+_FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+JOB_KINDS = ("add", "update", "delete")
+
+# 各类任务允许的 payload 字段（对应 store 写入方法的参数）与必填字段
+JOB_FIELDS = {
+    "add": frozenset({
+        "domain", "category", "title", "content", "tags", "source", "priority",
+        "source_url", "file_path", "preview_available", "item_id",
+    }),
+    "update": frozenset({"item_id", "title", "content", "tags", "category", "priority"}),
+    "delete": frozenset({"item_id"}),
+}
+JOB_REQUIRED_FIELDS = {
+    "add": ("domain", "category", "title", "content"),
+    "update": ("item_id",),
+    "delete": ("item_id",),
+}
+
+# 交互式写入（对话中添加的知识）优先于批量导入
+PRIORITY_INTERACTIVE = 10
+PRIORITY_BULK = 0
+
+
+class IngestionQueueFullError(Exception):
+    """待处理任务数达到上限（背压）."""
+    pass
+
+
+def validate_job(kind: str, payload: dict[str, Any]) -> None:
+    """校验任务类型与 payload 字段（只允许对应写入方法的参数）.
+
+    Raises:
+        ValueError: 未知任务类型、未知字段或缺少必填字段
+    """
+    if kind not in JOB_KINDS:
+        raise ValueError(f"未知的导入任务类型: {kind}")
+    unknown = sorted(set(payload) - JOB_FIELDS[kind])
+    if unknown:
+        raise ValueError(f"{kind} 任务不支持字段: {', '.join(unknown)}")
+    missing = [key for key in JOB_REQUIRED_FIELDS[kind] if not payload.get(key)]
+    if missing:
+        raise ValueError(f"{kind} 任务缺少字段: {', '.join(missing)}")
+
+
+@dataclass
+class IngestionJob:
+    """A single knowledge write job."""
+
+    job_id: str
+    kind: str
+    payload: dict[str, Any]
+    priority: int = 0
+    seq: int = 0
+    status: str = QUEUED
+    stage: str = ""
+    progress: float = 0.0
+    item_id: str = ""
+    error: str = ""
+    attempts: int = 0
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    started_at: str = ""
+    finished_at: str = ""
+
+    @property
+    def done(self) -> bool:
+        return self.status in _FINISHED
+
+    def summary(self) -> dict[str, Any]:
+        """任务状态（不含正文，用于状态查询）."""
+        data = asdict(self)
+        payload = data.pop("payload")
+        data["title"] = payload.get("title", "")
+        data["domain"] = payload.get("domain", "")
+        return data
+
+
+class IngestionQueue:
+    """Priority job queue with a bounded worker pool in front of a knowledge store."""
+
+    def __init__(
+            self,
+            store: Any,
+            jobs_dir: Path | None = None,
+            max_workers: int = 1,
+            max_pending: int = 1000,
+            keep_finished: int = 200,
+    ):
+        """初始化导入队列并恢复未完成的任务.
+
+        Args:
+            store: ChromaKnowledgeStore 实例
+            jobs_dir: 任务持久化目录（默认 knowledge/ingestion_jobs）
+            max_workers: 后台工作线程数
+            max_pending: 排队任务上限，超过时 submit 抛出 IngestionQueueFullError
+            keep_finished: 保留的已结束任务数（更早的任务记录会被清理）
+        """
+        self.store = store
+        self.jobs_dir = Path(jobs_dir or Path(store.knowledge_dir) / "ingestion_jobs")
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(1, max_pending)
+        self.keep_finished = max(0, keep_finished)
+
+        self._cond = threading.Condition()
+        self._jobs: dict[str, IngestionJob] = {}
+        self._heap: list[tuple[int, int, str]] = []
+        self._seq = 0
+        self._workers: list[threading.Thread] = []
+        self._closed = False
+
+        self._recover()
+
+    # ------------------------------------------------------------------
+    # 持久化
+    # ------------------------------------------------------------------
+
+    def _job_path(self, job_id: str) -> Path:
+        return self.jobs_dir / f"{job_id}.json"
+
+    def _persist(self, job: IngestionJob) -> None:
+        path = self._job_path(job.job_id)
+        tmp = path.with_suffix(".json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(asdict(job), f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def _recover(self) -> None:
+        """加载持久化的任务；排队中和中断的任务重新入队."""
+        requeued = 0
+        for path in sorted(self.jobs_dir.glob("*.json")):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    job = IngestionJob(**json.load(f))
+            except (OSError, TypeError, json.JSONDecodeError) as e:
+                logger.warning(f"⚠️ 无法加载导入任务 {path.name}: {e}")
+                continue
+            self._jobs[job.job_id] = job
+            self._seq = max(self._seq, job.seq)
+            if job.status == RUNNING:
+                job.status, job.stage, job.progress = QUEUED, "", 0.0
+                self._persist(job)
+            if job.status == QUEUED:
+                heapq.heappush(self._heap, (-job.priority, job.seq, job.job_id))
+                requeued += 1
+        if requeued:
+            logger.info(f"📥 恢复 {requeued} 个未完成的知识导入任务")
+            with self._cond:
+                self._ensure_workers()
+
+    def _prune_finished(self) -> None:
+        finished = sorted((j for j in self._jobs.values() if j.done), key=lambda j: j.seq)
+        for job in finished[:max(0, len(finished) - self.keep_finished)]:
+            self._jobs.pop(job.job_id, None)
+            self._job_path(job.job_id).unlink(missing_ok=True)
+
+    # ------------------------------------------------------------------
+    # 提交与查询
+    # ------------------------------------------------------------------
+
+    def submit(self, kind: str = "add", job_priority: int = PRIORITY_BULK, **payload: Any) -> IngestionJob:
+        """提交一个写入任务，立即返回任务句柄（快照）.
+
+        Args:
+            kind: add / update / delete
+            job_priority: 任务优先级，越大越先执行；同优先级按提交顺序执行
+                （与知识条目自身的 priority 字段无关）
+            **payload: 传给 store.add_knowledge / update_knowledge / delete_knowledge 的参数
+
+        Raises:
+            ValueError: 未知任务类型、不支持的字段或缺少必填字段（见 validate_job）
+            IngestionQueueFullError: 排队任务数达到上限
+        """
+        validate_job(kind, payload)
+
+        item_id = payload.get("item_id") or ""
+        if kind == "add" and not item_id:
+            item_id = self.store.new_item_id(payload["domain"])
+            payload["item_id"] = item_id
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("IngestionQueue is closed")
+            pending = sum(1 for j in self._jobs.values() if j.status == QUEUED)
+            if pending >= self.max_pending:
+                raise IngestionQueueFullError(f"知识导入队列已满 ({pending} 个任务排队中)")
+
+            self._seq += 1
+            job = IngestionJob(
+                job_id=uuid.uuid4().hex[:12],
+                kind=kind,
+                payload=payload,
+                priority=job_priority,
+                seq=self._seq,
+                item_id=item_id,
+            )
+            self._persist(job)
+            self._jobs[job.job_id] = job
+            heapq.heappush(self._heap, (-job_priority, job.seq, job.job_id))
+            self._ensure_workers()
+            self._cond.notify()
+            logger.info(f"📥 知识导入任务已排队: {job.job_id} ({kind}, priority={job_priority}, item={item_id})")
+            return IngestionJob(**asdict(job))
+
+    def get(self, job_id: str) -> IngestionJob | None:
+        """任务当前状态的快照."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return IngestionJob(**asdict(job)) if job else None
+
+    def list_jobs(self, status: str | None = None, limit: int = 50) -> list[dict[str, Any]]:
+        """最近的任务状态（新的在前）."""
+        with self._cond:
+            jobs = [j for j in self._jobs.values() if status is None or j.status == status]
+            jobs.sort(key=lambda j: j.seq, reverse=True)
+            return [j.summary() for j in jobs[:limit]]
+
+    def wait(self, job_id: str, timeout: float | None = None) -> IngestionJob | None:
+        """阻塞直到任务结束或超时，返回任务快照."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                job = self._jobs.get(job_id)
+                if job is None or job.done:
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+        return self.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """取消排队中的任务（执行中的任务不可取消）."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                return False
+            job.status = CANCELLED
+            job.finished_at = datetime.now().isoformat()
+            self._persist(job)
+            self._cond.notify_all()
+            return True
+
+    def stats(self) -> dict[str, Any]:
+        with self._cond:
+            counts = {s: 0 for s in (QUEUED, RUNNING, *_FINISHED)}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {"workers": len(self._workers), **counts}
+
+    # ------------------------------------------------------------------
+    # 执行
+    # ------------------------------------------------------------------
+
+    def _ensure_workers(self) -> None:
+        self._workers = [w for w in self._workers if w.is_alive()]
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(
+                target=self._run, name=f"nanobot-ingest-{len(self._workers)}", daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def _next_job(self) -> IngestionJob | None:
+        with self._cond:
+            while True:
+                while self._heap:
+                    _, _, job_id = heapq.heappop(self._heap)
+                    job = self._jobs.get(job_id)
+                    if job is not None and job.status == QUEUED:
+                        job.status = RUNNING
+                        job.attempts += 1
+                        job.started_at = datetime.now().isoformat()
+                        self._persist(job)
+                        return job
+                if self._closed:
+                    return None
+                self._cond.wait()
+
+    def _update_progress(self, job: IngestionJob, stage: str, progress: float) -> None:
+        with self._cond:
+            job.stage = stage
+            job.progress = round(progress, 3)
+
+    def _execute(self, job: IngestionJob) -> None:
+        payload = dict(job.payload)
+        if job.kind == "add":
+            self._update_progress(job, "chunking", 0.0)
+            self.store.add_knowledge(
+                **payload, progress_callback=lambda stage, p: self._update_progress(job, stage, p)
+            )
+        elif job.kind == "update":
+            item_id = payload.pop("item_id")
+            self._update_progress(job, "updating", 0.0)
+            if not self.store.update_knowledge(item_id, **payload):
+                raise RuntimeError(f"知识条目 {item_id} 更新失败")
+        else:
+            self._update_progress(job, "deleting", 0.0)
+            if not self.store.delete_knowledge(payload["item_id"]):
+                raise RuntimeError(f"知识条目 {payload['item_id']} 删除失败")
+
+    def _run(self) -> None:
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            start = time.time()
+            try:
+                self._execute(job)
+                status, error = SUCCEEDED, ""
+            except Exception as e:
+                status, error = FAILED, str(e)
+                logger.error(f"❌ 知识导入任务失败: {job.job_id} ({job.kind}, item={job.item_id}): {e}")
+
+            with self._cond:
+                job.status = status
+                job.error = error
+                job.finished_at = datetime.now().isoformat()
+                if status == SUCCEEDED:
+                    job.stage, job.progress = "done", 1.0
+                self._persist(job)
+                self._prune_finished()
+                self._cond.notify_all()
+            if status == SUCCEEDED:
+                logger.info(
+                    f"✅ 知识导入任务完成: {job.job_id} ({job.kind}, item={job.item_id}), "
+                    f"耗时 {time.time() - start:.2f} 秒"
+                )
+
+    def close(self, timeout: float = 30.0) -> None:
+        """停止接收新任务，执行完已排队任务后退出工作线程."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for worker in self._workers:
+            worker.join(timeout=timeout)
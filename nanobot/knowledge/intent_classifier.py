@@ -0,0 +1,272 @@
+"""Local embedding-based A/B/C intent classifier.
+
+Routes a user message to one of the web UI intents without an LLM round trip:
+
+- ``A`` knowledge Q&A (concepts, configuration, comparisons)
+- ``B`` ops / live queries (inspect resources, run commands)
+- ``C`` troubleshooting (errors, timeouts, backlogs)
+
+Labeled examples are embedded once with the retrieval embedding model. A
+message is scored against each intent by the mean cosine similarity to its
+``top_k`` nearest examples (a nearest-prototype classifier), and the scores are
+turned into a confidence with a softmax. Callers consult the LLM only when the
+confidence is below their threshold, and can log the cases where the LLM
+disagreed (``intent_disagreements.jsonl``) to grow the example set.
+
+Workspace examples (``knowledge/intent_examples.jsonl``, one
+``{"text": ..., "label": "A|B|C"}`` per line) are added to the built-in seeds.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+import numpy as np
+from loguru import logger
+
+INTENT_LABELS = ("A", "B", "C")
+EXAMPLES_FILE = "intent_examples.jsonl"
+DISAGREEMENTS_FILE = "intent_disagreements.jsonl"
+
+# 内置示例（与 LLM 分类提示词中的定义一致）
+SEED_EXAMPLES: dict[str, list[str]] = {
+    "A": [
+        "RocketMQ 的 NameServer 是什么",
+        "Broker 主从同步的原理",
+        "消费者组的配置参数有哪些",
+        "RocketMQ vs Kafka 有什么区别",
+        "消息队列选型对比",
+        "如何配置顺序消息",
+        "事务消息的最佳实践",
+        "k8s Deployment 和 StatefulSet 的区别",
+        "RocketMQ 5.0 有哪些新特性",
+        "Pod 的生命周期是怎样的",
+        "what is a consumer group",
+        "how does broker replication work",
+    ],
+    "B": [
+        "查询 broker-a 的 pod 状态",
+        "查看 namesrv 的日志",
+        "检查集群状态",
+        "执行 kubectl get pods",
+        "获取当前 topic 的消费进度",
+        "列出所有的 consumer group",
+        "查看最近的告警",
+        "帮我重启 broker-b",
+        "查一下 default 命名空间下的服务",
+        "统计今天的消息量",
+        "show me the pods in namespace mq",
+        "list topics on cluster prod",
+    ],
+    "C": [
+        "消费者报错 No route info of this topic",
+        "连不上 NameServer 怎么解决",
+        "发送消息超时",
+        "消息积压越来越多",
+        "broker 挂了",
+        "重启后消费异常",
+        "为什么一直报 Connection refused",
+        "pod 一直 CrashLoopBackOff",
+        "生产者抛出 MQClientException",
+        "集群出问题了，消费延迟很高",
+        "consumer keeps throwing timeout exception",
+        "why does the broker fail to start",
+    ],
+}
+
+
+@dataclass
+class IntentPrediction:
+    """本地分类结果."""
+
+    label: str
+    confidence: float
+    scores: dict[str, float] = field(default_factory=dict)
+    probabilities: dict[str, float] = field(default_factory=dict)
+    elapsed_ms: float = 0.0
+
+
+class IntentClassifier:
+    """Nearest-prototype intent classifier over an embedding model."""
+
+    def __init__(
+            self,
+            embed_fn: Callable[[list[str]], list[list[float]]],
+            workspace: Path | None = None,
+            examples: dict[str, list[str]] | None = None,
+            top_k: int = 3,
+            temperature: float = 0.05,
+    ):
+        """初始化并向量化示例.
+
+        Args:
+            embed_fn: 批量向量化函数（与检索共用的 embedding 模型）
+            workspace: 工作空间；读取 knowledge/intent_examples.jsonl，分歧日志也写在这里
+            examples: 标签 -> 示例文本；默认使用内置示例
+            top_k: 每个意图取最相似的 k 个示例求平均
+            temperature: softmax 温度，越小置信度越“尖锐”
+        """
+        self.embed_fn = embed_fn
+        self.knowledge_dir = Path(workspace) / "knowledge" if workspace else None
+        self.top_k = top_k
+        self.temperature = temperature
+        self._log_lock = threading.Lock()
+
+        labeled = {label: list(texts) for label, texts in (examples or SEED_EXAMPLES).items()}
+        for text, label in self._load_workspace_examples():
+            labeled.setdefault(label, []).append(text)
+
+        self.labels = [label for label in INTENT_LABELS if labeled.get(label)]
+        self._example_vectors: dict[str, np.ndarray] = {}
+        texts = [text for label in self.labels for text in labeled[label]]
+        vectors = self._normalize(np.asarray(embed_fn(texts), dtype=np.float32))
+        offset = 0
+        for label in self.labels:
+            count = len(labeled[label])
+            self._example_vectors[label] = vectors[offset:offset + count]
+            offset += count
+        logger.info(
+            "🧠 本地意图分类器已就绪: "
+            + ", ".join(f"{label}={len(self._example_vectors[label])}" for label in self.labels)
+        )
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+    def _load_workspace_examples(self) -> list[tuple[str, str]]:
+        if self.knowledge_dir is None:
+            return []
+        path = self.knowledge_dir / EXAMPLES_FILE
+        if not path.exists():
+            return []
+        examples = []
+        for record in load_labeled_examples(path):
+            examples.append((record["text"], record["label"]))
+        return examples
+
+    def classify(self, text: str, query_vector: list[float] | None = None) -> IntentPrediction:
+        """分类一条消息.
+
+        Args:
+            text: 用户消息
+            query_vector: 预先计算的消息向量（如 RetrievalContext 中的查询向量），提供时不再向量化
+        """
+        start = time.perf_counter()
+        if query_vector is None:
+            query_vector = self.embed_fn([text])[0]
+        vector = self._normalize(np.asarray(query_vector, dtype=np.float32))
+
+        scores = {}
+        for label in self.labels:
+            similarities = self._example_vectors[label] @ vector
+            k = min(self.top_k, len(similarities))
+            scores[label] = float(np.sort(similarities)[-k:].mean())
+
+        logits = np.asarray([scores[label] for label in self.labels]) / self.temperature
+        probs = np.exp(logits - logits.max())
+        probs /= probs.sum()
+        best = int(probs.argmax())
+        return IntentPrediction(
+            label=self.labels[best],
+            confidence=float(probs[best]),
+            scores=scores,
+            probabilities={label: float(p) for label, p in zip(self.labels, probs)},
+            elapsed_ms=(time.perf_counter() - start) * 1000,
+        )
+
+    def record_disagreement(self, text: str, prediction: IntentPrediction, llm_label: str) -> None:
+        """记录本地分类与 LLM 结果不一致的样本（供人工确认后加入 intent_examples.jsonl）."""
+        if self.knowledge_dir is None or prediction.label == llm_label:
+            return
+        record = {
+            "text": text,
+            "label": llm_label,
+            "predicted": prediction.label,
+            "confidence": round(prediction.confidence, 4),
+            "timestamp": datetime.now().isoformat(),
+        }
+        try:
+            with self._log_lock:
+                self.knowledge_dir.mkdir(parents=True, exist_ok=True)
+                with open(self.knowledge_dir / DISAGREEMENTS_FILE, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.warning(f"⚠️ 意图分歧样本写入失败: {e}")
+
+
+def load_labeled_examples(path: Path) -> list[dict[str, Any]]:
+    """读取 JSONL 标注样本（每行 {"text": ..., "label": "A|B|C"}），跳过无效行."""
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logger.warning(f"⚠️ 跳过无效的意图样本: {path}:{line_no}")
+                continue
+            text = str(record.get("text", "")).strip()
+            label = str(record.get("label", "")).strip().upper()
+            if text and label in INTENT_LABELS:
+                records.append({**record, "text": text, "label": label})
+    return records
+
+
+def evaluate(
+        classifier: IntentClassifier,
+        examples: Iterable[dict[str, Any]],
+        threshold: float = 0.0,
+) -> dict[str, Any]:
+    """离线评估：准确率、各意图召回、混淆矩阵、置信度覆盖率与延迟分位数.
+
+    Args:
+        classifier: 待评估的分类器
+        examples: 标注样本（text / label）
+        threshold: 置信度阈值；低于阈值的样本在线上会交给 LLM
+    """
+    confusion = {gold: {pred: 0 for pred in INTENT_LABELS} for gold in INTENT_LABELS}
+    latencies = []
+    correct = covered = covered_correct = 0
+    for record in examples:
+        prediction = classifier.classify(record["text"])
+        latencies.append(prediction.elapsed_ms)
+        confusion[record["label"]][prediction.label] += 1
+        hit = prediction.label == record["label"]
+        correct += hit
+        if prediction.confidence >= threshold:
+            covered += 1
+            covered_correct += hit
+
+    total = len(latencies)
+    per_label = {}
+    for label in INTENT_LABELS:
+        support = sum(confusion[label].values())
+        per_label[label] = {
+            "support": support,
+            "recall": confusion[label][label] / support if support else 0.0,
+        }
+    ms = np.asarray(latencies or [0.0])
+    return {
+        "total": total,
+        "accuracy": correct / total if total else 0.0,
+        "threshold": threshold,
+        "coverage": covered / total if total else 0.0,
+        "covered_accuracy": covered_correct / covered if covered else 0.0,
+        "per_label": per_label,
+        "confusion": confusion,
+        "latency_ms": {
+            "p50": float(np.percentile(ms, 50)),
+            "p95": float(np.percentile(ms, 95)),
+            "max": float(ms.max()),
+        },
+    }
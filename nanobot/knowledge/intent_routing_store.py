@@ -3,20 +3,28 @@
 from __future__ import annotations
 
 import asyncio
+import hashlib
+import json
 import re
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
 from threading import Lock, Thread
-from typing import Any
+from typing import Any, Callable
 
 from mcp import ClientSession
 from mcp.client.sse import sse_client
 
 import chromadb
-from chromadb.config import Settings
 from loguru import logger
 
 from nanobot.agent.skills import SkillsLoader
+from nanobot.knowledge.embedding_batcher import EmbeddingBatcher
+from nanobot.knowledge.metrics import RetrievalMetrics
 from nanobot.knowledge.rag_config import RAGConfig
+from nanobot.knowledge.retrieval_context import RetrievalContext
+from nanobot.knowledge.skills_watcher import SkillsIndexWatcher
+from nanobot.knowledge.storage import get_storage_context
 from nanobot.knowledge.text_chunker import TextChunker
 from nanobot.knowledge.vector_embedder import VectorEmbedder
 from nanobot.utils.helpers import ensure_dir
@@ -24,6 +32,9 @@ from nanobot.utils.helpers import ensure_dir
 TOOLS_COLLECTION = "ops_tools"
 SKILLS_COLLECTION = "skills_docs"
 
+# 单个 MCP server tools/list 的默认超时（秒），可由 server 配置的 discovery_timeout 覆盖
+DEFAULT_DISCOVERY_TIMEOUT = 10.0
+
 
 def _strip_frontmatter(content: str) -> str:
     if content.startswith("---"):
@@ -59,6 +70,14 @@ def _extract_mcp_tool_schema_fields(tool_def: dict[str, Any]) -> tuple[str, str,
     return name, desc, params
 
 
+def _tool_fingerprint(server: str, name: str, description: str, params: Any, model: str = "") -> str:
+    """工具指纹：server、名称、描述、入参 schema 哈希（及向量模型）任一变化即需重新向量化."""
+    schema = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    schema_hash = hashlib.sha256(schema.encode("utf-8")).hexdigest()
+    payload = "\x1f".join([server, name, description, schema_hash, model])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
 def _read_cfg(server_cfg: Any, key: str, default: Any = None) -> Any:
     if isinstance(server_cfg, dict):
         return server_cfg.get(key, default)
@@ -98,7 +117,7 @@ def _extract_tools_from_list_tools_result(result: Any) -> list[dict[str, Any]]:
 async def _fetch_mcp_tools_from_server_async(
     base_url: str,
     auth_token: str = "",
-    timeout: int = 10,
+    timeout: float = DEFAULT_DISCOVERY_TIMEOUT,
 ) -> list[dict[str, Any]]:
     headers = {"Authorization": f"Bearer {auth_token}"} if auth_token else {}
 
@@ -135,26 +154,65 @@ def _run_async_blocking(coro: Any) -> Any:
     return holder.get("value")
 
 
-def _fetch_mcp_tools_from_server(base_url: str, auth_token: str = "", timeout: int = 10) -> list[dict[str, Any]]:
-    """Call MCP server by mcp SSE client and return full tool definitions."""
-    if not base_url:
-        return []
-
-    try:
-        tools = _run_async_blocking(
-            _fetch_mcp_tools_from_server_async(
-                base_url=base_url,
-                auth_token=auth_token,
-                timeout=timeout,
-            )
-        )
-        return tools if isinstance(tools, list) else []
-    except TimeoutError as e:
-        logger.debug(f"[ROUTING] MCP tools/list timeout for {base_url}: {e}")
-    except Exception as e:
-        logger.warning(f"[ROUTING] MCP tools/list unexpected error for {base_url}: {e}")
-
-    return []
+@dataclass
+class MCPDiscoveryResult:
+    """单个 MCP server 的 tools/list 结果."""
+
+    server_name: str
+    status: str  # ok / empty / timeout / error / no_url
+    tools: list[dict[str, Any]] = field(default_factory=list)
+    elapsed_ms: float = 0.0
+    error: str = ""
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "server_name": self.server_name,
+            "status": self.status,
+            "tools": len(self.tools),
+            "elapsed_ms": round(self.elapsed_ms, 1),
+            "error": self.error,
+        }
+
+
+async def discover_mcp_tools(
+    mcp_servers: dict[str, Any] | None,
+    default_timeout: float = DEFAULT_DISCOVERY_TIMEOUT,
+) -> dict[str, MCPDiscoveryResult]:
+    """Fetch tools/list from every enabled MCP server concurrently on the running loop.
+
+    Each server has its own deadline (``discovery_timeout`` in its config, else
+    ``default_timeout``); a slow or dead server only yields a ``timeout``/``error``
+    result for itself, so the total time is bounded by the slowest server's deadline.
+    """
+
+    async def probe(server_name: str, server_cfg: Any) -> MCPDiscoveryResult:
+        server_url = str(_read_cfg(server_cfg, "server_url", "") or "")
+        if not server_url:
+            return MCPDiscoveryResult(server_name, "no_url")
+        auth_token = str(_read_cfg(server_cfg, "auth_token", "") or "")
+        timeout = float(_read_cfg(server_cfg, "discovery_timeout", 0) or default_timeout)
+        start = time.perf_counter()
+        try:
+            tools = await _fetch_mcp_tools_from_server_async(server_url, auth_token, timeout)
+            result = MCPDiscoveryResult(server_name, "ok" if tools else "empty", tools)
+        except TimeoutError:
+            logger.debug(f"[ROUTING] MCP tools/list timeout for {server_name} ({server_url}) after {timeout}s")
+            result = MCPDiscoveryResult(server_name, "timeout", error=f"timed out after {timeout}s")
+        except Exception as e:
+            # mcp 客户端的 TaskGroup 会把底层异常包进 ExceptionGroup，取第一个叶子异常作为原因
+            while isinstance(e, BaseExceptionGroup) and e.exceptions:
+                e = e.exceptions[0]
+            error = f"{type(e).__name__}: {e}"
+            logger.warning(f"[ROUTING] MCP tools/list unexpected error for {server_name} ({server_url}): {error}")
+            result = MCPDiscoveryResult(server_name, "error", error=error)
+        result.elapsed_ms = (time.perf_counter() - start) * 1000
+        return result
+
+    enabled = [
+        (name, cfg) for name, cfg in (mcp_servers or {}).items() if _read_cfg(cfg, "enabled", False)
+    ]
+    results = await asyncio.gather(*(probe(name, cfg) for name, cfg in enabled))
+    return {result.server_name: result for result in results}
 
 
 class IntentRoutingStore:
@@ -169,21 +227,41 @@ class IntentRoutingStore:
             chunk_size=self.rag_config.chunk_size,
             chunk_overlap=self.rag_config.chunk_overlap,
         )
-        self.embedder = VectorEmbedder(self.rag_config.embedding_model)
-
-        self.tools_dir = ensure_dir(workspace / "tools_index")
-        self.skills_dir = ensure_dir(workspace / "skills_index")
-        self.tools_chroma_dir = ensure_dir(self.tools_dir / "chroma_db")
-        self.skills_chroma_dir = ensure_dir(self.skills_dir / "chroma_db")
-
-        self.tools_client = chromadb.PersistentClient(
-            path=str(self.tools_chroma_dir),
-            settings=Settings(anonymized_telemetry=False, allow_reset=True),
-        )
-        self.skills_client = chromadb.PersistentClient(
-            path=str(self.skills_chroma_dir),
-            settings=Settings(anonymized_telemetry=False, allow_reset=True),
+        self.embedder = VectorEmbedder(self.rag_config.embedding_model, self.rag_config.inference_socket)
+        self.query_embedder = (
+            EmbeddingBatcher(self.embedder, self.rag_config.query_batch_size, self.rag_config.query_batch_wait_ms)
+            if self.rag_config.query_batch_size > 1 else self.embedder
         )
+        self.metrics = RetrievalMetrics(prefix="routing")
+        self._reranker: Any = None
+        self._reranker_lock = Lock()
+        self._tools_index_lock = Lock()
+        self._skills_index_lock = Lock()
+        self._skills_watcher: SkillsIndexWatcher | None = None
+        self.last_discovery: dict[str, MCPDiscoveryResult] = {}
+
+        # 工具与技能索引共用一个持久化目录和一个共享客户端（启动时重建，旧的
+        # tools_index/ skills_index/ 目录不再使用）
+        self.index_dir = ensure_dir(workspace / "routing_index")
+        self.chroma_dir = ensure_dir(self.index_dir / "chroma_db")
+        self._storage = get_storage_context()
+        self._storage_owner = f"intent-routing-{id(self):x}"
+        self._storage.acquire(self.chroma_dir, self._storage_owner)
+
+    @property
+    def tools_client(self) -> chromadb.ClientAPI:
+        return self._storage.client(self.chroma_dir)
+
+    @property
+    def skills_client(self) -> chromadb.ClientAPI:
+        return self._storage.client(self.chroma_dir)
+
+    def close(self) -> None:
+        """停止技能目录监听并释放对共享 Chroma 客户端的持有."""
+        if self._skills_watcher is not None:
+            self._skills_watcher.stop()
+            self._skills_watcher = None
+        self._storage.release(self.chroma_dir, self._storage_owner)
 
     @staticmethod
     def _build_rag_config(cfg: Any) -> RAGConfig:
@@ -196,21 +274,82 @@ class IntentRoutingStore:
                 rag.chunk_size = d.chunk_size
             if hasattr(d, "chunk_overlap"):
                 rag.chunk_overlap = d.chunk_overlap
+            if hasattr(d, "query_batch_size"):
+                rag.query_batch_size = d.query_batch_size
+            if hasattr(d, "query_batch_wait_ms"):
+                rag.query_batch_wait_ms = d.query_batch_wait_ms
+        rerank = getattr(cfg, "rerank", None)
+        if rerank is not None and getattr(rerank, "model_path", ""):
+            rag.rerank_model_path = rerank.model_path
+        inference = getattr(cfg, "inference", None)
+        if inference is not None and getattr(inference, "enabled", False):
+            rag.inference_socket = str(Path(inference.socket_path).expanduser())
         return rag
 
+    def get_reranker(self) -> Any:
+        """Return the route CrossEncoder (remote via inference service when configured), loaded once.
+
+        Returns None when no rerank model is configured.
+        """
+        if self._reranker is not None:
+            return self._reranker
+        model_path = self.rag_config.rerank_model_path
+        if not model_path:
+            return None
+        with self._reranker_lock:
+            if self._reranker is None:
+                if self.rag_config.inference_socket:
+                    from nanobot.knowledge.inference_service import connect_remote_reranker
+
+                    self._reranker = connect_remote_reranker(self.rag_config.inference_socket, model_path)
+                if self._reranker is None:
+                    from sentence_transformers import CrossEncoder
+
+                    logger.info(f"[ROUTING] loading CrossEncoder: {model_path}")
+                    self._reranker = CrossEncoder(model_path)
+        return self._reranker
+
     def _get_or_create(self, client: chromadb.ClientAPI, name: str):
         try:
             return client.get_collection(name=name)
         except Exception:
             return client.create_collection(name=name)
 
-    def init_tools_index(self, tool_schemas: list[dict[str, Any]], mcp_servers: dict[str, Any] | None = None) -> int:
-        """Build/refresh tools collection from ToolRegistry schemas and MCP servers full tools."""
-        collection = self._get_or_create(self.tools_client, TOOLS_COLLECTION)
-
-        docs: list[str] = []
-        ids: list[str] = []
-        metas: list[dict[str, Any]] = []
+    async def refresh_tools_index(
+            self,
+            tool_schemas: list[dict[str, Any]],
+            mcp_servers: dict[str, Any] | None = None,
+    ) -> int:
+        """Async variant of ``init_tools_index``: discovers MCP tools on the caller's loop,
+        then embeds/upserts in a worker thread."""
+        discovered = await discover_mcp_tools(mcp_servers)
+        return await asyncio.to_thread(self.init_tools_index, tool_schemas, mcp_servers, discovered)
+
+    def init_tools_index(
+            self,
+            tool_schemas: list[dict[str, Any]],
+            mcp_servers: dict[str, Any] | None = None,
+            discovered: dict[str, MCPDiscoveryResult] | None = None,
+    ) -> int:
+        """Build/refresh tools collection from ToolRegistry schemas and MCP servers full tools.
+
+        Incremental: each tool doc carries a fingerprint (server, name, description, input
+        schema hash) in its metadata; only added or changed tools are embedded and upserted,
+        and tools that disappeared are deleted. Returns the number of docs in the index.
+
+        ``discovered`` takes the result of ``discover_mcp_tools``; when omitted, all MCP
+        servers are queried concurrently here.
+        """
+        if discovered is None:
+            discovered = _run_async_blocking(discover_mcp_tools(mcp_servers)) if mcp_servers else {}
+        self._record_discovery(discovered)
+
+        model = self.rag_config.embedding_model
+        # None 表示沿用已入库的文档（MCP 拉取失败时）
+        entries: dict[str, tuple[str, dict[str, Any]] | None] = {}
+
+        def add_entry(doc_id: str, doc: str, meta: dict[str, Any], fingerprint: str) -> None:
+            entries[doc_id] = (doc, {**meta, "fingerprint": fingerprint})
 
         for schema in tool_schemas:
             fn = schema.get("function", {})
@@ -225,140 +364,291 @@ class IntentRoutingStore:
                 f"parameters: {params}\n"
                 f"usage: 使用该工具完成运维查询、执行、读取或写入任务。"
             )
-            docs.append(doc)
-            ids.append(f"tool::{name}")
-            metas.append({"source": "registry_tool", "tool_name": name})
-
-        for server_name, server_cfg in (mcp_servers or {}).items():
-            if not _read_cfg(server_cfg, "enabled", False):
-                continue
+            add_entry(
+                f"tool::{name}", doc, {"source": "registry_tool", "tool_name": name},
+                _tool_fingerprint("", name, desc, params, model),
+            )
 
-            server_url = str(_read_cfg(server_cfg, "server_url", "") or "")
-            auth_token = str(_read_cfg(server_cfg, "auth_token", "") or "")
+        with self._tools_index_lock:
+            collection = self._get_or_create(self.tools_client, TOOLS_COLLECTION)
+            existing = self._indexed_fingerprints(collection)
 
-            # 优先从 MCP list-tools 端点动态拉取，确保入库“全部工具定义”
-            server_tools = _fetch_mcp_tools_from_server(base_url=server_url, auth_token=auth_token)
+            for server_name, server_cfg in (mcp_servers or {}).items():
+                if not _read_cfg(server_cfg, "enabled", False):
+                    continue
 
-            # 动态拉取失败时，回退到本地配置中可能携带的 tools 字段
-            if not server_tools:
-                server_tools = (
-                    _read_cfg(server_cfg, "tools", None)
-                    or _read_cfg(server_cfg, "tool_specs", None)
-                    or []
-                )
-                if server_tools:
-                    logger.warning(
-                        f"[ROUTING] MCP tools/list unavailable for {server_name}, fallback to local configured tools"
-                    )
+                server_url = str(_read_cfg(server_cfg, "server_url", "") or "")
 
-            if not server_tools:
-                # 无工具清单时保留 server 级描述，便于检索命中到 MCP 入口
-                doc = (
-                    f"mcp_server: {server_name}\n"
-                    f"server_url: {server_url}\n"
-                    f"tool_name: use_mcp_tool\n"
-                    f"description: 通过 MCP 服务 {server_name} 调用其提供的工具能力。"
-                )
-                ids.append(f"mcp::{server_name}::use_mcp_tool")
-                docs.append(doc)
-                metas.append({"source": "mcp_server", "server_name": server_name, "tool_name": "use_mcp_tool"})
-                continue
+                # 优先使用 MCP list-tools 端点动态拉取的结果，确保入库“全部工具定义”
+                result = discovered.get(server_name)
+                server_tools = result.tools if result is not None else []
 
-            for tool_def in server_tools:
-                tool_name, tool_desc, tool_params = _extract_mcp_tool_schema_fields(tool_def)
-                if not tool_name:
-                    logger.debug(f"[ROUTING] discovered MCP tool without valid name on server {server_name}, skipped")
+                # 动态拉取失败时，回退到本地配置中可能携带的 tools 字段
+                if not server_tools:
+                    server_tools = (
+                        _read_cfg(server_cfg, "tools", None)
+                        or _read_cfg(server_cfg, "tool_specs", None)
+                        or []
+                    )
+                    if server_tools:
+                        logger.warning(
+                            f"[ROUTING] MCP tools/list unavailable for {server_name}, fallback to local configured tools"
+                        )
+
+                if not server_tools:
+                    # 拉取失败时保留该 server 上次入库的工具，避免一次断连清空索引
+                    prefix = f"mcp::{server_name}::"
+                    kept = [
+                        doc_id for doc_id in existing
+                        if doc_id.startswith(prefix) and doc_id != f"{prefix}use_mcp_tool"
+                    ]
+                    if kept:
+                        logger.warning(
+                            f"[ROUTING] MCP tools/list unavailable for {server_name}, keeping {len(kept)} indexed tools"
+                        )
+                        for doc_id in kept:
+                            entries[doc_id] = None
+                        continue
+
+                    # 无工具清单时保留 server 级描述，便于检索命中到 MCP 入口
+                    doc = (
+                        f"mcp_server: {server_name}\n"
+                        f"server_url: {server_url}\n"
+                        f"tool_name: use_mcp_tool\n"
+                        f"description: 通过 MCP 服务 {server_name} 调用其提供的工具能力。"
+                    )
+                    add_entry(
+                        f"{prefix}use_mcp_tool", doc,
+                        {"source": "mcp_server", "server_name": server_name, "tool_name": "use_mcp_tool"},
+                        _tool_fingerprint(f"{server_name}@{server_url}", "use_mcp_tool", "", {}, model),
+                    )
                     continue
 
-                logger.debug(f"[ROUTING] discovered MCP tool: server={server_name}, tool={tool_name}")
+                for tool_def in server_tools:
+                    tool_name, tool_desc, tool_params = _extract_mcp_tool_schema_fields(tool_def)
+                    if not tool_name:
+                        logger.debug(f"[ROUTING] discovered MCP tool without valid name on server {server_name}, skipped")
+                        continue
+
+                    logger.debug(f"[ROUTING] discovered MCP tool: server={server_name}, tool={tool_name}")
+
+                    doc = (
+                        f"mcp_server: {server_name}\n"
+                        f"server_url: {server_url}\n"
+                        f"tool_name: {tool_name}\n"
+                        f"description: {tool_desc}\n"
+                        f"parameters: {tool_params}\n"
+                        f"usage: 通过 MCP 服务调用该工具完成外部系统查询或操作。"
+                    )
+                    add_entry(
+                        f"mcp::{server_name}::{tool_name}", doc,
+                        {
+                            "source": "mcp_tool",
+                            "server_name": server_name,
+                            "tool_name": tool_name,
+                            "server_url": server_url,
+                        },
+                        _tool_fingerprint(f"{server_name}@{server_url}", tool_name, tool_desc, tool_params, model),
+                    )
 
-                doc = (
-                    f"mcp_server: {server_name}\n"
-                    f"server_url: {server_url}\n"
-                    f"tool_name: {tool_name}\n"
-                    f"description: {tool_desc}\n"
-                    f"parameters: {tool_params}\n"
-                    f"usage: 通过 MCP 服务调用该工具完成外部系统查询或操作。"
-                )
-                ids.append(f"mcp::{server_name}::{tool_name}")
-                docs.append(doc)
-                metas.append(
-                    {
-                        "source": "mcp_tool",
-                        "server_name": server_name,
-                        "tool_name": tool_name,
-                        "server_url": server_url,
-                    }
+            if not entries:
+                logger.warning("[ROUTING] tools index has no docs to index")
+
+            changed = [
+                doc_id for doc_id, entry in entries.items()
+                if entry is not None and existing.get(doc_id) != entry[1]["fingerprint"]
+            ]
+            removed = [doc_id for doc_id in existing if doc_id not in entries]
+
+            if changed:
+                docs = [entries[doc_id][0] for doc_id in changed]
+                metas = [entries[doc_id][1] for doc_id in changed]
+                with self.metrics.stage("index_embedding", index="tools"):
+                    embeddings = self.embedder.embed_batch(docs)
+                collection.upsert(ids=changed, documents=docs, metadatas=metas, embeddings=embeddings)
+            if removed:
+                collection.delete(ids=removed)
+
+            added = sum(1 for doc_id in changed if doc_id not in existing)
+            self.metrics.increment("tools_index_docs", added, change="added")
+            self.metrics.increment("tools_index_docs", len(changed) - added, change="changed")
+            self.metrics.increment("tools_index_docs", len(removed), change="removed")
+            logger.info(
+                f"[ROUTING] tools index refreshed: {len(entries)} docs "
+                f"(added={added}, changed={len(changed) - added}, removed={len(removed)}, "
+                f"unchanged={len(entries) - len(changed)})"
+            )
+            return len(entries)
+
+    def _record_discovery(self, discovered: dict[str, MCPDiscoveryResult]) -> None:
+        self.last_discovery = dict(discovered)
+        for result in discovered.values():
+            self.metrics.record_stage(
+                "mcp_discovery", result.elapsed_ms, server=result.server_name, status=result.status
+            )
+        if discovered:
+            logger.info(
+                "[ROUTING] MCP discovery: " + ", ".join(
+                    f"{r.server_name}={r.status}({len(r.tools)} tools, {r.elapsed_ms:.0f}ms)"
+                    for r in discovered.values()
                 )
+            )
 
-        if not docs:
-            logger.warning("[ROUTING] tools index has no docs to index")
-            return 0
+    def discovery_report(self) -> list[dict[str, Any]]:
+        """最近一次 MCP 工具发现的逐 server 状态."""
+        return [result.to_dict() for result in self.last_discovery.values()]
 
-        embeddings = self.embedder.embed_batch(docs)
-        collection.upsert(ids=ids, documents=docs, metadatas=metas, embeddings=embeddings)
-        logger.info(f"[ROUTING] tools index initialized: {len(docs)} docs")
-        return len(docs)
+    @staticmethod
+    def _indexed_fingerprints(collection: Any) -> dict[str, str]:
+        """已入库文档 id -> 指纹（旧版本入库、无指纹的文档为空串，会被重新向量化）."""
+        res = collection.get(include=["metadatas"])
+        ids = res.get("ids") or []
+        metas = res.get("metadatas") or []
+        return {
+            doc_id: str((metas[i] or {}).get("fingerprint", "")) if i < len(metas) else ""
+            for i, doc_id in enumerate(ids)
+        }
 
     def init_skills_index(self, skills_loader: SkillsLoader) -> int:
-        """Build/refresh skills collection from SKILL.md content."""
-        collection = self._get_or_create(self.skills_client, SKILLS_COLLECTION)
-        docs: list[str] = []
-        ids: list[str] = []
-        metas: list[dict[str, Any]] = []
-
-        skills = skills_loader.list_skills(filter_unavailable=False)
-        for skill in skills:
-            skill_name = skill["name"]
-            raw = skills_loader.load_skill(skill_name) or ""
-            content = _strip_frontmatter(raw)
-            if not content.strip():
-                continue
-            chunks = self.chunker.chunk_text(
-                content,
-                metadata={"skill_name": skill_name, "path": skill["path"], "source": skill["source"]},
-            )
-            for chunk in chunks:
-                text = chunk["text"]
-                meta = chunk["metadata"]
-                idx = int(meta.get("chunk_index", 0))
-                doc_id = f"skill::{skill_name}::{idx}"
-                ids.append(doc_id)
-                docs.append(text)
-                metas.append(
-                    {
-                        "source": "skill",
-                        "skill_name": skill_name,
-                        "path": meta.get("path", ""),
-                        "skill_source": meta.get("source", ""),
-                        "chunk_index": idx,
-                    }
+        """Build/refresh skills collection from SKILL.md content.
+
+        Incremental: chunks carry the skill path and a content hash in their metadata; only
+        skills whose path or content changed are re-chunked and re-embedded, and skills that
+        disappeared are deleted. Returns the number of chunks in the index.
+        """
+        model = self.rag_config.embedding_model
+        with self._skills_index_lock:
+            collection = self._get_or_create(self.skills_client, SKILLS_COLLECTION)
+            indexed = self._indexed_skills(collection)
+
+            docs: list[str] = []
+            ids: list[str] = []
+            metas: list[dict[str, Any]] = []
+            stale_ids: list[str] = []
+            seen: set[str] = set()
+            total = unchanged = 0
+
+            skills = skills_loader.list_skills(filter_unavailable=False)
+            for skill in skills:
+                skill_name = skill["name"]
+                seen.add(skill_name)
+                raw = skills_loader.load_skill(skill_name) or ""
+                content = _strip_frontmatter(raw)
+                content_hash = hashlib.sha256(f"{model}\x1f{content}".encode("utf-8")).hexdigest()
+
+                previous = indexed.get(skill_name)
+                if previous and previous["path"] == skill["path"] and previous["content_hash"] == content_hash:
+                    unchanged += 1
+                    total += len(previous["ids"])
+                    continue
+                if previous:
+                    stale_ids.extend(previous["ids"])
+                if not content.strip():
+                    continue
+
+                chunks = self.chunker.chunk_text(
+                    content,
+                    metadata={"skill_name": skill_name, "path": skill["path"], "source": skill["source"]},
                 )
+                for chunk in chunks:
+                    text = chunk["text"]
+                    meta = chunk["metadata"]
+                    idx = int(meta.get("chunk_index", 0))
+                    doc_id = f"skill::{skill_name}::{idx}"
+                    ids.append(doc_id)
+                    docs.append(text)
+                    metas.append(
+                        {
+                            "source": "skill",
+                            "skill_name": skill_name,
+                            "path": meta.get("path", ""),
+                            "skill_source": meta.get("source", ""),
+                            "chunk_index": idx,
+                            "content_hash": content_hash,
+                        }
+                    )
+
+            removed = [name for name in indexed if name not in seen]
+            for name in removed:
+                stale_ids.extend(indexed[name]["ids"])
+
+            # 先删旧分块（编辑后分块数可能变少），再写入新分块
+            if stale_ids:
+                collection.delete(ids=stale_ids)
+            if docs:
+                with self.metrics.stage("index_embedding", index="skills"):
+                    embeddings = self.embedder.embed_batch(docs)
+                collection.upsert(ids=ids, documents=docs, metadatas=metas, embeddings=embeddings)
+            total += len(docs)
+
+            if not total:
+                logger.warning("[ROUTING] skills index has no docs to index")
+            changed = len({meta["skill_name"] for meta in metas})
+            logger.info(
+                f"[ROUTING] skills index refreshed: {total} chunks "
+                f"(changed={changed}, removed={len(removed)}, unchanged={unchanged})"
+            )
+            return total
 
-        if not docs:
-            logger.warning("[ROUTING] skills index has no docs to index")
-            return 0
+    @staticmethod
+    def _indexed_skills(collection: Any) -> dict[str, dict[str, Any]]:
+        """已入库技能 -> {ids, path, content_hash}（旧版本入库、无哈希的技能会被重新向量化）."""
+        res = collection.get(include=["metadatas"])
+        skills: dict[str, dict[str, Any]] = {}
+        for doc_id, meta in zip(res.get("ids") or [], res.get("metadatas") or []):
+            meta = meta or {}
+            name = str(meta.get("skill_name", ""))
+            entry = skills.setdefault(
+                name, {"ids": [], "path": meta.get("path", ""), "content_hash": meta.get("content_hash", "")}
+            )
+            entry["ids"].append(doc_id)
+            if meta.get("content_hash", "") != entry["content_hash"]:
+                entry["content_hash"] = ""
+        return skills
+
+    def watch_skills(self, skills_loader: SkillsLoader, poll_interval: float = 5.0) -> SkillsIndexWatcher:
+        """Keep the skills index fresh: refresh incrementally whenever skill directories change."""
+        if self._skills_watcher is None:
+            self._skills_watcher = SkillsIndexWatcher(
+                skills_loader, lambda: self.init_skills_index(skills_loader), poll_interval=poll_interval
+            )
+            self._skills_watcher.start()
+        return self._skills_watcher
 
-        embeddings = self.embedder.embed_batch(docs)
-        collection.upsert(ids=ids, documents=docs, metadatas=metas, embeddings=embeddings)
-        logger.info(f"[ROUTING] skills index initialized: {len(docs)} chunks")
-        return len(docs)
+    def embed_query(self, query: str, context: RetrievalContext | None = None) -> list[float]:
+        """Query vector; with a RetrievalContext it is computed once per request and model."""
+        if context is not None:
+            return context.query_vector(self.query_embedder, self.rag_config.embedding_model, self.metrics)
+        return self.query_embedder.embed_text(query)
 
-    def search_tools(self, query: str, limit: int = 2) -> list[dict[str, Any]]:
+    def search_tools(self, query: str, limit: int = 2, query_vector: list[float] | None = None) -> list[dict[str, Any]]:
         collection = self._get_or_create(self.tools_client, TOOLS_COLLECTION)
-        return self._query_collection(collection, query, limit)
+        return self._query_collection(collection, query, limit, index="tools", query_vector=query_vector)
 
-    def search_skills(self, query: str, limit: int = 2) -> list[dict[str, Any]]:
+    def search_skills(self, query: str, limit: int = 2, query_vector: list[float] | None = None) -> list[dict[str, Any]]:
         collection = self._get_or_create(self.skills_client, SKILLS_COLLECTION)
-        return self._query_collection(collection, query, limit)
-
-    def _query_collection(self, collection: Any, query: str, limit: int) -> list[dict[str, Any]]:
-        emb = self.embedder.embed_text(query)
-        res = collection.query(
-            query_embeddings=[emb],
-            n_results=max(1, limit),
-            include=["documents", "metadatas", "distances"],
-        )
+        return self._query_collection(collection, query, limit, index="skills", query_vector=query_vector)
+
+    def _query_collection(
+            self,
+            collection: Any,
+            query: str,
+            limit: int,
+            index: str = "",
+            query_vector: list[float] | None = None,
+    ) -> list[dict[str, Any]]:
+        if query_vector is not None:
+            # 复用次数与首次计算耗时由 RetrievalContext 记录（见 embed_query）
+            emb = query_vector
+        else:
+            with self.metrics.stage("query_embedding", index=index):
+                emb = self.query_embedder.embed_text(query)
+        with self.metrics.stage("collection_query", index=index):
+            res = collection.query(
+                query_embeddings=[emb],
+                n_results=max(1, limit),
+                include=["documents", "metadatas", "distances"],
+            )
         docs = (res.get("documents") or [[]])[0]
         metas = (res.get("metadatas") or [[]])[0]
         dists = (res.get("distances") or [[]])[0]
@@ -373,6 +663,7 @@ class IntentRoutingStore:
                     "distance": dists[i] if i < len(dists) else None,
                 }
             )
+        self.metrics.record_candidates("collection_query", len(results), index=index)
         return results
 
 
@@ -392,3 +683,12 @@ def get_intent_routing_store(workspace: Path, config: Any) -> IntentRoutingStore
         store = IntentRoutingStore(workspace, config)
         _CACHE[key] = store
         return store
+
+
+def make_tool_search_fn(workspace: Path, config: Any) -> Callable[[str, int], list[dict[str, Any]]]:
+    """dynamic 工具下发使用的工具索引检索函数；路由存储在首次检索时创建."""
+
+    def search_tools(query: str, limit: int) -> list[dict[str, Any]]:
+        return get_intent_routing_store(workspace, config).search_tools(query, limit)
+
+    return search_tools
@@ -0,0 +1,287 @@
+"""Retrieval instrumentation: per-stage latency histograms, candidate counts and cache hits."""
+
+from __future__ import annotations
+
+import bisect
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from threading import Lock
+from typing import Any, Iterator
+
+# 毫秒级延迟分桶（上界），覆盖从亚毫秒的缓存命中到秒级的重排序
+DEFAULT_LATENCY_BUCKETS_MS: tuple[float, ...] = (
+    0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000,
+)
+
+# 候选数量分桶（上界）
+DEFAULT_COUNT_BUCKETS: tuple[float, ...] = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# 字节数分桶（上界），用于 *_bytes 指标（如 Web UI 每次响应的输出字节数）
+DEFAULT_SIZE_BUCKETS_BYTES: tuple[float, ...] = (
+    256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304,
+)
+
+RETRIEVAL_STAGES: tuple[str, ...] = (
+    "query_embedding",
+    "collection_query",
+    "merge",
+    "rerank",
+    "hydration",
+)
+
+LabelKey = tuple[tuple[str, str], ...]
+
+
+def _label_key(labels: dict[str, Any] | None) -> LabelKey:
+    if not labels:
+        return ()
+    return tuple(sorted((str(k), str(v)) for k, v in labels.items()))
+
+
+def _format_key(name: str, key: LabelKey) -> str:
+    if not key:
+        return name
+    inner = ",".join(f"{k}={v}" for k, v in key)
+    return f"{name}{{{inner}}}"
+
+
+class Histogram:
+    """Fixed-bucket histogram; O(log buckets) per observation, no per-sample storage."""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_LATENCY_BUCKETS_MS):
+        self.buckets = tuple(sorted(buckets))
+        # 最后一个计数槽用于超出最大上界的样本
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min: float | None = None
+        self.max: float | None = None
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float | None:
+        """Estimate a quantile as the upper bound of the bucket that contains it."""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank and c:
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(upper, self.max) if self.max is not None else upper
+        return self.max
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "avg": self.total / self.count if self.count else 0.0,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": {
+                **{str(b): c for b, c in zip(self.buckets, self.counts)},
+                "+Inf": self.counts[-1],
+            },
+        }
+
+
+class MetricsSink(ABC):
+    """Destination for retrieval metrics.
+
+    Subclass and implement ``observe``/``increment`` to forward metrics to an
+    external system (Prometheus, StatsD, ...).
+    """
+
+    @abstractmethod
+    def observe(self, name: str, value: float, labels: dict[str, Any] | None = None) -> None:
+        """Record one histogram observation."""
+        pass
+
+    @abstractmethod
+    def increment(self, name: str, amount: float = 1, labels: dict[str, Any] | None = None) -> None:
+        """Increase a counter."""
+        pass
+
+    def snapshot(self) -> dict[str, Any]:
+        """Return the current metric values, if the sink keeps any."""
+        return {"histograms": {}, "counters": {}}
+
+    def reset(self) -> None:
+        """Drop all recorded values, if the sink keeps any."""
+
+
+class NullMetricsSink(MetricsSink):
+    """Sink that discards everything."""
+
+    def observe(self, name: str, value: float, labels: dict[str, Any] | None = None) -> None:
+        return None
+
+    def increment(self, name: str, amount: float = 1, labels: dict[str, Any] | None = None) -> None:
+        return None
+
+
+class InMemoryMetricsSink(MetricsSink):
+    """Thread-safe in-process sink, queryable from Python."""
+
+    def __init__(self, bucket_overrides: dict[str, tuple[float, ...]] | None = None):
+        self._lock = Lock()
+        self._histograms: dict[tuple[str, LabelKey], Histogram] = {}
+        self._counters: dict[tuple[str, LabelKey], float] = {}
+        self._bucket_overrides = dict(bucket_overrides or {})
+
+    def _buckets_for(self, name: str) -> tuple[float, ...]:
+        if name in self._bucket_overrides:
+            return self._bucket_overrides[name]
+        if name.endswith("_ms"):
+            return DEFAULT_LATENCY_BUCKETS_MS
+        if name.endswith("_bytes"):
+            return DEFAULT_SIZE_BUCKETS_BYTES
+        return DEFAULT_COUNT_BUCKETS
+
+    def observe(self, name: str, value: float, labels: dict[str, Any] | None = None) -> None:
+        key = (name, _label_key(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = Histogram(self._buckets_for(name))
+                self._histograms[key] = hist
+            hist.observe(float(value))
+
+    def increment(self, name: str, amount: float = 1, labels: dict[str, Any] | None = None) -> None:
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def histogram(self, name: str, **labels: Any) -> dict[str, Any] | None:
+        """Return one histogram (exact label match) as a dict, or None."""
+        with self._lock:
+            hist = self._histograms.get((name, _label_key(labels)))
+            return hist.to_dict() if hist else None
+
+    def counter(self, name: str, **labels: Any) -> float:
+        """Return one counter value (exact label match)."""
+        with self._lock:
+            return self._counters.get((name, _label_key(labels)), 0)
+
+    def series(self, name: str) -> list[tuple[dict[str, str], dict[str, Any]]]:
+        """Return all label sets recorded for a histogram name."""
+        with self._lock:
+            return [
+                (dict(key), hist.to_dict())
+                for (n, key), hist in self._histograms.items()
+                if n == name
+            ]
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "histograms": {
+                    _format_key(name, key): hist.to_dict()
+                    for (name, key), hist in self._histograms.items()
+                },
+                "counters": {
+                    _format_key(name, key): value
+                    for (name, key), value in self._counters.items()
+                },
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+_DEFAULT_SINK: MetricsSink = InMemoryMetricsSink()
+
+
+def get_default_metrics_sink() -> MetricsSink:
+    """Return the process-wide sink used when a store is not given one explicitly."""
+    return _DEFAULT_SINK
+
+
+def set_default_metrics_sink(sink: MetricsSink) -> None:
+    """Replace the process-wide sink (affects stores created afterwards)."""
+    global _DEFAULT_SINK
+    _DEFAULT_SINK = sink
+
+
+class RetrievalMetrics:
+    """Instrumentation facade used by the knowledge and routing stores.
+
+    Records:
+    - ``retrieval.stage_ms{stage=...}``: per-stage latency histogram
+    - ``retrieval.candidates{stage=...}``: candidate counts flowing through each stage
+    - ``retrieval.cache_hits`` / ``retrieval.cache_misses{cache=...}``: cache effectiveness
+    - ``retrieval.searches`` / ``retrieval.errors``: request counters
+    """
+
+    def __init__(self, sink: MetricsSink | None = None, prefix: str = "retrieval"):
+        self.sink = sink if sink is not None else get_default_metrics_sink()
+        self.prefix = prefix
+
+    def _name(self, suffix: str) -> str:
+        return f"{self.prefix}.{suffix}"
+
+    @contextmanager
+    def stage(self, stage: str, **labels: Any) -> Iterator[None]:
+        """Time a block of code as one retrieval stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(stage, (time.perf_counter() - start) * 1000, **labels)
+
+    def record_stage(self, stage: str, elapsed_ms: float, **labels: Any) -> None:
+        self.sink.observe(self._name("stage_ms"), elapsed_ms, {"stage": stage, **labels})
+
+    def record_candidates(self, stage: str, count: int, **labels: Any) -> None:
+        self.sink.observe(self._name("candidates"), count, {"stage": stage, **labels})
+
+    def record_cache(self, cache: str, hit: bool, count: int = 1) -> None:
+        if count <= 0:
+            return
+        suffix = "cache_hits" if hit else "cache_misses"
+        self.sink.increment(self._name(suffix), count, {"cache": cache})
+
+    def increment(self, name: str, amount: float = 1, **labels: Any) -> None:
+        self.sink.increment(self._name(name), amount, labels)
+
+    def snapshot(self) -> dict[str, Any]:
+        """Raw metric values from the sink."""
+        return self.sink.snapshot()
+
+    def stage_summary(self) -> dict[str, dict[str, Any]]:
+        """Latency summary per stage (aggregated over other labels), in milliseconds.
+
+        Only available with a sink that exposes ``series`` (e.g. InMemoryMetricsSink).
+        """
+        series = getattr(self.sink, "series", None)
+        if series is None:
+            return {}
+
+        summary: dict[str, dict[str, Any]] = {}
+        for labels, hist in series(self._name("stage_ms")):
+            stage = labels.get("stage", "")
+            entry = summary.setdefault(
+                stage, {"count": 0, "sum_ms": 0.0, "max_ms": 0.0, "p95_ms": 0.0}
+            )
+            entry["count"] += hist["count"]
+            entry["sum_ms"] += hist["sum"]
+            entry["max_ms"] = max(entry["max_ms"], hist["max"] or 0.0)
+            # 多个标签组合时取最差的 p95，作为保守估计
+            entry["p95_ms"] = max(entry["p95_ms"], hist["p95"] or 0.0)
+        for entry in summary.values():
+            entry["avg_ms"] = entry["sum_ms"] / entry["count"] if entry["count"] else 0.0
+        return summary
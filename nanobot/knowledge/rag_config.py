@@ -24,14 +24,56 @@ class RAGConfig:
     top_k: int = 5
     similarity_threshold: float = 0.0
 
+    # Two-tier retrieval: document-level index first, then chunks of the selected documents.
+    # Applied automatically to collections with at least two_tier_min_chunks chunks.
+    two_tier_search: bool = True
+    two_tier_min_chunks: int = 2000
+    two_tier_top_docs: int = 20
+
+    # Cross-domain search: rank domains by query/centroid similarity and skip unrelated ones.
+    # The domain_pruning_min_domains best domains are always searched.
+    domain_pruning: bool = True
+    domain_pruning_min_domains: int = 2
+    domain_pruning_cutoff: float = 0.3
+    domain_pruning_margin: float = 0.15
+
+    # Neighbor-chunk expansion: return each hit with N adjacent chunks on both sides (opt-in, 0 = off)
+    neighbor_chunks: int = 0
+
+    # Context packing for the agent: MMR selection of search results up to a token budget (0 = off)
+    context_token_budget: int = 2000
+    mmr_lambda: float = 0.7
+
+    # Collection residency: memory budget for loaded collection indexes (0 = unlimited).
+    # Least recently used collections are evicted first; pinned domains are never evicted.
+    collection_memory_budget_mb: int = 0
+    pinned_domains: tuple = ()
+    # Evictions reopen the whole client and re-warm every surviving collection, so they are
+    # batched: at most one reopen per interval; the budget may be exceeded until then.
+    eviction_min_interval_seconds: float = 30.0
+
     # Performance configuration
     batch_size: int = 32
     timeout: int = 5
+
+    # Query embedding micro-batching (query_batch_size <= 1 disables it)
+    query_batch_size: int = 32
+    query_batch_wait_ms: float = 2.0
     
     # Rerank configuration
     rerank_model_path: str = ""
     rerank_threshold: float = 0.8
 
+    # Host-local inference service (embed/rerank daemon); empty = load models in-process
+    inference_socket: str = ""
+
+    # Prebuilt index snapshot restored on first start (`nanobot knowledge snapshot`)
+    snapshot_path: str = ""
+
+    # Background ingestion queue (knowledge writes)
+    ingestion_workers: int = 1
+    ingestion_max_pending: int = 1000
+
     @classmethod
     def from_env(cls) -> "RAGConfig":
         """Load configuration from environment variables.
@@ -42,10 +84,29 @@ class RAGConfig:
         - NANOBOT_CHUNK_OVERLAP: Text chunk overlap size in characters
         - NANOBOT_TOP_K: Number of results to return in retrieval
         - NANOBOT_SIMILARITY_THRESHOLD: Minimum similarity score threshold
+        - NANOBOT_TWO_TIER_SEARCH: Enable two-tier document-then-chunk retrieval (true/false)
+        - NANOBOT_TWO_TIER_MIN_CHUNKS: Minimum collection size for two-tier retrieval
+        - NANOBOT_TWO_TIER_TOP_DOCS: Documents selected by the first tier
+        - NANOBOT_DOMAIN_PRUNING: Prune unrelated domains in cross-domain search (true/false)
+        - NANOBOT_DOMAIN_PRUNING_MIN_DOMAINS: Domains always searched in cross-domain search
+        - NANOBOT_DOMAIN_PRUNING_CUTOFF: Query/centroid cosine similarity below which domains are skipped
+        - NANOBOT_DOMAIN_PRUNING_MARGIN: Max similarity gap to the best domain for a domain to be searched
+        - NANOBOT_NEIGHBOR_CHUNKS: Adjacent chunks returned on each side of a search hit (0 disables)
+        - NANOBOT_CONTEXT_TOKEN_BUDGET: Token budget for knowledge passed to the LLM (0 disables packing)
+        - NANOBOT_MMR_LAMBDA: Relevance/diversity trade-off for context packing (0.0-1.0)
+        - NANOBOT_COLLECTION_MEMORY_BUDGET_MB: Memory budget for loaded collections in MB (0 = unlimited)
+        - NANOBOT_PINNED_DOMAINS: Comma-separated domains that are never evicted
+        - NANOBOT_EVICTION_MIN_INTERVAL: Minimum seconds between client reopens that apply evictions
         - NANOBOT_BATCH_SIZE: Batch size for vectorization
         - NANOBOT_TIMEOUT: Timeout in seconds for operations
+        - NANOBOT_QUERY_BATCH_SIZE: Max concurrent query embeddings per model call
+        - NANOBOT_QUERY_BATCH_WAIT_MS: Max time to collect a query-embedding batch
         - NANOBOT_RERANK_MODEL_PATH: Path to rerank model
         - NANOBOT_RERANK_THRESHOLD: Rerank threshold (0.0-1.0)
+        - NANOBOT_INFERENCE_SOCKET: Unix socket of the local inference service
+        - NANOBOT_KNOWLEDGE_SNAPSHOT: Prebuilt knowledge index snapshot to restore on first start
+        - NANOBOT_INGESTION_WORKERS: Background ingestion worker threads
+        - NANOBOT_INGESTION_MAX_PENDING: Max queued ingestion jobs before submissions are rejected
         
         Returns:
             RAGConfig instance with values from environment or defaults
@@ -82,6 +143,75 @@ class RAGConfig:
             except ValueError:
                 pass  # Use default
 
+        if two_tier := os.getenv("NANOBOT_TWO_TIER_SEARCH"):
+            config.two_tier_search = two_tier.strip().lower() in ("1", "true", "yes", "on")
+
+        if two_tier_min_chunks := os.getenv("NANOBOT_TWO_TIER_MIN_CHUNKS"):
+            try:
+                config.two_tier_min_chunks = int(two_tier_min_chunks)
+            except ValueError:
+                pass  # Use default
+
+        if two_tier_top_docs := os.getenv("NANOBOT_TWO_TIER_TOP_DOCS"):
+            try:
+                config.two_tier_top_docs = int(two_tier_top_docs)
+            except ValueError:
+                pass  # Use default
+
+        if domain_pruning := os.getenv("NANOBOT_DOMAIN_PRUNING"):
+            config.domain_pruning = domain_pruning.strip().lower() in ("1", "true", "yes", "on")
+
+        if min_domains := os.getenv("NANOBOT_DOMAIN_PRUNING_MIN_DOMAINS"):
+            try:
+                config.domain_pruning_min_domains = int(min_domains)
+            except ValueError:
+                pass  # Use default
+
+        if cutoff := os.getenv("NANOBOT_DOMAIN_PRUNING_CUTOFF"):
+            try:
+                config.domain_pruning_cutoff = float(cutoff)
+            except ValueError:
+                pass  # Use default
+
+        if margin := os.getenv("NANOBOT_DOMAIN_PRUNING_MARGIN"):
+            try:
+                config.domain_pruning_margin = float(margin)
+            except ValueError:
+                pass  # Use default
+
+        if neighbor_chunks := os.getenv("NANOBOT_NEIGHBOR_CHUNKS"):
+            try:
+                config.neighbor_chunks = int(neighbor_chunks)
+            except ValueError:
+                pass  # Use default
+
+        if context_token_budget := os.getenv("NANOBOT_CONTEXT_TOKEN_BUDGET"):
+            try:
+                config.context_token_budget = int(context_token_budget)
+            except ValueError:
+                pass  # Use default
+
+        if mmr_lambda := os.getenv("NANOBOT_MMR_LAMBDA"):
+            try:
+                config.mmr_lambda = float(mmr_lambda)
+            except ValueError:
+                pass  # Use default
+
+        if memory_budget := os.getenv("NANOBOT_COLLECTION_MEMORY_BUDGET_MB"):
+            try:
+                config.collection_memory_budget_mb = int(memory_budget)
+            except ValueError:
+                pass  # Use default
+
+        if pinned_domains := os.getenv("NANOBOT_PINNED_DOMAINS"):
+            config.pinned_domains = tuple(d.strip() for d in pinned_domains.split(",") if d.strip())
+
+        if eviction_interval := os.getenv("NANOBOT_EVICTION_MIN_INTERVAL"):
+            try:
+                config.eviction_min_interval_seconds = float(eviction_interval)
+            except ValueError:
+                pass  # Use default
+
         # Load performance configuration
         if batch_size := os.getenv("NANOBOT_BATCH_SIZE"):
             try:
@@ -95,6 +225,18 @@ class RAGConfig:
             except ValueError:
                 pass  # Use default
 
+        if query_batch_size := os.getenv("NANOBOT_QUERY_BATCH_SIZE"):
+            try:
+                config.query_batch_size = int(query_batch_size)
+            except ValueError:
+                pass  # Use default
+
+        if query_batch_wait_ms := os.getenv("NANOBOT_QUERY_BATCH_WAIT_MS"):
+            try:
+                config.query_batch_wait_ms = float(query_batch_wait_ms)
+            except ValueError:
+                pass  # Use default
+
         # Load rerank configuration
         if rerank_model_path := os.getenv("NANOBOT_RERANK_MODEL_PATH"):
             config.rerank_model_path = rerank_model_path
@@ -105,6 +247,24 @@ class RAGConfig:
             except ValueError:
                 pass  # Use default
 
+        if inference_socket := os.getenv("NANOBOT_INFERENCE_SOCKET"):
+            config.inference_socket = inference_socket
+
+        if snapshot_path := os.getenv("NANOBOT_KNOWLEDGE_SNAPSHOT"):
+            config.snapshot_path = snapshot_path
+
+        if ingestion_workers := os.getenv("NANOBOT_INGESTION_WORKERS"):
+            try:
+                config.ingestion_workers = int(ingestion_workers)
+            except ValueError:
+                pass  # Use default
+
+        if ingestion_max_pending := os.getenv("NANOBOT_INGESTION_MAX_PENDING"):
+            try:
+                config.ingestion_max_pending = int(ingestion_max_pending)
+            except ValueError:
+                pass  # Use default
+
         return config
 
     def validate(self) -> bool:
@@ -129,6 +289,27 @@ class RAGConfig:
         if self.similarity_threshold < 0.0 or self.similarity_threshold > 1.0:
             return False
 
+        # Validate two-tier retrieval
+        if self.two_tier_min_chunks < 0 or self.two_tier_top_docs <= 0:
+            return False
+
+        # Validate domain pruning
+        if self.domain_pruning_min_domains <= 0 or not -1.0 <= self.domain_pruning_cutoff <= 1.0 \
+                or self.domain_pruning_margin < 0:
+            return False
+
+        # Validate neighbor expansion
+        if self.neighbor_chunks < 0:
+            return False
+
+        # Validate context packing
+        if self.context_token_budget < 0 or not 0.0 <= self.mmr_lambda <= 1.0:
+            return False
+
+        # Validate collection residency
+        if self.collection_memory_budget_mb < 0 or self.eviction_min_interval_seconds < 0:
+            return False
+
         # Validate batch size
         if self.batch_size <= 0:
             return False
@@ -137,6 +318,14 @@ class RAGConfig:
         if self.timeout <= 0:
             return False
 
+        # Validate query batching
+        if self.query_batch_size <= 0 or self.query_batch_wait_ms < 0:
+            return False
+
+        # Validate ingestion queue
+        if self.ingestion_workers <= 0 or self.ingestion_max_pending <= 0:
+            return False
+
         # Validate rerank threshold
         if self.rerank_threshold < 0.0 or self.rerank_threshold > 1.0:
             return False
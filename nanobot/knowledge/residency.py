@@ -0,0 +1,139 @@
+"""Memory-budgeted residency tracking for knowledge collections.
+
+Chroma loads a collection's HNSW index into memory the first time the
+collection is queried and keeps it for the lifetime of the client, so a
+process that has touched many domains holds every one of their indexes.
+
+``CollectionResidency`` records which collections have been loaded, their
+approximate footprint and when they were last used. Once the total exceeds
+the configured budget it selects least-recently-used collections to evict;
+collections of pinned domains are never selected.
+
+The embedded Chroma backend cannot unload a single index, so the store
+applies an eviction by reopening its client (which releases every loaded
+index) and re-warming the collections that are still resident. Because a
+reopen reloads every survivor, the store applies at most one reopen per
+``eviction_min_interval_seconds`` and accumulates victims in between. Loaded
+memory can exceed the budget until the next reopen, and a victim that is used
+again before then is simply kept. The client is shared by every owner of the
+persist root, so a reopen only happens while none of them is using it.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+# HNSW 邻接表与 id 映射的额外开销（实测约 500 字节/向量）
+BYTES_PER_VECTOR_OVERHEAD = 512
+
+
+def estimate_footprint(count: int, dimension: int) -> int:
+    """估算集合加载后的内存占用（字节）：float32 向量 + 每个向量的索引开销."""
+    return max(0, int(count)) * (max(0, int(dimension)) * 4 + BYTES_PER_VECTOR_OVERHEAD)
+
+
+@dataclass
+class ResidentCollection:
+    """一个已加载集合的记录."""
+
+    name: str
+    domain: str
+    footprint: int
+    loaded_at: float
+    last_used: float
+    hits: int = 1
+
+
+class CollectionResidency:
+    """LRU residency bookkeeping for collections under a memory budget."""
+
+    def __init__(self, budget_bytes: int = 0, pinned: Iterable[str] = ()):
+        """初始化.
+
+        Args:
+            budget_bytes: 已加载集合的内存预算（字节），0 表示不限制
+            pinned: 常驻领域，其集合永不被驱逐
+        """
+        self.budget_bytes = max(0, int(budget_bytes))
+        self.pinned = {domain for domain in pinned if domain}
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._resident: OrderedDict[str, ResidentCollection] = OrderedDict()
+
+    def is_resident(self, name: str) -> bool:
+        with self._lock:
+            return name in self._resident
+
+    def touch(self, name: str, domain: str, footprint: int | None = None) -> list[str]:
+        """记录集合被使用（首次使用即视为已加载），返回需要驱逐的集合名.
+
+        Args:
+            name: 物理集合名
+            domain: 所属领域（用于判断是否常驻）
+            footprint: 估算的内存占用；None 时沿用已有记录
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._resident.get(name)
+            if entry is None:
+                entry = ResidentCollection(name, domain, int(footprint or 0), loaded_at=now, last_used=now)
+                self._resident[name] = entry
+            else:
+                entry.hits += 1
+                entry.last_used = now
+                if footprint is not None:
+                    entry.footprint = int(footprint)
+                self._resident.move_to_end(name)
+            return self._select_victims(protect=name)
+
+    def _select_victims(self, protect: str) -> list[str]:
+        if not self.budget_bytes:
+            return []
+        total = sum(entry.footprint for entry in self._resident.values())
+        victims = []
+        # OrderedDict 按最近使用排序，最久未使用的在前
+        for name, entry in list(self._resident.items()):
+            if total <= self.budget_bytes:
+                break
+            if name == protect or entry.domain in self.pinned:
+                continue
+            victims.append(name)
+            total -= entry.footprint
+            del self._resident[name]
+        self.evictions += len(victims)
+        return victims
+
+    def discard(self, name: str) -> None:
+        """集合被删除时移除记录."""
+        with self._lock:
+            self._resident.pop(name, None)
+
+    def resident(self) -> list[ResidentCollection]:
+        """当前已加载的集合（最近使用的在后）."""
+        with self._lock:
+            return list(self._resident.values())
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            entries = list(self._resident.values())
+        return {
+            "budget_bytes": self.budget_bytes,
+            "resident_bytes": sum(entry.footprint for entry in entries),
+            "evictions": self.evictions,
+            "pinned": sorted(self.pinned),
+            "collections": [
+                {
+                    "name": entry.name,
+                    "domain": entry.domain,
+                    "footprint": entry.footprint,
+                    "pinned": entry.domain in self.pinned,
+                    "hits": entry.hits,
+                    "last_used": entry.last_used,
+                }
+                for entry in entries
+            ],
+        }
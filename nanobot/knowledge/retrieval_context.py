@@ -0,0 +1,57 @@
+"""Request-scoped query embeddings shared across index lookups.
+
+One web request can search the tools index, the skills index and the
+knowledge base with the same user text. Each store would otherwise run its
+own forward pass for that text. ``RetrievalContext`` embeds the query once per
+embedding model and hands the vector to every store, whose search APIs accept
+a precomputed ``query_vector``.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any
+
+
+class RetrievalContext:
+    """Caches the query embedding of one request, keyed by embedding model."""
+
+    def __init__(self, query: str):
+        self.query = query
+        self.computed = 0
+        self.reused = 0
+        self._lock = threading.Lock()
+        self._model_locks: dict[str, threading.Lock] = {}
+        self._vectors: dict[str, list[float]] = {}
+
+    def query_vector(self, embedder: Any, model: str, metrics: Any = None) -> list[float]:
+        """返回查询向量；同一模型只计算一次（并发调用时后来者等待首次计算的结果）.
+
+        Args:
+            embedder: 具有 embed_text 的向量化器（VectorEmbedder / EmbeddingBatcher）
+            model: 向量化模型标识，不同模型的向量不会互相复用
+            metrics: 可选的 RetrievalMetrics：首次计算计入 query_embedding 阶段耗时，
+                复用计入 query_embedding_reused；两者都记录 query_embedding 缓存命中/未命中
+        """
+        with self._lock:
+            model_lock = self._model_locks.setdefault(model, threading.Lock())
+        with model_lock:
+            vector = self._vectors.get(model)
+            if vector is not None:
+                self.reused += 1
+                if metrics is not None:
+                    metrics.increment("query_embedding_reused")
+                    metrics.record_cache("query_embedding", hit=True)
+                return vector
+            if metrics is None:
+                vector = list(embedder.embed_text(self.query))
+            else:
+                with metrics.stage("query_embedding"):
+                    vector = list(embedder.embed_text(self.query))
+                metrics.record_cache("query_embedding", hit=False)
+            self._vectors[model] = vector
+            self.computed += 1
+            return vector
+
+    def stats(self) -> dict[str, Any]:
+        return {"models": sorted(self._vectors), "computed": self.computed, "reused": self.reused}
@@ -274,7 +274,12 @@ class RocketMQKnowledgeInitializer:
         logger.info(
             f"✅ 找到 {len(categories)} 个知识类别，共 {sum(len(items) for items in categories.values())} 个知识条目")
         # Initialize from file system
-        self._initialize_from_filesystem(categories)
+        # 向量库支持索引代际时在新集合中重建，完成后原子切换，重建期间检索不受影响
+        if hasattr(self.store, 'build_generation'):
+            with self.store.build_generation(self.domain):
+                self._initialize_from_filesystem(categories)
+        else:
+            self._initialize_from_filesystem(categories)
 
         # 初始化状态由 store 统一管理，无需单独创建标记文件
         logger.info("✅ RocketMQ 知识库初始化状态已由 store 统一管理")
@@ -467,7 +472,7 @@ class RocketMQKnowledgeInitializer:
 
             # 3. 存储到 Chroma
             logger.info(f"💾 正在存储到 Chroma 数据库...")
-            collection = self.store._get_or_create_collection(self.domain)
+            collection = self.store._write_collection(self.domain)
 
             # 准备批量插入的数据
             ids = []
@@ -489,6 +494,9 @@ class RocketMQKnowledgeInitializer:
                 metadatas=metadatas,
                 embeddings=embeddings_list
             )
+            if hasattr(self.store, "_index_document"):
+                self.store._index_document(collection, item_id, metadatas[0], embeddings_list)
+                self.store._update_centroid(collection, added=embeddings_list)
 
             # 更新分块计数
             self.chunk_count += len(chunks)
@@ -0,0 +1,134 @@
+"""Watch skill directories and refresh the skills index when they change.
+
+Uses filesystem notifications (``watchfiles``) when the package is installed
+and every skill directory exists; otherwise falls back to polling the
+``SKILL.md`` files' mtimes. The refresh callback is expected to be incremental
+(``IntentRoutingStore.init_skills_index``), so a single edited skill only costs
+re-embedding that skill.
+"""
+
+from __future__ import annotations
+
+import threading
+from pathlib import Path
+from typing import Any, Callable
+
+from loguru import logger
+
+try:
+    import watchfiles
+except ImportError:  # pragma: no cover - watchfiles 随 uvicorn[standard] 安装
+    watchfiles = None
+
+SKILL_FILE = "SKILL.md"
+
+
+class SkillsIndexWatcher:
+    """Background thread that calls ``on_change`` after skill files change."""
+
+    def __init__(
+            self,
+            skills_loader: Any,
+            on_change: Callable[[], Any],
+            poll_interval: float = 5.0,
+            debounce_ms: int = 800,
+    ):
+        """初始化.
+
+        Args:
+            skills_loader: SkillsLoader（提供 workspace_skills / builtin_skills 目录）
+            on_change: 技能变化后调用的刷新函数
+            poll_interval: 轮询模式的检查间隔（秒）
+            debounce_ms: 通知模式下合并连续变更的窗口（毫秒）
+        """
+        self.skills_loader = skills_loader
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self.debounce_ms = debounce_ms
+        self.mode = ""
+        self.refreshes = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._baseline: dict[str, tuple[int, int]] = {}
+
+    def skill_dirs(self) -> list[Path]:
+        dirs = [self.skills_loader.workspace_skills, self.skills_loader.builtin_skills]
+        return [Path(d) for d in dirs if d]
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        dirs = self.skill_dirs()
+        # 目录不存在时无法注册通知（例如工作空间尚未创建 skills/），改为轮询
+        self.mode = "notify" if watchfiles is not None and dirs and all(d.is_dir() for d in dirs) else "poll"
+        # 启动时即记录基线，之后的任何变更都不会漏掉
+        self._baseline = self._snapshot()
+        self._thread = threading.Thread(target=self._run, name="skills-index-watcher", daemon=True)
+        self._thread.start()
+        logger.info(f"[ROUTING] watching skills ({self.mode}): {', '.join(str(d) for d in dirs)}")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        if self.mode == "notify":
+            self._run_notify()
+        else:
+            self._run_poll()
+
+    def _run_notify(self) -> None:
+        dirs = self.skill_dirs()
+        roots = {d.resolve() for d in dirs}
+
+        def is_skill_change(_change: Any, path: str) -> bool:
+            p = Path(path)
+            # SKILL.md 的增删改，或技能目录本身被删除/重命名
+            return p.name == SKILL_FILE or p.parent.resolve() in roots
+
+        try:
+            for _ in watchfiles.watch(
+                    *dirs,
+                    watch_filter=is_skill_change,
+                    debounce=self.debounce_ms,
+                    stop_event=self._stop,
+                    rust_timeout=1000,
+            ):
+                self._refresh()
+        except Exception as e:
+            if self._stop.is_set():
+                return
+            logger.warning(f"[ROUTING] skills watcher failed, falling back to polling: {e}")
+            self.mode = "poll"
+            self._baseline = self._snapshot()
+            self._run_poll()
+
+    def _snapshot(self) -> dict[str, tuple[int, int]]:
+        snapshot = {}
+        for root in self.skill_dirs():
+            if not root.is_dir():
+                continue
+            for skill_file in root.glob(f"*/{SKILL_FILE}"):
+                try:
+                    stat = skill_file.stat()
+                except OSError:
+                    continue
+                snapshot[str(skill_file)] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def _run_poll(self) -> None:
+        previous = self._baseline
+        while not self._stop.wait(self.poll_interval):
+            current = self._snapshot()
+            if current != previous:
+                previous = current
+                self._refresh()
+
+    def _refresh(self) -> None:
+        try:
+            self.on_change()
+            self.refreshes += 1
+        except Exception as e:
+            logger.warning(f"[ROUTING] skills index refresh failed: {e}")
@@ -0,0 +1,282 @@
+"""Prebuilt knowledge index snapshots.
+
+A snapshot packages everything needed to serve the knowledge base without
+re-embedding the bundled corpus:
+
+- the Chroma persistent directory (``chroma_db/``)
+- ``generations.json`` and ``init_status.json``
+- a manifest (``snapshot.json``) with the snapshot format version, the index
+  fingerprint (embedding model id + dimension, chunker settings, corpus hash)
+  and a sha256 checksum for every archived file
+
+Restoring verifies the format version, the fingerprint and every checksum
+before swapping the restored files into place, so a snapshot built with a
+different model or chunker configuration is refused instead of silently
+serving vectors from the wrong embedding space.
+"""
+
+from __future__ import annotations
+
+import glob
+import hashlib
+import io
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_NAME = "snapshot.json"
+DATA_PREFIX = "data/"
+_STATE_FILES = ("generations.json", "init_status.json")
+
+
+class SnapshotError(Exception):
+    """快照文件损坏、格式不支持或恢复失败."""
+    pass
+
+
+class SnapshotMismatchError(SnapshotError):
+    """快照与当前模型/分块配置/语料不匹配."""
+
+    def __init__(self, mismatches: dict[str, tuple[Any, Any]]):
+        self.mismatches = mismatches
+        details = ", ".join(f"{key}: snapshot={got!r} current={want!r}" for key, (got, want) in mismatches.items())
+        super().__init__(f"快照与当前配置不匹配 ({details})")
+
+
+def _sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def corpus_manifest(knowledge_dir: Path) -> dict[str, str]:
+    """Markdown 语料清单：相对路径 -> sha256（与 get_knowledge_categories 扫描的文件一致）."""
+    root = Path(os.path.expanduser(str(knowledge_dir)))
+    manifest = {}
+    for path in sorted(glob.glob(os.path.join(str(root), "**", "*.md"), recursive=True)):
+        manifest[str(Path(path).relative_to(root))] = _sha256_file(Path(path))
+    return manifest
+
+
+def index_fingerprint(
+        embedding_model: str,
+        dimension: int,
+        chunker: Any,
+        corpus: dict[str, str],
+) -> dict[str, Any]:
+    """索引指纹：决定向量是否可复用的全部因素."""
+    corpus_digest = hashlib.sha256(json.dumps(corpus, sort_keys=True).encode("utf-8")).hexdigest()
+    return {
+        "embedding_model": embedding_model,
+        "dimension": int(dimension),
+        "chunk_size": chunker.chunk_size,
+        "chunk_overlap": chunker.chunk_overlap,
+        "smart_chunking": bool(getattr(chunker, "smart_chunking", False)),
+        "preserve_structure": bool(getattr(chunker, "preserve_structure", False)),
+        "corpus_sha256": corpus_digest,
+    }
+
+
+def store_fingerprint(store: Any) -> dict[str, Any]:
+    """根据已初始化的 ChromaKnowledgeStore 计算当前索引指纹."""
+    return index_fingerprint(
+        store.config.embedding_model,
+        store.embedder.get_embedding_dimension(),
+        store.chunker,
+        corpus_manifest(store.knowledge_dir),
+    )
+
+
+def config_fingerprint(config: Any, knowledge_dir: Path, dimension: int) -> dict[str, Any]:
+    """根据 RAGConfig 计算索引指纹（无需打开 Chroma，用于 CLI 恢复）."""
+    from .text_chunker import TextChunker
+
+    chunker = TextChunker(
+        chunk_size=config.chunk_size,
+        chunk_overlap=config.chunk_overlap,
+        smart_chunking=False,
+        preserve_structure=False,
+    )
+    return index_fingerprint(config.embedding_model, dimension, chunker, corpus_manifest(knowledge_dir))
+
+
+def compare_fingerprints(snapshot: dict[str, Any], current: dict[str, Any]) -> dict[str, tuple[Any, Any]]:
+    """返回不一致的指纹字段 {key: (snapshot_value, current_value)}."""
+    keys = set(snapshot) | set(current)
+    return {key: (snapshot.get(key), current.get(key)) for key in sorted(keys) if snapshot.get(key) != current.get(key)}
+
+
+def create_snapshot(store: Any, output: Path) -> dict[str, Any]:
+    """将知识库索引打包为快照归档（tar.gz）.
+
+    打包期间持有 store 的写锁，保证 Chroma 文件处于一致状态。
+
+    Args:
+        store: ChromaKnowledgeStore 实例
+        output: 归档输出路径
+
+    Returns:
+        快照清单（即归档中的 snapshot.json）
+    """
+    from nanobot import __version__
+
+    output = Path(output).expanduser()
+    output.parent.mkdir(parents=True, exist_ok=True)
+    start = time.time()
+
+    quiesce = store.exclusive_writes() if hasattr(store, "exclusive_writes") else nullcontext()
+    with quiesce:
+        files: dict[str, Path] = {}
+        for path in sorted(Path(store.chroma_dir).rglob("*")):
+            if path.is_file():
+                files[f"{DATA_PREFIX}chroma_db/{path.relative_to(store.chroma_dir).as_posix()}"] = path
+        for name in _STATE_FILES:
+            path = Path(store.knowledge_dir) / name
+            if path.exists():
+                files[f"{DATA_PREFIX}{name}"] = path
+
+        manifest = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "created_at": datetime.now().isoformat(),
+            "nanobot_version": __version__,
+            "fingerprint": store_fingerprint(store),
+            "corpus": corpus_manifest(store.knowledge_dir),
+            "domains": store.domain_chunk_counts(),
+            "files": {arcname: _sha256_file(path) for arcname, path in files.items()},
+        }
+
+        tmp = output.with_name(output.name + ".tmp")
+        with tarfile.open(tmp, "w:gz") as tar:
+            payload = json.dumps(manifest, indent=2, ensure_ascii=False).encode("utf-8")
+            info = tarfile.TarInfo(MANIFEST_NAME)
+            info.size = len(payload)
+            info.mtime = int(time.time())
+            tar.addfile(info, io.BytesIO(payload))
+            for arcname, path in files.items():
+                tar.add(path, arcname=arcname, recursive=False)
+        os.replace(tmp, output)
+
+    logger.info(
+        f"📦 知识库快照已生成: {output} ({len(manifest['files'])} 个文件, "
+        f"{sum(manifest['domains'].values())} 个分块, 耗时 {time.time() - start:.2f} 秒)"
+    )
+    return manifest
+
+
+def read_snapshot_manifest(archive: Path) -> dict[str, Any]:
+    """读取并校验快照清单（不解压数据文件）."""
+    try:
+        with tarfile.open(Path(archive).expanduser(), "r:gz") as tar:
+            member = tar.extractfile(MANIFEST_NAME)
+            if member is None:
+                raise SnapshotError(f"快照缺少 {MANIFEST_NAME}")
+            manifest = json.loads(member.read().decode("utf-8"))
+    except (tarfile.TarError, OSError, KeyError, json.JSONDecodeError) as e:
+        raise SnapshotError(f"无法读取快照 {archive}: {e}") from e
+
+    version = manifest.get("format_version")
+    if version != SNAPSHOT_FORMAT_VERSION:
+        raise SnapshotError(f"不支持的快照格式版本: {version}（当前支持 {SNAPSHOT_FORMAT_VERSION}）")
+    return manifest
+
+
+def restore_snapshot(archive: Path, knowledge_dir: Path, expected: dict[str, Any]) -> dict[str, Any]:
+    """从快照恢复知识库索引.
+
+    必须在打开该工作空间的 Chroma 客户端之前调用（CLI 中或 store 初始化前）。
+    先解压到临时目录并逐个校验 sha256，全部通过后再替换 chroma_db 与状态文件；
+    替换失败时回滚到原有数据。
+
+    Args:
+        archive: 快照归档路径
+        knowledge_dir: 工作空间的知识库目录
+        expected: 当前配置的索引指纹（见 store_fingerprint / index_fingerprint）
+
+    Returns:
+        快照清单
+
+    Raises:
+        SnapshotMismatchError: 模型、维度、分块配置或语料与当前不一致
+        SnapshotError: 归档损坏、校验失败或恢复失败
+    """
+    start = time.time()
+    manifest = read_snapshot_manifest(archive)
+    mismatches = compare_fingerprints(manifest.get("fingerprint", {}), expected)
+    if mismatches:
+        raise SnapshotMismatchError(mismatches)
+
+    knowledge_dir = Path(knowledge_dir).expanduser()
+    knowledge_dir.mkdir(parents=True, exist_ok=True)
+    checksums: dict[str, str] = manifest.get("files", {})
+
+    staging = Path(tempfile.mkdtemp(prefix=".snapshot-restore-", dir=knowledge_dir))
+    try:
+        with tarfile.open(Path(archive).expanduser(), "r:gz") as tar:
+            for member in tar.getmembers():
+                if member.name == MANIFEST_NAME:
+                    continue
+                if member.name not in checksums or not member.isfile():
+                    raise SnapshotError(f"快照包含未登记的文件: {member.name}")
+                target = staging / member.name
+                if not target.resolve().is_relative_to(staging.resolve()):
+                    raise SnapshotError(f"快照包含非法路径: {member.name}")
+                target.parent.mkdir(parents=True, exist_ok=True)
+                with tar.extractfile(member) as src, open(target, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+
+        for arcname, digest in checksums.items():
+            path = staging / arcname
+            if not path.exists():
+                raise SnapshotError(f"快照缺少文件: {arcname}")
+            if _sha256_file(path) != digest:
+                raise SnapshotError(f"快照文件校验失败: {arcname}")
+
+        _swap_into_place(staging / DATA_PREFIX, knowledge_dir)
+    except (tarfile.TarError, OSError) as e:
+        raise SnapshotError(f"快照恢复失败: {e}") from e
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    logger.info(
+        f"📦 已从快照恢复知识库: {archive} ({len(checksums)} 个文件, "
+        f"{sum(manifest.get('domains', {}).values())} 个分块, 耗时 {time.time() - start:.2f} 秒)"
+    )
+    return manifest
+
+
+def _swap_into_place(source: Path, knowledge_dir: Path) -> None:
+    """用 source 中的 chroma_db 与状态文件替换 knowledge_dir 中的对应内容，失败时回滚."""
+    backup = Path(tempfile.mkdtemp(prefix=".snapshot-backup-", dir=knowledge_dir))
+    names = ["chroma_db", *_STATE_FILES]
+    moved: list[str] = []
+    try:
+        for name in names:
+            if (knowledge_dir / name).exists():
+                os.replace(knowledge_dir / name, backup / name)
+                moved.append(name)
+        for name in names:
+            if (source / name).exists():
+                os.replace(source / name, knowledge_dir / name)
+        (knowledge_dir / "chroma_db").mkdir(exist_ok=True)
+    except OSError:
+        # 回滚失败时保留备份目录，便于手工恢复
+        for name in names:
+            if name in moved:
+                if (knowledge_dir / name).is_dir():
+                    shutil.rmtree(knowledge_dir / name, ignore_errors=True)
+                os.replace(backup / name, knowledge_dir / name)
+        shutil.rmtree(backup, ignore_errors=True)
+        raise
+    shutil.rmtree(backup, ignore_errors=True)
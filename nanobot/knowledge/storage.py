@@ -0,0 +1,193 @@
+"""Process-wide storage context for Chroma clients.
+
+Every store that persists vectors (the knowledge store, the intent routing
+indexes) borrows its client from one ``StorageContext`` instead of opening its
+own ``PersistentClient``. The context owns exactly one client per persist root:
+
+- ``acquire(root, owner)`` opens the client on first use and registers the
+  owner; later owners of the same root get the same client.
+- ``using(root)`` marks the root's client as in use for the duration of a
+  block; ``client(root)`` returns the current client and must only be called
+  (and its collection handles only used) inside such a block.
+- ``reopen(root)`` closes and reopens the client when no owner is using it and
+  returns False otherwise, so a reopen never invalidates handles held by any
+  owner of the same root. Users arriving during a reopen wait for it to finish.
+- ``release(root, owner)`` drops an owner; the client is closed when the last
+  owner releases it.
+- ``shutdown()`` closes every client (also registered with ``atexit``); the
+  context refuses new acquisitions afterwards.
+"""
+
+from __future__ import annotations
+
+import atexit
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterator
+
+import chromadb
+from chromadb.config import Settings
+from loguru import logger
+
+
+def storage_settings() -> Settings:
+    """所有 Chroma 客户端共用的设置（同一目录的客户端设置必须一致）."""
+    return Settings(anonymized_telemetry=False, allow_reset=True)
+
+
+def _root_key(root: Path | str) -> str:
+    return os.path.realpath(os.path.expanduser(str(root)))
+
+
+@dataclass
+class _ClientEntry:
+    client: Any
+    owners: dict[str, int] = field(default_factory=dict)
+    users: int = 0  # 正在使用客户端的代码块数（所有 owner 合计）
+    recycling: bool = False
+
+
+class StorageContext:
+    """Owns one Chroma client per persist root and hands it out to stores."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._cond = threading.Condition(self._lock)
+        self._entries: dict[str, _ClientEntry] = {}
+        self._closed = False
+
+    def _open(self, key: str) -> Any:
+        logger.info(f"初始化 Chroma 持久化客户端: {key}")
+        return chromadb.PersistentClient(path=key, settings=storage_settings())
+
+    def acquire(self, root: Path | str, owner: str) -> Any:
+        """登记 owner 并返回该目录的共享客户端（首次使用时打开）.
+
+        Raises:
+            RuntimeError: 存储上下文已关闭
+        """
+        key = _root_key(root)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("StorageContext is shut down")
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _ClientEntry(self._open(key))
+                self._entries[key] = entry
+            entry.owners[owner] = entry.owners.get(owner, 0) + 1
+            return entry.client
+
+    @contextmanager
+    def using(self, root: Path | str) -> Iterator[Any]:
+        """标记目录的客户端正在使用（可嵌套）；正在重开时等待重开完成.
+
+        Raises:
+            RuntimeError: 该目录没有 owner（未 acquire 或已全部 release）
+        """
+        key = _root_key(root)
+        with self._cond:
+            while True:
+                entry = self._entries.get(key)
+                if entry is None:
+                    raise RuntimeError(f"Chroma 存储目录未打开: {root}")
+                if not entry.recycling:
+                    break
+                self._cond.wait()
+            entry.users += 1
+        try:
+            yield entry.client
+        finally:
+            with self._cond:
+                entry.users -= 1
+                self._cond.notify_all()
+
+    def client(self, root: Path | str) -> Any:
+        """已登记目录的当前客户端（在 using 块内调用）.
+
+        Raises:
+            RuntimeError: 该目录没有 owner（未 acquire 或已全部 release）
+        """
+        entry = self._entries.get(_root_key(root))
+        if entry is None:
+            raise RuntimeError(f"Chroma 存储目录未打开: {root}")
+        return entry.client
+
+    def is_open(self, root: Path | str) -> bool:
+        return _root_key(root) in self._entries
+
+    def release(self, root: Path | str, owner: str) -> None:
+        """注销 owner；最后一个 owner 释放时关闭客户端."""
+        key = _root_key(root)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or owner not in entry.owners:
+                return
+            entry.owners[owner] -= 1
+            if entry.owners[owner] <= 0:
+                del entry.owners[owner]
+            if not entry.owners:
+                del self._entries[key]
+                self._close(key, entry.client)
+
+    def reopen(self, root: Path | str) -> bool:
+        """关闭并重新打开目录的客户端（释放已加载的全部集合索引），owner 保持不变.
+
+        任一 owner 正在使用客户端（using 块内）时不重开并返回 False，由调用方稍后重试；
+        重开期间新的 using 等待重开完成。
+
+        Raises:
+            RuntimeError: 该目录没有 owner（未 acquire 或已全部 release）
+        """
+        key = _root_key(root)
+        with self._cond:
+            entry = self._entries.get(key)
+            if entry is None:
+                raise RuntimeError(f"Chroma 存储目录未打开: {root}")
+            if entry.users or entry.recycling:
+                return False
+            entry.recycling = True
+        try:
+            self._close(key, entry.client)
+            entry.client = self._open(key)
+        finally:
+            with self._cond:
+                entry.recycling = False
+                self._cond.notify_all()
+        return True
+
+    def shutdown(self) -> None:
+        """关闭所有客户端，之后不再接受 acquire."""
+        with self._lock:
+            self._closed = True
+            entries, self._entries = self._entries, {}
+        for key, entry in entries.items():
+            self._close(key, entry.client)
+
+    @staticmethod
+    def _close(key: str, client: Any) -> None:
+        try:
+            client.close()
+        except Exception as e:
+            logger.warning(f"关闭 Chroma 客户端失败: {key}: {e}")
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {key: dict(entry.owners) for key, entry in self._entries.items()}
+
+
+_CONTEXT: StorageContext | None = None
+_CONTEXT_LOCK = threading.Lock()
+
+
+def get_storage_context() -> StorageContext:
+    """进程级存储上下文（首次调用时创建，并在进程退出时关闭所有客户端）."""
+    global _CONTEXT
+    if _CONTEXT is None:
+        with _CONTEXT_LOCK:
+            if _CONTEXT is None:
+                _CONTEXT = StorageContext()
+                atexit.register(_CONTEXT.shutdown)
+    return _CONTEXT
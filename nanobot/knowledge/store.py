@@ -1,13 +1,20 @@
 """Knowledge base storage system for domain-specific knowledge."""
 
+import ctypes
+import ctypes.util
+import functools
+import hashlib
 import json
+import os
+import threading
+import time
+from contextlib import ExitStack, contextmanager
 from dataclasses import dataclass, asdict
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
-import chromadb
-from chromadb.config import Settings
+import numpy as np
 from loguru import logger
 
 # 添加CrossEncoder相关导入
@@ -21,11 +28,50 @@ except ImportError as e:
     logger.warning(f"sentence_transformers 库未安装，CrossEncoder 重排序功能将不可用: {e}")
 
 from nanobot.utils.helpers import ensure_dir
+from .metrics import MetricsSink, RetrievalMetrics
 from .rag_config import RAGConfig
+from .residency import CollectionResidency, estimate_footprint
+from .retrieval_context import RetrievalContext
+from .storage import get_storage_context
+from .context_packer import PackCandidate, PackedContext, make_token_counter, pack_context
 from .text_chunker import TextChunker
+from .embedding_batcher import EmbeddingBatcher
 from .vector_embedder import VectorEmbedder
 
 
+# 代际集合名后缀：knowledge_{domain}__g{N}
+GENERATION_SEPARATOR = "__g"
+
+# 文档级索引集合前缀：docindex__{物理集合名}，每个知识条目一条（分块向量的质心）
+DOC_INDEX_PREFIX = "docindex__"
+
+# 同一目录的其他 owner 正在使用客户端时，驱逐重开的重试间隔（秒）
+EVICTION_RETRY_SECONDS = 1.0
+
+
+def _release_free_memory() -> None:
+    """让 glibc 把已释放的堆内存归还操作系统（其他平台无操作）."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"))
+        if hasattr(libc, "malloc_trim"):
+            libc.malloc_trim(0)
+    except OSError:
+        pass
+
+
+def _uses_client(method):
+    """方法执行期间标记 Chroma 客户端正在使用，结束后执行待处理的集合驱逐."""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._client_in_use():
+            result = method(self, *args, **kwargs)
+        self._apply_evictions()
+        return result
+
+    return wrapper
+
+
 class RAGKnowledgeError(Exception):
     """RAG 知识库系统基础异常."""
     pass
@@ -77,27 +123,65 @@ class KnowledgeItem:
 class ChromaKnowledgeStore:
     """基于 Chroma 的知识库存储系统."""
 
-    def __init__(self, workspace: Path, config: Optional[RAGConfig] = None):
+    def __init__(
+            self,
+            workspace: Path,
+            config: Optional[RAGConfig] = None,
+            metrics_sink: Optional[MetricsSink] = None
+    ):
         """初始化知识库.
 
         Args:
             workspace: 工作空间路径
             config: RAG 配置
+            metrics_sink: 检索指标输出（默认使用进程级内存 sink）
 
         Raises:
             ChromaConnectionError: Chroma 数据库连接失败时抛出
             EmbeddingModelError: Embedding 模型加载失败时抛出
             RuntimeError: CrossEncoder 模型初始化失败时抛出
         """
-        import time
         start_time = time.time()
 
         self.workspace = workspace
         self.config = config or RAGConfig()
+        self.metrics = RetrievalMetrics(metrics_sink)
         self.knowledge_dir = ensure_dir(workspace / "knowledge")
         self.chroma_dir = ensure_dir(self.knowledge_dir / "chroma_db")
         self.init_status_file = self.knowledge_dir / "init_status.json"
 
+        # 索引代际：domain -> live 物理集合名；读者只读指针，写者按领域串行
+        self.generations_file = self.knowledge_dir / "generations.json"
+        self.retire_grace_seconds = 30.0
+        self._generation_lock = threading.RLock()
+        self._write_locks: Dict[str, threading.RLock] = {}
+        self._building: Dict[str, tuple] = {}
+        self._live: Dict[str, str] = {}
+        self._retired: List[Dict[str, Any]] = []
+        self._generations_mtime = None
+        self._retire_timer = None
+        # 已确认文档级索引完整的分块集合（物理名）；首次回填按集合串行
+        self._doc_index_ready: set = set()
+        self._doc_index_locks: Dict[str, threading.Lock] = {}
+        # 文档级索引失效计数：回填期间有写入失败或删除时不标记就绪
+        self._doc_index_epochs: Dict[str, int] = {}
+        # 已解析的领域质心（物理集合名 -> 质心，空集合为 None），由 _update_centroid 维护；
+        # 版本号防止检索线程用写入前读到的旧质心覆盖缓存
+        self._centroids: Dict[str, Optional[np.ndarray]] = {}
+        self._centroid_versions: Dict[str, int] = {}
+
+        # 集合驻留：按内存预算 LRU 驱逐已加载的集合，常驻领域不驱逐
+        self.residency = CollectionResidency(
+            self.config.collection_memory_budget_mb * 1024 * 1024, self.config.pinned_domains
+        )
+        self._client_cond = threading.Condition()
+        self._client_users = 0
+        self._client_recycling = False
+        self._pending_evictions: set = set()
+        self._last_reopen = 0.0
+        self._eviction_timer = None
+        self._embedding_dimension: Optional[int] = None
+
         logger.info("🏗️  开始初始化 RAG 知识库 Chroma")
         logger.info(f"   - 工作空间: {workspace}")
         logger.info(f"   - 知识库目录: {self.knowledge_dir}")
@@ -109,17 +193,28 @@ class ChromaKnowledgeStore:
         logger.info(f"   - 分块大小: {self.config.chunk_size}")
         logger.info(f"   - 分块重叠: {self.config.chunk_overlap}")
 
-        self.embedder = VectorEmbedder(self.config.embedding_model)
+        self.embedder = VectorEmbedder(self.config.embedding_model, self.config.inference_socket)
+        # 并发查询的向量化合并为一次 embed_batch 调用
+        self.query_embedder = (
+            EmbeddingBatcher(self.embedder, self.config.query_batch_size, self.config.query_batch_wait_ms)
+            if self.config.query_batch_size > 1 else self.embedder
+        )
         self.chunker = TextChunker(
             chunk_size=self.config.chunk_size,
             chunk_overlap=self.config.chunk_overlap,
             smart_chunking=False,  # 启用智能分割
             preserve_structure=False  # 保持文档结构
         )
-        self.chroma_client = None
+        self._storage = get_storage_context()
+        self._storage_owner = f"knowledge-store-{id(self):x}"
+        self._maybe_restore_snapshot()
         self._init_chroma()
         self._init_status: Dict[str, Any] = {}
         self._load_init_status()
+        self._load_generations(force=True)
+        with self._client_in_use():
+            self._drop_retired_generations()
+            self._drop_orphan_generations()
 
         # 初始化CrossEncoder重排序模型
         self.cross_encoder = None
@@ -129,26 +224,60 @@ class ChromaKnowledgeStore:
         logger.info(f"✅ RAG 知识库Chroma初始化完成，总耗时: {elapsed:.2f} 秒")
         logger.info("📚 内置知识库将在首次使用时自动初始化")
 
+    def _maybe_restore_snapshot(self) -> None:
+        """首次启动（内置知识尚未初始化）时从预构建快照恢复索引，避免重新向量化.
+
+        快照与当前模型/分块配置/语料不一致或已损坏时记录警告，回退到正常初始化流程。
+        """
+        snapshot_path = self.config.snapshot_path
+        if not snapshot_path or self._storage.is_open(self.chroma_dir):
+            # 其他 store 已打开同一目录时不能替换其下的文件
+            return
+        try:
+            with open(self.init_status_file, 'r', encoding='utf-8') as f:
+                if json.load(f).get("rocketmq", {}).get("initialized_at"):
+                    return
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+        from .snapshot import SnapshotError, restore_snapshot, store_fingerprint
+
+        if not Path(snapshot_path).expanduser().exists():
+            logger.warning(f"⚠️  知识库快照不存在: {snapshot_path}，将重新向量化内置知识")
+            return
+
+        logger.info(f"📦 检测到知识库快照配置，尝试恢复: {snapshot_path}")
+        try:
+            restore_snapshot(Path(snapshot_path), self.knowledge_dir, store_fingerprint(self))
+        except SnapshotError as e:
+            logger.warning(f"⚠️  知识库快照不可用，将重新向量化内置知识: {str(e)}")
+
     def _init_chroma(self) -> None:
-        """初始化 Chroma 客户端.
+        """从进程级存储上下文获取 Chroma 客户端（同一目录的所有 store 共用一个客户端）.
 
         Raises:
             ChromaConnectionError: Chroma 数据库连接失败时抛出
         """
         try:
-            logger.info(f"初始化 Chroma 持久化客户端: {self.chroma_dir}")
-            self.chroma_client = chromadb.PersistentClient(
-                path=str(self.chroma_dir),
-                settings=Settings(
-                    anonymized_telemetry=False,
-                    allow_reset=True
-                )
-            )
+            self._storage.acquire(self.chroma_dir, self._storage_owner)
             logger.info("Chroma 客户端初始化成功")
         except Exception as e:
             logger.error(f"Chroma 客户端初始化失败: {str(e)}", exc_info=True)
             raise ChromaConnectionError(str(e))
 
+    @property
+    def chroma_client(self):
+        """当前的共享 Chroma 客户端（驱逐重开后自动指向新客户端）."""
+        return self._storage.client(self.chroma_dir)
+
+    def close(self) -> None:
+        """释放对共享 Chroma 客户端的持有；最后一个持有者释放时客户端关闭."""
+        if self._retire_timer is not None:
+            self._retire_timer.cancel()
+        if self._eviction_timer is not None:
+            self._eviction_timer.cancel()
+        self._storage.release(self.chroma_dir, self._storage_owner)
+
     def _get_or_create_collection(self, domain: str):
         """获取或创建 Chroma 集合.
 
@@ -161,7 +290,7 @@ class ChromaKnowledgeStore:
         Raises:
             ChromaConnectionError: 集合创建失败时抛出
         """
-        collection_name = f"knowledge_{domain}"
+        collection_name = self._live_collection_name(domain)
 
         try:
             # 尝试获取现有集合
@@ -195,6 +324,690 @@ class ChromaKnowledgeStore:
                 logger.error(f"❌ 集合创建失败: {collection_name}, 错误: {str(e)}", exc_info=True)
                 raise ChromaConnectionError(f"创建集合失败: {str(e)}")
 
+    # ------------------------------------------------------------------
+    # 集合驻留：按内存预算驱逐最久未使用的已加载集合
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def _client_in_use(self):
+        """标记 Chroma 客户端正在使用.
+
+        计数登记在存储上下文中（同一目录的所有 owner 共用），重新打开客户端（驱逐）只在
+        没有任何使用者时进行；客户端和集合句柄只能在此范围内使用。
+        """
+        with self._storage.using(self.chroma_dir):
+            with self._client_cond:
+                self._client_users += 1
+            try:
+                yield
+            finally:
+                with self._client_cond:
+                    self._client_users -= 1
+
+    def _touch_collection(self, domain: str, collection, refresh: bool = False) -> None:
+        """记录集合被查询/写入（首次使用时 Chroma 将其索引载入内存）.
+
+        Args:
+            domain: 所属领域
+            collection: Chroma 集合
+            refresh: 写入后重新估算内存占用
+        """
+        footprint = None
+        resident = self.residency.is_resident(collection.name)
+        if not resident:
+            # 已选为驱逐对象但客户端尚未重开：索引仍在内存中，再次使用时取消驱逐
+            with self._client_cond:
+                self._pending_evictions.discard(collection.name)
+        if refresh or not resident:
+            try:
+                if self._embedding_dimension is None:
+                    self._embedding_dimension = self.embedder.get_embedding_dimension()
+                footprint = estimate_footprint(collection.count(), self._embedding_dimension)
+            except Exception as e:
+                logger.debug(f"估算集合内存占用失败: {collection.name}, 错误: {str(e)}")
+        victims = self.residency.touch(collection.name, domain, footprint)
+        if victims:
+            with self._client_cond:
+                self._pending_evictions.update(victims)
+
+    def _apply_evictions(self) -> None:
+        """执行待处理的驱逐.
+
+        嵌入式 Chroma 无法单独卸载某个集合的索引，因此在没有使用者时重新打开客户端
+        （释放全部已加载索引），再在后台预热仍驻留的集合。一次重开的代价是重新载入
+        所有仍驻留的集合，因此驱逐按 eviction_min_interval_seconds 合并：间隔内选出的
+        驱逐对象累积到下一次重开一并执行，期间已加载索引的实际占用可能超出预算。
+        本 store 仍在使用客户端时推迟到最外层调用结束；同一目录的其他 owner 正在使用时
+        定时重试。
+        """
+        with self._client_cond:
+            if not self._pending_evictions or self._client_users or self._client_recycling:
+                return
+            wait = self._last_reopen + self.config.eviction_min_interval_seconds - time.monotonic()
+            if wait > 0:
+                self._schedule_evictions(wait)
+                return
+            self._client_recycling = True
+            victims = sorted(self._pending_evictions)
+
+        start = time.perf_counter()
+        reopened = False
+        try:
+            reopened = self._storage.reopen(self.chroma_dir)
+        except Exception as e:
+            logger.error(f"❌ 重新打开 Chroma 客户端失败: {str(e)}", exc_info=True)
+        finally:
+            with self._client_cond:
+                self._client_recycling = False
+                if reopened:
+                    self._pending_evictions.difference_update(victims)
+                    self._last_reopen = time.monotonic()
+                else:
+                    self._schedule_evictions(EVICTION_RETRY_SECONDS)
+        if not reopened:
+            return
+        _release_free_memory()
+
+        self.metrics.increment("collection_evictions", len(victims))
+        self.metrics.increment("client_reopens")
+        stats = self.residency.stats()
+        logger.info(
+            f"♻️  已驱逐 {len(victims)} 个集合: {', '.join(victims)}，"
+            f"驻留 {stats['resident_bytes'] / 2 ** 20:.1f}/{stats['budget_bytes'] / 2 ** 20:.0f} MB，"
+            f"耗时 {(time.perf_counter() - start) * 1000:.1f} 毫秒"
+        )
+        survivors = [entry.name for entry in self.residency.resident()]
+        if survivors:
+            threading.Thread(
+                target=self._rewarm_collections, args=(survivors,), name="nanobot-rewarm", daemon=True
+            ).start()
+
+    def _schedule_evictions(self, delay: float) -> None:
+        """间隔未到时定时执行合并后的驱逐（调用方持有 _client_cond）."""
+        if self._eviction_timer is not None:
+            return
+        self._eviction_timer = threading.Timer(delay, self._on_eviction_timer)
+        self._eviction_timer.daemon = True
+        self._eviction_timer.start()
+
+    def _on_eviction_timer(self) -> None:
+        with self._client_cond:
+            self._eviction_timer = None
+        self._apply_evictions()
+
+    def _rewarm_collections(self, names: List[str]) -> None:
+        """重新载入仍驻留（含常驻领域）的集合索引，避免其下一次查询承担加载延迟."""
+        with self._client_in_use():
+            for name in names:
+                if not self.residency.is_resident(name):
+                    continue
+                try:
+                    collection = self.chroma_client.get_collection(name)
+                    if collection.count() == 0:
+                        continue
+                    if self._embedding_dimension is None:
+                        self._embedding_dimension = self.embedder.get_embedding_dimension()
+                    collection.query(query_embeddings=[[0.0] * self._embedding_dimension], n_results=1, include=[])
+                except Exception as e:
+                    logger.debug(f"预热集合失败: {name}, 错误: {str(e)}")
+
+    def residency_stats(self) -> Dict[str, Any]:
+        """集合驻留状态（预算、已加载集合及其估算占用）."""
+        return self.residency.stats()
+
+    def embed_query(self, query: str, context: Optional[RetrievalContext] = None) -> List[float]:
+        """查询向量；传入 RetrievalContext 时同一请求内按模型只计算一次."""
+        if context is not None:
+            return context.query_vector(self.query_embedder, self.config.embedding_model, self.metrics)
+        return self.query_embedder.embed_text(query)
+
+    # ------------------------------------------------------------------
+    # 索引代际（generation）：后台构建新集合，完成后原子切换 live 指针
+    # ------------------------------------------------------------------
+
+    def _parse_collection_name(self, name: str) -> Optional[tuple]:
+        """解析物理集合名，返回 (domain, generation)；非知识库集合返回 None.
+
+        ``knowledge_{domain}`` 为第 0 代，``knowledge_{domain}__g{N}`` 为第 N 代。
+        """
+        if not name.startswith("knowledge_"):
+            return None
+        rest = name[len("knowledge_"):]
+        base, sep, gen = rest.rpartition(GENERATION_SEPARATOR)
+        if sep and base and gen.isdigit():
+            return base, int(gen)
+        return rest, 0
+
+    def _load_generations(self, force: bool = False) -> None:
+        """加载 generations.json；文件未变化时跳过（其他进程切换后可被感知）."""
+        try:
+            mtime = self.generations_file.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if not force and mtime == self._generations_mtime:
+            return
+
+        data: Dict[str, Any] = {}
+        if mtime is not None:
+            try:
+                with open(self.generations_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                logger.warning(f"⚠️ 索引代际文件加载失败，保留当前指针: {str(e)}")
+                return
+
+        with self._generation_lock:
+            self._live = dict(data.get("live", {}))
+            self._retired = list(data.get("retired", []))
+            self._generations_mtime = mtime
+
+    def _save_generations(self) -> None:
+        """原子写入 generations.json（先写临时文件再 rename）."""
+        tmp = self.generations_file.with_suffix(".json.tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({"live": self._live, "retired": self._retired}, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, self.generations_file)
+        self._generations_mtime = self.generations_file.stat().st_mtime_ns
+
+    def _live_collection_name(self, domain: str) -> str:
+        """领域当前 live 集合的物理名称."""
+        self._load_generations()
+        return self._live.get(domain, f"knowledge_{domain}")
+
+    def _domain_write_lock(self, domain: str) -> threading.RLock:
+        with self._generation_lock:
+            lock = self._write_locks.get(domain)
+            if lock is None:
+                lock = threading.RLock()
+                self._write_locks[domain] = lock
+            return lock
+
+    def _write_collection(self, domain: str):
+        """写入目标集合：构建线程写 staging 集合，其他写入者写 live 集合."""
+        building = self._building.get(domain)
+        if building and building[1] == threading.get_ident():
+            return building[2]
+        return self._get_or_create_collection(domain)
+
+    def _live_collections(self) -> List[tuple]:
+        """列出所有领域的 live 集合 [(domain, collection)]，不包含构建中或已退役的代际（在 _client_in_use 内调用）."""
+        self._load_generations()
+        result = []
+        for coll_info in self.chroma_client.list_collections():
+            parsed = self._parse_collection_name(coll_info.name)
+            if parsed is None:
+                continue
+            domain = parsed[0]
+            if coll_info.name != self._live.get(domain, f"knowledge_{domain}"):
+                continue
+            try:
+                result.append((domain, self.chroma_client.get_collection(coll_info.name)))
+            except Exception as e:
+                logger.warning(f"获取集合 '{coll_info.name}' 失败: {str(e)}")
+        return result
+
+    @contextmanager
+    def build_generation(self, domain: str):
+        """在新的代际集合中重建领域索引，成功后原子切换为 live.
+
+        构建期间：
+        - 读者继续读取旧的 live 集合，既不阻塞也看不到半成品；
+        - 同领域的其他写入者等待构建结束后写入新代际；
+        - 构建线程内的 add/update/delete 自动写入 staging 集合。
+        构建失败时删除 staging 集合，live 指针保持不变。
+
+        Yields:
+            staging 集合
+        """
+        with self._client_in_use(), self._domain_write_lock(domain):
+            self._load_generations(force=True)
+            existing = [
+                parsed[1] for parsed in (
+                    self._parse_collection_name(c.name) for c in self.chroma_client.list_collections()
+                ) if parsed and parsed[0] == domain
+            ]
+            live_parsed = self._parse_collection_name(self._live_collection_name(domain))
+            generation = max(existing + [live_parsed[1] if live_parsed else 0]) + 1
+            staging_name = f"knowledge_{domain}{GENERATION_SEPARATOR}{generation}"
+
+            staging = self.chroma_client.create_collection(
+                name=staging_name,
+                metadata={
+                    "domain": domain,
+                    "generation": generation,
+                    "created_at": datetime.now().isoformat(),
+                    "description": f"{domain} 知识库集合（第 {generation} 代）"
+                }
+            )
+            self._building[domain] = (staging_name, threading.get_ident(), staging)
+            logger.info(f"🏗️  开始构建领域 '{domain}' 的新索引代际: {staging_name}")
+
+            try:
+                yield staging
+            except BaseException:
+                self._building.pop(domain, None)
+                self._delete_collection_family(staging_name)
+                logger.error(f"❌ 领域 '{domain}' 新索引构建失败，live 集合保持不变")
+                raise
+
+            self._building.pop(domain, None)
+            self._swap_live(domain, staging_name)
+
+    def _swap_live(self, domain: str, new_name: str) -> None:
+        """原子切换 live 指针；旧集合延迟删除，给进行中的读请求留出时间."""
+        with self._generation_lock:
+            self._load_generations(force=True)
+            old_name = self._live.get(domain, f"knowledge_{domain}")
+            self._live[domain] = new_name
+            if old_name != new_name:
+                self._retired.append({"name": old_name, "retired_at": time.time()})
+            self._save_generations()
+        logger.info(f"🔀 领域 '{domain}' live 索引已切换: {old_name} -> {new_name}")
+        self.metrics.increment("generation_swaps", domain=domain)
+        self._drop_retired_generations()
+
+    def _drop_retired_generations(self) -> None:
+        """删除超过宽限期的退役集合."""
+        now = time.time()
+        with self._generation_lock:
+            due = [r for r in self._retired if now - r.get("retired_at", 0) >= self.retire_grace_seconds]
+            if not due:
+                pending = [r for r in self._retired if r not in due]
+                if pending and self._retire_timer is None:
+                    delay = max(0.0, min(r["retired_at"] for r in pending) + self.retire_grace_seconds - now)
+                    self._retire_timer = threading.Timer(delay, self._on_retire_timer)
+                    self._retire_timer.daemon = True
+                    self._retire_timer.start()
+                return
+            self._load_generations(force=True)
+            live_names = set(self._live.values())
+            for entry in due:
+                name = entry["name"]
+                if name in live_names:
+                    continue
+                if self._delete_collection_family(name):
+                    logger.info(f"🗑️  已删除退役索引集合: {name}")
+            self._retired = [r for r in self._retired if r not in due]
+            self._save_generations()
+        if self._retired:
+            self._drop_retired_generations()
+
+    def _delete_collection_family(self, name: str) -> bool:
+        """删除分块集合及其文档级索引，返回分块集合是否被删除."""
+        self._invalidate_doc_index(name)
+        self._set_cached_centroid(name, None, evict=True)
+        self.residency.discard(name)
+        self.residency.discard(DOC_INDEX_PREFIX + name)
+        try:
+            self.chroma_client.delete_collection(DOC_INDEX_PREFIX + name)
+        except Exception:
+            pass
+        try:
+            self.chroma_client.delete_collection(name)
+            return True
+        except Exception:
+            return False
+
+    # ------------------------------------------------------------------
+    # 文档级索引：两级检索先选文档，再只在这些文档的分块中检索
+    # ------------------------------------------------------------------
+
+    def _get_doc_index(self, collection):
+        """获取（必要时创建）分块集合对应的文档级索引集合."""
+        return self.chroma_client.get_or_create_collection(
+            name=DOC_INDEX_PREFIX + collection.name,
+            metadata={"chunk_collection": collection.name, "created_at": datetime.now().isoformat()}
+        )
+
+    @staticmethod
+    def _doc_metadata(metadata: Dict[str, Any], chunk_count: int) -> Dict[str, Any]:
+        doc_meta = {
+            key: metadata[key] for key in ("item_id", "domain", "category", "title", "tags", "priority", "created_at")
+            if key in metadata and metadata[key] not in (None, [])
+        }
+        doc_meta["chunk_count"] = chunk_count
+        return doc_meta
+
+    def _invalidate_doc_index(self, name: str) -> None:
+        """标记文档级索引需要重新回填（进行中的回填完成后也不会标记就绪）."""
+        with self._generation_lock:
+            self._doc_index_ready.discard(name)
+            self._doc_index_epochs[name] = self._doc_index_epochs.get(name, 0) + 1
+
+    def _index_document(self, collection, item_id: str, metadata: Dict[str, Any], embeddings: List[Any]) -> None:
+        """写入/刷新单个文档的文档级索引条目."""
+        self._index_documents(collection, [(item_id, metadata, embeddings)])
+
+    def _index_documents(self, collection, entries: List[tuple]) -> bool:
+        """批量写入文档级索引条目 [(item_id, metadata, chunk_embeddings)]，向量为分块向量的质心.
+
+        文档级索引是辅助结构，写入失败只记录警告，并让两级检索在下次使用前重新回填。
+
+        Returns:
+            是否写入成功
+        """
+        entries = [e for e in entries if e[2] is not None and len(e[2]) > 0]
+        if not entries:
+            return True
+        try:
+            self._get_doc_index(collection).upsert(
+                ids=[item_id for item_id, _, _ in entries],
+                embeddings=[np.asarray(embs, dtype=np.float32).mean(axis=0).tolist() for _, _, embs in entries],
+                documents=[metadata.get("title", "") for _, metadata, _ in entries],
+                metadatas=[self._doc_metadata(metadata, len(embs)) for _, metadata, embs in entries],
+            )
+        except Exception as e:
+            self._invalidate_doc_index(collection.name)
+            logger.warning(f"文档级索引更新失败: {[e[0] for e in entries][:5]}, 错误: {str(e)}")
+            return False
+        return True
+
+    def _unindex_document(self, collection, item_id: str) -> None:
+        if collection.name not in self._doc_index_ready:
+            # 回填可能正在进行，其分块快照中仍包含该文档
+            self._invalidate_doc_index(collection.name)
+        try:
+            self._get_doc_index(collection).delete(ids=[item_id])
+        except Exception as e:
+            self._invalidate_doc_index(collection.name)
+            logger.warning(f"文档级索引删除失败: {item_id}, 错误: {str(e)}")
+
+    def _ensure_doc_index(self, collection):
+        """确保文档级索引与分块集合一致；首次使用时从已有分块回填.
+
+        同一集合的回填串行执行，并发的检索等待回填完成，不会看到只写入了一部分的索引；
+        所有批次写入成功后才标记就绪。
+        """
+        doc_index = self._get_doc_index(collection)
+        if collection.name in self._doc_index_ready:
+            return doc_index
+
+        with self._generation_lock:
+            lock = self._doc_index_locks.setdefault(collection.name, threading.Lock())
+        with lock:
+            if collection.name in self._doc_index_ready:
+                return doc_index
+            self._backfill_doc_index(collection, doc_index)
+        return doc_index
+
+    def _backfill_doc_index(self, collection, doc_index) -> None:
+        """从分块集合重建文档级索引；全部写入成功且期间未失效时标记就绪."""
+        started = time.perf_counter()
+        epoch = self._doc_index_epochs.get(collection.name, 0)
+        grouped: Dict[str, Dict[str, Any]] = {}
+        page, offset = 5000, 0
+        while True:
+            batch = collection.get(include=["embeddings", "metadatas"], limit=page, offset=offset)
+            ids = batch.get("ids") or []
+            for i in range(len(ids)):
+                metadata = batch["metadatas"][i] or {}
+                item_id = metadata.get("item_id")
+                if not item_id:
+                    continue
+                entry = grouped.setdefault(item_id, {"metadata": metadata, "embeddings": []})
+                if metadata.get("chunk_index", 0) == 0:
+                    entry["metadata"] = metadata
+                entry["embeddings"].append(batch["embeddings"][i])
+            if len(ids) < page:
+                break
+            offset += page
+
+        indexed = set(doc_index.get(include=[]).get("ids") or [])
+        stale = list(indexed - set(grouped))
+        if stale:
+            doc_index.delete(ids=stale)
+        entries = [(item_id, e["metadata"], e["embeddings"]) for item_id, e in grouped.items()]
+        complete = True
+        for batch_start in range(0, len(entries), 1000):
+            complete = self._index_documents(collection, entries[batch_start:batch_start + 1000]) and complete
+
+        with self._generation_lock:
+            if complete and self._doc_index_epochs.get(collection.name, 0) == epoch:
+                self._doc_index_ready.add(collection.name)
+            else:
+                complete = False
+        if not complete:
+            logger.warning(f"[KNOWLEDGE_STORE] ⚠️  文档级索引回填未完成，下次使用时重试: {collection.name}")
+            return
+        logger.info(
+            f"[KNOWLEDGE_STORE] 📑 文档级索引已就绪: {collection.name}, {len(grouped)} 个文档, "
+            f"删除 {len(stale)} 个过期文档, 耗时 {time.perf_counter() - started:.3f}秒"
+        )
+
+    def _use_two_tier(self, collection, two_tier: Optional[bool]) -> bool:
+        enabled = self.config.two_tier_search if two_tier is None else two_tier
+        if not enabled:
+            return False
+        # 显式开启时总是使用；按配置开启时只对分块数足够多的集合使用
+        return two_tier is True or collection.count() >= self.config.two_tier_min_chunks
+
+    def _select_documents(self, collection, query_vector: List[float], where_filter: Dict[str, Any]) -> Optional[List[str]]:
+        """第一级检索：在文档级索引中选出最相关的 item_id；失败时返回 None（回退到全量分块检索）."""
+        try:
+            doc_index = self._ensure_doc_index(collection)
+            self._touch_collection((collection.metadata or {}).get("domain", ""), doc_index)
+            results = doc_index.query(
+                query_embeddings=[query_vector],
+                n_results=self.config.two_tier_top_docs,
+                where=self._combine_where(where_filter),
+                include=[]
+            )
+            return list(results["ids"][0]) if results and results["ids"] else []
+        except Exception as e:
+            logger.warning(f"文档级检索失败，回退到全量分块检索: {collection.name}, 错误: {str(e)}")
+            return None
+
+    # ------------------------------------------------------------------
+    # 领域质心：跨领域检索时先按质心相似度裁剪集合
+    # ------------------------------------------------------------------
+
+    def _update_centroid(self, collection, added: List[Any] = None, removed: List[Any] = None) -> None:
+        """增量维护领域质心（分块向量均值，存放在集合元数据 centroid / centroid_count 中）.
+
+        在写入完成后、持有领域写锁时调用。质心尚未建立的非空集合跳过，由检索时惰性重建。
+        同时刷新进程内的质心缓存，检索时不再读取集合元数据。
+        """
+        added = [] if added is None else list(added)
+        removed = [] if removed is None else list(removed)
+        if not added and not removed:
+            return
+        try:
+            metadata = dict(self.chroma_client.get_collection(collection.name).metadata or {})
+            count = int(metadata.get("centroid_count", 0))
+            if not metadata.get("centroid") and collection.count() - len(added) + len(removed) > 0:
+                self._set_cached_centroid(collection.name, None, evict=True)
+                return
+
+            total = np.asarray(json.loads(metadata["centroid"]), dtype=np.float64) * count if count else 0.0
+            if added:
+                total = total + np.asarray(added, dtype=np.float64).sum(axis=0)
+            if removed:
+                total = total - np.asarray(removed, dtype=np.float64).sum(axis=0)
+            count += len(added) - len(removed)
+
+            centroid = None
+            if count > 0 and not np.isscalar(total):
+                centroid = np.round(total / count, 6)
+                metadata["centroid"] = json.dumps(centroid.tolist())
+                metadata["centroid_count"] = count
+            else:
+                metadata["centroid"] = ""
+                metadata["centroid_count"] = 0
+            collection.modify(metadata=metadata)
+            self._set_cached_centroid(collection.name, centroid.astype(np.float32) if centroid is not None else None)
+        except Exception as e:
+            self._set_cached_centroid(collection.name, None, evict=True)
+            logger.warning(f"领域质心更新失败: {collection.name}, 错误: {str(e)}")
+
+    def _set_cached_centroid(self, name: str, centroid: Optional[np.ndarray], evict: bool = False) -> None:
+        """写入端更新（或清除）质心缓存，并使进行中的读取结果失效."""
+        with self._generation_lock:
+            self._centroid_versions[name] = self._centroid_versions.get(name, 0) + 1
+            if evict:
+                self._centroids.pop(name, None)
+            else:
+                self._centroids[name] = centroid
+
+    def _domain_centroid(self, collection) -> Optional[np.ndarray]:
+        """读取领域质心；优先使用进程内缓存，缺失或与分块数不一致时从已有向量重建."""
+        name = collection.name
+        with self._generation_lock:
+            cached = name in self._centroids
+            centroid = self._centroids.get(name)
+            version = self._centroid_versions.get(name, 0)
+        self.metrics.record_cache("domain_centroid", hit=cached)
+        if cached:
+            return centroid
+
+        centroid = self._load_centroid(collection)
+        with self._generation_lock:
+            if self._centroid_versions.get(name, 0) == version:
+                self._centroids[name] = centroid
+        return centroid
+
+    def _load_centroid(self, collection) -> Optional[np.ndarray]:
+        """从集合元数据解析质心；缺失或与分块数不一致时从已有向量重建并保存."""
+        metadata = dict(collection.metadata or {})
+        chunk_count = collection.count()
+        if chunk_count == 0:
+            return None
+        if metadata.get("centroid") and int(metadata.get("centroid_count", 0)) == chunk_count:
+            return np.asarray(json.loads(metadata["centroid"]), dtype=np.float32)
+
+        start = time.perf_counter()
+        total, count, page, offset = None, 0, 5000, 0
+        while True:
+            batch = collection.get(include=["embeddings"], limit=page, offset=offset)
+            embeddings = batch.get("embeddings")
+            if embeddings is not None and len(embeddings):
+                part = np.asarray(embeddings, dtype=np.float64).sum(axis=0)
+                total = part if total is None else total + part
+                count += len(embeddings)
+            if len(batch.get("ids") or []) < page:
+                break
+            offset += page
+        if total is None:
+            return None
+
+        centroid = (total / count).astype(np.float32)
+        metadata["centroid"] = json.dumps(np.round(centroid, 6).tolist())
+        metadata["centroid_count"] = count
+        try:
+            collection.modify(metadata=metadata)
+        except Exception as e:
+            logger.warning(f"领域质心保存失败: {collection.name}, 错误: {str(e)}")
+        logger.info(
+            f"[KNOWLEDGE_STORE] 🎯 已重建领域质心: {collection.name}, {count} 个分块, "
+            f"耗时 {time.perf_counter() - start:.3f}秒"
+        )
+        return centroid
+
+    def _prune_domains(self, collections: List[tuple], query_vector: List[float]) -> List[tuple]:
+        """按查询与领域质心的余弦相似度排序并裁剪待检索集合.
+
+        至少保留 domain_pruning_min_domains 个最相似的领域；其余领域只有相似度不低于
+        domain_pruning_cutoff 且与最佳领域相差不超过 domain_pruning_margin 时才检索；
+        没有质心的领域始终保留。
+        """
+        min_domains = max(1, self.config.domain_pruning_min_domains)
+        if not self.config.domain_pruning or len(collections) <= min_domains:
+            return collections
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        query_norm = float(np.linalg.norm(query)) or 1.0
+        scored, unscored = [], []
+        for domain_name, collection in collections:
+            try:
+                centroid = self._domain_centroid(collection)
+            except Exception as e:
+                logger.debug(f"读取领域质心失败: {domain_name}, 错误: {str(e)}")
+                centroid = None
+            if centroid is None or len(centroid) != len(query):
+                unscored.append((domain_name, collection))
+                continue
+            similarity = float(query @ centroid) / (query_norm * (float(np.linalg.norm(centroid)) or 1.0))
+            scored.append((similarity, domain_name, collection))
+
+        scored.sort(key=lambda entry: entry[0], reverse=True)
+        floor = max(self.config.domain_pruning_cutoff, scored[0][0] - self.config.domain_pruning_margin) if scored else 0.0
+        kept = [
+            (domain_name, collection) for rank, (similarity, domain_name, collection) in enumerate(scored)
+            if rank < min_domains or similarity >= floor
+        ]
+        kept.extend(unscored)
+
+        pruned = len(collections) - len(kept)
+        self.metrics.increment("domains_pruned", pruned)
+        if pruned:
+            logger.info(
+                f"[KNOWLEDGE_STORE] ✂️  领域裁剪: {len(collections)} -> {len(kept)} "
+                f"({', '.join(f'{d}={s:.3f}' for s, d, _ in scored)})"
+            )
+        return kept
+
+    @staticmethod
+    def _combine_where(*filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """合并多个元数据过滤条件（Chroma 多个字段需要用 $and 组合）."""
+        clauses = []
+        for where in filters:
+            for key, value in (where or {}).items():
+                clauses.append({key: value})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    @contextmanager
+    def exclusive_writes(self):
+        """暂停所有领域的写入（快照等需要一致的磁盘状态时使用），读者不受影响.
+
+        期间同时持有客户端，驱逐不会重开客户端。
+        """
+        with self._client_in_use(), self._generation_lock:
+            self._load_generations(force=True)
+            domains = set(self._live) | set(self._write_locks)
+            for coll_info in self.chroma_client.list_collections():
+                parsed = self._parse_collection_name(coll_info.name)
+                if parsed:
+                    domains.add(parsed[0])
+            locks = [self._domain_write_lock(domain) for domain in sorted(domains)]
+        # 领域锁在代际锁之外获取，避免与持有领域锁、等待代际锁的构建线程死锁
+        with self._client_in_use(), ExitStack() as stack:
+            for lock in locks:
+                stack.enter_context(lock)
+            yield
+
+    def _drop_orphan_generations(self, max_age_seconds: float = 3600.0) -> None:
+        """删除中断构建遗留的 staging 集合（既非 live 也未在构建中，且创建超过 max_age_seconds）."""
+        live_names = set(self._live.values())
+        building_names = {b[0] for b in self._building.values()}
+        collections = self.chroma_client.list_collections()
+        existing = {c.name for c in collections}
+        for coll_info in collections:
+            name = coll_info.name
+            if name.startswith(DOC_INDEX_PREFIX):
+                # 文档级索引随其分块集合一起删除；基础集合已不存在时直接清理
+                if name[len(DOC_INDEX_PREFIX):] not in existing:
+                    self._delete_collection_family(name[len(DOC_INDEX_PREFIX):])
+                continue
+            parsed = self._parse_collection_name(name)
+            if not parsed or parsed[1] == 0 or name in live_names or name in building_names:
+                continue
+            try:
+                created_at = (coll_info.metadata or {}).get("created_at")
+                age = time.time() - datetime.fromisoformat(created_at).timestamp() if created_at else None
+                if age is not None and age < max_age_seconds:
+                    continue
+                self._delete_collection_family(name)
+                logger.info(f"🧹 已删除中断构建遗留的索引集合: {name}")
+            except Exception as e:
+                logger.debug(f"清理遗留集合 {name} 失败: {str(e)}")
+
+    def _on_retire_timer(self) -> None:
+        with self._generation_lock:
+            self._retire_timer = None
+        with self._client_in_use():
+            self._drop_retired_generations()
+
     def _load_init_status(self) -> None:
         """加载初始化状态文件."""
         if self.init_status_file.exists():
@@ -226,6 +1039,13 @@ class ChromaKnowledgeStore:
             logger.error("ℹ️  未配置 CrossEncoder 模型路径，跳过重排序功能")
             raise FileNotFoundError(f"CrossEncoder 未配置模型路径 {model_path}")
 
+        if self.config.inference_socket:
+            from .inference_service import connect_remote_reranker
+
+            self.cross_encoder = connect_remote_reranker(self.config.inference_socket, model_path)
+            if self.cross_encoder is not None:
+                return
+
         try:
             logger.info("🔧 初始化 CrossEncoder 重排序模型...")
             logger.info(f"   - 模型: 本地模型")
@@ -418,12 +1238,8 @@ class ChromaKnowledgeStore:
 
                 logger.info(f"🚀 开始初始化 RocketMQ 知识库")
 
-                # 如果需要重新初始化，先清空现有集合
-                try:
-                    self.chroma_client.delete_collection(f"knowledge_rocketmq")
-                    logger.info("🗑️  已删除旧的 RocketMQ 集合")
-                except Exception:
-                    logger.info("ℹ️  RocketMQ 集合不存在，无需删除")
+                # 不再先删除旧集合：初始化器在新的索引代际中重建，
+                # 完成后原子切换，重建期间检索继续读取旧集合
 
                 # 初始化 RocketMQ 知识
                 logger.info("📚 正在加载 RocketMQ 知识内容...")
@@ -473,6 +1289,12 @@ class ChromaKnowledgeStore:
             logger.error(f"❌ 初始化 RocketMQ 知识失败: {str(e)}", exc_info=True)
             print(f"⚠️ 初始化 RocketMQ 知识失败: {e}")
 
+    @staticmethod
+    def new_item_id(domain: str) -> str:
+        """生成知识条目 ID: {domain}_{timestamp}."""
+        return f"{domain}_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+
+    @_uses_client
     def add_knowledge(
             self,
             domain: str,
@@ -484,7 +1306,9 @@ class ChromaKnowledgeStore:
             priority: int = 1,
             source_url: str = "",
             file_path: str = "",
-            preview_available: bool = True
+            preview_available: bool = True,
+            item_id: str = None,
+            progress_callback: Optional[Callable[[str, float], None]] = None
     ) -> str:
         """添加知识条目.
 
@@ -499,13 +1323,15 @@ class ChromaKnowledgeStore:
             source_url: 原文档链接
             file_path: 本地文件路径
             preview_available: 是否可预览
+            item_id: 预先分配的条目 ID（后台导入任务使用，重试时保持幂等）
+            progress_callback: 进度回调 (stage, fraction)，stage 为 chunking/embedding/writing
 
         Returns:
             知识条目 ID
         """
         # 1. 创建 KnowledgeItem
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S%f")
-        item_id = f"{domain}_{timestamp}"
+        if not item_id:
+            item_id = self.new_item_id(domain)
 
         if tags is None:
             tags = []
@@ -535,18 +1361,22 @@ class ChromaKnowledgeStore:
                 logger.warning(f"知识条目 {item_id} 分块后为空，跳过")
                 return item_id
 
-            # 3. 批量向量化
+            # 3. 批量向量化（有进度回调时按 batch_size 分段，便于汇报进度）
             chunk_texts = [chunk["text"] for chunk in chunks]
             try:
-                embeddings = self.embedder.embed_batch(chunk_texts)
+                if progress_callback is None:
+                    embeddings = self.embedder.embed_batch(chunk_texts)
+                else:
+                    embeddings = []
+                    step = max(1, self.config.batch_size)
+                    for start in range(0, len(chunk_texts), step):
+                        progress_callback("embedding", start / len(chunk_texts))
+                        embeddings.extend(self.embedder.embed_batch(chunk_texts[start:start + step]))
             except Exception as e:
                 logger.error(f"知识条目 {item_id} 向量化失败: {str(e)}")
                 raise
 
-            # 4. 存储到 Chroma 集合
-            collection = self._get_or_create_collection(domain)
-
-            # 准备批量插入的数据
+            # 4. 准备批量插入的数据
             ids = []
             documents = []
             metadatas = []
@@ -559,13 +1389,21 @@ class ChromaKnowledgeStore:
                 metadatas.append(chunk["metadata"])
                 embeddings_list.append(embedding)
 
-            # 批量插入到 Chroma
-            collection.add(
-                ids=ids,
-                documents=documents,
-                metadatas=metadatas,
-                embeddings=embeddings_list
-            )
+            # 5. 批量写入 Chroma（同领域写入串行；重建期间由构建线程写入新代际）
+            # 使用 upsert：预分配 item_id 的导入任务中断后重试不会产生重复分块
+            if progress_callback is not None:
+                progress_callback("writing", 1.0)
+            with self._domain_write_lock(domain):
+                collection = self._write_collection(domain)
+                collection.upsert(
+                    ids=ids,
+                    documents=documents,
+                    metadatas=metadatas,
+                    embeddings=embeddings_list
+                )
+                self._index_document(collection, item_id, metadatas[0], embeddings_list)
+                self._update_centroid(collection, added=embeddings_list)
+                self._touch_collection(domain, collection, refresh=True)
 
             logger.info(
                 f"知识条目 {item_id} 已添加: {len(chunks)} 个分块"
@@ -580,6 +1418,7 @@ class ChromaKnowledgeStore:
             )
             raise
 
+    @_uses_client
     def search_knowledge(
             self,
             query: str = None,
@@ -587,8 +1426,13 @@ class ChromaKnowledgeStore:
             category: str = None,
             tags: List[str] = None,
             top_k: int = None,
-            return_scores: bool = False
-    ) -> List[KnowledgeItem]:
+            return_scores: bool = False,
+            two_tier: Optional[bool] = None,
+            expand_neighbors: Optional[int] = None,
+            token_budget: Optional[int] = None,
+            token_model: Optional[str] = None,
+            query_vector: Optional[List[float]] = None
+    ) -> Union[List[KnowledgeItem], Tuple[List[KnowledgeItem], List[Dict[str, float]]], PackedContext]:
         """搜索知识条目.
 
         Args:
@@ -598,10 +1442,19 @@ class ChromaKnowledgeStore:
             tags: 标签过滤
             top_k: 返回结果数量
             return_scores: 是否返回包含得分的结果
+            two_tier: 两级检索（先在文档级索引中选出 two_tier_top_docs 个文档，
+                再只检索这些文档的分块）；None 时按配置对大集合自动启用
+            expand_neighbors: 为每个命中分块补充前后各 N 个相邻分块，合并为连续段落；
+                None 时使用配置的 neighbor_chunks，0 表示只返回命中分块
+            token_budget: 上下文 token 预算；指定时按 MMR 选择结果直到预算用尽，
+                返回 PackedContext（含被丢弃的条目及原因），忽略 return_scores
+            token_model: 计算 token 时使用的模型分词器（默认字符估算）
+            query_vector: 预先计算的查询向量（如 RetrievalContext.query_vector），提供时不再向量化 query
 
         Returns:
             知识条目列表，按相似度分数降序排列（语义检索）或按创建时间排序（元数据过滤）
             如果 return_scores 为 True，则返回 (知识条目列表, 得分列表) 的元组
+            如果指定 token_budget，则返回 PackedContext
         """
 
         # 使用配置的默认值或参数指定的值
@@ -612,7 +1465,13 @@ class ChromaKnowledgeStore:
         if not query:
             logger.info(
                 f"[KNOWLEDGE_STORE] 🔍 执行元数据过滤检索: domain={domain}, category={category}, tags={tags}, top_k={top_k}")
-            return self._search_by_metadata(domain, category, tags, top_k)
+            items = self._search_by_metadata(domain, category, tags, top_k)
+            if token_budget is not None:
+                return self._pack_items(
+                    [PackCandidate(item, item.content, -rank) for rank, item in enumerate(items)],
+                    token_budget, token_model
+                )
+            return items
 
         # 有 query 参数时，使用 RAG 语义检索（需求 6.4）
         logger.info(f"[KNOWLEDGE_STORE] 🔍 开始语义检索:")
@@ -622,14 +1481,21 @@ class ChromaKnowledgeStore:
         logger.info(f"[KNOWLEDGE_STORE]   - Tags: {tags}")
         logger.info(f"[KNOWLEDGE_STORE]   - Top K: {top_k}")
 
+        self.metrics.increment("searches")
+
         try:
-            # 1. 向量化查询文本
-            start_time = datetime.now()
-            logger.info(f"[KNOWLEDGE_STORE] 🧮 开始向量化查询文本...")
-            query_vector = self.embedder.embed_text(query)
-            vectorize_time = (datetime.now() - start_time).total_seconds()
-            logger.info(
-                f"[KNOWLEDGE_STORE] ✅ 查询向量化完成，耗时: {vectorize_time:.3f}秒，向量维度: {len(query_vector)}")
+            # 1. 向量化查询文本（调用方已提供向量时直接复用）
+            start_time = time.perf_counter()
+            if query_vector is None:
+                logger.info(f"[KNOWLEDGE_STORE] 🧮 开始向量化查询文本...")
+                with self.metrics.stage("query_embedding"):
+                    query_vector = self.query_embedder.embed_text(query)
+                vectorize_time = time.perf_counter() - start_time
+                logger.info(
+                    f"[KNOWLEDGE_STORE] ✅ 查询向量化完成，耗时: {vectorize_time:.3f}秒，向量维度: {len(query_vector)}")
+            else:
+                # 复用次数与首次计算耗时由 RetrievalContext 记录（见 embed_query）
+                logger.info(f"[KNOWLEDGE_STORE] ♻️ 使用预先计算的查询向量，向量维度: {len(query_vector)}")
 
             # 2. 构建元数据过滤条件
             where_filter = {}
@@ -650,41 +1516,53 @@ class ChromaKnowledgeStore:
                 except Exception as e:
                     logger.warning(f"获取领域 '{domain}' 的集合失败: {str(e)}")
             else:
-                # 搜索所有领域
+                # 搜索所有领域：先按领域质心裁剪明显无关的集合
                 try:
-                    all_collections = self.chroma_client.list_collections()
-                    for coll_info in all_collections:
-                        coll_name = coll_info.name
-                        if coll_name.startswith("knowledge_"):
-                            domain_name = coll_name.replace("knowledge_", "")
-                            try:
-                                collection = self.chroma_client.get_collection(coll_name)
-                                collections_to_search.append((domain_name, collection))
-                            except Exception as e:
-                                logger.warning(f"获取集合 '{coll_name}' 失败: {str(e)}")
+                    collections_to_search.extend(self._live_collections())
                 except Exception as e:
                     logger.error(f"列出集合失败: {str(e)}")
-                    return []
+                    return PackedContext(token_budget=token_budget) if token_budget is not None else []
+                with self.metrics.stage("domain_pruning"):
+                    collections_to_search = self._prune_domains(collections_to_search, query_vector)
 
             if not collections_to_search:
                 logger.warning("[KNOWLEDGE_STORE] ⚠️  没有可搜索的集合")
-                return []
+                return PackedContext(token_budget=token_budget) if token_budget is not None else []
 
             logger.info(f"[KNOWLEDGE_STORE] 📚 将在 {len(collections_to_search)} 个集合中搜索")
 
-            # 4. 在所有相关集合中执行相似度搜索
+            # 4. 在所有相关集合中执行相似度搜索（只有打包时 MMR 需要分块向量）
+            include = ["documents", "metadatas", "distances"]
+            if token_budget is not None:
+                include.append("embeddings")
             all_results = []
-            search_start = datetime.now()
+            search_start = time.perf_counter()
 
             for domain_name, collection in collections_to_search:
                 try:
+                    chunk_where = where_filter
+                    if self._use_two_tier(collection, two_tier):
+                        # 第一级：文档级索引选出候选文档；第二级只检索这些文档的分块
+                        with self.metrics.stage("doc_query", domain=domain_name):
+                            item_ids = self._select_documents(collection, query_vector, where_filter)
+                        if item_ids is not None:
+                            self.metrics.record_candidates("doc_query", len(item_ids), domain=domain_name)
+                            if not item_ids:
+                                continue
+                            chunk_where = {**where_filter, "item_id": {"$in": item_ids}}
+
                     # 执行 Chroma 查询
-                    results = collection.query(
-                        query_embeddings=[query_vector],
-                        n_results=top_k,
-                        where=where_filter if where_filter else None,
-                        include=["documents", "metadatas", "distances"]
-                    )
+                    self._touch_collection(domain_name, collection)
+                    with self.metrics.stage("collection_query", domain=domain_name):
+                        results = collection.query(
+                            query_embeddings=[query_vector],
+                            n_results=top_k,
+                            where=self._combine_where(chunk_where),
+                            include=include
+                        )
+
+                    hit_count = len(results["ids"][0]) if results and results["ids"] else 0
+                    self.metrics.record_candidates("collection_query", hit_count, domain=domain_name)
 
                     # 处理查询结果
                     if results and results["ids"] and len(results["ids"][0]) > 0:
@@ -693,6 +1571,7 @@ class ChromaKnowledgeStore:
                             document = results["documents"][0][i]
                             metadata = results["metadatas"][0][i]
                             distance = results["distances"][0][i]
+                            embedding = results["embeddings"][0][i] if results.get("embeddings") is not None else None
 
                             # 将距离转换为相似度分数 (距离越小，相似度越高)
                             # Chroma 使用 L2 距离，我们将其转换为 0-1 的相似度分数
@@ -708,28 +1587,43 @@ class ChromaKnowledgeStore:
                                 "document": document,
                                 "metadata": metadata,
                                 "similarity_score": similarity_score,
-                                "domain": domain_name
+                                "domain": domain_name,
+                                "embedding": embedding
                             })
 
                 except Exception as e:
                     logger.warning(f"在领域 '{domain_name}' 中搜索失败: {str(e)}")
                     continue
 
-            search_time = (datetime.now() - search_start).total_seconds()
+            search_time = time.perf_counter() - search_start
             logger.info(
                 f"[KNOWLEDGE_STORE] 🔎 相似度搜索完成，耗时: {search_time:.3f}秒，找到 {len(all_results)} 个分块结果")
 
-            # 5. 按相似度分数降序排序
-            all_results.sort(key=lambda x: x["similarity_score"], reverse=True)
+            with self.metrics.stage("merge"):
+                # 5. 按相似度分数降序排序
+                all_results.sort(key=lambda x: x["similarity_score"], reverse=True)
 
-            # 6. 限制返回结果数量
-            all_results = all_results[:top_k]
+                # 6. 限制返回结果数量
+                all_results = all_results[:top_k]
+            self.metrics.record_candidates("merge", len(all_results))
 
             # 8. 使用CrossEncoder进行重排序
-            reranked_results = self._rerank_results(query, all_results)
-
-            # 9. 重构为 KnowledgeItem 对象
+            with self.metrics.stage("rerank"):
+                reranked_results = self._rerank_results(query, all_results)
+            self.metrics.record_candidates("rerank", len(reranked_results))
+
+            # 9. 相邻分块扩展：一次批量 get 取回命中分块前后的上下文
+            if expand_neighbors is None:
+                expand_neighbors = self.config.neighbor_chunks
+            passages = {}
+            if expand_neighbors > 0 and reranked_results:
+                with self.metrics.stage("neighbor_expansion"):
+                    passages = self._expand_neighbors(reranked_results, collections_to_search, expand_neighbors)
+
+            # 10. 重构为 KnowledgeItem 对象
+            hydration_start = time.perf_counter()
             knowledge_items = []
+            pack_candidates = []
             seen_item_ids = set()  # 用于去重（同一知识条目的不同分块）
 
             for result in reranked_results:
@@ -748,7 +1642,7 @@ class ChromaKnowledgeStore:
                         domain=metadata.get("domain", result["domain"]),
                         category=metadata.get("category", ""),
                         title=metadata.get("title", ""),
-                        content=result["document"],  # 使用分块的内容
+                        content=passages.get(item_id, result["document"]),  # 分块（或扩展后的段落）内容
                         tags=metadata.get("tags", []),
                         created_at=metadata.get("created_at", ""),
                         updated_at=metadata.get("updated_at", ""),
@@ -771,6 +1665,12 @@ class ChromaKnowledgeStore:
                     # 由于 KnowledgeItem 不支持额外字段，我们直接返回原对象
                     # 并在日志中记录分数
                     knowledge_items.append(knowledge_item)
+                    pack_candidates.append(PackCandidate(
+                        knowledge_item,
+                        knowledge_item.content,
+                        result.get("rerank_score", result.get("similarity_score", 0)),
+                        result.get("embedding")
+                    ))
 
                     logger.debug(
                         f"添加结果: id={item_id}, title={metadata.get('title', '')[:30]}, "
@@ -782,7 +1682,11 @@ class ChromaKnowledgeStore:
                     logger.warning(f"重构 KnowledgeItem 失败: {str(e)}")
                     continue
 
-            total_time = (datetime.now() - start_time).total_seconds()
+            self.metrics.record_stage("hydration", (time.perf_counter() - hydration_start) * 1000)
+            self.metrics.record_candidates("hydration", len(knowledge_items))
+
+            total_time = time.perf_counter() - start_time
+            self.metrics.record_stage("total", total_time * 1000)
             logger.info(f"[KNOWLEDGE_STORE] ✅ 语义检索完成:")
             logger.info(f"[KNOWLEDGE_STORE]   - 返回结果数: {len(knowledge_items)}")
             logger.info(f"[KNOWLEDGE_STORE]   - 总耗时: {total_time:.3f}秒")
@@ -795,6 +1699,9 @@ class ChromaKnowledgeStore:
                 logger.info(
                     f"[KNOWLEDGE_STORE]   {i}. {item.title[:50]} (相似度: {similarity_score:.4f}, 重排序得分: {rerank_score:.2f})")
 
+            if token_budget is not None:
+                return self._pack_items(pack_candidates, token_budget, token_model)
+
             if return_scores:
                 # 构建得分列表
                 scores = []
@@ -808,8 +1715,100 @@ class ChromaKnowledgeStore:
                 return knowledge_items
 
         except Exception as e:
+            self.metrics.increment("errors")
             logger.error(f"语义检索失败: {str(e)}", exc_info=True)
-            return []
+            return PackedContext(token_budget=token_budget) if token_budget is not None else []
+
+    def _pack_items(self, candidates: List[PackCandidate], token_budget: int, token_model: Optional[str]) -> PackedContext:
+        """按 MMR 与 token 预算打包检索结果，并记录打包指标."""
+        with self.metrics.stage("packing"):
+            packed = pack_context(
+                candidates,
+                token_budget,
+                mmr_lambda=self.config.mmr_lambda,
+                count_tokens=make_token_counter(token_model),
+                on_truncate=lambda item, text: KnowledgeItem(**{**item.to_dict(), "content": text}),
+            )
+        self.metrics.record_candidates("packing", len(packed.items))
+        for reason, count in packed.drop_summary().items():
+            self.metrics.increment("packing_dropped", count, reason=reason)
+        return packed
+
+    def _expand_neighbors(
+            self,
+            results: List[Dict[str, Any]],
+            collections: List[Tuple[str, Any]],
+            radius: int
+    ) -> Dict[str, str]:
+        """为最终结果补充相邻分块，返回 {item_id: 连续段落}.
+
+        同一条目的多个命中分块的窗口会合并；每个集合只发起一次按 id 的批量 get。
+        不相邻的窗口之间以省略号分隔。
+
+        Args:
+            results: 重排序后的分块结果（已截断到 top_k）
+            collections: 本次检索的 (领域, 集合) 列表
+            radius: 每个命中分块前后各扩展的分块数
+        """
+        collection_by_domain = dict(collections)
+        # item_id -> (领域, 需要的分块序号)
+        windows: Dict[str, Tuple[str, set]] = {}
+        for result in results:
+            metadata = result["metadata"]
+            item_id = metadata.get("item_id")
+            if not item_id or result["domain"] not in collection_by_domain:
+                continue
+            index = int(metadata.get("chunk_index", 0))
+            last = int(metadata.get("total_chunks", index + radius + 1)) - 1
+            _, indices = windows.setdefault(item_id, (result["domain"], set()))
+            indices.update(range(max(0, index - radius), min(last, index + radius) + 1))
+
+        ids_by_domain: Dict[str, List[str]] = {}
+        for item_id, (domain_name, indices) in windows.items():
+            ids_by_domain.setdefault(domain_name, []).extend(f"{item_id}_chunk_{i}" for i in sorted(indices))
+
+        texts: Dict[str, Dict[int, str]] = {}
+        fetched = 0
+        for domain_name, ids in ids_by_domain.items():
+            try:
+                batch = collection_by_domain[domain_name].get(ids=ids, include=["documents", "metadatas"])
+            except Exception as e:
+                logger.warning(f"在领域 '{domain_name}' 中获取相邻分块失败: {str(e)}")
+                continue
+            for document, metadata in zip(batch.get("documents") or [], batch.get("metadatas") or []):
+                if metadata and metadata.get("item_id") in windows:
+                    texts.setdefault(metadata["item_id"], {})[int(metadata.get("chunk_index", 0))] = document
+                    fetched += 1
+        self.metrics.record_candidates("neighbor_expansion", fetched)
+
+        passages = {}
+        for item_id, chunks in texts.items():
+            # 按序号切分为连续区间，区间内去掉分块重叠后拼接
+            runs: List[List[str]] = []
+            previous = None
+            for index in sorted(chunks):
+                if previous is None or index != previous + 1:
+                    runs.append([])
+                runs[-1].append(chunks[index])
+                previous = index
+            passages[item_id] = "\n\n…\n\n".join(self._stitch_chunks(run) for run in runs)
+        return passages
+
+    def _stitch_chunks(self, texts: List[str]) -> str:
+        """拼接相邻分块，去掉分块之间的重叠文本."""
+        max_overlap = self.chunker.chunk_overlap
+        merged = texts[0]
+        for text in texts[1:]:
+            overlap = 0
+            for size in range(min(max_overlap, len(merged), len(text)), 0, -1):
+                if merged.endswith(text[:size]):
+                    overlap = size
+                    break
+            if overlap:
+                merged += text[overlap:]
+            else:
+                merged += " " + text
+        return merged
 
     def _search_by_metadata(
             self,
@@ -851,16 +1850,7 @@ class ChromaKnowledgeStore:
             else:
                 # 搜索所有领域
                 try:
-                    all_collections = self.chroma_client.list_collections()
-                    for coll_info in all_collections:
-                        coll_name = coll_info.name
-                        if coll_name.startswith("knowledge_"):
-                            domain_name = coll_name.replace("knowledge_", "")
-                            try:
-                                collection = self.chroma_client.get_collection(coll_name)
-                                collections_to_search.append((domain_name, collection))
-                            except Exception as e:
-                                logger.warning(f"获取集合 '{coll_name}' 失败: {str(e)}")
+                    collections_to_search.extend(self._live_collections())
                 except Exception as e:
                     logger.error(f"列出集合失败: {str(e)}")
                     return []
@@ -961,155 +1951,213 @@ class ChromaKnowledgeStore:
             logger.error(f"元数据过滤检索失败: {str(e)}", exc_info=True)
             return []
 
-    def update_knowledge(self, item_id: str, **kwargs) -> bool:
-        """更新知识条目.
-        
-        根据需求 5.2，更新知识条目时需要：
-        1. 删除旧的向量数据
-        2. 更新内容并重新向量化
-        3. 存储新的向量数据
-        
+    def _locate_item(self, item_id: str):
+        """查找知识条目所在的领域与集合.
+
+        item_id 形如 ``{domain}_{timestamp}``，优先直接命中对应集合，失败时再遍历所有集合。
+
         Args:
             item_id: 知识条目 ID
-            **kwargs: 要更新的字段（title, content, tags, category, priority）
-            
+
         Returns:
-            是否更新成功
+            (domain, collection)，未找到时为 (None, None)
         """
-        logger.info(f"开始更新知识条目: {item_id}")
-
+        guessed = item_id.rsplit("_", 1)[0] if "_" in item_id else ""
         try:
-            # 1. 首先查找该知识条目所属的领域
-            # 通过遍历所有集合查找包含该 item_id 的集合
-            domain = None
-            old_metadata = None
+            candidates = self._live_collections()
+        except Exception as e:
+            logger.error(f"列出集合失败: {str(e)}")
+            return None, None
+        candidates.sort(key=lambda pair: pair[0] != guessed)
 
+        for domain, collection in candidates:
             try:
-                all_collections = self.chroma_client.list_collections()
-                for coll_info in all_collections:
-                    coll_name = coll_info.name
-                    if coll_name.startswith("knowledge_"):
-                        try:
-                            collection = self.chroma_client.get_collection(coll_name)
-                            # 查询该集合中是否有该 item_id 的分块
-                            results = collection.get(
-                                where={"item_id": item_id},
-                                limit=1
-                            )
-
-                            if results and results["ids"] and len(results["ids"]) > 0:
-                                domain = coll_name.replace("knowledge_", "")
-                                old_metadata = results["metadatas"][0]
-                                logger.info(f"找到知识条目 {item_id} 在领域 {domain}")
-                                break
-                        except Exception as e:
-                            logger.warning(f"查询集合 {coll_name} 失败: {str(e)}")
-                            continue
+                collection = self._write_collection(domain) if domain in self._building else collection
+                results = collection.get(where={"item_id": item_id}, limit=1, include=[])
+                if results and results["ids"]:
+                    return domain, collection
             except Exception as e:
-                logger.error(f"列出集合失败: {str(e)}")
-                return False
-
-            if not domain or not old_metadata:
-                logger.warning(f"知识条目 {item_id} 不存在")
-                return False
-
-            # 2. 删除旧的向量数据
-            collection = self._get_or_create_collection(domain)
-
-            # 查找所有属于该 item_id 的分块
-            old_chunks = collection.get(
-                where={"item_id": item_id}
-            )
-
-            if old_chunks and old_chunks["ids"]:
-                chunk_ids = old_chunks["ids"]
-                collection.delete(ids=chunk_ids)
-                logger.info(f"删除了 {len(chunk_ids)} 个旧的向量分块")
-            else:
-                logger.warning(f"未找到知识条目 {item_id} 的旧向量数据")
-
-            # 3. 准备更新后的元数据
-            # 合并旧元数据和新的更新字段
-            updated_metadata = old_metadata.copy()
+                logger.debug(f"查询集合 {collection.name} 失败: {str(e)}")
+        return None, None
 
-            # 允许更新的字段
-            allowed_fields = ['title', 'content', 'tags', 'category', 'priority']
-            for key, value in kwargs.items():
-                if key in allowed_fields:
-                    updated_metadata[key] = value
+    @_uses_client
+    def get_item_chunks(self, item_id: str) -> List[Dict[str, Any]]:
+        """读取知识条目的所有分块（只查 live 索引代际），按 chunk_index 排序.
 
-            # 更新时间戳
-            updated_metadata["updated_at"] = datetime.now().isoformat()
+        Returns:
+            [{"index", "text", "metadata"}]，条目不存在时为空列表
+        """
+        domain, collection = self._locate_item(item_id)
+        if not domain:
+            return []
+        chunks = collection.get(where={"item_id": item_id}, include=["documents", "metadatas"])
+        result = [
+            {"index": int((metadata or {}).get("chunk_index", 0)), "text": document, "metadata": metadata or {}}
+            for document, metadata in zip(chunks.get("documents") or [], chunks.get("metadatas") or [])
+        ]
+        result.sort(key=lambda chunk: chunk["index"])
+        return result
+
+    @staticmethod
+    def _chunk_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @_uses_client
+    def update_knowledge(self, item_id: str, **kwargs) -> bool:
+        """更新知识条目.
 
-            # 4. 获取更新后的内容（如果没有提供新内容，使用旧内容）
-            # 注意：旧的 content 不在 metadata 中，需要从 documents 中获取
-            if "content" in kwargs:
-                new_content = kwargs["content"]
-            else:
-                # 如果没有提供新内容，从旧分块中重建内容
-                if old_chunks and old_chunks["documents"]:
-                    # 将所有分块的文本合并
-                    new_content = " ".join(old_chunks["documents"])
-                else:
-                    logger.error(f"无法获取知识条目 {item_id} 的内容")
-                    return False
+        两条快速路径：
+        1. 仅更新元数据（title, tags, category, priority）：通过 collection.update
+           原地改写所有分块的元数据，不做任何向量化。
+        2. 更新内容：重新分块后按分块文本哈希与已存储分块比对，
+           只对新增或变化的分块向量化；文本未变的分块复用已有向量，
+           同一位置文本未变时只改写元数据；多余的旧分块被删除。
 
-            # 5. 重新分块和向量化
-            # 准备用于分块的元数据（不包含 chunk_index 和 total_chunks）
-            chunk_metadata = {
-                "item_id": item_id,
-                "domain": updated_metadata.get("domain", domain),
-                "category": updated_metadata.get("category", ""),
-                "title": updated_metadata.get("title", ""),
-                "tags": updated_metadata.get("tags", []),
-                "source": updated_metadata.get("source", "user"),
-                "priority": updated_metadata.get("priority", 1),
-                "created_at": updated_metadata.get("created_at", ""),
-                "updated_at": updated_metadata["updated_at"]
-            }
+        Args:
+            item_id: 知识条目 ID
+            **kwargs: 要更新的字段（title, content, tags, category, priority）
 
-            # 文本分块
-            chunks = self.chunker.chunk_text(new_content, chunk_metadata)
+        Returns:
+            是否更新成功
+        """
+        logger.info(f"开始更新知识条目: {item_id}")
 
-            if not chunks:
-                logger.warning(f"知识条目 {item_id} 更新后分块为空")
+        try:
+            # 1. 查找该知识条目所属的领域
+            domain, collection = self._locate_item(item_id)
+            if not domain:
+                logger.warning(f"知识条目 {item_id} 不存在")
                 return False
+            logger.info(f"找到知识条目 {item_id} 在领域 {domain}")
+
+            # 同领域写入串行；重建期间等待新代际切换完成后再写入
+            with self._domain_write_lock(domain):
+                collection = self._write_collection(domain)
+
+                # 2. 读取所有旧分块（含向量，用于复用）
+                include = ["documents", "metadatas"]
+                if "content" in kwargs:
+                    include.append("embeddings")
+                old_chunks = collection.get(where={"item_id": item_id}, include=include)
+                old_ids = list(old_chunks.get("ids") or [])
+                if not old_ids:
+                    logger.warning(f"未找到知识条目 {item_id} 的旧向量数据")
+                    return False
+                old_docs = list(old_chunks.get("documents") or [])
+                old_metas = list(old_chunks.get("metadatas") or [])
 
-            # 6. 批量向量化
-            chunk_texts = [chunk["text"] for chunk in chunks]
-            try:
-                embeddings = self.embedder.embed_batch(chunk_texts)
-            except Exception as e:
-                logger.error(f"知识条目 {item_id} 重新向量化失败: {str(e)}")
-                raise
-
-            # 7. 存储新的向量数据
-            # 准备批量插入的数据
-            ids = []
-            documents = []
-            metadatas = []
-            embeddings_list = []
-
-            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-                chunk_id = f"{item_id}_chunk_{i}"
-                ids.append(chunk_id)
-                documents.append(chunk["text"])
-                metadatas.append(chunk["metadata"])
-                embeddings_list.append(embedding)
-
-            # 批量插入到 Chroma
-            collection.add(
-                ids=ids,
-                documents=documents,
-                metadatas=metadatas,
-                embeddings=embeddings_list
-            )
+                # 3. 需要更新的元数据字段
+                meta_updates = {
+                    key: value for key, value in kwargs.items()
+                    if key in ("title", "tags", "category", "priority")
+                }
+                meta_updates["updated_at"] = datetime.now().isoformat()
+
+                # 4. 快速路径一：仅元数据更新，不做向量化
+                if "content" not in kwargs:
+                    new_metas = [{**(meta or {}), **meta_updates} for meta in old_metas]
+                    collection.update(ids=old_ids, metadatas=new_metas)
+                    try:
+                        self._get_doc_index(collection).update(
+                            ids=[item_id], metadatas=[self._doc_metadata(new_metas[0], len(old_ids))]
+                        )
+                    except Exception as e:
+                        self._invalidate_doc_index(collection.name)
+                        logger.warning(f"文档级索引元数据更新失败: {item_id}, 错误: {str(e)}")
+                    self.metrics.increment("updates", kind="metadata")
+                    logger.info(f"知识条目 {item_id} 元数据更新成功: {len(old_ids)} 个分块（无向量化）")
+                    return True
+
+                # 5. 快速路径二：内容更新，按分块哈希比对
+                base_metadata = dict(old_metas[0] or {})
+                base_metadata.pop("chunk_index", None)
+                base_metadata.pop("total_chunks", None)
+                base_metadata.update(meta_updates)
+
+                chunks = self.chunker.chunk_text(kwargs["content"], base_metadata)
+                if not chunks:
+                    logger.warning(f"知识条目 {item_id} 更新后分块为空")
+                    return False
 
-            logger.info(
-                f"知识条目 {item_id} 更新成功: {len(chunks)} 个新分块"
-            )
+                old_embeddings = old_chunks.get("embeddings")
+                old_by_id = {cid: old_docs[i] for i, cid in enumerate(old_ids)}
+                reusable: Dict[str, Any] = {}
+                if old_embeddings is not None:
+                    for i, doc in enumerate(old_docs):
+                        reusable.setdefault(self._chunk_hash(doc), old_embeddings[i])
+
+                metadata_only_ids, metadata_only_metas = [], []
+                upsert_ids, upsert_docs, upsert_metas, upsert_embeddings = [], [], [], []
+                to_embed: List[int] = []
+
+                for i, chunk in enumerate(chunks):
+                    chunk_id = f"{item_id}_chunk_{i}"
+                    text = chunk["text"]
+                    if old_by_id.get(chunk_id) == text:
+                        # 同一位置文本未变：只改写元数据（chunk_index/total_chunks 等）
+                        metadata_only_ids.append(chunk_id)
+                        metadata_only_metas.append(chunk["metadata"])
+                        continue
+                    upsert_ids.append(chunk_id)
+                    upsert_docs.append(text)
+                    upsert_metas.append(chunk["metadata"])
+                    cached = reusable.get(self._chunk_hash(text))
+                    if cached is not None:
+                        # 文本移动到了新位置：复用已有向量
+                        upsert_embeddings.append(list(cached))
+                    else:
+                        upsert_embeddings.append(None)
+                        to_embed.append(len(upsert_embeddings) - 1)
+
+                # 6. 只对新增或变化的分块向量化
+                if to_embed:
+                    try:
+                        new_vectors = self.embedder.embed_batch([upsert_docs[j] for j in to_embed])
+                    except Exception as e:
+                        logger.error(f"知识条目 {item_id} 重新向量化失败: {str(e)}")
+                        raise
+                    for j, vector in zip(to_embed, new_vectors):
+                        upsert_embeddings[j] = vector
+                # 位置未变或移动后复用的分块计为命中，需要重新向量化的计为未命中
+                self.metrics.record_cache("chunk_embedding", hit=True, count=len(chunks) - len(to_embed))
+                self.metrics.record_cache("chunk_embedding", hit=False, count=len(to_embed))
+
+                # 7. 写入：先写新分块，再删除多余的旧分块
+                if upsert_ids:
+                    collection.upsert(
+                        ids=upsert_ids,
+                        documents=upsert_docs,
+                        metadatas=upsert_metas,
+                        embeddings=upsert_embeddings,
+                    )
+                if metadata_only_ids:
+                    collection.update(ids=metadata_only_ids, metadatas=metadata_only_metas)
+
+                new_ids = {f"{item_id}_chunk_{i}" for i in range(len(chunks))}
+                stale_ids = [cid for cid in old_ids if cid not in new_ids]
+                if stale_ids:
+                    collection.delete(ids=stale_ids)
+
+                # 文档级索引：用全部新分块的向量重新计算质心
+                final_vectors = dict(zip(upsert_ids, upsert_embeddings))
+                if old_embeddings is not None:
+                    for i, cid in enumerate(old_ids):
+                        final_vectors.setdefault(cid, old_embeddings[i])
+                new_vectors = [final_vectors[f"{item_id}_chunk_{i}"] for i in range(len(chunks))]
+                self._index_document(collection, item_id, chunks[0]["metadata"], new_vectors)
+                self._touch_collection(domain, collection, refresh=True)
+                if old_embeddings is not None:
+                    self._update_centroid(collection, added=new_vectors, removed=list(old_embeddings))
+
+                self.metrics.increment("updates", kind="content")
+                self.metrics.increment("update_chunks_embedded", len(to_embed))
+                logger.info(
+                    f"知识条目 {item_id} 更新成功: {len(chunks)} 个分块, "
+                    f"新向量化 {len(to_embed)}, 复用向量 {len(upsert_ids) - len(to_embed)}, "
+                    f"仅元数据 {len(metadata_only_ids)}, 删除 {len(stale_ids)}"
+                )
 
-            return True
+                return True
 
         except Exception as e:
             logger.error(
@@ -1118,6 +2166,7 @@ class ChromaKnowledgeStore:
             )
             return False
 
+    @_uses_client
     def delete_knowledge(self, item_id: str) -> bool:
         """删除知识条目.
 
@@ -1134,53 +2183,33 @@ class ChromaKnowledgeStore:
 
         try:
             # 1. 查找该知识条目所属的领域
-            # 通过遍历所有集合查找包含该 item_id 的集合
-            domain = None
-
-            try:
-                all_collections = self.chroma_client.list_collections()
-                for coll_info in all_collections:
-                    coll_name = coll_info.name
-                    if coll_name.startswith("knowledge_"):
-                        try:
-                            collection = self.chroma_client.get_collection(coll_name)
-                            # 查询该集合中是否有该 item_id 的分块
-                            results = collection.get(
-                                where={"item_id": item_id},
-                                limit=1
-                            )
-
-                            if results and results["ids"] and len(results["ids"]) > 0:
-                                domain = coll_name.replace("knowledge_", "")
-                                logger.info(f"找到知识条目 {item_id} 在领域 {domain}")
-                                break
-                        except Exception as e:
-                            logger.warning(f"查询集合 {coll_name} 失败: {str(e)}")
-                            continue
-            except Exception as e:
-                logger.error(f"列出集合失败: {str(e)}")
-                return False
-
+            domain, _ = self._locate_item(item_id)
             if not domain:
                 logger.warning(f"知识条目 {item_id} 不存在")
                 return False
+            logger.info(f"找到知识条目 {item_id} 在领域 {domain}")
 
             # 2. 删除所有相关分块
-            collection = self._get_or_create_collection(domain)
+            with self._domain_write_lock(domain):
+                collection = self._write_collection(domain)
 
-            # 查找所有属于该 item_id 的分块
-            chunks = collection.get(
-                where={"item_id": item_id}
-            )
+                # 查找所有属于该 item_id 的分块
+                chunks = collection.get(
+                    where={"item_id": item_id},
+                    include=["embeddings"]
+                )
 
-            if chunks and chunks["ids"]:
-                chunk_ids = chunks["ids"]
-                collection.delete(ids=chunk_ids)
-                logger.info(f"成功删除知识条目 {item_id} 的 {len(chunk_ids)} 个分块")
-                return True
-            else:
-                logger.warning(f"未找到知识条目 {item_id} 的分块数据")
-                return False
+                if chunks and chunks["ids"]:
+                    chunk_ids = chunks["ids"]
+                    collection.delete(ids=chunk_ids)
+                    self._unindex_document(collection, item_id)
+                    if chunks.get("embeddings") is not None:
+                        self._update_centroid(collection, removed=list(chunks["embeddings"]))
+                    logger.info(f"成功删除知识条目 {item_id} 的 {len(chunk_ids)} 个分块")
+                    return True
+                else:
+                    logger.warning(f"未找到知识条目 {item_id} 的分块数据")
+                    return False
 
         except Exception as e:
             logger.error(
@@ -1189,6 +2218,24 @@ class ChromaKnowledgeStore:
             )
             return False
 
+    @_uses_client
+    def domain_chunk_counts(self) -> Dict[str, int]:
+        """各领域 live 集合的分块数."""
+        return {domain: collection.count() for domain, collection in self._live_collections()}
+
+    @_uses_client
+    def collection_stats(self) -> Dict[str, Any]:
+        """live 集合统计（集合数与分块总数），计数期间持有客户端."""
+        collections = self._live_collections()
+        total_documents = 0
+        for _, collection in collections:
+            try:
+                total_documents += collection.count()
+            except Exception as e:
+                logger.debug(f"统计集合 {collection.name} 失败: {str(e)}")
+        return {"total_collections": len(collections), "total_documents": total_documents}
+
+    @_uses_client
     def get_domains(self) -> List[str]:
         """获取所有领域列表.
         
@@ -1196,22 +2243,20 @@ class ChromaKnowledgeStore:
             领域列表
         """
         try:
-            # 获取所有集合
-            collections = self.chroma_client.list_collections()
-
-            # 从集合名称中提取领域名称
-            # 集合名称格式: knowledge_{domain}
+            # 集合名称格式: knowledge_{domain}[__g{N}]，只统计 live 代际
+            self._load_generations()
             domains = []
-            for collection in collections:
-                if collection.name.startswith("knowledge_"):
-                    domain = collection.name[len("knowledge_"):]
-                    domains.append(domain)
+            for collection in self.chroma_client.list_collections():
+                parsed = self._parse_collection_name(collection.name)
+                if parsed and collection.name == self._live.get(parsed[0], f"knowledge_{parsed[0]}"):
+                    domains.append(parsed[0])
 
             return sorted(domains)
         except Exception as e:
             logger.error(f"获取领域列表失败: {str(e)}", exc_info=True)
             return []
 
+    @_uses_client
     def get_categories(self, domain: str = None) -> List[str]:
         """获取分类列表.
         
@@ -1250,6 +2295,7 @@ class ChromaKnowledgeStore:
             logger.error(f"获取分类列表失败: {str(e)}", exc_info=True)
             return []
 
+    @_uses_client
     def get_tags(self, domain: str = None) -> List[str]:
         """获取标签列表.
         
@@ -1296,6 +2342,7 @@ class ChromaKnowledgeStore:
             logger.error(f"获取标签列表失败: {str(e)}", exc_info=True)
             return []
 
+    @_uses_client
     def export_knowledge(self, domain: str = None) -> Dict[str, Any]:
         """导出知识为 JSON 格式.
 
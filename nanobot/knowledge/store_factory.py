@@ -7,11 +7,14 @@ from typing import Any
 from loguru import logger
 
 from nanobot.config.loader import load_config
+from nanobot.knowledge.domain_router import DomainRouter
+from nanobot.knowledge.ingestion_queue import IngestionQueue
 from nanobot.knowledge.rag_config import RAGConfig
 from nanobot.knowledge.store import ChromaKnowledgeStore
 
 _STORE_CACHE: dict[str, ChromaKnowledgeStore] = {}
 _STORE_LOCK = Lock()
+_QUEUE_CACHE: dict[int, IngestionQueue] = {}
 
 
 def build_rag_config(cfg: Any) -> RAGConfig:
@@ -31,10 +34,46 @@ def build_rag_config(cfg: Any) -> RAGConfig:
             rag_config.top_k = defaults.top_k
         if hasattr(defaults, "similarity_threshold"):
             rag_config.similarity_threshold = defaults.similarity_threshold
+        if hasattr(defaults, "two_tier_search"):
+            rag_config.two_tier_search = defaults.two_tier_search
+        if hasattr(defaults, "two_tier_min_chunks"):
+            rag_config.two_tier_min_chunks = defaults.two_tier_min_chunks
+        if hasattr(defaults, "two_tier_top_docs"):
+            rag_config.two_tier_top_docs = defaults.two_tier_top_docs
+        if hasattr(defaults, "domain_pruning"):
+            rag_config.domain_pruning = defaults.domain_pruning
+        if hasattr(defaults, "domain_pruning_min_domains"):
+            rag_config.domain_pruning_min_domains = defaults.domain_pruning_min_domains
+        if hasattr(defaults, "domain_pruning_cutoff"):
+            rag_config.domain_pruning_cutoff = defaults.domain_pruning_cutoff
+        if hasattr(defaults, "domain_pruning_margin"):
+            rag_config.domain_pruning_margin = defaults.domain_pruning_margin
+        if hasattr(defaults, "neighbor_chunks"):
+            rag_config.neighbor_chunks = defaults.neighbor_chunks
+        if hasattr(defaults, "knowledge_context_tokens"):
+            rag_config.context_token_budget = defaults.knowledge_context_tokens
+        if hasattr(defaults, "knowledge_mmr_lambda"):
+            rag_config.mmr_lambda = defaults.knowledge_mmr_lambda
+        if hasattr(defaults, "knowledge_memory_budget_mb"):
+            rag_config.collection_memory_budget_mb = defaults.knowledge_memory_budget_mb
+        if hasattr(defaults, "knowledge_pinned_domains"):
+            rag_config.pinned_domains = tuple(defaults.knowledge_pinned_domains)
+        if hasattr(defaults, "knowledge_eviction_interval_s"):
+            rag_config.eviction_min_interval_seconds = defaults.knowledge_eviction_interval_s
         if hasattr(defaults, "batch_size"):
             rag_config.batch_size = defaults.batch_size
         if hasattr(defaults, "timeout"):
             rag_config.timeout = defaults.timeout
+        if hasattr(defaults, "query_batch_size"):
+            rag_config.query_batch_size = defaults.query_batch_size
+        if hasattr(defaults, "query_batch_wait_ms"):
+            rag_config.query_batch_wait_ms = defaults.query_batch_wait_ms
+        if hasattr(defaults, "ingestion_workers"):
+            rag_config.ingestion_workers = defaults.ingestion_workers
+        if hasattr(defaults, "ingestion_max_pending"):
+            rag_config.ingestion_max_pending = defaults.ingestion_max_pending
+        if getattr(defaults, "knowledge_snapshot", ""):
+            rag_config.snapshot_path = str(Path(defaults.knowledge_snapshot).expanduser())
 
     # 从rerank配置中读取
     if hasattr(cfg, "rerank"):
@@ -43,6 +82,11 @@ def build_rag_config(cfg: Any) -> RAGConfig:
         if hasattr(cfg.rerank, "threshold") and cfg.rerank.threshold > 0:
             rag_config.rerank_threshold = cfg.rerank.threshold
 
+    # 本机推理服务（多进程共享一份模型）
+    inference = getattr(cfg, "inference", None)
+    if inference is not None and getattr(inference, "enabled", False):
+        rag_config.inference_socket = str(Path(inference.socket_path).expanduser())
+
     return rag_config
 
 
@@ -81,3 +125,38 @@ def get_chroma_store(workspace: Path | None = None, cfg: Any | None = None) -> C
         _STORE_CACHE[cache_key] = store
         logger.info(f"[KNOWLEDGE] ♻️ ChromaKnowledgeStore initialized once for workspace: {ws}")
         return store
+
+
+def build_domain_router(workspace: Path, cfg: Any) -> DomainRouter:
+    """Create the agent's domain router; with knowledge_router_embedding_fallback on,
+    keyword misses fall back to the knowledge store's embedding model."""
+    embed_fn = None
+    if cfg.agents.defaults.knowledge_router_embedding_fallback:
+        def embed_fn(texts: list[str]) -> list[list[float]]:
+            return get_chroma_store(workspace, cfg=cfg).embedder.embed_batch(texts)
+
+    return DomainRouter(workspace, embed_fn=embed_fn)
+
+
+def get_ingestion_queue(workspace: Path | None = None, cfg: Any | None = None) -> IngestionQueue:
+    """
+    Get the background ingestion queue for a workspace's knowledge store.
+
+    One queue (and worker pool) exists per store; queued jobs persisted by a
+    previous process are resumed when it is first created.
+    """
+    store = get_chroma_store(workspace, cfg=cfg)
+    queue = _QUEUE_CACHE.get(id(store))
+    if queue is not None:
+        return queue
+
+    with _STORE_LOCK:
+        queue = _QUEUE_CACHE.get(id(store))
+        if queue is None:
+            queue = IngestionQueue(
+                store,
+                max_workers=store.config.ingestion_workers,
+                max_pending=store.config.ingestion_max_pending,
+            )
+            _QUEUE_CACHE[id(store)] = queue
+        return queue
@@ -6,6 +6,10 @@ from typing import Any, Dict, List
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from loguru import logger
 
+from nanobot.utils.logging_policy import get_logger
+
+log = get_logger("knowledge.chunker")
+
 class TextChunker:
     """文本分块器，将长文本分割为语义块."""
 
@@ -58,8 +62,8 @@ class TextChunker:
             length_function=len,
         )
         
-        logger.info(f"分隔符分割器初始化完成: chunk_size={self.chunk_size}, chunk_overlap={self.chunk_overlap}")
-        logger.info(f"分隔符优先级: CHUNK_BOUNDARY > 代码块 > 段落 > 句子 > 标点")
+        log.debug(f"分隔符分割器初始化完成: chunk_size={self.chunk_size}, chunk_overlap={self.chunk_overlap}")
+        log.debug("分隔符优先级: CHUNK_BOUNDARY > 代码块 > 段落 > 句子 > 标点")
 
     def chunk_text(self, text: str, metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
         """分块文本并保留元数据.
@@ -81,16 +85,16 @@ class TextChunker:
         has_chunk_marker = any(marker in text for marker in chunk_markers)
         
         if has_chunk_marker:
-            logger.info(f"检测到手动分块标记，文档: {metadata.get('title', 'Unknown')}")
-            for marker in chunk_markers:
-                if marker in text:
-                    chunk_count = text.count(marker)
-                    logger.info(f"{marker} 标记数量: {chunk_count}")
-                    break
+            log.debug(f"检测到手动分块标记，文档: {metadata.get('title', 'Unknown')}")
+            if log.enabled("DEBUG"):
+                for marker in chunk_markers:
+                    if marker in text:
+                        log.debug(f"{marker} 标记数量: {text.count(marker)}")
+                        break
 
         # 如果文本长度不超过 chunk_size，不需要分块
         if len(text) <= self.chunk_size:
-            logger.debug(f"文本长度 {len(text)} 不超过 chunk_size {self.chunk_size}，不分块")
+            log.debug(f"文本长度 {len(text)} 不超过 chunk_size {self.chunk_size}，不分块")
             return [{
                 "text": text,
                 "metadata": {
@@ -104,17 +108,17 @@ class TextChunker:
         try:
             chunks = self.splitter.split_text(text)
                 
-            logger.info(f"文本分块完成: 原始长度={len(text)}, 分块数={len(chunks)}")
-
-            # 打印原始分块的详细信息
-            logger.debug("=== 原始分块详情 ===")
-            for i, chunk in enumerate(chunks):
-                chunk_preview = chunk.replace('\n', '\\n')[:100]
-                logger.debug(f"原始Chunk {i+1}: 长度={len(chunk)}, 预览='{chunk_preview}...'")
-                for marker in chunk_markers:
-                    if marker in chunk:
-                        logger.debug(f"  ⚠️ Chunk {i+1} 包含{marker}标记")
-                        break
+            # 打印原始分块的详细信息（逐块格式化开销较大，仅在 DEBUG 开启时执行）
+            debug_chunks = log.enabled("DEBUG")
+            if debug_chunks:
+                log.debug("=== 原始分块详情 ===")
+                for i, chunk in enumerate(chunks):
+                    chunk_preview = chunk.replace('\n', '\\n')[:100]
+                    log.debug(f"原始Chunk {i+1}: 长度={len(chunk)}, 预览='{chunk_preview}...'")
+                    for marker in chunk_markers:
+                        if marker in chunk:
+                            log.debug(f"  ⚠️ Chunk {i+1} 包含{marker}标记")
+                            break
 
             # 为每个分块添加元数据
             result = []
@@ -139,7 +143,7 @@ class TextChunker:
                 clean_chunk = clean_chunk.strip()
                 
                 if len(clean_chunk) < 10:  # 过滤掉内容太少的chunk
-                    logger.debug(f"跳过内容过少的chunk {i+1}: {len(clean_chunk)} 字符, 内容='{clean_chunk}'")
+                    log.debug(f"跳过内容过少的chunk {i+1}: {len(clean_chunk)} 字符, 内容='{clean_chunk}'")
                     continue
                     
                 result.append({
@@ -156,26 +160,26 @@ class TextChunker:
                 item["metadata"]["total_chunks"] = len(result)
 
             # 打印最终分块的详细信息
-            logger.debug("=== 最终分块详情 ===")
-            for i, item in enumerate(result):
-                chunk = item["text"]
-                chunk_preview = chunk.replace('\n', '\\n')
-                has_boundary = any(marker in chunk for marker in chunk_markers)
-                logger.debug(f"最终Chunk {i+1}: 长度={len(chunk)}, BOUNDARY={has_boundary}")
-                logger.debug(f"  全部chunk内容: {chunk_preview}")
-                
-                # 如果chunk包含标题，特别标注
-                if any(marker in chunk for marker in ["####", "###", "**步骤"]):
-                    titles = []
-                    if "####" in chunk:
-                        titles.append("四级标题")
-                    if "###" in chunk:
-                        titles.append("三级标题")
-                    if "**步骤" in chunk:
-                        titles.append("步骤标记")
-                    logger.debug(f"  📋 包含结构: {', '.join(titles)}")
-
-            logger.info(f"过滤后的分块数量: {len(result)} (原始: {len(chunks)})")
+            if debug_chunks:
+                log.debug("=== 最终分块详情 ===")
+                for i, item in enumerate(result):
+                    chunk = item["text"]
+                    has_boundary = any(marker in chunk for marker in chunk_markers)
+                    log.debug(f"最终Chunk {i+1}: 长度={len(chunk)}, BOUNDARY={has_boundary}")
+                    log.payload("  全部chunk内容:", lambda chunk=chunk: chunk.replace('\n', '\\n'))
+
+                    # 如果chunk包含标题，特别标注
+                    if any(marker in chunk for marker in ["####", "###", "**步骤"]):
+                        titles = []
+                        if "####" in chunk:
+                            titles.append("四级标题")
+                        if "###" in chunk:
+                            titles.append("三级标题")
+                        if "**步骤" in chunk:
+                            titles.append("步骤标记")
+                        log.debug(f"  📋 包含结构: {', '.join(titles)}")
+
+            log.info(f"文本分块完成: 原始长度={len(text)}, 分块数={len(result)} (过滤前: {len(chunks)})")
             return result
 
         except Exception as e:
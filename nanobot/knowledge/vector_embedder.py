@@ -21,17 +21,21 @@ class EmbeddingModelError(Exception):
 class VectorEmbedder:
     """文本向量化器，使用本地 Embedding 模型."""
 
-    def __init__(self, model_name: str):
+    def __init__(self, model_name: str, service_socket: str = ""):
         """初始化向量化器.
         
         Args:
             model_name: sentence-transformers 模型名称
+            service_socket: 本机推理服务的 Unix socket 路径；配置后优先使用推理服务，
+                不可用或模型不一致时回退到进程内加载
             
         Raises:
             EmbeddingModelError: 模型加载失败时抛出
         """
         self.model_name = model_name
+        self.service_socket = service_socket
         self.model = None
+        self.remote = False
         self._load_model()
 
     def _load_model(self) -> None:
@@ -40,6 +44,15 @@ class VectorEmbedder:
         Raises:
             EmbeddingModelError: 模型加载失败时抛出
         """
+        if self.service_socket:
+            from .inference_service import connect_remote_embedder
+
+            remote_model = connect_remote_embedder(self.service_socket, self.model_name)
+            if remote_model is not None:
+                self.model = remote_model
+                self.remote = True
+                return
+
         try:
             logger.info(f"正在加载 Embedding 模型: {self.model_name}")
             self.model = SentenceTransformer(self.model_name)
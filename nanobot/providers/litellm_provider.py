@@ -13,6 +13,9 @@ from loguru import logger
 
 from nanobot.providers.base import LLMProvider, LLMResponse, ToolCallRequest
 from nanobot.providers.registry import find_by_model, find_gateway
+from nanobot.utils.logging_policy import get_logger
+
+log = get_logger("llm")
 
 
 class LiteLLMProvider(LLMProvider):
@@ -156,9 +159,9 @@ class LiteLLMProvider(LLMProvider):
             kwargs["tools"] = tools
             kwargs["tool_choice"] = "auto"
 
-        # 记录LLM入参
-        logger.info(f"[LLM] 调用模型: {model}")
-        logger.info(f"[LLM] 入参: {json.dumps(kwargs, ensure_ascii=False)}")
+        # 记录LLM入参（完整入参仅在 llm 子系统开启 DEBUG 时序列化，且截断/采样）
+        log.info(f"[LLM] 调用模型: {model}, messages={len(messages)}, tools={len(tools or [])}")
+        log.payload("[LLM] 入参:", lambda: {k: v for k, v in kwargs.items() if k != "api_key"})
 
         # 记录开始时间
         start_time = time.time()
@@ -194,7 +197,10 @@ class LiteLLMProvider(LLMProvider):
                                 }
 
                                 if len(content_chunk) < min_chunk_length:
-                                    logger.debug(f"[LLM] 流式调用回调: {json.dumps(context_info, ensure_ascii=False)}")
+                                    log.debug(
+                                        "[LLM] 流式调用回调: {}",
+                                        lambda: json.dumps(context_info, ensure_ascii=False),
+                                    )
                                     continue
                                 if asyncio.iscoroutinefunction(stream_callback):
                                     await stream_callback(context_info)
@@ -206,8 +212,7 @@ class LiteLLMProvider(LLMProvider):
                 duration = end_time - start_time
 
                 # 记录LLM出参和耗时
-                logger.info(f"[LLM] 流式调用耗时: {duration:.3f}秒")
-                logger.info(f"[LLM] 流式输出内容长度: {len(full_content)}字符")
+                log.info(f"[LLM] 流式调用耗时: {duration:.3f}秒, 输出内容长度: {len(full_content)}字符")
 
                 # 创建一个模拟的response对象用于解析
                 class MockResponse:
@@ -271,9 +276,11 @@ class LiteLLMProvider(LLMProvider):
                 duration = end_time - start_time
 
                 # 记录LLM出参和耗时
-                logger.info(f"[LLM] 调用耗时: {duration:.3f}秒")
-                logger.info(
-                    f"[LLM] 出参: {json.dumps(response.model_dump() if hasattr(response, 'model_dump') else str(response), ensure_ascii=False)}")
+                log.info(f"[LLM] 调用耗时: {duration:.3f}秒")
+                log.payload(
+                    "[LLM] 出参:",
+                    lambda: response.model_dump() if hasattr(response, 'model_dump') else str(response),
+                )
 
                 return self._parse_response(response, tools)
         except Exception as e:
@@ -0,0 +1,207 @@
+"""Logging policy for hot paths: per-subsystem levels, lazy formatting, capped and sampled payloads.
+
+Usage::
+
+    from nanobot.utils.logging_policy import get_logger
+
+    log = get_logger("llm")
+    log.info(f"[LLM] 调用模型: {model}")                       # gated by the "llm" level
+    log.debug("[LLM] chunk: {}", lambda: json.dumps(info))     # args are zero-arg callables
+    log.payload("[LLM] 入参:", lambda: kwargs)                  # capped, sampled, DEBUG by default
+
+Subsystem names are dotted; a level configured for ``knowledge`` also applies to
+``knowledge.chunker`` unless the more specific name has its own entry.
+"""
+
+from __future__ import annotations
+
+import json
+import random
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from loguru import logger
+
+_LEVEL_NO: dict[str, int] = {
+    "TRACE": 5,
+    "DEBUG": 10,
+    "INFO": 20,
+    "SUCCESS": 25,
+    "WARNING": 30,
+    "ERROR": 40,
+    "CRITICAL": 50,
+}
+
+
+def _level_no(level: str | int) -> int:
+    if isinstance(level, int):
+        return level
+    return _LEVEL_NO.get(str(level).upper(), _LEVEL_NO["INFO"])
+
+
+@dataclass
+class LogPolicy:
+    """Process-wide logging policy."""
+
+    default_level: str = "INFO"
+    levels: dict[str, str] = field(default_factory=dict)  # subsystem -> level
+    max_payload_chars: int = 2000  # 0 disables the cap
+    payload_sample_rate: float = 1.0  # fraction of payload dumps actually emitted
+    payload_level: str = "DEBUG"
+
+    def __post_init__(self) -> None:
+        self._resolved: dict[str, int] = {}
+
+    def level_for(self, subsystem: str) -> int:
+        """Resolve the minimum level number for a subsystem (longest dotted prefix wins)."""
+        cached = self._resolved.get(subsystem)
+        if cached is not None:
+            return cached
+
+        name = subsystem
+        level = self.default_level
+        while name:
+            if name in self.levels:
+                level = self.levels[name]
+                break
+            name = name.rpartition(".")[0]
+
+        resolved = _level_no(level)
+        self._resolved[subsystem] = resolved
+        return resolved
+
+    @classmethod
+    def from_config(cls, cfg: Any) -> "LogPolicy":
+        """Build from a LoggingConfig-like object (attributes or dict keys)."""
+        def _get(key: str, default: Any) -> Any:
+            if isinstance(cfg, dict):
+                return cfg.get(key, default)
+            return getattr(cfg, key, default)
+
+        return cls(
+            default_level=str(_get("default_level", "INFO")),
+            levels=dict(_get("levels", {}) or {}),
+            max_payload_chars=int(_get("max_payload_chars", 2000)),
+            payload_sample_rate=float(_get("payload_sample_rate", 1.0)),
+            payload_level=str(_get("payload_level", "DEBUG")),
+        )
+
+
+_POLICY = LogPolicy()
+
+
+def get_log_policy() -> LogPolicy:
+    """Return the active policy."""
+    return _POLICY
+
+
+def configure_logging_policy(policy: LogPolicy | Any | None = None) -> LogPolicy:
+    """Install a policy. Accepts a LogPolicy, a LoggingConfig, a dict, or None (defaults)."""
+    global _POLICY
+    if policy is None:
+        _POLICY = LogPolicy()
+    elif isinstance(policy, LogPolicy):
+        _POLICY = policy
+    else:
+        _POLICY = LogPolicy.from_config(policy)
+    return _POLICY
+
+
+def format_payload(payload: Any, max_chars: int) -> str:
+    """Serialize a payload for logging, stopping once ``max_chars`` is exceeded.
+
+    Dicts and lists are JSON-encoded incrementally, so a multi-megabyte request
+    costs roughly ``max_chars`` of work instead of a full ``json.dumps``.
+    """
+    if callable(payload):
+        payload = payload()
+
+    if isinstance(payload, str):
+        text = payload
+        if max_chars and len(text) > max_chars:
+            return f"{text[:max_chars]}...[truncated {len(text) - max_chars} chars]"
+        return text
+
+    try:
+        encoder = json.JSONEncoder(ensure_ascii=False, default=str)
+        parts: list[str] = []
+        size = 0
+        for piece in encoder.iterencode(payload):
+            parts.append(piece)
+            size += len(piece)
+            if max_chars and size > max_chars:
+                return f"{''.join(parts)[:max_chars]}...[truncated]"
+        return "".join(parts)
+    except Exception:
+        return format_payload(str(payload), max_chars)
+
+
+class SubsystemLogger:
+    """Thin loguru wrapper that applies the active LogPolicy before any formatting happens.
+
+    Positional args are passed to loguru with ``opt(lazy=True)``: they must be
+    zero-arg callables and are only evaluated when the record is emitted.
+    """
+
+    __slots__ = ("subsystem",)
+
+    def __init__(self, subsystem: str):
+        self.subsystem = subsystem
+
+    def enabled(self, level: str | int = "DEBUG") -> bool:
+        return _level_no(level) >= _POLICY.level_for(self.subsystem)
+
+    def _emit(self, level: str, message: str, args: tuple[Callable[[], Any], ...]) -> None:
+        if _level_no(level) < _POLICY.level_for(self.subsystem):
+            return
+        # depth=2: skip _emit and the public wrapper so records point at the caller
+        logger.opt(lazy=True, depth=2).log(level, message, *args)
+
+    def trace(self, message: str, *args: Callable[[], Any]) -> None:
+        self._emit("TRACE", message, args)
+
+    def debug(self, message: str, *args: Callable[[], Any]) -> None:
+        self._emit("DEBUG", message, args)
+
+    def info(self, message: str, *args: Callable[[], Any]) -> None:
+        self._emit("INFO", message, args)
+
+    def warning(self, message: str, *args: Callable[[], Any]) -> None:
+        self._emit("WARNING", message, args)
+
+    def error(self, message: str, *args: Callable[[], Any]) -> None:
+        self._emit("ERROR", message, args)
+
+    def payload(self, label: str, payload: Any, level: str | None = None) -> bool:
+        """Log a potentially large payload; capped, sampled and lazily serialized.
+
+        ``payload`` may be the value itself or a zero-arg callable producing it.
+        Returns True when the payload was emitted.
+        """
+        policy = _POLICY
+        level = level or policy.payload_level
+        if _level_no(level) < policy.level_for(self.subsystem):
+            return False
+        if policy.payload_sample_rate < 1.0 and random.random() >= policy.payload_sample_rate:
+            return False
+
+        max_chars = policy.max_payload_chars
+        logger.opt(lazy=True, depth=1).log(
+            level,
+            "{} {}",
+            lambda: label,
+            lambda: format_payload(payload, max_chars),
+        )
+        return True
+
+
+_LOGGERS: dict[str, SubsystemLogger] = {}
+
+
+def get_logger(subsystem: str) -> SubsystemLogger:
+    """Return the (cached) logger for a subsystem such as ``llm`` or ``knowledge.chunker``."""
+    log = _LOGGERS.get(subsystem)
+    if log is None:
+        log = SubsystemLogger(subsystem)
+        _LOGGERS[subsystem] = log
+    return log
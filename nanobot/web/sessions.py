@@ -0,0 +1,157 @@
+"""Per-connection sessions and request scheduling for the web UI.
+
+Every WebSocket connection gets its own agent session key, so concurrent users
+no longer share one conversation history. Messages of a connection are queued
+and handled in order by a worker task, while different connections are
+processed concurrently up to ``max_concurrent`` requests.
+
+Fairness: a connection has at most one request waiting for a processing slot
+(the rest wait in its own queue), and slots are granted in FIFO order, so a
+connection that sends many messages cannot starve the others.
+
+Session ids are issued by the server and signed with a per-process secret, so
+a client can only resume a session it was given (e.g. a reloaded browser tab
+that kept its id in ``sessionStorage``); unknown or forged ids get a fresh
+session. Connections that pass the same id share the session and are
+serialized on it. When a connection closes, its queued messages are dropped
+and the in-flight request is cancelled.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import secrets
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from loguru import logger
+
+SESSION_PREFIX = "webui"
+# 会话 ID 为 "<随机部分>.<签名>"，签名为 HMAC-SHA256 的前 _SIGNATURE_CHARS 个十六进制字符
+_SIGNATURE_CHARS = 32
+
+
+@dataclass
+class WebConnection:
+    """一个 WebSocket 连接的会话与请求队列."""
+
+    websocket: Any
+    session_id: str
+    queue: asyncio.Queue
+    worker: asyncio.Task | None = None
+    processed: int = 0
+
+    @property
+    def session_key(self) -> str:
+        # 只用随机部分作为会话键，签名不会出现在会话文件名中
+        return f"{SESSION_PREFIX}:{self.session_id.partition('.')[0]}"
+
+
+class ConnectionScheduler:
+    """Runs web UI requests per connection with a global concurrency limit."""
+
+    def __init__(
+            self,
+            handler: Callable[[str, WebConnection], Awaitable[Any]],
+            max_concurrent: int = 4,
+            max_pending: int = 8,
+            secret: bytes | None = None,
+    ):
+        """初始化.
+
+        Args:
+            handler: 处理单条消息的协程函数 (user_input, connection)
+            max_concurrent: 全局同时处理的请求数
+            max_pending: 单个连接排队等待的消息数上限
+            secret: 会话 ID 签名密钥；未提供时每个进程随机生成（重启后旧 ID 失效）
+        """
+        self.handler = handler
+        self._secret = secret or secrets.token_bytes(32)
+        self.connections: dict[int, WebConnection] = {}
+        self.configure(max_concurrent, max_pending)
+
+    def configure(self, max_concurrent: int, max_pending: int) -> None:
+        """设置并发上限（在开始处理请求前调用）；已有连接时会替换正在使用的信号量与会话锁，因此拒绝."""
+        if getattr(self, "connections", None):
+            raise RuntimeError("已有连接时不能修改并发上限")
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_pending = max(1, max_pending)
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+        self._session_locks: dict[str, asyncio.Lock] = {}
+        self._active = 0
+
+    def _sign(self, token: str) -> str:
+        return hmac.new(self._secret, token.encode("ascii"), hashlib.sha256).hexdigest()[:_SIGNATURE_CHARS]
+
+    def issue_session_id(self) -> str:
+        """生成新的会话 ID（不可猜测，带签名）."""
+        token = secrets.token_hex(16)
+        return f"{token}.{self._sign(token)}"
+
+    def verify_session_id(self, session_id: str) -> bool:
+        """是否为本进程签发的会话 ID."""
+        token, _, signature = session_id.partition(".")
+        if not token.isalnum() or not token.isascii() or len(signature) != _SIGNATURE_CHARS:
+            return False
+        return hmac.compare_digest(signature, self._sign(token))
+
+    def open(self, websocket: Any, session_id: str | None = None) -> WebConnection:
+        """注册连接；session_id 未提供或不是本进程签发的 ID 时为连接分配新会话."""
+        if session_id and not self.verify_session_id(session_id):
+            logger.warning("[WEB] ⚠️ 拒绝未签发的会话 ID，分配新会话")
+            session_id = None
+        session_id = session_id or self.issue_session_id()
+        connection = WebConnection(websocket, session_id, asyncio.Queue(maxsize=self.max_pending))
+        connection.worker = asyncio.create_task(self._run(connection))
+        self.connections[id(websocket)] = connection
+        logger.info(f"[WEB] 🔌 连接已建立，会话 {connection.session_key}")
+        return connection
+
+    def submit(self, connection: WebConnection, user_input: str) -> bool:
+        """加入连接的消息队列；队列已满时返回 False."""
+        try:
+            connection.queue.put_nowait(user_input)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def close(self, connection: WebConnection) -> None:
+        """注销连接：丢弃排队消息并取消正在处理的请求."""
+        self.connections.pop(id(connection.websocket), None)
+        if connection.worker is not None and not connection.worker.done():
+            connection.worker.cancel()
+            try:
+                await connection.worker
+            except asyncio.CancelledError:
+                pass
+        if not any(c.session_key == connection.session_key for c in self.connections.values()):
+            self._session_locks.pop(connection.session_key, None)
+        logger.info(f"[WEB] 🔌 连接已关闭，会话 {connection.session_key}，处理请求 {connection.processed} 条")
+
+    async def _run(self, connection: WebConnection) -> None:
+        lock = self._session_locks.setdefault(connection.session_key, asyncio.Lock())
+        while True:
+            user_input = await connection.queue.get()
+            # 先获取会话锁再排队等待处理槽位，同一会话的请求不会占用多个槽位
+            async with lock, self._slots:
+                self._active += 1
+                try:
+                    await self.handler(user_input, connection)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"[WEB] ❌ 请求处理失败 ({connection.session_key}): {e}")
+                finally:
+                    self._active -= 1
+                    connection.processed += 1
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "connections": len(self.connections),
+            "active_requests": self._active,
+            "queued_requests": sum(c.queue.qsize() for c in self.connections.values()),
+            "max_concurrent": self.max_concurrent,
+            "max_pending": self.max_pending,
+        }
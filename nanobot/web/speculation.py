@@ -0,0 +1,117 @@
+"""Speculative retrieval while the intent is still being classified.
+
+When the local classifier is not confident, the web UI waits for an LLM round
+trip before it knows whether to search the knowledge base (A), the tools and
+skills indexes (B) or the skills index (C). ``SpeculativeRetrieval`` starts the
+searches of the plausible intents in worker threads during that wait. Once the
+intent is known, the matching branches are kept and the others are cancelled.
+
+A branch that is already running in its worker thread cannot be interrupted.
+Cancelling it only discards the result, so the policy caps waste by starting
+only branches whose intent has enough local probability. Without local
+probabilities (no local classifier) only the cheap index lookups are started.
+The knowledge branch, which includes the cross-encoder rerank, then waits for
+the intent.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Callable
+
+from loguru import logger
+
+# 每个意图需要的检索分支
+INTENT_BRANCHES: dict[str, tuple[str, ...]] = {
+    "A": ("knowledge",),
+    "B": ("tools", "skills"),
+    "C": ("skills",),
+}
+
+# 没有本地分类概率时只预检索的低开销分支（向量索引查询，无重排序）
+CHEAP_BRANCHES: tuple[str, ...] = ("tools", "skills")
+
+
+class SpeculativeRetrieval:
+    """Per-request set of speculative retrieval branches."""
+
+    def __init__(self, branches: dict[str, Callable[[], Any]], min_probability: float = 0.2):
+        """初始化.
+
+        Args:
+            branches: 分支名 -> 同步检索函数（在线程中执行）
+            min_probability: 本地分类概率低于该值的意图不预先检索（0 表示全部预检索）
+        """
+        self.branches = branches
+        self.min_probability = min_probability
+        self.saved_seconds = 0.0
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._started_at: dict[str, float] = {}
+        self._finished_at: dict[str, float] = {}
+        self._decided_at: float | None = None
+
+    def start(self, probabilities: dict[str, float] | None = None) -> list[str]:
+        """按本地分类概率启动可能用到的检索分支；probabilities 为 None 时只启动 CHEAP_BRANCHES."""
+        wanted: list[str] = []
+        if probabilities is None:
+            wanted = [name for name in CHEAP_BRANCHES if name in self.branches]
+        for intent, names in INTENT_BRANCHES.items():
+            if probabilities is None or probabilities.get(intent, 0.0) < self.min_probability:
+                continue
+            wanted.extend(name for name in names if name in self.branches and name not in wanted)
+        for name in wanted:
+            if name not in self._tasks:
+                self._started_at[name] = time.perf_counter()
+                task = asyncio.create_task(asyncio.to_thread(self.branches[name]))
+                task.add_done_callback(lambda _t, n=name: self._finished_at.setdefault(n, time.perf_counter()))
+                self._tasks[name] = task
+        if wanted:
+            logger.info(f"[WEB] ⚡ 预检索分支已启动: {', '.join(wanted)}")
+        return wanted
+
+    def resolve(self, intent: str) -> list[str]:
+        """意图确定后取消无关分支，返回被取消的分支名."""
+        self._decided_at = time.perf_counter()
+        keep = set(INTENT_BRANCHES.get(intent, ()))
+        cancelled = [name for name in self._tasks if name not in keep]
+        for name in cancelled:
+            self._tasks.pop(name).cancel()
+        if cancelled:
+            logger.info(f"[WEB] ⚡ 意图 {intent}，取消预检索分支: {', '.join(cancelled)}")
+        return cancelled
+
+    def take(self, name: str) -> asyncio.Task | None:
+        """取出已启动的分支（只能取一次）；未启动时返回 None."""
+        task = self._tasks.pop(name, None)
+        if task is None:
+            return None
+        decided_at = self._decided_at or time.perf_counter()
+        finished_at = self._finished_at.get(name, decided_at)
+        # 分支在意图确定之前已经运行的时间即为节省的时间
+        saved = max(0.0, min(finished_at, decided_at) - self._started_at[name])
+        self.saved_seconds += saved
+        logger.info(f"[WEB] ⚡ 使用预检索结果: {name}，节省 {saved:.3f} 秒")
+        return task
+
+    def cancel_all(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+
+
+async def run_branch(
+        speculation: SpeculativeRetrieval | None,
+        name: str,
+        fn: Callable[..., Any],
+        *args: Any,
+        **kwargs: Any,
+) -> Any:
+    """优先使用预检索结果；分支未启动或失败时在线程中直接执行 fn."""
+    task = speculation.take(name) if speculation is not None else None
+    if task is not None:
+        try:
+            return await task
+        except Exception as e:
+            logger.warning(f"[WEB] 预检索分支 {name} 失败，重新检索: {e}")
+    return await asyncio.to_thread(fn, *args, **kwargs)
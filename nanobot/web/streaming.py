@@ -0,0 +1,172 @@
+"""Coalesced WebSocket output for one streamed web UI response.
+
+Streaming used to send one WebSocket frame per provider chunk. At high token
+rates the per-frame cost (JSON encoding, framing, compression flush, browser
+``onmessage`` dispatch) dominates. ``StreamWriter`` buffers the messages of a
+response and flushes them as one frame when either the time window
+(``window_ms``, counted from the first buffered message) or the size budget
+(``max_bytes``) is reached:
+
+- A single buffered message is sent unchanged (a plain string or a JSON object).
+- Several messages are sent as ``{"type": "batch", "messages": [...]}``, which
+  the page unpacks in order, so message boundaries are preserved.
+- Consecutive text/reasoning ``stream_chunk`` objects of the same kind are
+  merged into one chunk before sending.
+
+The writer also guarantees exactly one completion frame per response and
+records frames, bytes and messages per response in the metrics sink.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from typing import Any
+
+from loguru import logger
+
+from nanobot.knowledge.metrics import MetricsSink, get_default_metrics_sink
+
+# 可以合并的流式内容类型（工具调用、迭代开始、知识库查询等保持独立消息）
+MERGEABLE_CONTENT_TYPES = frozenset({"text", "reasoning", "final_answer"})
+_MERGE_BLOCKING_FLAGS = ("is_tool_call", "is_iteration_start", "is_completed")
+
+
+def _mergeable(previous: Any, current: dict[str, Any]) -> bool:
+    return (
+            isinstance(previous, dict)
+            and previous.get("type") == current.get("type") == "stream_chunk"
+            and previous.get("content_type") == current.get("content_type")
+            and current.get("content_type") in MERGEABLE_CONTENT_TYPES
+            and previous.get("iteration_count") == current.get("iteration_count")
+            and not any(previous.get(f) or current.get(f) for f in _MERGE_BLOCKING_FLAGS)
+    )
+
+
+class StreamWriter:
+    """Wraps a WebSocket for one response; ``send_text`` / ``send_json`` are coalesced."""
+
+    def __init__(
+            self,
+            websocket: Any,
+            window_ms: float = 25.0,
+            max_bytes: int = 16384,
+            sink: MetricsSink | None = None,
+    ):
+        """初始化.
+
+        Args:
+            websocket: 底层 WebSocket 连接
+            window_ms: 合并窗口（毫秒），从缓冲区第一条消息开始计时；0 表示不合并
+            max_bytes: 缓冲区达到该大小时立即发送
+            sink: 指标输出（每次响应的帧数、字节数、消息数与耗时），默认使用全局 sink
+        """
+        self.websocket = websocket
+        self.window_ms = window_ms
+        self.max_bytes = max_bytes
+        self.sink = sink if sink is not None else get_default_metrics_sink()
+        self.frames = 0
+        self.bytes = 0
+        self.messages = 0
+        self.completed = False
+        self._buffer: list[str | dict[str, Any]] = []
+        self._buffered_bytes = 0
+        self._send_lock = asyncio.Lock()
+        self._flush_task: asyncio.Task | None = None
+        self._started = time.perf_counter()
+        self._closed = False
+
+    def __getattr__(self, name: str) -> Any:
+        # close() / receive_text() 等其余接口直接使用底层连接
+        return getattr(self.websocket, name)
+
+    async def send_text(self, text: str) -> None:
+        await self._add(text, len(text.encode("utf-8")))
+
+    async def send_json(self, data: dict[str, Any]) -> None:
+        if data.get("is_completed"):
+            if self.completed:
+                return
+            self.completed = True
+        # 与上一条同类流式内容合并，只累加增量的大小
+        if self._buffer and _mergeable(self._buffer[-1], data):
+            previous = self._buffer[-1]
+            content = data.get("content", "")
+            self._buffer[-1] = {**previous, **data, "content": previous.get("content", "") + content}
+            self.messages += 1
+            self._buffered_bytes += len(content.encode("utf-8"))
+            await self._maybe_flush()
+            return
+        await self._add(data, len(json.dumps(data, ensure_ascii=False).encode("utf-8")))
+
+    async def send_completion(self, **fields: Any) -> None:
+        """发送处理完成消息（每次响应只发送一次）并立即刷新."""
+        await self.send_json({
+            "type": "stream_chunk",
+            "content_type": "completion",
+            "content": "处理完成",
+            "is_completed": True,
+            **fields,
+        })
+        await self.flush()
+
+    async def _add(self, message: str | dict[str, Any], size: int) -> None:
+        self._buffer.append(message)
+        self.messages += 1
+        self._buffered_bytes += size
+        await self._maybe_flush()
+
+    async def _maybe_flush(self) -> None:
+        if self.window_ms <= 0 or self._buffered_bytes >= self.max_bytes:
+            await self.flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.window_ms / 1000)
+        self._flush_task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            # 连接已断开：由接收循环处理断开，这里只丢弃缓冲
+            logger.debug(f"[WEB] 流式输出发送失败: {e}")
+
+    async def flush(self) -> None:
+        """立即发送缓冲区中的消息（一帧）."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        async with self._send_lock:
+            if not self._buffer:
+                return
+            buffer, self._buffer, self._buffered_bytes = self._buffer, [], 0
+            if len(buffer) == 1:
+                frame = buffer[0] if isinstance(buffer[0], str) else json.dumps(buffer[0], ensure_ascii=False)
+            else:
+                frame = json.dumps({"type": "batch", "messages": buffer}, ensure_ascii=False)
+            self.frames += 1
+            self.bytes += len(frame.encode("utf-8"))
+            await self.websocket.send_text(frame)
+
+    async def close(self, *args: Any, **kwargs: Any) -> None:
+        """Flush pending output, then close the underlying WebSocket."""
+        await self.finish()
+        await self.websocket.close(*args, **kwargs)
+
+    async def finish(self) -> None:
+        """刷新剩余输出并记录本次响应的指标（可重复调用）."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await self.flush()
+        finally:
+            if self.messages:
+                self.sink.observe("webui.stream_frames", self.frames)
+                self.sink.observe("webui.stream_bytes", self.bytes)
+                self.sink.observe("webui.stream_messages", self.messages)
+                self.sink.observe("webui.stream_ms", (time.perf_counter() - self._started) * 1000)
+            logger.debug(
+                f"[WEB] 流式输出: {self.messages} 条消息 -> {self.frames} 帧, {self.bytes} 字节"
+            )
@@ -0,0 +1,140 @@
+"""Background warm-up of the web UI with per-subsystem readiness.
+
+Loading models, ingesting the built-in knowledge base and building the
+routing indexes can take minutes. The web UI therefore starts serving at once
+and warms up in a background thread. ``WarmupTracker`` records the progress of
+each stage, which ``/readyz`` reports:
+
+- The service is *ready* once every required stage (the LLM / agent loop) is
+  ready, so chat works.
+- It is *degraded* while optional stages (knowledge base, routing indexes,
+  local intent classifier) are still loading or have failed. Requests then
+  skip the missing subsystems, e.g. chat without RAG.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from loguru import logger
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+_TERMINAL_STATES = (READY, FAILED, SKIPPED)
+
+
+@dataclass
+class StageStatus:
+    """一个预热阶段的状态."""
+
+    name: str
+    required: bool = False
+    state: str = PENDING
+    elapsed_ms: float | None = None
+    error: str | None = None
+    detail: Any = None
+    _started: float | None = field(default=None, repr=False)
+
+    def to_dict(self) -> dict[str, Any]:
+        elapsed_ms = self.elapsed_ms
+        if self.state == LOADING and self._started is not None:
+            elapsed_ms = (time.perf_counter() - self._started) * 1000
+        return {
+            "name": self.name,
+            "required": self.required,
+            "state": self.state,
+            "elapsed_ms": round(elapsed_ms, 1) if elapsed_ms is not None else None,
+            "error": self.error,
+            "detail": self.detail,
+        }
+
+
+class WarmupTracker:
+    """Runs warm-up stages and tracks which subsystems are ready."""
+
+    def __init__(self, stages: list[tuple[str, bool]]):
+        """初始化.
+
+        Args:
+            stages: 按执行顺序排列的 (阶段名, 是否为就绪必需)
+        """
+        self._lock = threading.Lock()
+        self._stages = {name: StageStatus(name, required) for name, required in stages}
+        self._thread: threading.Thread | None = None
+
+    def run(self, name: str, fn: Callable[[], Any]) -> bool:
+        """执行一个阶段；fn 的返回值记为阶段详情，异常记为失败。返回是否成功."""
+        status = self._stages[name]
+        with self._lock:
+            status.state = LOADING
+            status.error = None
+            status._started = time.perf_counter()
+        logger.info(f"[WEB] ⏳ 预热阶段开始: {name}")
+        try:
+            detail = fn()
+        except Exception as e:
+            with self._lock:
+                status.state = FAILED
+                status.error = str(e)
+                status.elapsed_ms = (time.perf_counter() - status._started) * 1000
+            logger.error(f"[WEB] ❌ 预热阶段失败: {name} ({status.elapsed_ms:.0f}ms): {e}")
+            return False
+        with self._lock:
+            status.state = READY
+            status.detail = detail
+            status.elapsed_ms = (time.perf_counter() - status._started) * 1000
+        logger.info(f"[WEB] ✅ 预热阶段完成: {name} ({status.elapsed_ms:.0f}ms)")
+        return True
+
+    def skip(self, name: str, reason: str) -> None:
+        with self._lock:
+            status = self._stages[name]
+            status.state = SKIPPED
+            status.error = reason
+
+    def state(self, name: str) -> str:
+        return self._stages[name].state
+
+    def is_ready(self, name: str) -> bool:
+        return self._stages[name].state == READY
+
+    def current_stage(self) -> str | None:
+        """正在执行的阶段（未开始或全部结束时为 None）."""
+        for status in self._stages.values():
+            if status.state == LOADING:
+                return status.name
+        return None
+
+    @property
+    def ready(self) -> bool:
+        return all(s.state == READY for s in self._stages.values() if s.required)
+
+    @property
+    def finished(self) -> bool:
+        return all(s.state in _TERMINAL_STATES for s in self._stages.values())
+
+    def start(self, target: Callable[[], Any]) -> threading.Thread:
+        """在后台线程中执行预热（只启动一次）."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=target, name="webui-warmup", daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            stages = [s.to_dict() for s in self._stages.values()]
+        ready = self.ready
+        return {
+            "ready": ready,
+            "degraded": ready and any(s["state"] != READY for s in stages if not s["required"]),
+            "finished": self.finished,
+            "subsystems": {s["name"]: s["state"] for s in stages},
+            "stages": stages,
+        }
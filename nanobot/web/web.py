@@ -1,18 +1,27 @@
 """Web interface for nanobot with intent classification."""
 
+import asyncio
 from pathlib import Path
 from typing import Any
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 from loguru import logger
 
 from nanobot.agent import AgentLoop
 from nanobot.config import Config
-from nanobot.knowledge.intent_routing_store import get_intent_routing_store, IntentRoutingStore
-from nanobot.knowledge.store_factory import get_chroma_store
+from nanobot.knowledge.intent_classifier import IntentClassifier, IntentPrediction
+from nanobot.knowledge.intent_routing_store import get_intent_routing_store, IntentRoutingStore, make_tool_search_fn
+from nanobot.knowledge.ingestion_queue import IngestionQueueFullError, validate_job
+from nanobot.knowledge.metrics import get_default_metrics_sink
+from nanobot.knowledge.retrieval_context import RetrievalContext
+from nanobot.knowledge.store_factory import build_domain_router, get_chroma_store, get_ingestion_queue
 from nanobot.providers import LLMProvider
+from nanobot.web.sessions import ConnectionScheduler, WebConnection
+from nanobot.web.speculation import SpeculativeRetrieval, run_branch
+from nanobot.web.streaming import StreamWriter
+from nanobot.web.warmup import WarmupTracker
 
 
 def diagnose_knowledge_base(workspace_path: Path) -> dict:
@@ -40,19 +49,9 @@ def diagnose_knowledge_base(workspace_path: Path) -> dict:
             store = get_chroma_store(workspace_path)
             status["available"] = True
 
-            # 获取集合信息
-            collections = store.chroma_client.list_collections()
-            status["total_collections"] = len(collections)
-
-            # 计算总文档数
-            total_docs = 0
-            for collection in collections:
-                try:
-                    count = collection.count()
-                    total_docs += count
-                except:
-                    pass
-            status["total_documents"] = total_docs
+            # 集合与分块统计（只统计 live 索引代际）
+            status.update(store.collection_stats())
+            status["residency"] = store.residency_stats()
 
         except Exception as e:
             status["error"] = f"ChromaKnowledgeStore初始化失败: {str(e)}"
@@ -106,11 +105,24 @@ provider: LLMProvider = None
 agent_loop: AgentLoop = None
 config: Config = None
 intent_routing_store: IntentRoutingStore = None
+intent_classifier: IntentClassifier = None
 
+# /api/chat 与未指定会话时使用的会话
+WEBUI_SESSION_KEY = "cli:webui"
 
-def initialize_webui_resources():
-    """Initialize resources for webui."""
-    global provider, agent_loop, config, intent_routing_store
+
+# 预热阶段（按执行顺序）；只有 llm 是就绪必需的，其余未就绪时降级服务
+warmup = WarmupTracker([
+    ("llm", True),
+    ("knowledge", False),
+    ("routing", False),
+    ("intent_classifier", False),
+])
+
+
+def _init_llm() -> dict:
+    """加载配置，创建 provider 与 agent_loop。"""
+    global provider, agent_loop, config
     from nanobot.config.loader import load_config
     from nanobot.bus.queue import MessageBus
     from nanobot.agent.loop import AgentLoop
@@ -124,9 +136,9 @@ def initialize_webui_resources():
     p = config.get_provider()
     model = config.agents.defaults.model
     if not (p and p.api_key) and not model.startswith("bedrock/"):
-        return False
+        raise RuntimeError("未配置 API 密钥")
 
-    provider = LiteLLMProvider(
+    llm_provider = LiteLLMProvider(
         api_key=p.api_key if p else None,
         api_base=config.get_api_base(),
         default_model=model,
@@ -136,32 +148,103 @@ def initialize_webui_resources():
 
     agent_loop = AgentLoop(
         bus=bus,
-        provider=provider,
+        provider=llm_provider,
         workspace=config.workspace_path,
         brave_api_key=config.tools.web.search.api_key or None,
         exec_config=config.tools.exec,
         restrict_to_workspace=config.tools.restrict_to_workspace,
+        tool_exposure=config.agents.defaults.tool_exposure,
+        dynamic_tools_top_n=config.agents.defaults.dynamic_tools_top_n,
+        pinned_tools=config.agents.defaults.pinned_tools,
+        tool_search_fn=make_tool_search_fn(config.workspace_path, config),
+        mcp_config=config.mcp,
+        domain_router=build_domain_router(config.workspace_path, config),
     )
+    # provider 最后赋值：请求以 provider 和 agent_loop 都存在作为可以处理的条件
+    provider = llm_provider
+    return {"model": model}
+
+
+def _init_knowledge() -> dict:
+    """初始化内置 RocketMQ 知识库（已初始化时跳过）并诊断知识库状态。"""
+    from nanobot.knowledge.rocketmq_init import initialize_rocketmq_knowledge
+
+    initialize_rocketmq_knowledge(config.workspace_path)
 
     # 诊断知识库状态
     knowledge_status = diagnose_knowledge_base(config.workspace_path)
     logger.info(f"[WEB] 📚 知识库状态: {knowledge_status}")
+    if not knowledge_status.get("available"):
+        raise RuntimeError(knowledge_status.get("error") or "知识库不可用")
+    return {
+        "total_collections": knowledge_status.get("total_collections", 0),
+        "total_documents": knowledge_status.get("total_documents", 0),
+    }
+
+
+def _init_routing() -> dict:
+    """初始化意图路由向量库（tools/skills）。"""
+    global intent_routing_store
+    store = get_intent_routing_store(config.workspace_path, config)
+    tools_count = store.init_tools_index(
+        tool_schemas=agent_loop.tools.get_definitions(),
+        mcp_servers=config.mcp.servers,
+    )
+    skills_count = store.init_skills_index(agent_loop.context.skills)
+    # 技能目录变化时增量刷新 skills 索引
+    store.watch_skills(agent_loop.context.skills)
+    logger.info(
+        f"[WEB] 🧭 意图路由索引初始化完成: tools_docs={tools_count}, skills_chunks={skills_count}"
+    )
+    # 索引建好后再对请求可见
+    intent_routing_store = store
+    return {"tools_docs": tools_count, "skills_chunks": skills_count}
+
+
+def _init_intent_classifier() -> dict:
+    """本地意图分类器（与意图路由索引共用 embedding 模型），置信度不足时才调用 LLM。"""
+    global intent_classifier
+    intent_classifier = IntentClassifier(
+        intent_routing_store.embedder.embed_batch, workspace=config.workspace_path
+    )
+    return {"labels": intent_classifier.labels}
+
+
+def initialize_webui_resources():
+    """Initialize resources for webui (blocking); progress is tracked in ``warmup``."""
+    llm_ready = warmup.run("llm", _init_llm)
+
+    if config is None:
+        warmup.skip("knowledge", "配置加载失败")
+    else:
+        warmup.run("knowledge", _init_knowledge)
+
+    if agent_loop is None:
+        warmup.skip("routing", "agent loop 未初始化")
+    else:
+        warmup.run("routing", _init_routing)
+
+    if intent_routing_store is None:
+        warmup.skip("intent_classifier", "意图路由索引不可用，使用 LLM 分类")
+    elif not config.agents.defaults.intent_local_classifier:
+        warmup.skip("intent_classifier", "未启用 intent_local_classifier")
+    else:
+        warmup.run("intent_classifier", _init_intent_classifier)
+
+    return llm_ready
+
+
+def configure_webui_limits(webui_config) -> None:
+    """按 config.webui 设置连接调度的并发上限；须在服务开始接受连接前调用（预热线程中不可调用）。"""
+    scheduler.configure(
+        webui_config.max_concurrent_requests,
+        webui_config.max_pending_per_connection,
+    )
 
-    # 初始化意图路由向量库（tools/skills）
-    try:
-        intent_routing_store = get_intent_routing_store(config.workspace_path, config)
-        tools_count = intent_routing_store.init_tools_index(
-            tool_schemas=agent_loop.tools.get_definitions(),
-            mcp_servers=config.mcp.servers,
-        )
-        skills_count = intent_routing_store.init_skills_index(agent_loop.context.skills)
-        logger.info(
-            f"[WEB] 🧭 意图路由索引初始化完成: tools_docs={tools_count}, skills_chunks={skills_count}"
-        )
-    except Exception as e:
-        logger.error(f"[WEB] ❌ 意图路由索引初始化失败: {e}")
 
-    return True
+def start_webui_warmup():
+    """在后台线程中初始化 Web UI 资源，服务立即开始接受请求（进度见 /readyz）。"""
+    return warmup.start(initialize_webui_resources)
 
 
 def load_html_template(template_name: str) -> str:
@@ -298,65 +381,89 @@ async def preview_knowledge_item(item_id: str = None, source_url: str = None, fi
         }
 
 
-async def get_full_document_content(store, item_id: str):
-    """获取知识条目的完整文档内容."""
+@web_app.post("/api/knowledge/jobs")
+async def submit_knowledge_job(payload: dict[str, Any]):
+    """Queue a knowledge write (add/update/delete) for background ingestion."""
+    from nanobot.config.loader import load_config
+
+    config = load_config()
+    payload = dict(payload)
+    kind = payload.pop("kind", "add")
+    job_priority = int(payload.pop("job_priority", 0))
+    # 先校验字段，未知字段或缺少必填字段时不加载知识库直接返回
     try:
-        # 查找该知识条目所属的领域
-        domain = None
-        all_collections = store.chroma_client.list_collections()
+        validate_job(kind, payload)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
 
-        for coll_info in all_collections:
-            coll_name = coll_info.name
-            if coll_name.startswith("knowledge_"):
-                try:
-                    collection = store.chroma_client.get_collection(coll_name)
-                    # 查询该集合中是否有该 item_id 的分块
-                    results = collection.get(
-                        where={"item_id": item_id},
-                        include=["documents", "metadatas"]
-                    )
+    try:
+        queue = await asyncio.to_thread(get_ingestion_queue, config.workspace_path, cfg=config)
+        job = queue.submit(kind, job_priority=job_priority, **payload)
+    except IngestionQueueFullError as e:
+        return {"status": "busy", "message": str(e)}
+    except Exception as e:
+        return {"status": "error", "message": f"提交导入任务失败: {str(e)}"}
 
-                    if results and results["ids"] and len(results["ids"]) > 0:
-                        domain = coll_name.replace("knowledge_", "")
-                        break
-                except Exception as e:
-                    logger.warning(f"查询集合 {coll_name} 失败: {str(e)}")
-                    continue
+    return {"status": "queued", "job": job.summary()}
 
-        if not domain:
-            return None
 
-        # 获取该知识条目的所有分块
-        collection = store.chroma_client.get_collection(f"knowledge_{domain}")
-        chunks = collection.get(
-            where={"item_id": item_id},
-            include=["documents", "metadatas"]
-        )
+@web_app.get("/api/knowledge/jobs")
+async def list_knowledge_jobs(status: str = None, limit: int = 50):
+    """List recent ingestion jobs."""
+    from nanobot.config.loader import load_config
 
-        if not chunks or not chunks["ids"]:
-            return None
+    config = load_config()
+    queue = await asyncio.to_thread(get_ingestion_queue, config.workspace_path, cfg=config)
+    return {"status": "success", "jobs": queue.list_jobs(status=status, limit=limit), "stats": queue.stats()}
 
-        # 按 chunk_index 排序并合并内容
-        chunk_data = []
-        metadata = None
 
-        for i in range(len(chunks["ids"])):
-            chunk_metadata = chunks["metadatas"][i]
-            chunk_document = chunks["documents"][i]
-            chunk_index = chunk_metadata.get("chunk_index", 0)
+@web_app.get("/api/knowledge/jobs/{job_id}")
+async def get_knowledge_job(job_id: str):
+    """Ingestion job status and progress."""
+    from nanobot.config.loader import load_config
 
-            chunk_data.append({
-                "index": chunk_index,
-                "text": chunk_document,
-                "metadata": chunk_metadata
-            })
+    config = load_config()
+    queue = await asyncio.to_thread(get_ingestion_queue, config.workspace_path, cfg=config)
+    job = queue.get(job_id)
+    if job is None:
+        return {"status": "error", "message": f"未找到导入任务 {job_id}"}
+    return {"status": "success", "job": job.summary()}
+
+
+@web_app.get("/api/routing/mcp-discovery")
+async def get_mcp_discovery():
+    """Per-server status of the last MCP tool discovery."""
+    if intent_routing_store is None:
+        return {"status": "error", "message": "意图路由索引未初始化"}
+    return {"status": "success", "servers": intent_routing_store.discovery_report()}
+
+
+@web_app.post("/api/routing/tools/refresh")
+async def refresh_tools_index():
+    """Re-discover MCP tools concurrently and refresh the tools index incrementally."""
+    if intent_routing_store is None or agent_loop is None:
+        return {"status": "error", "message": "意图路由索引未初始化"}
+    try:
+        count = await intent_routing_store.refresh_tools_index(
+            tool_schemas=agent_loop.tools.get_definitions(),
+            mcp_servers=config.mcp.servers,
+        )
+    except Exception as e:
+        logger.error(f"[WEB] ❌ 工具索引刷新失败: {e}")
+        return {"status": "error", "message": str(e)}
+    return {"status": "success", "tools_docs": count, "servers": intent_routing_store.discovery_report()}
 
-            # 使用第一个分块的元数据作为整体元数据
-            if metadata is None:
-                metadata = chunk_metadata
 
-        # 按索引排序
-        chunk_data.sort(key=lambda x: x["index"])
+async def get_full_document_content(store, item_id: str):
+    """获取知识条目的完整文档内容."""
+    try:
+        # 该知识条目的所有分块（按 chunk_index 排序，只查 live 索引代际）
+        chunk_data = await asyncio.to_thread(store.get_item_chunks, item_id)
+        if not chunk_data:
+            return None
+
+        # 使用第一个分块的元数据作为整体元数据
+        metadata = chunk_data[0]["metadata"]
 
         # 合并所有分块的文本
         full_content = " ".join(chunk["text"] for chunk in chunk_data)
@@ -380,30 +487,143 @@ async def get_full_document_content(store, item_id: str):
         return None
 
 
+async def _handle_connection_message(user_input: str, connection: WebConnection):
+    """Process one queued message of a connection with real-time streaming."""
+    await process_user_message_streaming(user_input, connection.websocket, session_key=connection.session_key)
+
+
+# 每个连接一个会话：连接内按顺序处理，连接之间并发（上限见 config.webui）
+scheduler = ConnectionScheduler(_handle_connection_message)
+
+
 @web_app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    """Handle WebSocket connections with real-time streaming."""
+async def websocket_endpoint(websocket: WebSocket, session: str | None = None):
+    """Handle WebSocket connections with real-time streaming.
+
+    Each connection gets its own agent session. The server-issued session id is sent
+    as the first frame (``{"type": "session", "session_id": ...}``); pass it back as
+    ``?session=<id>`` to resume the session. Ids the server did not issue are rejected.
+    """
     await manager.connect(websocket)
+    connection = scheduler.open(websocket, session)
+    await websocket.send_json({"type": "session", "session_id": connection.session_id})
     try:
         while True:
             data = await websocket.receive_text()
-            # Process user message with real-time streaming
-            await process_user_message_streaming(data, websocket)
+            # 消息进入连接队列，由连接的 worker 处理；接收循环保持运行以便及时发现断开
+            if not scheduler.submit(connection, data):
+                await websocket.send_text("⚠️ 待处理的消息过多，请等待当前请求完成后再发送\n")
     except WebSocketDisconnect:
         manager.disconnect(websocket)
+    finally:
+        # 断开时取消该连接正在处理的请求
+        await scheduler.close(connection)
+
+
+@web_app.get("/healthz")
+async def healthz():
+    """Liveness：进程存活即返回，不依赖预热进度."""
+    return {"status": "ok"}
+
+
+@web_app.get("/readyz")
+async def readyz():
+    """Readiness：LLM 就绪后返回 200（知识库 / 路由索引未就绪时 degraded 为 true），否则 503."""
+    snapshot = warmup.snapshot()
+    return JSONResponse(snapshot, status_code=200 if snapshot["ready"] else 503)
+
 
+@web_app.get("/api/webui/sessions")
+async def get_webui_sessions():
+    """连接数、正在处理与排队的请求数."""
+    return scheduler.stats()
 
-async def classify_user_intent(user_input: str, websocket: WebSocket) -> str:
+
+@web_app.get("/api/webui/stream-metrics")
+async def get_stream_metrics():
+    """每次响应的流式输出帧数、字节数、消息数与耗时分布."""
+    histograms = get_default_metrics_sink().snapshot().get("histograms", {})
+    return {name: hist for name, hist in histograms.items() if name.startswith("webui.stream_")}
+
+
+INTENT_NAMES = {"A": "问答类", "B": "运维操作类", "C": "排障类"}
+
+
+async def _classify_intent_locally(user_input: str, retrieval: RetrievalContext | None) -> IntentPrediction | None:
+    """本地 embedding 分类（毫秒级）；分类器不可用或失败时返回 None。"""
+    if intent_classifier is None or intent_routing_store is None:
+        return None
+    try:
+        query_vector = await _shared_query_vector(intent_routing_store, user_input, retrieval)
+        if query_vector is None:
+            return await asyncio.to_thread(intent_classifier.classify, user_input)
+        return intent_classifier.classify(user_input, query_vector)
+    except Exception as e:
+        logger.warning(f"[WEB] 本地意图分类失败，使用 LLM 分类: {e}")
+        return None
+
+
+def _build_speculation(user_input: str, retrieval: RetrievalContext) -> SpeculativeRetrieval | None:
+    """按配置创建请求级预检索（知识库 / tools / skills 三个分支）。"""
+    if config is None or not config.agents.defaults.speculative_retrieval:
+        return None
+
+    branches = {}
+
+    def knowledge():
+        store = get_chroma_store(config.workspace_path, cfg=config)
+        return store.search_knowledge(
+            query=user_input, return_scores=True, query_vector=store.embed_query(user_input, retrieval)
+        )
+
+    # 预热未完成的子系统不预检索
+    if warmup.is_ready("knowledge"):
+        branches["knowledge"] = knowledge
+    if intent_routing_store is not None:
+        branches["tools"] = lambda: intent_routing_store.search_tools(
+            user_input, 2, intent_routing_store.embed_query(user_input, retrieval)
+        )
+        branches["skills"] = lambda: intent_routing_store.search_skills(
+            user_input, 2, intent_routing_store.embed_query(user_input, retrieval)
+        )
+    return SpeculativeRetrieval(branches, min_probability=config.agents.defaults.speculative_min_probability)
+
+
+async def classify_user_intent(
+        user_input: str,
+        websocket: WebSocket,
+        retrieval: RetrievalContext | None = None,
+        speculation: SpeculativeRetrieval | None = None,
+) -> str:
     """
-    使用LLM对用户意图进行分类
+    对用户意图进行分类：先用本地分类器，置信度不足时再使用LLM
     
     Args:
         user_input: 用户输入
         websocket: WebSocket连接
+        retrieval: 请求级检索上下文（本地分类复用其查询向量）
+        speculation: 预检索；需要调用 LLM 分类时，先按本地分类概率启动可能用到的检索分支
         
     Returns:
         'A' 表示知识问答，'B' 表示运维操作，'C' 表示故障排查
     """
+    prediction = await _classify_intent_locally(user_input, retrieval)
+    threshold = config.agents.defaults.intent_confidence_threshold if config else 1.0
+    if prediction is not None:
+        logger.info(
+            f"[WEB] 🧠 本地意图分类: {prediction.label} (置信度 {prediction.confidence:.2f}, "
+            f"{prediction.elapsed_ms:.1f}ms, 阈值 {threshold})"
+        )
+        if prediction.confidence >= threshold:
+            await websocket.send_text(
+                f"✅ 用户意图识别: {INTENT_NAMES[prediction.label]} ({prediction.label}, "
+                f"本地分类置信度 {prediction.confidence:.2f})\n\n"
+            )
+            return prediction.label
+
+    if speculation is not None:
+        speculation.start(prediction.probabilities if prediction is not None else None)
+
     intent_prompt = f"""
     你是一个意图路由分类器。请判断用户问题的意图，仅回复单个字母（A、B、C）。
 
@@ -490,13 +710,10 @@ async def classify_user_intent(user_input: str, websocket: WebSocket) -> str:
             await websocket.send_text(f"⚠️ 意图识别结果异常: {intent}，默认为问答类\n")
             return "A"
 
-        intent_type = "问答类"
-        if intent == "B":
-            intent_type = "运维操作类"
-        if intent == "C":
-            intent_type = "排障类"
+        if prediction is not None:
+            intent_classifier.record_disagreement(user_input, prediction, intent)
 
-        await websocket.send_text(f"✅ 用户意图识别: {intent_type} ({intent})\n\n")
+        await websocket.send_text(f"✅ 用户意图识别: {INTENT_NAMES[intent]} ({intent})\n\n")
 
         return intent
 
@@ -506,7 +723,11 @@ async def classify_user_intent(user_input: str, websocket: WebSocket) -> str:
         return "A"  # 出错时默认回退到 A
 
 
-async def process_user_message_streaming(user_input: str, websocket: WebSocket):
+async def process_user_message_streaming(
+        user_input: str,
+        websocket: WebSocket,
+        session_key: str = WEBUI_SESSION_KEY,
+):
     """Process user message with real-time streaming output."""
     import time
 
@@ -514,29 +735,84 @@ async def process_user_message_streaming(user_input: str, websocket: WebSocket):
 
     # Check if provider and agent_loop are initialized
     if not provider or not agent_loop:
+        if not warmup.finished:
+            stage = warmup.current_stage() or "llm"
+            await websocket.send_text(f"⏳ Web UI 正在初始化（{stage}），请稍后再试。\n")
+            return
         await websocket.send_text("Error: Web UI resources not initialized. Please restart the server.")
         return
 
-    # Send initial processing message
-    await websocket.send_text("🤖 AI Agent is processing your request...\n\n")
-
-    # 第一步：用户意图识别
-    user_intent = await classify_user_intent(user_input, websocket)
-
-    # 根据意图决定处理流程
-    if user_intent == "A":
-        # 问答类：查询知识库
-        await process_qa_intent(user_input, websocket, start_time)
-    elif user_intent == "B":
-        # 运维操作：查 tools 索引 top2，作为系统补充上下文进入 loop
-        await process_ops_intent(user_input, websocket, start_time)
-    elif user_intent == "C":
-        # 故障排查：查 skills 索引 top2，作为系统补充上下文进入 loop
-        await process_troubleshooting_intent(user_input, websocket, start_time)
-    else:
-        # 非法值默认 A
-        await websocket.send_text(f"⚠️ 意图值非法: {user_intent}，默认按 A 问答类处理\n")
-        await process_qa_intent(user_input, websocket, start_time)
+    # 合并流式输出帧，响应结束时刷新并记录帧数 / 字节数
+    if not isinstance(websocket, StreamWriter):
+        websocket = StreamWriter(
+            websocket,
+            window_ms=config.webui.stream_coalesce_ms if config else 0,
+            max_bytes=config.webui.stream_coalesce_bytes if config else 0,
+        )
+
+    # 请求级检索上下文：意图分类与 tools / skills / 知识库检索共用同一个查询向量
+    retrieval = RetrievalContext(user_input)
+
+    # LLM 分类期间预先检索可能用到的分支，意图确定后只保留对应分支
+    speculation = _build_speculation(user_input, retrieval)
+
+    try:
+        # Send initial processing message
+        await websocket.send_text("🤖 AI Agent is processing your request...\n\n")
+
+        # 第一步：用户意图识别
+        user_intent = await classify_user_intent(user_input, websocket, retrieval, speculation)
+        if user_intent not in ("A", "B", "C"):
+            # 非法值默认 A
+            await websocket.send_text(f"⚠️ 意图值非法: {user_intent}，默认按 A 问答类处理\n")
+            user_intent = "A"
+        if speculation is not None:
+            speculation.resolve(user_intent)
+
+        # 根据意图决定处理流程
+        if user_intent == "A" and not warmup.is_ready("knowledge"):
+            # 知识库未就绪：降级为不带知识库的对话
+            await websocket.send_text(
+                f"⚠️ 知识库暂不可用（{warmup.state('knowledge')}），本次不使用知识库直接回答\n"
+            )
+            await process_troubleshooting_intent(
+                user_input, websocket, start_time,
+                use_skills_retrieval=False,
+                retrieval=retrieval, speculation=speculation, session_key=session_key,
+            )
+        elif user_intent == "A":
+            # 问答类：查询知识库
+            await process_qa_intent(user_input, websocket, start_time, retrieval=retrieval, speculation=speculation)
+        elif user_intent == "B":
+            # 运维操作：查 tools 索引 top2，作为系统补充上下文进入 loop
+            await process_ops_intent(
+                user_input, websocket, start_time,
+                retrieval=retrieval, speculation=speculation, session_key=session_key,
+            )
+        else:
+            # 故障排查：查 skills 索引 top2，作为系统补充上下文进入 loop
+            await process_troubleshooting_intent(
+                user_input, websocket, start_time,
+                retrieval=retrieval, speculation=speculation, session_key=session_key,
+            )
+    finally:
+        if speculation is not None:
+            speculation.cancel_all()
+            if speculation.saved_seconds:
+                logger.info(f"[WEB] ⚡ 预检索共节省 {speculation.saved_seconds:.3f} 秒")
+        await websocket.finish()
+    logger.debug(f"[WEB] 请求级查询向量: {retrieval.stats()}")
+
+
+async def _shared_query_vector(store: Any, user_input: str, retrieval: RetrievalContext | None) -> list[float] | None:
+    """在线程中计算（或复用）请求级查询向量；失败时返回 None，由检索方法自行向量化。"""
+    if retrieval is None:
+        return None
+    try:
+        return await asyncio.to_thread(store.embed_query, user_input, retrieval)
+    except Exception as e:
+        logger.warning(f"[WEB] query embedding failed, stores will embed on their own: {e}")
+        return None
 
 
 def _build_retrieval_context(title: str, results: list[dict], limit: int = 2) -> str | None:
@@ -577,9 +853,13 @@ def _rerank_route_candidates(query: str, results: list[dict[str, Any]]) -> list[
 
     try:
         import math
-        from sentence_transformers import CrossEncoder
 
-        reranker = CrossEncoder(model_path)
+        if intent_routing_store is not None:
+            reranker = intent_routing_store.get_reranker()
+        else:
+            from sentence_transformers import CrossEncoder
+
+            reranker = CrossEncoder(model_path)
         pairs = [(query, (item.get("document") or "")) for item in results]
         raw_scores = reranker.predict(pairs)
         for i, score in enumerate(raw_scores):
@@ -597,10 +877,16 @@ def _rerank_route_candidates(query: str, results: list[dict[str, Any]]) -> list[
         return fallback
 
 
-async def process_ops_intent(user_input: str, websocket: WebSocket, start_time: float):
+async def process_ops_intent(
+        user_input: str,
+        websocket: WebSocket,
+        start_time: float,
+        retrieval: RetrievalContext | None = None,
+        speculation: SpeculativeRetrieval | None = None,
+        session_key: str = WEBUI_SESSION_KEY,
+):
 
     """处理运维操作意图：tools/skills 联合检索并重排后进入 loop。"""
-    import json
     import time
 
     def _build_ops_preview_items(results: list[dict[str, Any]]) -> list[dict[str, Any]]:
@@ -662,21 +948,30 @@ async def process_ops_intent(user_input: str, websocket: WebSocket, start_time:
             start_time,
             additional_context=None,
             use_skills_retrieval=False,
+            retrieval=retrieval,
+            speculation=speculation,
+            session_key=session_key,
         )
 
     tools_results: list[dict[str, Any]] = []
     skills_results: list[dict[str, Any]] = []
 
+    query_vector = await _shared_query_vector(intent_routing_store, user_input, retrieval)
+
     await websocket.send_text("🧰 正在检索工具能力库（top2）...\n")
     try:
-        tools_results = intent_routing_store.search_tools(user_input, limit=2)
+        tools_results = await run_branch(
+            speculation, "tools", intent_routing_store.search_tools, user_input, 2, query_vector
+        )
         await websocket.send_text(f"✅ tools 检索完成，命中 {len(tools_results)} 条\n")
     except Exception as e:
         await websocket.send_text(f"⚠️ tools 检索失败: {str(e)}\n")
 
     await websocket.send_text("🛠️ 正在检索 skills 库（top2）...\n")
     try:
-        skills_results = intent_routing_store.search_skills(user_input, limit=2)
+        skills_results = await run_branch(
+            speculation, "skills", intent_routing_store.search_skills, user_input, 2, query_vector
+        )
         await websocket.send_text(f"✅ skills 检索完成，命中 {len(skills_results)} 条\n")
     except Exception as e:
         await websocket.send_text(f"⚠️ skills 检索失败: {str(e)}\n")
@@ -701,7 +996,7 @@ async def process_ops_intent(user_input: str, websocket: WebSocket, start_time:
             "timestamp": time.time(),
             "duration_from_start": round(time.time() - start_time, 3),
         }
-        await websocket.send_text(json.dumps(knowledge_message, ensure_ascii=False))
+        await websocket.send_json(knowledge_message)
 
         await websocket.send_text(
             f"✅ 联合检索完成，tools={len(tools_results)}，skills={len(skills_results)}，重排后取 top2\n\n"
@@ -721,7 +1016,7 @@ async def process_ops_intent(user_input: str, websocket: WebSocket, start_time:
             "timestamp": time.time(),
             "duration_from_start": round(time.time() - start_time, 3),
         }
-        await websocket.send_text(json.dumps(knowledge_message, ensure_ascii=False))
+        await websocket.send_json(knowledge_message)
 
     return await process_troubleshooting_intent(
         user_input,
@@ -729,13 +1024,21 @@ async def process_ops_intent(user_input: str, websocket: WebSocket, start_time:
         start_time,
         additional_context=additional_context,
         use_skills_retrieval=False,
+        retrieval=retrieval,
+        speculation=speculation,
+        session_key=session_key,
     )
 
 
-async def process_qa_intent(user_input: str, websocket: WebSocket, start_time: float):
+async def process_qa_intent(
+        user_input: str,
+        websocket: WebSocket,
+        start_time: float,
+        retrieval: RetrievalContext | None = None,
+        speculation: SpeculativeRetrieval | None = None,
+):
     """处理问答类意图：优先查询知识库"""
     import time
-    import json
     from nanobot.config.loader import load_config
 
     try:
@@ -758,7 +1061,11 @@ async def process_qa_intent(user_input: str, websocket: WebSocket, start_time: f
     await websocket.send_text("📚 正在查询知识库...\n")
 
     # 搜索知识库，返回得分
-    search_result = store.search_knowledge(query=user_input, return_scores=True)
+    # 在线程中执行，避免阻塞事件循环；并发会话的查询向量化由 EmbeddingBatcher 合并
+    query_vector = await _shared_query_vector(store, user_input, retrieval)
+    search_result = await run_branch(
+        speculation, "knowledge", store.search_knowledge, query=user_input, return_scores=True, query_vector=query_vector
+    )
 
     # 检查返回值类型
     if isinstance(search_result, tuple) and len(search_result) == 2:
@@ -880,7 +1187,7 @@ async def process_qa_intent(user_input: str, websocket: WebSocket, start_time: f
             'duration_from_start': round(time.time() - start_time, 3)
         }
 
-        await websocket.send_text(json.dumps(knowledge_message, ensure_ascii=False))
+        await websocket.send_json(knowledge_message)
 
         # 问答类：将知识库原文输入模型，生成 Markdown 格式答案
         await websocket.send_text("🤖 正在基于知识库原文生成答案...\n")
@@ -940,15 +1247,7 @@ async def process_qa_intent(user_input: str, websocket: WebSocket, start_time: f
         await websocket.send_text(f"\n---\n*总耗时: {total_processing_time}秒*\n")
 
         # 发送处理完成状态消息，让前端按钮可以点击
-        completion_message = {
-            'type': 'stream_chunk',
-            'content_type': 'completion',
-            'content': '处理完成',
-            'is_completed': True,
-            'timestamp': end_time,
-            'duration_from_start': total_processing_time
-        }
-        await websocket.send_text(json.dumps(completion_message, ensure_ascii=False))
+        await websocket.send_completion(timestamp=end_time, duration_from_start=total_processing_time)
 
         return
     else:
@@ -962,15 +1261,7 @@ async def process_qa_intent(user_input: str, websocket: WebSocket, start_time: f
         await websocket.send_text(f"\n---\n*总耗时: {total_processing_time}秒*\n")
 
         # 发送处理完成状态消息，让前端按钮可以点击
-        completion_message = {
-            'type': 'stream_chunk',
-            'content_type': 'completion',
-            'content': '处理完成',
-            'is_completed': True,
-            'timestamp': end_time,
-            'duration_from_start': total_processing_time
-        }
-        await websocket.send_text(json.dumps(completion_message, ensure_ascii=False))
+        await websocket.send_completion(timestamp=end_time, duration_from_start=total_processing_time)
 
         return
 
@@ -981,18 +1272,23 @@ async def process_troubleshooting_intent(
         start_time: float,
         additional_context: str | None = None,
         use_skills_retrieval: bool = True,
+        retrieval: RetrievalContext | None = None,
+        speculation: SpeculativeRetrieval | None = None,
+        session_key: str = WEBUI_SESSION_KEY,
 ):
     """处理排查类意图：可带系统补充上下文进入 loop。"""
 
     import time
-    import json
 
     # C 类默认先查 skills 索引；B 类可通过 use_skills_retrieval=False 禁用
     if use_skills_retrieval and additional_context is None and intent_routing_store:
 
         await websocket.send_text("🛠️ 正在检索 skills 库（top2）...\n")
         try:
-            skill_hits = intent_routing_store.search_skills(user_input, limit=2)
+            query_vector = await _shared_query_vector(intent_routing_store, user_input, retrieval)
+            skill_hits = await run_branch(
+                speculation, "skills", intent_routing_store.search_skills, user_input, 2, query_vector
+            )
             additional_context = _build_retrieval_context("Troubleshooting Skill Retrieval Context", skill_hits,
                                                           limit=2)
             await websocket.send_text(f"✅ skills 检索完成，命中 {len(skill_hits)} 条\n\n")
@@ -1086,17 +1382,19 @@ async def process_troubleshooting_intent(
             message_data['knowledge_count'] = context_info.get('knowledge_count', 0)
             message_data['knowledge_result'] = context_info.get('knowledge_result', '')
 
-        await websocket.send_text(json.dumps(message_data, ensure_ascii=False))
-
-    # 为agent_loop设置流式回调
-    agent_loop.stream_callback = stream_callback
+        await websocket.send_json(message_data)
 
-    # Process with streaming output
+    # Process with streaming output（流式回调只作用于本次请求，并发连接互不覆盖）
+    # AgentLoop 的会话由 channel:chat_id 决定，按会话 key 拆分
+    channel, _, chat_id = session_key.partition(":")
     response = await agent_loop.process_direct(
         user_input,
-        session_key="cli:webui",
+        session_key=session_key,
+        channel=channel,
+        chat_id=chat_id,
         additional_context=additional_context,
         disable_auto_kb=True,
+        stream_callback=stream_callback,
     )
 
     # Record LLM end time
@@ -1118,26 +1416,7 @@ async def process_troubleshooting_intent(
     await websocket.send_text(f"\n---\n*总耗时: {total_processing_time}秒 | LLM执行耗时: {llm_execution_time}秒*")
 
     # 发送处理完成状态消息，让前端按钮可以点击
-    completion_message = {
-        'type': 'stream_chunk',
-        'content_type': 'completion',
-        'content': '处理完成',
-        'is_completed': True,
-        'timestamp': end_time,
-        'duration_from_start': total_processing_time
-    }
-    await websocket.send_text(json.dumps(completion_message, ensure_ascii=False))
-
-    # 发送处理完成状态消息，让前端按钮可以点击
-    completion_message = {
-        'type': 'stream_chunk',
-        'content_type': 'completion',
-        'content': '处理完成',
-        'is_completed': True,
-        'timestamp': end_time,
-        'duration_from_start': total_processing_time
-    }
-    await websocket.send_text(json.dumps(completion_message, ensure_ascii=False))
+    await websocket.send_completion(timestamp=end_time, duration_from_start=total_processing_time)
 
 
 async def process_user_message(user_input: str) -> str:
@@ -1153,7 +1432,10 @@ async def process_user_message(user_input: str) -> str:
     # Record LLM start time
     llm_start_time = time.time()
 
-    response = await agent_loop.process_direct(user_input, session_key="cli:webui")
+    channel, _, chat_id = WEBUI_SESSION_KEY.partition(":")
+    response = await agent_loop.process_direct(
+        user_input, session_key=WEBUI_SESSION_KEY, channel=channel, chat_id=chat_id
+    )
 
     # Record LLM end time
     llm_end_time = time.time()
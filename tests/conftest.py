@@ -0,0 +1,55 @@
+import hashlib
+import re
+
+import pytest
+
+from nanobot.knowledge import store as store_module
+from nanobot.knowledge.metrics import InMemoryMetricsSink
+from nanobot.knowledge.rag_config import RAGConfig
+
+
+class HashingEmbedder:
+    """Deterministic bag-of-words embedder for store tests (no model download)."""
+
+    dimension = 32
+
+    def __init__(self, model_name="", inference_socket=None):
+        self.embedded: list[str] = []
+
+    def get_embedding_dimension(self):
+        return self.dimension
+
+    def embed_text(self, text):
+        return self.embed_batch([text])[0]
+
+    def embed_batch(self, texts):
+        self.embedded.extend(texts)
+        vectors = []
+        for text in texts:
+            vector = [0.0] * self.dimension
+            for word in re.findall(r"\w+", text.lower()):
+                vector[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % self.dimension] += 1.0
+            norm = sum(v * v for v in vector) ** 0.5 or 1.0
+            vectors.append([v / norm for v in vector])
+        return vectors
+
+
+@pytest.fixture
+def make_knowledge_store(tmp_path, monkeypatch):
+    """Factory for ChromaKnowledgeStore instances backed by a temp workspace and HashingEmbedder."""
+    monkeypatch.setattr(store_module, "VectorEmbedder", HashingEmbedder)
+    monkeypatch.setattr(store_module, "CROSS_ENCODER_AVAILABLE", False)
+    stores = []
+
+    def factory(workspace=None, **overrides):
+        options = {"chunk_size": 120, "chunk_overlap": 20, "query_batch_size": 1}
+        options.update(overrides)
+        store = store_module.ChromaKnowledgeStore(
+            workspace or tmp_path, RAGConfig(**options), metrics_sink=InMemoryMetricsSink()
+        )
+        stores.append(store)
+        return store
+
+    yield factory
+    for store in stores:
+        store.close()
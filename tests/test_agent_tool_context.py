@@ -0,0 +1,71 @@
+import asyncio
+
+from nanobot.agent.loop import AgentLoop
+from nanobot.agent.tools.cron import CronTool
+from nanobot.agent.tools.message import MessageTool
+from nanobot.agent.tools.spawn import SpawnTool
+from nanobot.bus.queue import MessageBus
+from nanobot.cron.service import CronService
+from nanobot.providers.base import LLMProvider, LLMResponse, ToolCallRequest
+
+
+class InterleavingProvider(LLMProvider):
+    """First turn calls message/spawn/cron; waits until every request reached its first turn."""
+
+    def __init__(self, concurrent: int):
+        super().__init__()
+        self._arrived = 0
+        self._all_arrived = asyncio.Event()
+        self._concurrent = concurrent
+
+    async def chat(self, messages, tools=None, model=None, **kwargs) -> LLMResponse:
+        if messages[-1]["role"] == "tool":
+            return LLMResponse(content="done")
+        self._arrived += 1
+        if self._arrived == self._concurrent:
+            self._all_arrived.set()
+        await self._all_arrived.wait()
+        return LLMResponse(content=None, tool_calls=[
+            ToolCallRequest(id="1", name="message", arguments={"content": "hi"}),
+            ToolCallRequest(id="2", name="spawn", arguments={"task": "check"}),
+            ToolCallRequest(id="3", name="cron", arguments={"action": "add", "message": "ping", "every_seconds": 60}),
+        ])
+
+    def get_default_model(self) -> str:
+        return "fake"
+
+
+class RecordingSubagents:
+    def __init__(self):
+        self.origins = []
+
+    async def spawn(self, task, label=None, origin_channel="cli", origin_chat_id="direct"):
+        self.origins.append((origin_channel, origin_chat_id))
+        return "started"
+
+
+def test_concurrent_requests_keep_their_own_tool_context(tmp_path) -> None:
+    loop = AgentLoop(bus=MessageBus(), provider=InterleavingProvider(concurrent=2), workspace=tmp_path)
+    loop._tool_exposure_loaded = True
+    sent = []
+
+    async def send(msg):
+        sent.append((msg.channel, msg.chat_id))
+
+    subagents = RecordingSubagents()
+    cron = CronService(tmp_path / "cron" / "jobs.json")
+    loop.tools.register(MessageTool(send_callback=send))
+    loop.tools.register(SpawnTool(manager=subagents))
+    loop.tools.register(CronTool(cron))
+
+    async def scenario():
+        return await asyncio.gather(*(
+            loop.process_direct("remind me", channel="web", chat_id=chat_id, disable_auto_kb=True)
+            for chat_id in ("alice", "bob")
+        ))
+
+    assert asyncio.run(scenario()) == ["done", "done"]
+    expected = [("web", "alice"), ("web", "bob")]
+    assert sorted(sent) == expected
+    assert sorted(subagents.origins) == expected
+    assert sorted((job.payload.channel, job.payload.to) for job in cron.list_jobs()) == expected
@@ -0,0 +1,98 @@
+import time
+
+from nanobot.knowledge.residency import CollectionResidency, estimate_footprint
+
+
+def test_least_recently_used_collection_is_evicted_first() -> None:
+    residency = CollectionResidency(budget_bytes=250)
+    assert residency.touch("knowledge_a", "a", 100) == []
+    assert residency.touch("knowledge_b", "b", 100) == []
+    residency.touch("knowledge_a", "a")
+
+    assert residency.touch("knowledge_c", "c", 100) == ["knowledge_b"]
+    assert [entry.name for entry in residency.resident()] == ["knowledge_a", "knowledge_c"]
+    assert residency.stats()["evictions"] == 1
+
+
+def test_pinned_domains_are_never_evicted() -> None:
+    residency = CollectionResidency(budget_bytes=150, pinned=["hot"])
+    residency.touch("knowledge_hot", "hot", 100)
+    residency.touch("knowledge_a", "a", 100)
+
+    assert residency.touch("knowledge_b", "b", 100) == ["knowledge_a"]
+    assert residency.is_resident("knowledge_hot")
+
+
+def test_unlimited_budget_only_tracks() -> None:
+    residency = CollectionResidency()
+    for name in ("knowledge_a", "knowledge_b"):
+        assert residency.touch(name, name, estimate_footprint(10_000, 384)) == []
+    assert residency.stats()["resident_bytes"] == 2 * estimate_footprint(10_000, 384)
+
+
+def _store_with_domains(make_knowledge_store, monkeypatch, domains=("a", "b", "c"), interval=0.0):
+    store = make_knowledge_store(eviction_min_interval_seconds=interval)
+    for domain in domains:
+        store.add_knowledge(domain, "general", f"{domain} guide", f"{domain} first part", tags=[domain])
+    # 每个集合 1 个分块，预算只够两个集合
+    store.residency.budget_bytes = 2 * estimate_footprint(1, store.embedder.dimension) + 100
+
+    reopens, rewarmed = [], []
+    reopen = store._storage.reopen
+    monkeypatch.setattr(store._storage, "reopen", lambda root: reopens.append(root) or reopen(root))
+    monkeypatch.setattr(store, "_rewarm_collections", lambda names: rewarmed.append(names))
+    return store, reopens, rewarmed
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_store_eviction_reopens_client_and_rewarms_survivors(make_knowledge_store, monkeypatch) -> None:
+    store, reopens, rewarmed = _store_with_domains(make_knowledge_store, monkeypatch)
+
+    assert store.search_knowledge("a first part", domain="a")
+    assert len(reopens) == 1
+    assert _wait_for(lambda: rewarmed == [["knowledge_c", "knowledge_a"]])
+    assert store.metrics.sink.counter("retrieval.collection_evictions") == 1
+    assert not store.residency.is_resident("knowledge_b")
+    # 重开后的客户端仍可检索被驱逐的集合（按需重新载入）
+    assert store.search_knowledge("b first part", domain="b")
+
+
+def test_store_evictions_are_batched_within_interval(make_knowledge_store, monkeypatch) -> None:
+    store, reopens, rewarmed = _store_with_domains(make_knowledge_store, monkeypatch, interval=0.3)
+    store.search_knowledge("a first part", domain="a")
+    assert len(reopens) == 1
+
+    # 间隔内的驱逐推迟并合并；等待期间再次使用的集合取消驱逐
+    store.search_knowledge("b first part", domain="b")
+    store.search_knowledge("c first part", domain="c")
+    assert len(reopens) == 1
+    assert store._pending_evictions == {"knowledge_a"}
+
+    assert _wait_for(lambda: store.metrics.sink.counter("retrieval.client_reopens") == 2)
+    assert len(reopens) == 2
+    assert store.metrics.sink.counter("retrieval.collection_evictions") == 2
+    assert _wait_for(lambda: rewarmed[-1] == ["knowledge_b", "knowledge_c"])
+
+
+def test_reopen_waits_for_other_owners_of_the_root(make_knowledge_store, monkeypatch) -> None:
+    store, reopens, rewarmed = _store_with_domains(make_knowledge_store, monkeypatch)
+    monkeypatch.setattr("nanobot.knowledge.store.EVICTION_RETRY_SECONDS", 0.05)
+
+    # 另一个 owner（同一目录）持有集合句柄期间，驱逐不重开客户端
+    with store._storage.using(store.chroma_dir) as client:
+        handle = client.get_collection("knowledge_b")
+        assert store.search_knowledge("a first part", domain="a")
+        assert store.search_knowledge("c first part", domain="c")
+        assert reopens and store.metrics.sink.counter("retrieval.client_reopens") == 0
+        assert handle.count() == 1
+
+    # 使用结束后定时重试完成驱逐
+    assert _wait_for(lambda: store.metrics.sink.counter("retrieval.client_reopens") == 1)
+    assert not store._pending_evictions
+    assert store.domain_chunk_counts() == {"a": 1, "b": 1, "c": 1}
@@ -0,0 +1,70 @@
+from nanobot.knowledge.context_packer import (
+    DROPPED_BUDGET,
+    DROPPED_REDUNDANT,
+    PackCandidate,
+    pack_context,
+)
+
+
+def _count_words(text: str) -> int:
+    return len(text.split())
+
+
+def test_near_duplicates_are_dropped_in_favour_of_diverse_results() -> None:
+    candidates = [
+        PackCandidate("a", "broker flush disk " * 5, 0.9, [1.0, 0.0]),
+        PackCandidate("a-copy", "broker flush disk " * 5, 0.85, [0.99, 0.01]),
+        PackCandidate("b", "consumer rebalance " * 5, 0.5, [0.0, 1.0]),
+    ]
+    packed = pack_context(candidates, token_budget=100, count_tokens=_count_words)
+
+    assert packed.items == ["a", "b"]
+    assert packed.dropped == [("a-copy", DROPPED_REDUNDANT)]
+    assert packed.tokens_used == 25
+
+
+def test_budget_is_respected_and_overflow_reported() -> None:
+    candidates = [
+        PackCandidate("a", "word " * 40, 0.9, [1.0, 0.0, 0.0]),
+        PackCandidate("b", "word " * 40, 0.8, [0.0, 1.0, 0.0]),
+        PackCandidate("c", "word " * 10, 0.1, [0.0, 0.0, 1.0]),
+    ]
+    packed = pack_context(candidates, token_budget=60, count_tokens=_count_words)
+
+    assert packed.items == ["a", "c"]
+    assert packed.dropped == [("b", DROPPED_BUDGET)]
+    assert packed.tokens_used <= 60
+
+
+def test_last_result_is_truncated_to_fill_the_budget() -> None:
+    candidates = [
+        PackCandidate("a", "word " * 100, 0.9, [1.0, 0.0]),
+        PackCandidate("b", "word " * 200, 0.8, [0.0, 1.0]),
+    ]
+    packed = pack_context(
+        candidates, token_budget=200, count_tokens=_count_words, on_truncate=lambda item, text: f"{item}:{_count_words(text)}"
+    )
+
+    assert packed.items[0] == "a"
+    assert packed.truncated == 1
+    assert packed.tokens_used <= 200
+
+
+def test_search_fetches_chunk_embeddings_only_when_packing(make_knowledge_store, monkeypatch) -> None:
+    from chromadb.api.models.Collection import Collection
+
+    store = make_knowledge_store()
+    store.add_knowledge("rocketmq", "general", "Disk", "broker disk full", tags=["mq"])
+    store.add_knowledge("rocketmq", "general", "Lag", "consumer lag growing", tags=["mq"])
+
+    includes = []
+    query = Collection.query
+    monkeypatch.setattr(Collection, "query", lambda self, **kw: includes.append(kw.get("include")) or query(self, **kw))
+
+    items = store.search_knowledge("broker disk", domain="rocketmq")
+    assert isinstance(items, list) and items[0].title == "Disk"
+    assert "embeddings" not in includes[-1]
+
+    packed = store.search_knowledge("broker disk", domain="rocketmq", token_budget=100)
+    assert packed.items[0].title == "Disk"
+    assert "embeddings" in includes[-1]
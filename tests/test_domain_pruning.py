@@ -0,0 +1,94 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+
+def _chunk_embeddings(collection):
+    return np.asarray(collection.get(include=["embeddings"])["embeddings"], dtype=np.float64)
+
+
+def test_centroid_is_maintained_on_add_and_delete(make_knowledge_store) -> None:
+    store = make_knowledge_store()
+    first = store.add_knowledge("rocketmq", "general", "Disk", "broker disk full", tags=["mq"])
+    collection = store._get_or_create_collection("rocketmq")
+    assert np.allclose(store._domain_centroid(collection), _chunk_embeddings(collection).mean(axis=0), atol=1e-5)
+
+    store.add_knowledge("rocketmq", "general", "Lag", "consumer lag growing", tags=["mq"])
+    centroid = store._domain_centroid(collection)
+    assert np.allclose(centroid, _chunk_embeddings(collection).mean(axis=0), atol=1e-5)
+    metadata = store.chroma_client.get_collection(collection.name).metadata
+    assert metadata["centroid_count"] == 2
+
+    store.delete_knowledge(first)
+    assert np.allclose(store._domain_centroid(collection), _chunk_embeddings(collection).mean(axis=0), atol=1e-5)
+
+    store.delete_knowledge(store.search_knowledge("consumer lag", domain="rocketmq")[0].id)
+    assert store._domain_centroid(collection) is None
+
+
+def test_centroid_is_cached_between_searches(make_knowledge_store, monkeypatch) -> None:
+    store = make_knowledge_store(domain_pruning_min_domains=1)
+    store.add_knowledge("rocketmq", "general", "Disk", "broker disk full", tags=["mq"])
+    store.add_knowledge("kubernetes", "general", "Pods", "pod pending events", tags=["k8s"])
+    store._centroids.clear()
+
+    loads = []
+    load = store._load_centroid
+    monkeypatch.setattr(store, "_load_centroid", lambda collection: loads.append(collection.name) or load(collection))
+    for _ in range(3):
+        store._prune_domains(store._live_collections(), store.embed_query("broker disk"))
+
+    assert sorted(loads) == ["knowledge_kubernetes", "knowledge_rocketmq"]
+    sink = store.metrics.sink
+    assert sink.counter("retrieval.cache_misses", cache="domain_centroid") == 2
+    assert sink.counter("retrieval.cache_hits", cache="domain_centroid") == 4
+
+    # 写入后缓存随 _update_centroid 刷新，不需要重新解析
+    store.add_knowledge("rocketmq", "general", "Lag", "consumer lag growing", tags=["mq"])
+    collection = store._get_or_create_collection("rocketmq")
+    assert np.allclose(store._domain_centroid(collection), _chunk_embeddings(collection).mean(axis=0), atol=1e-5)
+    assert len(loads) == 2
+
+
+def _pruning_store(make_knowledge_store, monkeypatch, centroids, **config):
+    store = make_knowledge_store(**config)
+    monkeypatch.setattr(store, "_domain_centroid", lambda collection: centroids[collection.name])
+    collections = [(name, SimpleNamespace(name=name)) for name in centroids]
+    return store, collections
+
+
+def _vector(similarity):
+    # 与查询 [1, 0] 的余弦相似度为 similarity 的单位向量
+    return np.asarray([similarity, (1 - similarity ** 2) ** 0.5], dtype=np.float32)
+
+
+def test_pruning_keeps_min_domains_and_applies_cutoff(make_knowledge_store, monkeypatch) -> None:
+    centroids = {"a": _vector(0.9), "b": _vector(0.2), "c": _vector(0.1), "d": None}
+    store, collections = _pruning_store(
+        make_knowledge_store, monkeypatch, centroids,
+        domain_pruning_min_domains=1, domain_pruning_cutoff=0.3, domain_pruning_margin=1.0,
+    )
+
+    kept = [name for name, _ in store._prune_domains(collections, [1.0, 0.0])]
+    # 没有质心的领域始终保留
+    assert kept == ["a", "d"]
+    assert store.metrics.sink.counter("retrieval.domains_pruned") == 2
+
+    store.config.domain_pruning_min_domains = 2
+    assert [name for name, _ in store._prune_domains(collections, [1.0, 0.0])] == ["a", "b", "d"]
+
+
+def test_pruning_margin_relative_to_best_domain(make_knowledge_store, monkeypatch) -> None:
+    centroids = {"a": _vector(0.95), "b": _vector(0.85), "c": _vector(0.7)}
+    store, collections = _pruning_store(
+        make_knowledge_store, monkeypatch, centroids,
+        domain_pruning_min_domains=1, domain_pruning_cutoff=0.3, domain_pruning_margin=0.15,
+    )
+
+    assert [name for name, _ in store._prune_domains(collections, [1.0, 0.0])] == ["a", "b"]
+
+    store.config.domain_pruning_margin = 0.3
+    assert [name for name, _ in store._prune_domains(collections, [1.0, 0.0])] == ["a", "b", "c"]
+
+    store.config.domain_pruning = False
+    assert store._prune_domains(collections, [1.0, 0.0]) == collections
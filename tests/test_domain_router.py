@@ -0,0 +1,54 @@
+import json
+import os
+
+from nanobot.config.schema import Config
+from nanobot.knowledge.domain_router import AhoCorasick, DomainRouter
+from nanobot.knowledge.store_factory import build_domain_router
+
+
+def test_automaton_finds_overlapping_patterns() -> None:
+    automaton = AhoCorasick({"he": 1, "she": 2, "hers": 3, "消息队列": 4})
+    found = sorted((pos, pattern) for pos, pattern, _ in automaton.iter_matches("ushers 消息队列"))
+    assert found == [(3, "he"), (3, "she"), (5, "hers"), (10, "消息队列")]
+
+
+def test_routes_by_most_matches_and_defaults_to_general(tmp_path) -> None:
+    router = DomainRouter(tmp_path)
+    assert router.route("RocketMQ broker 的 topic 堆积怎么办").domain == "rocketmq"
+    assert router.route("kubectl get pod 报错").domain == "kubernetes"
+
+    decision = router.route("今天天气如何")
+    assert (decision.domain, decision.method) == ("general", "default")
+    assert decision.elapsed_ms >= 0
+
+
+def test_keyword_file_is_hot_reloaded(tmp_path) -> None:
+    keywords_file = tmp_path / "knowledge" / "domain_keywords.json"
+    keywords_file.parent.mkdir()
+    keywords_file.write_text(json.dumps({"redis": {"keywords": ["redis"], "synonyms": ["缓存"]}}))
+    router = DomainRouter(tmp_path)
+    assert router.route("缓存穿透").domain == "redis"
+
+    keywords_file.write_text(json.dumps({"mysql": ["慢查询", "binlog"], "redis": ["redis"]}))
+    stat = keywords_file.stat()
+    os.utime(keywords_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert router.route("慢查询分析").domain == "mysql"
+    assert router.route("缓存穿透").domain == "general"
+
+
+def test_embedding_fallback(tmp_path) -> None:
+    vectors = {"redis": [1.0, 0.0], "mysql": [0.0, 1.0], "key value store": [0.9, 0.1]}
+    router = DomainRouter(tmp_path, embed_fn=lambda texts: [vectors.get(t, [0.0, 0.0]) for t in texts])
+    keywords_file = tmp_path / "knowledge" / "domain_keywords.json"
+    keywords_file.parent.mkdir()
+    keywords_file.write_text(json.dumps({"redis": ["redis"], "mysql": ["mysql"]}))
+
+    decision = router.route("key value store")
+    assert (decision.domain, decision.method) == ("redis", "embedding")
+
+
+def test_build_domain_router_follows_fallback_flag(tmp_path) -> None:
+    config = Config()
+    assert build_domain_router(tmp_path, config).embed_fn is None
+    config.agents.defaults.knowledge_router_embedding_fallback = True
+    assert build_domain_router(tmp_path, config).embed_fn is not None
@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from nanobot.knowledge.embedding_batcher import EmbeddingBatcher
+
+
+class SlowEmbedder:
+    """Embedder whose cost is dominated by a fixed per-call overhead."""
+
+    def __init__(self, fail: bool = False) -> None:
+        self.batches: list[list[str]] = []
+        self.fail = fail
+
+    def embed_text(self, text: str) -> list[float]:
+        return [0.0, 0.0]
+
+    def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        time.sleep(0.02)
+        if self.fail:
+            raise RuntimeError("model exploded")
+        self.batches.append(list(texts))
+        return [[float(len(t)), float(i)] for i, t in enumerate(texts)]
+
+
+def test_concurrent_threads_share_batches() -> None:
+    embedder = SlowEmbedder()
+    batcher = EmbeddingBatcher(embedder, max_batch_size=16, max_wait_ms=20)
+    barrier = threading.Barrier(12)
+    results: dict[int, list[float]] = {}
+
+    def worker(i: int) -> None:
+        barrier.wait()
+        results[i] = batcher.embed_text("q" * (i + 1))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(12)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    batcher.close()
+
+    assert all(results[i][0] == i + 1 for i in range(12))
+    assert len(embedder.batches) < 12
+    assert batcher.stats()["requests"] == 12
+
+
+def test_identical_inflight_texts_are_computed_once() -> None:
+    embedder = SlowEmbedder()
+    batcher = EmbeddingBatcher(embedder, max_wait_ms=20)
+
+    futures = [batcher.submit("same query") for _ in range(5)]
+    vectors = [f.result() for f in futures]
+    batcher.close()
+
+    assert sum(batch.count("same query") for batch in embedder.batches) == 1
+    assert all(v == vectors[0] for v in vectors)
+    assert batcher.stats()["deduplicated"] == 4
+
+
+def test_async_callers_and_error_propagation() -> None:
+    batcher = EmbeddingBatcher(SlowEmbedder(), max_wait_ms=5)
+
+    async def run() -> list[list[float]]:
+        return await asyncio.gather(*(batcher.aembed_text(f"t{i}") for i in range(4)))
+
+    assert len(asyncio.run(run())) == 4
+    batcher.close()
+
+    failing = EmbeddingBatcher(SlowEmbedder(fail=True), max_wait_ms=0)
+    with pytest.raises(RuntimeError, match="exploded"):
+        failing.embed_text("boom")
+    failing.close()
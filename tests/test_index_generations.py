@@ -0,0 +1,116 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+
+
+def _titles(items):
+    return sorted(item.title for item in items)
+
+
+def _collection_names(store):
+    return sorted(c.name for c in store.chroma_client.list_collections())
+
+
+def test_build_swaps_live_pointer_after_success(make_knowledge_store) -> None:
+    store = make_knowledge_store()
+    store.add_knowledge("rocketmq", "general", "Old broker guide", "broker topic offsets", tags=["mq"])
+
+    with ThreadPoolExecutor(max_workers=1) as reader:
+        with store.build_generation("rocketmq") as staging:
+            assert staging.name == "knowledge_rocketmq__g1"
+            # 构建线程内的写入进入 staging 集合
+            store.add_knowledge("rocketmq", "general", "New broker guide", "broker topic offsets", tags=["mq"])
+            assert staging.count() == 1
+            # 构建期间其他线程仍读取旧的 live 集合
+            during = reader.submit(store.search_knowledge, "broker topic", domain="rocketmq").result()
+            assert _titles(during) == ["Old broker guide"]
+
+        after = reader.submit(store.search_knowledge, "broker topic", domain="rocketmq").result()
+    assert _titles(after) == ["New broker guide"]
+    chunks = store.get_item_chunks(after[0].id)
+    assert [(c["index"], c["text"]) for c in chunks] == [(0, "broker topic offsets")]
+
+    generations = json.loads(store.generations_file.read_text())
+    assert generations["live"] == {"rocketmq": "knowledge_rocketmq__g1"}
+    assert [entry["name"] for entry in generations["retired"]] == ["knowledge_rocketmq"]
+    # 宽限期内旧集合保留，给进行中的读请求留出时间
+    assert "knowledge_rocketmq" in _collection_names(store)
+
+
+def test_retired_generation_is_dropped_after_grace(make_knowledge_store) -> None:
+    store = make_knowledge_store()
+    store.retire_grace_seconds = 0
+    store.add_knowledge("rocketmq", "general", "Broker guide", "broker topic offsets", tags=["mq"])
+
+    for expected in ("knowledge_rocketmq__g1", "knowledge_rocketmq__g2"):
+        with store.build_generation("rocketmq") as staging:
+            assert staging.name == expected
+            store.add_knowledge("rocketmq", "general", "Broker guide", "broker topic offsets", tags=["mq"])
+
+    assert [n for n in _collection_names(store) if not n.startswith("doc")] == ["knowledge_rocketmq__g2"]
+    assert json.loads(store.generations_file.read_text())["retired"] == []
+
+
+def test_failed_build_keeps_live_collection(make_knowledge_store) -> None:
+    store = make_knowledge_store()
+    store.add_knowledge("rocketmq", "general", "Broker guide", "broker topic offsets", tags=["mq"])
+
+    with pytest.raises(RuntimeError):
+        with store.build_generation("rocketmq"):
+            store.add_knowledge("rocketmq", "general", "Half built", "broker topic offsets", tags=["mq"])
+            raise RuntimeError("embedding server went away")
+
+    assert "knowledge_rocketmq__g1" not in _collection_names(store)
+    assert store._live_collection_name("rocketmq") == "knowledge_rocketmq"
+    assert _titles(store.search_knowledge("broker topic", domain="rocketmq")) == ["Broker guide"]
+
+
+def test_restart_cleans_up_after_crash_mid_build(make_knowledge_store, tmp_path) -> None:
+    store = make_knowledge_store()
+    store.add_knowledge("rocketmq", "general", "Broker guide", "broker topic offsets", tags=["mq"])
+
+    # 进程在构建中途崩溃：staging 集合与过期的退役记录遗留在磁盘上
+    long_ago = (datetime.now() - timedelta(hours=2)).isoformat()
+    store.chroma_client.create_collection("knowledge_rocketmq__g3", metadata={"domain": "rocketmq", "created_at": long_ago})
+    store.chroma_client.create_collection("knowledge_redis__g1", metadata={"domain": "redis", "created_at": datetime.now().isoformat()})
+    store.chroma_client.create_collection("knowledge_mysql__g2", metadata={"domain": "mysql", "created_at": long_ago})
+    store.generations_file.write_text(json.dumps({
+        "live": {"mysql": "knowledge_mysql__g1"},
+        "retired": [{"name": "knowledge_mysql__g2", "retired_at": 0}],
+    }))
+    store.close()
+
+    restarted = make_knowledge_store(tmp_path)
+    names = _collection_names(restarted)
+    assert "knowledge_rocketmq__g3" not in names
+    assert "knowledge_mysql__g2" not in names
+    # 刚创建的 staging 集合可能属于另一个进程中正在进行的构建，保留
+    assert "knowledge_redis__g1" in names
+    assert _titles(restarted.search_knowledge("broker topic", domain="rocketmq")) == ["Broker guide"]
+    assert json.loads(restarted.generations_file.read_text())["retired"] == []
+
+
+def test_concurrent_writer_waits_for_build(make_knowledge_store) -> None:
+    store = make_knowledge_store()
+    store.add_knowledge("rocketmq", "general", "Broker guide", "broker topic offsets", tags=["mq"])
+    started = threading.Event()
+
+    def writer():
+        started.set()
+        store.add_knowledge("rocketmq", "general", "Written during build", "broker topic offsets", tags=["mq"])
+
+    with store.build_generation("rocketmq") as staging:
+        thread = threading.Thread(target=writer)
+        thread.start()
+        assert started.wait(5)
+        thread.join(0.2)
+        # 同领域写入者等待构建完成
+        assert thread.is_alive()
+        store.add_knowledge("rocketmq", "general", "Rebuilt guide", "broker topic offsets", tags=["mq"])
+    thread.join(5)
+
+    assert staging.name == store._live_collection_name("rocketmq")
+    assert _titles(store.search_knowledge("broker topic", domain="rocketmq")) == ["Rebuilt guide", "Written during build"]
@@ -0,0 +1,96 @@
+import threading
+
+import numpy as np
+import pytest
+
+from nanobot.knowledge.inference_service import (
+    InferenceClient,
+    InferenceServer,
+    InferenceServiceError,
+    connect_remote_embedder,
+    connect_remote_reranker,
+)
+from nanobot.knowledge.vector_embedder import VectorEmbedder
+
+
+class TinyEmbedder:
+    """Deterministic 4-dim embedder that records the batch sizes it sees."""
+
+    def __init__(self) -> None:
+        self.calls: list[int] = []
+
+    def encode(self, texts, convert_to_numpy=True):
+        self.calls.append(len(texts))
+        return np.array([[len(t), t.count("a"), 1.0, 0.0] for t in texts], dtype=np.float32)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return 4
+
+
+class TinyReranker:
+    def predict(self, pairs):
+        return np.array([float(len(doc)) for _, doc in pairs])
+
+
+@pytest.fixture
+def server(tmp_path):
+    srv = InferenceServer(
+        tmp_path / "inf.sock",
+        embedding_model="tiny",
+        embed_model=TinyEmbedder(),
+        rerank_model_path="tiny-rerank",
+        rerank_model=TinyReranker(),
+        max_wait_ms=50,
+    )
+    srv.start_in_thread()
+    yield srv
+    srv.stop_thread()
+
+
+def test_embed_and_rerank_roundtrip(server) -> None:
+    client = InferenceClient(server.socket_path)
+
+    vectors = client.embed(["aa", "b"])
+    assert vectors.shape == (2, 4)
+    assert vectors[0].tolist() == [2.0, 2.0, 1.0, 0.0]
+    assert client.rerank([("q", "abc"), ("q", "a")]) == [3.0, 1.0]
+    assert client.info()["dimension"] == 4
+
+
+def test_concurrent_requests_are_batched(server) -> None:
+    client = InferenceClient(server.socket_path)
+    barrier = threading.Barrier(8)
+
+    def worker(i: int) -> None:
+        barrier.wait()
+        client.embed([f"text {i}"])
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    stats = client.stats()["embed"]
+    assert stats["items"] == 8
+    assert stats["batches"] < 8
+    assert max(server.embed_model.calls) > 1
+
+
+def test_vector_embedder_client_mode(server) -> None:
+    embedder = VectorEmbedder("tiny", service_socket=str(server.socket_path))
+
+    assert embedder.remote
+    assert embedder.get_embedding_dimension() == 4
+    assert embedder.embed_text("aaa") == [3.0, 3.0, 1.0, 0.0]
+    assert embedder.embed_batch(["a", "", "bb"])[1] == [0.0] * 4
+
+
+def test_model_mismatch_and_unreachable_fall_back(server, tmp_path) -> None:
+    assert connect_remote_embedder(server.socket_path, "other-model") is None
+    assert connect_remote_embedder(tmp_path / "missing.sock", "tiny") is None
+    assert connect_remote_reranker(server.socket_path, "other-rerank") is None
+    assert connect_remote_reranker(server.socket_path, "tiny-rerank").model_path == "tiny-rerank"
+    assert connect_remote_reranker(tmp_path / "missing.sock", "tiny-rerank") is None
+    with pytest.raises(InferenceServiceError):
+        InferenceClient(tmp_path / "missing.sock").info()
@@ -0,0 +1,107 @@
+import threading
+import time
+
+import pytest
+
+from nanobot.knowledge.ingestion_queue import FAILED, QUEUED, RUNNING, SUCCEEDED, IngestionQueue
+
+
+class FakeStore:
+    """Records writes; ``gate`` holds the first add until released."""
+
+    def __init__(self, knowledge_dir) -> None:
+        self.knowledge_dir = knowledge_dir
+        self.added: list[str] = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self._n = 0
+
+    def new_item_id(self, domain: str) -> str:
+        self._n += 1
+        return f"{domain}_{self._n}"
+
+    def add_knowledge(self, progress_callback=None, **kwargs) -> str:
+        self.gate.wait(5)
+        if kwargs["title"] == "boom":
+            raise RuntimeError("embedding failed")
+        progress_callback("embedding", 0.5)
+        self.added.append(kwargs["title"])
+        return kwargs["item_id"]
+
+    def delete_knowledge(self, item_id: str) -> bool:
+        return False
+
+
+def _add(queue, title, job_priority=0):
+    return queue.submit(
+        "add", job_priority=job_priority,
+        domain="rocketmq", category="general", title=title, content="text", priority=1,
+    )
+
+
+def test_jobs_run_in_priority_order(tmp_path) -> None:
+    store = FakeStore(tmp_path)
+    store.gate.clear()
+    queue = IngestionQueue(store)
+
+    first = _add(queue, "first")
+    while queue.get(first.job_id).status != RUNNING:
+        time.sleep(0.01)
+    low = _add(queue, "low")
+    high = _add(queue, "high", job_priority=10)
+    assert first.item_id == "rocketmq_1" and first.status == QUEUED
+    store.gate.set()
+
+    for job in (first, low, high):
+        assert queue.wait(job.job_id, timeout=5).status == SUCCEEDED
+    queue.close()
+
+    assert store.added == ["first", "high", "low"]
+    assert queue.get(high.job_id).progress == 1.0
+
+
+def test_failures_are_reported(tmp_path) -> None:
+    queue = IngestionQueue(FakeStore(tmp_path))
+
+    failed = queue.wait(_add(queue, "boom").job_id, timeout=5)
+    missing = queue.wait(queue.submit("delete", item_id="rocketmq_9").job_id, timeout=5)
+    queue.close()
+
+    assert failed.status == FAILED and "embedding failed" in failed.error
+    assert missing.status == FAILED
+    assert queue.stats()[FAILED] == 2
+
+
+def test_queued_jobs_survive_restart(tmp_path) -> None:
+    store = FakeStore(tmp_path)
+    store.gate.clear()
+    queue = IngestionQueue(store)
+    _add(queue, "blocking")
+    pending = _add(queue, "pending")
+    assert queue.cancel(pending.job_id) is True
+    resumed = _add(queue, "resumed")
+
+    # 模拟进程重启：新队列从磁盘恢复（包括执行中被中断的任务）
+    restarted_store = FakeStore(tmp_path)
+    restarted = IngestionQueue(restarted_store)
+    assert restarted.wait(resumed.job_id, timeout=5).status == SUCCEEDED
+    restarted.close()
+    store.gate.set()
+    queue.close()
+
+    assert sorted(restarted_store.added) == ["blocking", "resumed"]
+    assert restarted.get(pending.job_id).status == "cancelled"
+
+
+def test_submit_rejects_unknown_or_missing_fields(tmp_path) -> None:
+    queue = IngestionQueue(FakeStore(tmp_path))
+
+    with pytest.raises(ValueError, match="progress_callback"):
+        queue.submit("add", domain="rocketmq", category="general", title="t", content="c", progress_callback=print)
+    with pytest.raises(ValueError, match="embeddings"):
+        queue.submit("update", item_id="rocketmq_1", embeddings=[[0.0]])
+    with pytest.raises(ValueError, match="item_id"):
+        queue.submit("delete")
+    with pytest.raises(ValueError, match="title"):
+        queue.submit("add", domain="rocketmq", category="general", content="c")
+    assert queue.stats()["queued"] == 0
@@ -0,0 +1,62 @@
+import json
+
+from nanobot.knowledge.intent_classifier import IntentClassifier, evaluate
+
+VOCAB = ["是什么", "区别", "查看", "查询", "报错", "超时"]
+
+
+def fake_embed(texts):
+    return [[1.0 if word in text else 0.0 for word in VOCAB] + [0.1] for text in texts]
+
+
+EXAMPLES = {
+    "A": ["NameServer 是什么", "RocketMQ 和 Kafka 的区别"],
+    "B": ["查看 broker 日志", "查询 pod 状态"],
+    "C": ["消费者报错", "发送超时"],
+}
+
+
+def test_classifies_by_nearest_examples(tmp_path):
+    classifier = IntentClassifier(fake_embed, workspace=tmp_path, examples=EXAMPLES, top_k=1)
+
+    prediction = classifier.classify("为什么一直报错")
+    assert prediction.label == "C"
+    assert prediction.confidence > 0.9
+    assert set(prediction.scores) == {"A", "B", "C"}
+
+    # 复用预先计算的查询向量
+    assert classifier.classify("ignored", query_vector=fake_embed(["查看日志"])[0]).label == "B"
+
+
+def test_workspace_examples_and_disagreement_log(tmp_path):
+    knowledge = tmp_path / "knowledge"
+    knowledge.mkdir()
+    (knowledge / "intent_examples.jsonl").write_text(
+        json.dumps({"text": "重启", "label": "B"}, ensure_ascii=False) + "\n", encoding="utf-8"
+    )
+
+    def vocab_embed(texts):
+        return [[1.0 if "重启" in t else 0.0] + v for t, v in zip(texts, fake_embed(texts))]
+
+    classifier = IntentClassifier(vocab_embed, workspace=tmp_path, examples=EXAMPLES, top_k=1)
+    assert classifier.classify("重启一下").label == "B"
+
+    prediction = classifier.classify("查看一下")
+    classifier.record_disagreement("查看一下", prediction, "B")
+    classifier.record_disagreement("查看一下", prediction, "C")
+    lines = (knowledge / "intent_disagreements.jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["label"] for line in lines] == ["C"]
+
+
+def test_evaluate_reports_accuracy_coverage_and_latency():
+    classifier = IntentClassifier(fake_embed, examples=EXAMPLES, top_k=1)
+    report = evaluate(
+        classifier,
+        [{"text": "这是什么", "label": "A"}, {"text": "查询一下", "label": "B"}, {"text": "查看报错", "label": "C"}],
+        threshold=0.9,
+    )
+
+    assert report["total"] == 3
+    assert report["confusion"]["A"]["A"] == 1
+    assert report["coverage"] < 1.0
+    assert report["latency_ms"]["p95"] >= report["latency_ms"]["p50"]
@@ -0,0 +1,83 @@
+import io
+import json
+import tarfile
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from nanobot.knowledge.rag_config import RAGConfig
+from nanobot.knowledge.snapshot import (
+    SnapshotError,
+    SnapshotMismatchError,
+    config_fingerprint,
+    create_snapshot,
+    restore_snapshot,
+)
+from nanobot.knowledge.text_chunker import TextChunker
+
+
+def _make_store(root: Path) -> SimpleNamespace:
+    knowledge_dir = root / "knowledge"
+    chroma_dir = knowledge_dir / "chroma_db"
+    (chroma_dir / "segment").mkdir(parents=True)
+    (chroma_dir / "chroma.sqlite3").write_bytes(b"sqlite-bytes")
+    (chroma_dir / "segment" / "data.bin").write_bytes(b"\x00\x01\x02")
+    (knowledge_dir / "init_status.json").write_text(json.dumps({"rocketmq": {"initialized_at": "now"}}))
+    (knowledge_dir / "broker.md").write_text("# Broker\ncontent")
+    config = RAGConfig(embedding_model="tiny", chunk_size=200, chunk_overlap=20)
+    return SimpleNamespace(
+        knowledge_dir=knowledge_dir,
+        chroma_dir=chroma_dir,
+        config=config,
+        embedder=SimpleNamespace(get_embedding_dimension=lambda: 4),
+        chunker=TextChunker(chunk_size=200, chunk_overlap=20),
+        domain_chunk_counts=lambda: {},
+    )
+
+
+def test_snapshot_roundtrip(tmp_path) -> None:
+    store = _make_store(tmp_path / "src")
+    archive = tmp_path / "kb.tar.gz"
+    create_snapshot(store, archive)
+
+    target = tmp_path / "dst" / "knowledge"
+    target.mkdir(parents=True)
+    (target / "broker.md").write_text("# Broker\ncontent")
+    restore_snapshot(archive, target, config_fingerprint(store.config, target, 4))
+
+    assert (target / "chroma_db" / "segment" / "data.bin").read_bytes() == b"\x00\x01\x02"
+    assert json.loads((target / "init_status.json").read_text())["rocketmq"]["initialized_at"] == "now"
+
+
+def test_mismatched_model_or_corpus_is_refused(tmp_path) -> None:
+    store = _make_store(tmp_path / "src")
+    archive = tmp_path / "kb.tar.gz"
+    create_snapshot(store, archive)
+    target = tmp_path / "dst" / "knowledge"
+    target.mkdir(parents=True)
+
+    other_model = RAGConfig(embedding_model="other", chunk_size=200, chunk_overlap=20)
+    with pytest.raises(SnapshotMismatchError) as exc:
+        restore_snapshot(archive, target, config_fingerprint(other_model, target, 4))
+    assert {"embedding_model", "corpus_sha256"} <= set(exc.value.mismatches)
+    assert not (target / "chroma_db").exists()
+
+
+def test_corrupted_archive_is_refused(tmp_path) -> None:
+    store = _make_store(tmp_path / "src")
+    archive = tmp_path / "kb.tar.gz"
+    create_snapshot(store, archive)
+
+    tampered = tmp_path / "tampered.tar.gz"
+    with tarfile.open(archive, "r:gz") as src, tarfile.open(tampered, "w:gz") as dst:
+        for member in src.getmembers():
+            data = src.extractfile(member).read()
+            if member.name.endswith("data.bin"):
+                data = b"evil"
+                member.size = len(data)
+            dst.addfile(member, io.BytesIO(data))
+
+    with pytest.raises(SnapshotError, match="校验失败"):
+        restore_snapshot(tampered, store.knowledge_dir, config_fingerprint(store.config, store.knowledge_dir, 4))
+    assert (store.chroma_dir / "segment" / "data.bin").read_bytes() == b"\x00\x01\x02"
@@ -0,0 +1,73 @@
+from nanobot.knowledge.store import ChromaKnowledgeStore
+
+PARAGRAPHS = [
+    f"Paragraph {i} explains how the broker handles topic {i} and consumer group {i} offsets." for i in range(5)
+]
+
+
+def _chunks(store, item_id):
+    _, collection = store._locate_item(item_id)
+    result = collection.get(where={"item_id": item_id}, include=["documents", "metadatas"])
+    return dict(zip(result["ids"], result["documents"])), result["metadatas"]
+
+
+def test_chunk_hash_depends_only_on_text() -> None:
+    assert ChromaKnowledgeStore._chunk_hash("broker") == ChromaKnowledgeStore._chunk_hash("broker")
+    assert ChromaKnowledgeStore._chunk_hash("broker") != ChromaKnowledgeStore._chunk_hash("broker ")
+
+
+def test_locate_item_finds_domain_and_collection(make_knowledge_store) -> None:
+    store = make_knowledge_store()
+    item_id = store.add_knowledge("rocketmq", "general", "Broker guide", "\n\n".join(PARAGRAPHS), tags=["mq"])
+    # 条目 ID 不带领域前缀时遍历所有集合查找
+    other_id = store.add_knowledge("kubernetes", "general", "Pods", "pod pending events", tags=["k8s"], item_id="custom-id")
+
+    domain, collection = store._locate_item(item_id)
+    assert domain == "rocketmq" and collection.name == "knowledge_rocketmq"
+    assert store._locate_item(other_id)[0] == "kubernetes"
+    assert store._locate_item("rocketmq_missing") == (None, None)
+
+
+def test_metadata_only_update_embeds_nothing(make_knowledge_store) -> None:
+    store = make_knowledge_store()
+    item_id = store.add_knowledge("rocketmq", "general", "Broker guide", "\n\n".join(PARAGRAPHS), tags=["mq"])
+    store.embedder.embedded.clear()
+
+    assert store.update_knowledge(item_id, title="Broker handbook", tags=["broker"])
+    assert store.embedder.embedded == []
+    _, metadatas = _chunks(store, item_id)
+    assert len(metadatas) == 5
+    assert all(meta["title"] == "Broker handbook" for meta in metadatas)
+
+
+def test_paragraph_edit_reembeds_only_the_changed_chunk(make_knowledge_store) -> None:
+    store = make_knowledge_store()
+    item_id = store.add_knowledge("rocketmq", "general", "Broker guide", "\n\n".join(PARAGRAPHS), tags=["mq"])
+    store.embedder.embedded.clear()
+
+    edited = list(PARAGRAPHS)
+    edited[2] = edited[2].replace("topic 2", "queue 2")
+    assert store.update_knowledge(item_id, content="\n\n".join(edited))
+
+    assert store.embedder.embedded == [edited[2]]
+    documents, _ = _chunks(store, item_id)
+    assert documents[f"{item_id}_chunk_2"] == edited[2]
+    sink = store.metrics.sink
+    assert sink.counter("retrieval.cache_hits", cache="chunk_embedding") == 4
+    assert sink.counter("retrieval.cache_misses", cache="chunk_embedding") == 1
+
+
+def test_deleted_paragraph_removes_stale_chunks(make_knowledge_store) -> None:
+    store = make_knowledge_store()
+    item_id = store.add_knowledge("rocketmq", "general", "Broker guide", "\n\n".join(PARAGRAPHS), tags=["mq"])
+    store.embedder.embedded.clear()
+
+    remaining = PARAGRAPHS[:2] + PARAGRAPHS[3:]
+    assert store.update_knowledge(item_id, content="\n\n".join(remaining))
+
+    # 后移的段落复用已有向量
+    assert store.embedder.embedded == []
+    documents, metadatas = _chunks(store, item_id)
+    assert sorted(documents) == [f"{item_id}_chunk_{i}" for i in range(4)]
+    assert [documents[f"{item_id}_chunk_{i}"] for i in range(4)] == remaining
+    assert all(meta["total_chunks"] == 4 for meta in metadatas)
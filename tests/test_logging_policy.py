@@ -0,0 +1,59 @@
+from loguru import logger
+
+from nanobot.utils.logging_policy import (
+    LogPolicy,
+    configure_logging_policy,
+    format_payload,
+    get_logger,
+)
+
+
+def _capture() -> tuple[list[str], int]:
+    records: list[str] = []
+    handler_id = logger.add(lambda m: records.append(m.record["message"]), level="TRACE")
+    return records, handler_id
+
+
+def test_subsystem_level_uses_longest_dotted_prefix() -> None:
+    policy = LogPolicy(default_level="WARNING", levels={"knowledge": "DEBUG", "knowledge.chunker": "ERROR"})
+
+    assert policy.level_for("knowledge.store") == 10
+    assert policy.level_for("knowledge.chunker") == 40
+    assert policy.level_for("llm") == 30
+
+
+def test_payload_is_lazy_when_level_disabled() -> None:
+    configure_logging_policy(LogPolicy(default_level="INFO"))
+    records, handler_id = _capture()
+    calls: list[int] = []
+    try:
+        emitted = get_logger("llm").payload("[LLM] 入参:", lambda: calls.append(1) or {"a": 1})
+    finally:
+        logger.remove(handler_id)
+        configure_logging_policy()
+
+    assert emitted is False
+    assert calls == []
+    assert records == []
+
+
+def test_payload_is_capped_and_sampled() -> None:
+    configure_logging_policy(LogPolicy(default_level="DEBUG", max_payload_chars=50))
+    records, handler_id = _capture()
+    try:
+        get_logger("loop").payload("[LOOP] out:", {"text": "x" * 10_000})
+        configure_logging_policy(LogPolicy(default_level="DEBUG", payload_sample_rate=0.0))
+        assert get_logger("loop").payload("[LOOP] out:", "dropped") is False
+    finally:
+        logger.remove(handler_id)
+        configure_logging_policy()
+
+    assert len(records) == 1
+    assert records[0].startswith("[LOOP] out: {")
+    assert records[0].endswith("...[truncated]")
+    assert len(records[0]) < 100
+
+
+def test_format_payload_truncates_strings() -> None:
+    assert format_payload("abc", 0) == "abc"
+    assert format_payload("abcdef", 3) == "abc...[truncated 3 chars]"
@@ -0,0 +1,66 @@
+PARAGRAPHS = [f"Step {i}: check broker {i} logs and restart consumer group {i} carefully." for i in range(6)]
+
+
+def _hit(item_id, index, total=len(PARAGRAPHS), domain="rocketmq"):
+    return {
+        "domain": domain,
+        "metadata": {"item_id": item_id, "chunk_index": index, "total_chunks": total},
+    }
+
+
+def _store_with_guide(make_knowledge_store):
+    store = make_knowledge_store()
+    item_id = store.add_knowledge("rocketmq", "general", "Runbook", "\n\n".join(PARAGRAPHS), tags=["mq"])
+    collections = [("rocketmq", store._get_or_create_collection("rocketmq"))]
+    return store, item_id, collections
+
+
+def test_stitch_removes_chunk_overlap(make_knowledge_store) -> None:
+    store = make_knowledge_store(chunk_overlap=10)
+    assert store._stitch_chunks(["alpha beta gamma", "gamma delta"]) == "alpha beta gamma delta"
+    # 没有重叠时以空格拼接
+    assert store._stitch_chunks(["alpha", "beta"]) == "alpha beta"
+    # 重叠超过 chunk_overlap 时不去重
+    assert store._stitch_chunks(["one two three four", "two three four five"]) == "one two three four two three four five"
+    assert store._stitch_chunks(["only"]) == "only"
+
+
+def test_expansion_is_clipped_at_document_boundaries(make_knowledge_store) -> None:
+    store, item_id, collections = _store_with_guide(make_knowledge_store)
+
+    passages = store._expand_neighbors([_hit(item_id, 0)], collections, 1)
+    assert passages[item_id] == " ".join(PARAGRAPHS[:2])
+
+    passages = store._expand_neighbors([_hit(item_id, 5)], collections, 2)
+    assert passages[item_id] == " ".join(PARAGRAPHS[3:])
+
+
+def test_overlapping_windows_are_merged(make_knowledge_store) -> None:
+    store, item_id, collections = _store_with_guide(make_knowledge_store)
+
+    passages = store._expand_neighbors([_hit(item_id, 1), _hit(item_id, 3)], collections, 1)
+    assert passages[item_id] == " ".join(PARAGRAPHS[0:5])
+    assert store.metrics.sink.histogram("retrieval.candidates", stage="neighbor_expansion")["max"] == 5
+
+
+def test_disjoint_windows_are_separated(make_knowledge_store) -> None:
+    store, item_id, collections = _store_with_guide(make_knowledge_store)
+
+    passages = store._expand_neighbors([_hit(item_id, 0), _hit(item_id, 5)], collections, 1)
+    assert passages[item_id] == " ".join(PARAGRAPHS[0:2]) + "\n\n…\n\n" + " ".join(PARAGRAPHS[4:6])
+
+
+def test_unknown_domain_is_skipped(make_knowledge_store) -> None:
+    store, item_id, collections = _store_with_guide(make_knowledge_store)
+    assert store._expand_neighbors([_hit(item_id, 2, domain="redis")], collections, 1) == {}
+
+
+def test_search_expands_neighbors_only_when_requested(make_knowledge_store) -> None:
+    store, item_id, _ = _store_with_guide(make_knowledge_store)
+    assert store.config.neighbor_chunks == 0
+
+    hit = store.search_knowledge("broker 3 logs consumer group 3", domain="rocketmq", top_k=1)[0]
+    assert hit.content == PARAGRAPHS[3]
+
+    expanded = store.search_knowledge("broker 3 logs consumer group 3", domain="rocketmq", top_k=1, expand_neighbors=1)[0]
+    assert expanded.content == " ".join(PARAGRAPHS[2:5])
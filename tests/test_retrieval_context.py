@@ -0,0 +1,71 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from nanobot.knowledge.metrics import InMemoryMetricsSink, RetrievalMetrics
+from nanobot.knowledge.retrieval_context import RetrievalContext
+
+
+class CountingEmbedder:
+    def __init__(self, scale: float = 1.0):
+        self.scale = scale
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def embed_text(self, text):
+        with self._lock:
+            self.calls += 1
+        time.sleep(0.05)
+        return [self.scale * len(text), self.scale]
+
+
+def test_query_is_embedded_once_per_model_across_threads():
+    embedder = CountingEmbedder()
+    context = RetrievalContext("broker 启动失败")
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        vectors = list(pool.map(lambda _: context.query_vector(embedder, "bge-small"), range(4)))
+
+    assert embedder.calls == 1
+    assert all(v == vectors[0] for v in vectors)
+    assert context.stats() == {"models": ["bge-small"], "computed": 1, "reused": 3}
+
+
+def test_different_models_get_their_own_vectors():
+    small, large = CountingEmbedder(1.0), CountingEmbedder(2.0)
+    context = RetrievalContext("pod pending")
+
+    assert context.query_vector(small, "small") == [11.0, 1.0]
+    assert context.query_vector(large, "large") == [22.0, 2.0]
+    assert context.query_vector(small, "small") == [11.0, 1.0]
+    assert (small.calls, large.calls) == (1, 1)
+
+
+def test_query_embedding_cache_hits_are_recorded():
+    sink = InMemoryMetricsSink()
+    metrics = RetrievalMetrics(sink)
+    context = RetrievalContext("consumer lag")
+
+    for _ in range(3):
+        context.query_vector(CountingEmbedder(), "bge-small", metrics)
+
+    assert sink.counter("retrieval.cache_misses", cache="query_embedding") == 1
+    assert sink.counter("retrieval.cache_hits", cache="query_embedding") == 2
+    # 首次计算计入 query_embedding 阶段；复用只计数
+    assert sink.histogram("retrieval.stage_ms", stage="query_embedding")["count"] == 1
+    assert sink.counter("retrieval.query_embedding_reused") == 2
+
+
+def test_passing_a_vector_does_not_count_as_reuse(make_knowledge_store):
+    store = make_knowledge_store()
+    store.add_knowledge("rocketmq", "general", "Disk", "broker disk full", tags=["mq"])
+    context = RetrievalContext("broker disk")
+
+    vector = store.embed_query("broker disk", context)
+    assert store.search_knowledge("broker disk", domain="rocketmq", query_vector=vector)
+
+    sink = store.metrics.sink
+    assert sink.histogram("retrieval.stage_ms", stage="query_embedding")["count"] == 1
+    assert sink.counter("retrieval.query_embedding_reused") == 0
+    store.embed_query("broker disk", context)
+    assert sink.counter("retrieval.query_embedding_reused") == 1
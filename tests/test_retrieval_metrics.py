@@ -0,0 +1,56 @@
+from nanobot.knowledge.metrics import (
+    Histogram,
+    InMemoryMetricsSink,
+    NullMetricsSink,
+    RetrievalMetrics,
+)
+
+
+def test_histogram_quantiles_use_bucket_upper_bounds() -> None:
+    hist = Histogram((1, 10, 100))
+    for value in (0.5, 0.5, 5, 50):
+        hist.observe(value)
+
+    data = hist.to_dict()
+    assert data["count"] == 4
+    assert data["min"] == 0.5
+    assert data["max"] == 50
+    assert hist.quantile(0.5) == 1
+    assert hist.quantile(0.99) == 50
+
+
+def test_stage_timer_records_labelled_histogram() -> None:
+    sink = InMemoryMetricsSink()
+    metrics = RetrievalMetrics(sink)
+
+    with metrics.stage("collection_query", domain="rocketmq"):
+        pass
+    metrics.record_candidates("merge", 7)
+
+    stage = sink.histogram("retrieval.stage_ms", stage="collection_query", domain="rocketmq")
+    assert stage is not None and stage["count"] == 1
+    assert sink.histogram("retrieval.candidates", stage="merge")["max"] == 7
+    assert "collection_query" in metrics.stage_summary()
+
+
+def test_cache_counters_and_snapshot() -> None:
+    sink = InMemoryMetricsSink()
+    metrics = RetrievalMetrics(sink)
+
+    metrics.record_cache("query_embedding", hit=True)
+    metrics.record_cache("query_embedding", hit=True)
+    metrics.record_cache("query_embedding", hit=False)
+
+    assert sink.counter("retrieval.cache_hits", cache="query_embedding") == 2
+    assert sink.counter("retrieval.cache_misses", cache="query_embedding") == 1
+    assert "retrieval.cache_hits{cache=query_embedding}" in metrics.snapshot()["counters"]
+
+    sink.reset()
+    assert metrics.snapshot() == {"histograms": {}, "counters": {}}
+
+
+def test_null_sink_discards_everything() -> None:
+    metrics = RetrievalMetrics(NullMetricsSink())
+    with metrics.stage("rerank"):
+        pass
+    assert metrics.stage_summary() == {}
@@ -0,0 +1,61 @@
+import time
+
+from nanobot.agent.skills import SkillsLoader
+from nanobot.knowledge import intent_routing_store as routing
+from nanobot.knowledge.skills_watcher import SkillsIndexWatcher
+
+
+class FakeEmbedder:
+    def __init__(self, model_name="", inference_socket=None):
+        self.embedded: list[str] = []
+
+    def embed_batch(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(t)), 1.0, 0.5] for t in texts]
+
+
+def _write_skill(root, name, body):
+    skill_dir = root / "skills" / name
+    skill_dir.mkdir(parents=True, exist_ok=True)
+    (skill_dir / "SKILL.md").write_text(f"---\nname: {name}\n---\n{body}\n", encoding="utf-8")
+
+
+def test_skills_index_reembeds_only_changed_skills(tmp_path, monkeypatch):
+    monkeypatch.setattr(routing, "VectorEmbedder", FakeEmbedder)
+    _write_skill(tmp_path, "restart-broker", "Restart the broker safely.")
+    _write_skill(tmp_path, "drain-node", "Cordon and drain a node.")
+    loader = SkillsLoader(tmp_path, builtin_skills_dir=tmp_path / "none")
+
+    store = routing.IntentRoutingStore(tmp_path, None)
+    try:
+        assert store.init_skills_index(loader) == 2
+        store.embedder.embedded.clear()
+        assert store.init_skills_index(loader) == 2
+        assert store.embedder.embedded == []
+
+        _write_skill(tmp_path, "drain-node", "Cordon, drain and uncordon a node.")
+        (tmp_path / "skills" / "restart-broker" / "SKILL.md").unlink()
+        assert store.init_skills_index(loader) == 1
+        assert store.embedder.embedded == ["Cordon, drain and uncordon a node."]
+
+        collection = store.skills_client.get_collection(routing.SKILLS_COLLECTION)
+        assert collection.get()["ids"] == ["skill::drain-node::0"]
+    finally:
+        store.close()
+
+
+def test_polling_watcher_refreshes_on_skill_edit(tmp_path):
+    _write_skill(tmp_path, "restart-broker", "v1")
+    loader = SkillsLoader(tmp_path, builtin_skills_dir=tmp_path / "none")
+    calls = []
+    watcher = SkillsIndexWatcher(loader, lambda: calls.append(1), poll_interval=0.05)
+    watcher.start()
+    try:
+        assert watcher.mode == "poll"  # builtin 目录不存在，回退为轮询
+        _write_skill(tmp_path, "restart-broker", "v2 with more text")
+        deadline = time.time() + 3
+        while not calls and time.time() < deadline:
+            time.sleep(0.05)
+        assert calls
+    finally:
+        watcher.stop()
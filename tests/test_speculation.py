@@ -0,0 +1,67 @@
+import asyncio
+import threading
+
+from nanobot.web.speculation import SpeculativeRetrieval, run_branch
+
+
+def test_speculation_keeps_branches_of_resolved_intent() -> None:
+    calls: list[str] = []
+    release = threading.Event()
+
+    def branch(name: str):
+        def run():
+            calls.append(name)
+            release.wait(5)
+            return [name]
+        return run
+
+    async def scenario():
+        speculation = SpeculativeRetrieval(
+            {name: branch(name) for name in ("knowledge", "tools", "skills")}, min_probability=0.2
+        )
+        # A 概率过低，不预检索知识库
+        started = speculation.start({"A": 0.05, "B": 0.6, "C": 0.35})
+        assert started == ["tools", "skills"]
+        await asyncio.sleep(0.05)
+        release.set()
+
+        assert speculation.resolve("C") == ["tools"]
+        skills = await run_branch(speculation, "skills", lambda: ["fresh"])
+        # 未预检索的分支回退为直接检索
+        knowledge = await run_branch(speculation, "knowledge", lambda: ["fresh"])
+        speculation.cancel_all()
+        return skills, knowledge
+
+    skills, knowledge = asyncio.run(scenario())
+    assert skills == ["skills"]
+    assert knowledge == ["fresh"]
+    assert "knowledge" not in calls
+
+
+def test_run_branch_falls_back_when_speculation_fails() -> None:
+    def broken():
+        raise RuntimeError("index unavailable")
+
+    async def scenario():
+        speculation = SpeculativeRetrieval({"knowledge": broken})
+        assert speculation.start({"A": 0.9}) == ["knowledge"]
+        speculation.resolve("A")
+        return await run_branch(speculation, "knowledge", lambda query: [query], "retry")
+
+    assert asyncio.run(scenario()) == ["retry"]
+
+
+def test_without_local_probabilities_only_cheap_branches_start() -> None:
+    calls: list[str] = []
+
+    async def scenario():
+        speculation = SpeculativeRetrieval(
+            {name: (lambda n=name: calls.append(n)) for name in ("knowledge", "tools", "skills")}
+        )
+        started = speculation.start(None)
+        await asyncio.sleep(0.05)
+        speculation.cancel_all()
+        return started
+
+    assert asyncio.run(scenario()) == ["tools", "skills"]
+    assert sorted(calls) == ["skills", "tools"]
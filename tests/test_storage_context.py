@@ -0,0 +1,63 @@
+import pytest
+
+from nanobot.knowledge.storage import StorageContext
+
+
+def test_owners_of_one_root_share_a_client(tmp_path):
+    ctx = StorageContext()
+    first = ctx.acquire(tmp_path / "db", "knowledge")
+    second = ctx.acquire(tmp_path / "db", "routing")
+    other = ctx.acquire(tmp_path / "other", "knowledge")
+
+    assert first is second
+    assert other is not first
+    assert ctx.client(tmp_path / "db") is first
+    assert ctx.stats()[str((tmp_path / "db").resolve())] == {"knowledge": 1, "routing": 1}
+    ctx.shutdown()
+
+
+def test_last_release_closes_the_client(tmp_path):
+    ctx = StorageContext()
+    client = ctx.acquire(tmp_path, "knowledge")
+    client.get_or_create_collection("docs").add(ids=["a"], embeddings=[[0.1, 0.2]])
+    ctx.acquire(tmp_path, "routing")
+
+    ctx.release(tmp_path, "knowledge")
+    assert ctx.is_open(tmp_path)
+    assert ctx.client(tmp_path).get_collection("docs").count() == 1
+
+    ctx.release(tmp_path, "routing")
+    assert not ctx.is_open(tmp_path)
+    with pytest.raises(RuntimeError):
+        ctx.client(tmp_path)
+
+    # 重新打开后数据仍在
+    assert ctx.acquire(tmp_path, "knowledge").get_collection("docs").count() == 1
+    ctx.shutdown()
+
+
+def test_shutdown_refuses_new_owners(tmp_path):
+    ctx = StorageContext()
+    ctx.acquire(tmp_path, "knowledge")
+    ctx.shutdown()
+
+    assert not ctx.is_open(tmp_path)
+    with pytest.raises(RuntimeError):
+        ctx.acquire(tmp_path, "knowledge")
+
+
+def test_reopen_is_refused_while_an_owner_uses_the_client(tmp_path):
+    ctx = StorageContext()
+    ctx.acquire(tmp_path, "knowledge")
+    ctx.acquire(tmp_path, "snapshot")
+
+    with ctx.using(tmp_path) as client:
+        client.get_or_create_collection("docs").add(ids=["a"], embeddings=[[0.1, 0.2]])
+        assert not ctx.reopen(tmp_path)
+        assert ctx.client(tmp_path) is client
+
+    assert ctx.reopen(tmp_path)
+    with ctx.using(tmp_path) as reopened:
+        assert reopened is not client
+        assert reopened.get_collection("docs").count() == 1
+    ctx.shutdown()
@@ -0,0 +1,102 @@
+from typing import Any
+
+from nanobot.agent.loop import AgentLoop
+from nanobot.agent.tools.base import Tool
+from nanobot.agent.tools.exposure import ToolExposure
+from nanobot.agent.tools.registry import ToolRegistry
+from nanobot.bus.queue import MessageBus
+from nanobot.config.schema import MCPConfig, MCPConnectionConfig
+from nanobot.providers.base import LLMProvider, LLMResponse
+
+
+class NamedTool(Tool):
+    def __init__(self, name: str):
+        self._name = name
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def description(self) -> str:
+        return f"{self._name} tool"
+
+    @property
+    def parameters(self) -> dict[str, Any]:
+        return {"type": "object", "properties": {}}
+
+    async def execute(self, **kwargs: Any) -> str:
+        return self._name
+
+
+def _registry(*names: str) -> ToolRegistry:
+    registry = ToolRegistry()
+    for name in names:
+        registry.register(NamedTool(name))
+    return registry
+
+
+def _names(definitions):
+    return [d["function"]["name"] for d in definitions]
+
+
+def test_exposes_pinned_retrieved_and_called_tools():
+    registry = _registry("exec", "knowledge_search", "use_mcp_tool", "cron", "web_fetch")
+    hits = [
+        {"id": "mcp::ops::restart", "metadata": {"source": "mcp_tool", "tool_name": "restart"}},
+        {"id": "tool::web_fetch", "metadata": {"source": "registry_tool", "tool_name": "web_fetch"}},
+        {"id": "tool::gone", "metadata": {"source": "registry_tool", "tool_name": "gone"}},
+    ]
+    exposure = ToolExposure(registry, lambda query, limit: hits, top_n=3, pinned=["exec"])
+
+    retrieved = exposure.retrieve("restart the broker")
+    assert retrieved == {"use_mcp_tool", "web_fetch"}
+    assert _names(exposure.definitions(retrieved)) == ["exec", "use_mcp_tool", "web_fetch"]
+    assert _names(exposure.definitions(retrieved, called={"cron"})) == ["exec", "use_mcp_tool", "cron", "web_fetch"]
+
+
+def test_falls_back_to_all_tools_without_usable_hits():
+    registry = _registry("exec", "cron")
+
+    def failing(query, limit):
+        raise RuntimeError("index not built")
+
+    assert ToolExposure(registry, failing, pinned=["exec"]).retrieve("hi") is None
+    empty = ToolExposure(registry, lambda query, limit: [], pinned=["exec"])
+    assert _names(empty.definitions(empty.retrieve("hi"))) == ["exec", "cron"]
+
+
+class SilentProvider(LLMProvider):
+    async def chat(self, messages, tools=None, model=None, **kwargs) -> LLMResponse:
+        return LLMResponse(content="ok")
+
+    def get_default_model(self) -> str:
+        return "fake"
+
+
+def _loop(tmp_path, **options) -> AgentLoop:
+    return AgentLoop(bus=MessageBus(), provider=SilentProvider(), workspace=tmp_path, **options)
+
+
+def test_loop_uses_exposure_options_from_constructor(tmp_path):
+    hits = [{"id": "tool::knowledge_search", "metadata": {"source": "registry_tool", "tool_name": "knowledge_search"}}]
+    loop = _loop(tmp_path, tool_exposure="dynamic", pinned_tools=["exec"], tool_search_fn=lambda query, limit: hits)
+
+    retrieved = loop._get_tool_exposure().retrieve("search the knowledge base")
+    assert _names(loop._tool_definitions(retrieved, set())) == ["exec", "knowledge_search"]
+    assert _loop(tmp_path)._get_tool_exposure() is None
+
+
+def test_loop_keeps_mcp_proxy_exposed_when_a_server_is_enabled(tmp_path):
+    servers = {"ops": MCPConnectionConfig(server_name="ops", enabled=True)}
+    loop = _loop(
+        tmp_path, tool_exposure="dynamic", pinned_tools=["exec"],
+        tool_search_fn=lambda query, limit: [], mcp_config=MCPConfig(servers=servers),
+    )
+
+    exposure = loop._get_tool_exposure()
+    assert "use_mcp_tool" in _names(exposure.definitions(set()))
+
+    servers["ops"].enabled = False
+    loop = _loop(tmp_path, tool_exposure="dynamic", pinned_tools=["exec"], mcp_config=MCPConfig(servers=servers))
+    assert _names(loop._get_tool_exposure().definitions(set())) == ["exec"]
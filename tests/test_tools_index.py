@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+from nanobot.knowledge import intent_routing_store as routing
+
+
+class FakeEmbedder:
+    def __init__(self, model_name="", inference_socket=None):
+        self.embedded: list[str] = []
+
+    def embed_batch(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(t)), 1.0, 0.5] for t in texts]
+
+    def embed_text(self, text):
+        return self.embed_batch([text])[0]
+
+
+def _schema(name, description):
+    return {"type": "function", "function": {"name": name, "description": description, "parameters": {}}}
+
+
+def test_refresh_embeds_only_added_or_changed_tools(tmp_path, monkeypatch):
+    monkeypatch.setattr(routing, "VectorEmbedder", FakeEmbedder)
+    server_tools = {"ops": [{"name": "restart", "description": "Restart a pod", "inputSchema": {"type": "object"}}]}
+
+    async def fetch(base_url, auth_token="", timeout=10):
+        return server_tools["ops"]
+
+    monkeypatch.setattr(routing, "_fetch_mcp_tools_from_server_async", fetch)
+    servers = {"ops": {"enabled": True, "server_url": "http://ops"}}
+
+    store = routing.IntentRoutingStore(tmp_path, None)
+    try:
+        assert store.init_tools_index([_schema("exec", "Run"), _schema("read_file", "Read")], servers) == 3
+        assert len(store.embedder.embedded) == 3
+
+        store.embedder.embedded.clear()
+        assert store.init_tools_index([_schema("exec", "Run"), _schema("read_file", "Read")], servers) == 3
+        assert store.embedder.embedded == []
+
+        server_tools["ops"] = [{"name": "restart", "description": "Restart a pod", "inputSchema": {"type": "array"}}]
+        store.init_tools_index([_schema("exec", "Run shell commands")], servers)
+        assert len(store.embedder.embedded) == 2
+
+        collection = store.tools_client.get_collection(routing.TOOLS_COLLECTION)
+        assert sorted(collection.get()["ids"]) == ["mcp::ops::restart", "tool::exec"]
+    finally:
+        store.close()
+
+
+def test_unreachable_server_keeps_indexed_tools(tmp_path, monkeypatch):
+    monkeypatch.setattr(routing, "VectorEmbedder", FakeEmbedder)
+    server_tools = [{"name": "restart", "description": "Restart a pod"}]
+
+    async def fetch(base_url, auth_token="", timeout=10):
+        if not server_tools:
+            raise ConnectionError("refused")
+        return server_tools
+
+    monkeypatch.setattr(routing, "_fetch_mcp_tools_from_server_async", fetch)
+    servers = {"ops": {"enabled": True, "server_url": "http://ops"}}
+
+    store = routing.IntentRoutingStore(tmp_path, None)
+    try:
+        store.init_tools_index([], servers)
+        server_tools = []
+        store.embedder.embedded.clear()
+        store.init_tools_index([], servers)
+
+        collection = store.tools_client.get_collection(routing.TOOLS_COLLECTION)
+        assert collection.get()["ids"] == ["mcp::ops::restart"]
+        assert store.embedder.embedded == []
+    finally:
+        store.close()
+
+
+def test_discovery_runs_servers_concurrently_with_own_deadlines(monkeypatch):
+    async def fetch(base_url, auth_token="", timeout=10):
+        async with asyncio.timeout(timeout):
+            await asyncio.sleep(5 if base_url == "http://dead" else 0.3)
+        return [{"name": f"tool_{base_url[7:]}"}]
+
+    monkeypatch.setattr(routing, "_fetch_mcp_tools_from_server_async", fetch)
+    servers = {
+        "a": {"enabled": True, "server_url": "http://a"},
+        "b": {"enabled": True, "server_url": "http://b"},
+        "dead": {"enabled": True, "server_url": "http://dead", "discovery_timeout": 0.5},
+        "off": {"enabled": False, "server_url": "http://off"},
+    }
+
+    start = time.perf_counter()
+    results = asyncio.run(routing.discover_mcp_tools(servers))
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 1.0
+    assert {name: r.status for name, r in results.items()} == {"a": "ok", "b": "ok", "dead": "timeout"}
+    assert results["a"].tools == [{"name": "tool_a"}]
@@ -0,0 +1,120 @@
+import threading
+
+from nanobot.knowledge.store import DOC_INDEX_PREFIX
+
+TOPICS = ["broker disk full", "consumer lag growing", "name server timeout", "topic route missing"]
+
+
+def _populate(store):
+    return [
+        store.add_knowledge("rocketmq", "general", topic.title(), f"{topic} troubleshooting steps", tags=["mq"])
+        for topic in TOPICS
+    ]
+
+
+def _doc_ids(store, collection):
+    return sorted(store.chroma_client.get_collection(DOC_INDEX_PREFIX + collection.name).get()["ids"])
+
+
+def _reset_doc_index(store, collection):
+    store.chroma_client.delete_collection(DOC_INDEX_PREFIX + collection.name)
+    store._invalidate_doc_index(collection.name)
+
+
+def test_first_use_backfills_existing_chunks(make_knowledge_store) -> None:
+    store = make_knowledge_store()
+    item_ids = _populate(store)
+    collection = store._get_or_create_collection("rocketmq")
+    _reset_doc_index(store, collection)
+
+    store._ensure_doc_index(collection)
+
+    assert _doc_ids(store, collection) == sorted(item_ids)
+    assert collection.name in store._doc_index_ready
+    selected = store._select_documents(collection, store.embed_query("consumer lag growing"), {})
+    assert selected[0] == item_ids[1]
+
+
+def test_backfill_drops_stale_documents(make_knowledge_store) -> None:
+    store = make_knowledge_store()
+    item_ids = _populate(store)
+    collection = store._get_or_create_collection("rocketmq")
+    doc_index = store._get_doc_index(collection)
+    doc_index.upsert(ids=["rocketmq_gone"], embeddings=[[1.0] + [0.0] * 31], metadatas=[{"item_id": "rocketmq_gone"}])
+    store._invalidate_doc_index(collection.name)
+
+    store._ensure_doc_index(collection)
+
+    assert _doc_ids(store, collection) == sorted(item_ids)
+
+
+def test_index_is_not_ready_until_every_batch_is_written(make_knowledge_store, monkeypatch) -> None:
+    store = make_knowledge_store()
+    _populate(store)
+    collection = store._get_or_create_collection("rocketmq")
+    _reset_doc_index(store, collection)
+
+    monkeypatch.setattr(store, "_index_documents", lambda collection, entries: False)
+    store._ensure_doc_index(collection)
+    assert collection.name not in store._doc_index_ready
+
+    monkeypatch.undo()
+    store._ensure_doc_index(collection)
+    assert collection.name in store._doc_index_ready
+
+
+def test_concurrent_first_use_backfills_once(make_knowledge_store, monkeypatch) -> None:
+    store = make_knowledge_store()
+    _populate(store)
+    collection = store._get_or_create_collection("rocketmq")
+    _reset_doc_index(store, collection)
+
+    calls = []
+    backfill = store._backfill_doc_index
+
+    def counting_backfill(*args):
+        calls.append(1)
+        backfill(*args)
+
+    monkeypatch.setattr(store, "_backfill_doc_index", counting_backfill)
+    threads = [threading.Thread(target=store._ensure_doc_index, args=(collection,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert len(_doc_ids(store, collection)) == len(TOPICS)
+
+
+def test_doc_index_error_falls_back_to_full_search(make_knowledge_store, monkeypatch) -> None:
+    store = make_knowledge_store()
+    _populate(store)
+    collection = store._get_or_create_collection("rocketmq")
+
+    def broken(collection):
+        raise RuntimeError("doc index unavailable")
+
+    monkeypatch.setattr(store, "_ensure_doc_index", broken)
+    assert store._select_documents(collection, store.embed_query("broker"), {}) is None
+
+    results = store.search_knowledge("broker disk full", domain="rocketmq", two_tier=True)
+    assert results and results[0].title == "Broker Disk Full"
+
+
+def test_two_tier_threshold(make_knowledge_store) -> None:
+    store = make_knowledge_store(two_tier_min_chunks=5)
+    _populate(store)
+    collection = store._get_or_create_collection("rocketmq")
+
+    # 按配置启用时只对分块数达到 two_tier_min_chunks 的集合使用
+    assert collection.count() == 4
+    assert not store._use_two_tier(collection, None)
+    store.add_knowledge("rocketmq", "general", "Acl", "acl denied troubleshooting", tags=["mq"])
+    assert store._use_two_tier(collection, None)
+
+    assert store._use_two_tier(collection, True)
+    assert not store._use_two_tier(collection, False)
+    store.config.two_tier_search = False
+    assert not store._use_two_tier(collection, None)
+    assert store._use_two_tier(collection, True)
@@ -0,0 +1,43 @@
+import threading
+
+from nanobot.web.warmup import FAILED, LOADING, READY, SKIPPED, WarmupTracker
+
+
+def test_warmup_reports_ready_and_degraded_subsystems() -> None:
+    tracker = WarmupTracker([("llm", True), ("knowledge", False), ("routing", False)])
+    assert not tracker.ready
+    assert tracker.snapshot()["subsystems"] == {"llm": "pending", "knowledge": "pending", "routing": "pending"}
+
+    assert tracker.run("llm", lambda: {"model": "m"})
+    assert tracker.ready
+    assert tracker.snapshot()["degraded"]
+
+    def broken():
+        raise RuntimeError("no collections")
+
+    assert not tracker.run("knowledge", broken)
+    tracker.skip("routing", "disabled")
+    snapshot = tracker.snapshot()
+    assert snapshot["ready"] and snapshot["degraded"] and snapshot["finished"]
+    assert snapshot["subsystems"] == {"llm": READY, "knowledge": FAILED, "routing": SKIPPED}
+    assert snapshot["stages"][0]["detail"] == {"model": "m"}
+    assert snapshot["stages"][1]["error"] == "no collections"
+
+
+def test_warmup_runs_in_background() -> None:
+    tracker = WarmupTracker([("llm", True)])
+    started = threading.Event()
+    release = threading.Event()
+
+    def stage():
+        started.set()
+        release.wait(5)
+
+    thread = tracker.start(lambda: tracker.run("llm", stage))
+    assert started.wait(5)
+    assert tracker.current_stage() == "llm"
+    assert tracker.state("llm") == LOADING
+    assert tracker.snapshot()["stages"][0]["elapsed_ms"] is not None
+    release.set()
+    thread.join(5)
+    assert tracker.ready and tracker.finished and not tracker.snapshot()["degraded"]
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from nanobot.web.sessions import ConnectionScheduler
+
+
+def test_connections_run_concurrently_in_their_own_sessions() -> None:
+    events: list[tuple[str, str, str]] = []
+
+    async def handler(user_input, connection):
+        events.append(("start", connection.session_key, user_input))
+        await asyncio.sleep(0.05)
+        events.append(("end", connection.session_key, user_input))
+
+    async def scenario():
+        scheduler = ConnectionScheduler(handler, max_concurrent=2)
+        first = scheduler.open(object())
+        second = scheduler.open(object())
+        for text in ("a1", "a2"):
+            scheduler.submit(first, text)
+        scheduler.submit(second, "b1")
+        await asyncio.sleep(0.02)
+        stats = scheduler.stats()
+        await asyncio.sleep(0.15)
+        await scheduler.close(first)
+        await scheduler.close(second)
+        return first, second, stats
+
+    first, second, stats = asyncio.run(scenario())
+    assert first.session_key != second.session_key
+    assert stats["active_requests"] == 2
+    # 两个连接同时处理；同一连接内按顺序处理
+    assert events[:2] == [("start", first.session_key, "a1"), ("start", second.session_key, "b1")]
+    first_events = [e for e in events if e[1] == first.session_key]
+    assert [e[2] for e in first_events] == ["a1", "a1", "a2", "a2"]
+
+
+def test_close_cancels_in_flight_request_and_limits_queue() -> None:
+    async def scenario():
+        done = asyncio.Event()
+
+        async def handler(user_input, connection):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                done.set()
+                raise
+
+        scheduler = ConnectionScheduler(handler, max_concurrent=1, max_pending=1)
+        connection = scheduler.open(object())
+        assert scheduler.submit(connection, "first")
+        await asyncio.sleep(0.01)
+        assert scheduler.submit(connection, "second")
+        assert not scheduler.submit(connection, "third")
+        await scheduler.close(connection)
+        return done.is_set(), scheduler.stats()
+
+    was_cancelled, stats = asyncio.run(scenario())
+    assert was_cancelled
+    assert stats["connections"] == 0
+    assert stats["active_requests"] == 0
+
+
+def test_configure_is_rejected_once_connections_exist() -> None:
+    async def handler(user_input, connection):
+        pass
+
+    async def scenario():
+        scheduler = ConnectionScheduler(handler)
+        scheduler.configure(2, 3)
+        connection = scheduler.open(object())
+        try:
+            with pytest.raises(RuntimeError):
+                scheduler.configure(1, 1)
+            return scheduler.max_concurrent, scheduler.max_pending
+        finally:
+            await scheduler.close(connection)
+
+    assert asyncio.run(scenario()) == (2, 3)
+
+
+def test_only_server_issued_session_ids_are_resumed() -> None:
+    async def handler(user_input, connection):
+        pass
+
+    async def scenario():
+        scheduler = ConnectionScheduler(handler)
+        other = ConnectionScheduler(handler)
+        first = scheduler.open(object())
+        resumed = scheduler.open(object(), first.session_id)
+        guessed = scheduler.open(object(), "alice")
+        forged = scheduler.open(object(), other.issue_session_id())
+        for connection in (first, resumed, guessed, forged):
+            await scheduler.close(connection)
+        return first, resumed, guessed, forged
+
+    first, resumed, guessed, forged = asyncio.run(scenario())
+    assert resumed.session_key == first.session_key
+    # 会话键不包含签名
+    assert first.session_id.split(".")[1] not in first.session_key
+    assert guessed.session_key not in ("webui:alice", first.session_key)
+    assert forged.session_key != first.session_key
+    assert all(c.session_id.count(".") == 1 for c in (guessed, forged))
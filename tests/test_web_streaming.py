@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+from nanobot.knowledge.metrics import InMemoryMetricsSink
+from nanobot.web.streaming import StreamWriter
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.frames: list[str] = []
+
+    async def send_text(self, text: str) -> None:
+        self.frames.append(text)
+
+
+def _chunk(content: str, content_type: str = "text") -> dict:
+    return {"type": "stream_chunk", "content_type": content_type, "content": content, "iteration_count": 1}
+
+
+def test_stream_writer_coalesces_chunks_into_one_frame() -> None:
+    ws = FakeWebSocket()
+    sink = InMemoryMetricsSink()
+
+    async def scenario():
+        writer = StreamWriter(ws, window_ms=50, sink=sink)
+        await writer.send_text("🤖 processing\n")
+        for token in ("Hel", "lo ", "world"):
+            await writer.send_json(_chunk(token))
+        await writer.send_json({**_chunk("", "tool"), "is_tool_call": True, "tool_name": "exec"})
+        await writer.send_completion(duration_from_start=1.0)
+        await writer.send_completion(duration_from_start=2.0)
+        await writer.finish()
+        return writer
+
+    writer = asyncio.run(scenario())
+    assert len(ws.frames) == 1
+    batch = json.loads(ws.frames[0])
+    assert batch["type"] == "batch"
+    messages = batch["messages"]
+    assert messages[0] == "🤖 processing\n"
+    assert messages[1]["content"] == "Hello world"
+    assert messages[2]["tool_name"] == "exec"
+    # 只有一条完成消息
+    assert [m for m in messages if isinstance(m, dict) and m.get("is_completed")] == [messages[3]]
+    assert len(messages) == 4
+    assert writer.messages == 6
+    assert sink.histogram("webui.stream_frames")["sum"] == 1
+    assert sink.histogram("webui.stream_bytes")["sum"] == len(ws.frames[0].encode("utf-8"))
+
+
+def test_stream_writer_flushes_on_window_and_size() -> None:
+    ws = FakeWebSocket()
+
+    async def scenario():
+        writer = StreamWriter(ws, window_ms=10, max_bytes=64, sink=InMemoryMetricsSink())
+        await writer.send_text("first")
+        await asyncio.sleep(0.05)
+        # 超过大小上限立即发送
+        await writer.send_text("x" * 100)
+        sent_before_finish = len(ws.frames)
+        await writer.finish()
+        return sent_before_finish
+
+    assert asyncio.run(scenario()) == 2
+    assert ws.frames == ["first", "x" * 100]